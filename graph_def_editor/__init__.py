@@ -12,38 +12,128 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-# ==============================================================================
 """GDE: A GraphDef Editor for TensorFlow
 
 A version of the old [`contrib.graph_editor`](https://github.com/tensorflow/tensorflow/tree/r1.12/tensorflow/contrib/graph_editor) API that operates over serialized TensorFlow graphs represented as GraphDef protocol buffer messages.
+
+On Python 3.7 and later, submodules are loaded on first access to one of
+their attributes (PEP 562), so `import graph_def_editor` by itself is cheap.
+Older versions of Python load all submodules up front.
 """
 
 from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-# pylint: disable=wildcard-import
-from graph_def_editor.edit import *
-from graph_def_editor.graph import *
-from graph_def_editor.match import *
-from graph_def_editor.node import *
-from graph_def_editor.reroute import *
-from graph_def_editor.select import *
-from graph_def_editor.subgraph import *
-from graph_def_editor.transform import *
-from graph_def_editor.util import *
-from graph_def_editor.variable import *
-# pylint: enable=wildcard-import
+import importlib
+import sys
+
+# Whether TensorFlow was loaded before this package. Decides which protobuf
+# bindings `graph_def_editor.protos` uses, however late it is loaded.
+_TENSORFLOW_LOADED_FIRST = "tensorflow" in sys.modules
+
+# Public names of each submodule that are also available at the top level
+# of the package. Must stay in sync with the submodules' `__all__` lists.
+_SUBMODULE_EXPORTS = {
+  "batch_norm_folding": ["fold_batch_norms"],
+  "common_subexpression_elimination": ["eliminate_common_subexpressions"],
+  "constant_folding": ["KernelContext", "register_numpy_kernel",
+                       "unregister_numpy_kernel", "get_numpy_kernel",
+                       "fold_constants"],
+  "dtypes": ["DType", "as_dtype"],
+  "edit": ["detach_control_inputs", "detach_control_outputs",
+           "detach_inputs", "detach_outputs", "detach", "connect", "bypass"],
+  "graph": ["Graph"],
+  "inference_cache": ["InferenceCache", "get_inference_cache",
+                      "set_inference_cache"],
+  "match": ["op_type", "op_attr", "OpMatcher", "find_all"],
+  "node": ["Node"],
+  "op_set": ["OpSet"],
+  "pass_manager": ["Analyses", "Pass", "PassRecord", "PassManager",
+                   "register_analysis", "unregister_analysis"],
+  "passthrough_elimination": ["eliminate_passthrough_ops"],
+  "pruning": ["prune"],
+  "reroute": ["swap_ts", "reroute_ts", "swap_inputs", "reroute_inputs",
+              "swap_outputs", "reroute_outputs", "swap_ios", "reroute_ios",
+              "remove_control_inputs", "add_control_inputs"],
+  "rewrite": ["RewriteRule", "RewriteDriver"],
+  "select": ["can_be_regex", "make_regex", "filter_ts", "filter_ts_from_regex",
+             "filter_ops", "filter_ops_from_regex", "get_name_scope_ops",
+             "check_cios", "get_ops_ios", "compute_boundary_ts",
+             "get_within_boundary_ops", "get_forward_walk_ops",
+             "get_backward_walk_ops", "get_walks_intersection_ops",
+             "get_walks_union_ops", "select_ops", "select_ts",
+             "select_ops_and_ts"],
+  "shape_functions": ["ShapeContext", "register_shape_function",
+                      "unregister_shape_function", "get_shape_function"],
+  "subgraph": ["SubGraphView", "make_view", "make_view_from_scope"],
+  "symbolic": ["SymbolicDim", "SymbolicShapeContext",
+               "register_symbolic_shape_function", "symbolic_num_elements",
+               "evaluate_symbolic_shape"],
+  "tensor_shape": ["TensorShape"],
+  "transform": ["replace_t_with_placeholder_handler",
+                "keep_t_if_possible_handler",
+                "assign_renamed_collections_handler",
+                "transform_op_if_inside_handler", "copy_op_handler",
+                "Transformer", "TransformerInfo", "copy",
+                "copy_with_input_replacements", "replicate", "graph_replace"],
+  "util": ["make_list_of_op", "make_list_of_t", "get_generating_ops",
+           "get_consuming_ops", "ControlOutputs", "placeholder_name",
+           "make_placeholder_from_tensor",
+           "make_placeholder_from_dtype_and_shape",
+           "load_variables_to_tf_graph", "make_const", "make_placeholder"],
+  "variable": ["Variable"],
+}
+
+# Submodules that are not wildcard-exported but are still reachable as
+# attributes of the package.
+_OTHER_SUBMODULES = ["pattern", "protos", "tensor", "tensor_util"]
 
 # some useful aliases
-# pylint: disable=g-bad-import-order
-from graph_def_editor import subgraph as _subgraph
-from graph_def_editor import util as _util
-# pylint: enable=g-bad-import-order
-ph = _util.make_placeholder_from_dtype_and_shape
-sgv = _subgraph.make_view
-sgv_scope = _subgraph.make_view_from_scope
+_ALIASES = {
+  "ph": ("util", "make_placeholder_from_dtype_and_shape"),
+  "sgv": ("subgraph", "make_view"),
+  "sgv_scope": ("subgraph", "make_view_from_scope"),
+}
+
+# Dict[str, Tuple[str, str]]; maps public name to (submodule, attribute)
+_LAZY_ATTRS = dict(_ALIASES)
+for _module_name, _names in _SUBMODULE_EXPORTS.items():
+  _LAZY_ATTRS.update((n, (_module_name, n)) for n in _names)
+del _module_name, _names
+
+__all__ = sorted(set(_LAZY_ATTRS) - set(_ALIASES))
+
+
+def __getattr__(name):
+  if name in _SUBMODULE_EXPORTS or name in _OTHER_SUBMODULES:
+    return importlib.import_module("." + name, __name__)
+  if name not in _LAZY_ATTRS:
+    raise AttributeError("module '{}' has no attribute '{}'".format(
+      __name__, name))
+  module_name, attr_name = _LAZY_ATTRS[name]
+  value = getattr(importlib.import_module("." + module_name, __name__),
+                  attr_name)
+  # Cache so that later lookups bypass this function.
+  globals()[name] = value
+  return value
+
+
+def __dir__():
+  return sorted(set(globals()) | set(_LAZY_ATTRS) | set(_SUBMODULE_EXPORTS)
+                | set(_OTHER_SUBMODULES))
+
+
+if sys.version_info < (3, 7):
+  # Module-level __getattr__ is ignored before PEP 562, so load everything
+  # now.
+  for _name in sorted(_SUBMODULE_EXPORTS) + _OTHER_SUBMODULES:
+    importlib.import_module("." + _name, __name__)
+  for _name in _LAZY_ATTRS:
+    __getattr__(_name)
+  del _name
 
 del absolute_import
 del division
 del print_function
+del sys
@@ -0,0 +1,225 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Folding of inference-time batch normalization into the weights of the
+preceding convolution or matrix multiplication."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+from graph_def_editor import graph, pass_manager, rewrite, util
+from graph_def_editor.pattern import Input, Op, repeated
+
+__all__ = [
+  "fold_batch_norms",
+]
+
+
+def fold_batch_norms(g: 'graph.Graph',
+                     analyses: 'pass_manager.Analyses' = None) -> int:
+  """
+  Fold batch normalization at inference time into the constant weights of
+  the op that produces its input.
+
+  Two patterns are folded:
+    * `FusedBatchNorm`, `FusedBatchNormV2` or `FusedBatchNormV3` with
+      `is_training` set to False, applied to the output of a `Conv2D` or
+      `DepthwiseConv2dNative`. The filter is scaled by
+      `scale / sqrt(variance + epsilon)` along its output channels, and the
+      batch normalization is replaced with a `BiasAdd` of
+      `offset - mean * scale / sqrt(variance + epsilon)`.
+    * `Mul` of the output of a `Conv2D`, `DepthwiseConv2dNative` or `MatMul`
+      by a constant that is a scalar or a vector of per-channel factors,
+      which is how batch normalization of a rank-2 tensor looks once its
+      parameters are folded into constants. The weights are scaled by the
+      factors and the `Mul` is removed.
+
+  The filter or weights, and the parameters of the batch normalization,
+  must be `Const` nodes, possibly read through chains of `Identity` nodes.
+  New values are computed with NumPy and stored in new `Const` nodes. The
+  rewrites are `gde.RewriteRule`s, so a match is left unchanged if any of
+  its intermediate nodes is used elsewhere or has a control input from
+  outside the match, or if the batch normalization or `Mul` has no
+  consumers. Matches whose shapes, data formats or dtypes do not line up
+  exactly are left unchanged as well.
+
+  Args:
+    g: `gde.Graph` to modify in place.
+    analyses: Unused; accepted so that this function can be added to a
+      `gde.PassManager` as a function pass.
+
+  Returns:
+    The number of batch normalizations and multiplications folded.
+  """
+  del analyses  # Unused
+  driver = rewrite.RewriteDriver([
+    rewrite.RewriteRule(_FUSED_BATCH_NORM_PATTERN, _fold_fused_batch_norm,
+                        name="fold_fused_batch_norm"),
+    rewrite.RewriteRule(_MUL_PATTERN, _fold_mul, name="fold_mul"),
+  ])
+  return driver.run(g)
+
+
+################################################################################
+# Stuff below this line is private to this file.
+
+
+_CONV_OP_TYPES = ("Conv2D", "DepthwiseConv2dNative")
+
+
+def _const_through_identities(name):
+  """Pattern for a `Const`, captured under `name`, possibly read through a
+  chain of `Identity` nodes."""
+  return repeated(Op("Identity", inputs=[Op("Const", name=name)]),
+                  min_count=0)
+
+
+def _is_inference_batch_norm(n):
+  """Returns True if `n` normalizes with its mean and variance inputs, and
+  only its first output is used."""
+  return not _get_attr(n, "is_training", True) and \
+      all(len(t.consumers()) == 0 for t in n.outputs[1:])
+
+
+_FUSED_BATCH_NORM_PATTERN = Op(
+  ("FusedBatchNorm", "FusedBatchNormV2", "FusedBatchNormV3"),
+  name="batch_norm", predicate=_is_inference_batch_norm,
+  inputs=[
+    Op(_CONV_OP_TYPES, name="conv", inputs=[
+      Input("x"), _const_through_identities("filter")]),
+    _const_through_identities("scale"),
+    _const_through_identities("offset"),
+    _const_through_identities("mean"),
+    _const_through_identities("variance")])
+
+_MUL_PATTERN = Op(
+  "Mul", name="mul", commutative=True,
+  inputs=[
+    Op(_CONV_OP_TYPES + ("MatMul",), name="conv", inputs=[
+      Input("x"), _const_through_identities("filter")]),
+    _const_through_identities("factor")])
+
+
+def _get_attr(n, key, default):
+  """Returns the value of attribute `key` of `n`, or `default` if the
+  attribute is missing, as it is in graphs exported with default-valued
+  attributes stripped."""
+  if key not in n.get_attr_keys():
+    return default
+  return n.get_attr(key)
+
+
+def _data_format(n):
+  """Returns the value of the `data_format` attribute of `n` as a string,
+  with TensorFlow's default for missing attributes."""
+  value = _get_attr(n, "data_format", "NHWC")
+  return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def _num_output_channels(conv, weights):
+  """Returns the number of output channels of `conv` given the value of its
+  filter or weights, or None if the weights have an unexpected rank."""
+  if conv.op_type == "MatMul":
+    if weights.ndim != 2:
+      return None
+    return weights.shape[0] if _get_attr(conv, "transpose_b", False) \
+      else weights.shape[1]
+  if weights.ndim != 4:
+    return None
+  if conv.op_type == "DepthwiseConv2dNative":
+    return weights.shape[2] * weights.shape[3]
+  return weights.shape[3]
+
+
+def _scale_weights(conv, weights, factors):
+  """Returns the weights of `conv` with each output channel multiplied by
+  the corresponding entry of the vector `factors`."""
+  if conv.op_type == "MatMul":
+    if _get_attr(conv, "transpose_b", False):
+      factors = factors[:, np.newaxis]
+  elif conv.op_type == "DepthwiseConv2dNative":
+    factors = factors.reshape(weights.shape[2:])
+  return (weights * factors).astype(weights.dtype)
+
+
+def _replace_weights(g, bindings, name, factors):
+  """Replace the filter or weights of the bound `conv` node with a new
+  `Const` holding them scaled by `factors`. Returns the `conv` node."""
+  conv, filter_node = bindings["conv"], bindings["filter"]
+  new_filter = util.make_const(
+    g, name, _scale_weights(conv, filter_node.get_attr("value"), factors),
+    uniquify_name=True)
+  new_filter.device = filter_node.device
+  conv.replace_input(1, new_filter.output(0))
+  return conv
+
+
+def _fold_fused_batch_norm(g, bindings):
+  """Replacement function of the rule for `FusedBatchNorm`."""
+  batch_norm, conv = bindings["batch_norm"], bindings["conv"]
+  weights = bindings["filter"].get_attr("value")
+  num_channels = _num_output_channels(conv, weights)
+  params = [np.asarray(bindings[k].get_attr("value"), dtype=np.float64)
+            for k in ("scale", "offset", "mean", "variance")]
+  if num_channels is None or \
+          any(p.shape != (num_channels,) for p in params) or \
+          _data_format(batch_norm) != _data_format(conv) or \
+          not np.issubdtype(weights.dtype, np.floating):
+    return None
+  scale, offset, mean, variance = params
+  factors = scale / np.sqrt(variance + _get_attr(batch_norm, "epsilon", 1e-4))
+  dtype = batch_norm.get_attr("T")
+  bias = util.make_const(
+    g, batch_norm.name + "/folded_bias",
+    (offset - mean * factors).astype(dtype.as_numpy_dtype),
+    uniquify_name=True)
+  bias.device = bindings["offset"].device
+
+  conv = _replace_weights(g, bindings, batch_norm.name + "/folded_weights",
+                          factors)
+  bias_add = g.add_node(batch_norm.name + "/folded", "BiasAdd",
+                        uniquify_name=True)
+  bias_add.add_attr("T", dtype)
+  bias_add.add_attr("data_format", _data_format(batch_norm))
+  bias_add.device = batch_norm.device
+  bias_add.set_inputs([conv.output(0), bias.output(0)])
+  bias_add.infer_outputs()
+  return [bias_add.output(0)] + [None] * (len(batch_norm.outputs) - 1)
+
+
+def _fold_mul(g, bindings):
+  """Replacement function of the rule for `Mul` by a constant."""
+  mul, conv = bindings["mul"], bindings["conv"]
+  weights = bindings["filter"].get_attr("value")
+  factor = np.asarray(bindings["factor"].get_attr("value"))
+  num_channels = _num_output_channels(conv, weights)
+  if num_channels is None or not np.issubdtype(weights.dtype, np.floating):
+    return None
+  rank = 2 if conv.op_type == "MatMul" else 4
+  channel_axis = 1 if rank == 4 and _data_format(conv) == "NCHW" else rank - 1
+  if factor.ndim > rank:
+    return None
+  if factor.size == 1:
+    factors = np.full([num_channels], factor.item())
+  else:
+    shape = [1] * (rank - factor.ndim) + list(factor.shape)
+    if shape[channel_axis] != num_channels or \
+            any(d != 1 for i, d in enumerate(shape) if i != channel_axis):
+      return None
+    factors = factor.reshape([num_channels])
+  return _replace_weights(g, bindings, mul.name + "/folded_weights",
+                          factors).output(0)
@@ -0,0 +1,183 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Common subexpression elimination: merging nodes that compute the same
+values."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from typing import Iterable, Union
+
+from graph_def_editor import graph, node, pass_manager, reroute, tensor, \
+  transform
+
+__all__ = [
+  "eliminate_common_subexpressions",
+]
+
+# Op types whose outputs only depend on their inputs and attributes, and
+# that have no side effects.
+DEFAULT_PURE_OP_TYPES = frozenset([
+  "Abs", "Add", "AddN", "AddV2", "All", "Any", "ArgMax", "ArgMin",
+  "BiasAdd", "BroadcastArgs", "BroadcastTo", "Cast", "Ceil", "Concat",
+  "ConcatV2", "Const", "Conv2D", "DepthwiseConv2dNative", "Div", "Elu",
+  "Equal", "Exp", "ExpandDims", "Fill", "Floor", "FloorDiv", "FloorMod",
+  "Gather", "GatherV2", "Greater", "GreaterEqual", "Identity", "IdentityN",
+  "Less", "LessEqual", "Log", "LogicalAnd", "LogicalNot", "LogicalOr",
+  "MatMul", "Max", "Maximum", "Mean", "Min", "Minimum", "Mul", "Neg",
+  "NotEqual", "OneHot", "OnesLike", "Pack", "Pad", "PadV2", "Pow", "Prod",
+  "Range", "Rank", "RealDiv", "Reciprocal", "Relu", "Relu6", "Reshape",
+  "Round", "Rsqrt", "Select", "SelectV2", "Shape", "ShapeN", "Sigmoid",
+  "Sign", "Size", "Slice", "Softmax", "Softplus", "Split", "SplitV", "Sqrt",
+  "Square", "SquaredDifference", "Squeeze", "StopGradient", "StridedSlice",
+  "Sub", "Sum", "Tanh", "Tile", "Transpose", "Unpack", "ZerosLike",
+])
+
+# Op types whose two inputs can be swapped without changing the result
+_COMMUTATIVE_OP_TYPES = frozenset([
+  "Add", "AddV2", "Equal", "LogicalAnd", "LogicalOr", "Maximum", "Minimum",
+  "Mul", "NotEqual", "SquaredDifference",
+])
+
+
+def eliminate_common_subexpressions(
+        g: 'graph.Graph', analyses: 'pass_manager.Analyses' = None,
+        keep: Iterable[Union[str, 'tensor.Tensor', 'node.Node']] = (),
+        op_types: Iterable[str] = None) -> int:
+  """
+  Merge nodes that are guaranteed to compute the same values, such as the
+  identical constants, shape computations and casts that copies of a
+  subgraph contain.
+
+  Nodes are visited in topological order and hashed by op type, attributes
+  other than internal ones such as `_has_manual_control_dependencies`,
+  device, data inputs and control inputs, where inputs that come from nodes
+  found to be duplicates earlier are replaced with the first node of their
+  class. The inputs of commutative ops such as `Add` are compared in either
+  order. Nodes with the same hash are equivalent, and every node but the
+  first of each class is merged into the first: its data and control
+  consumers are rerouted, in bulk with `gde.reroute_ts()`, to the node that
+  stays, and it is removed. Since equivalent nodes have the same control
+  inputs, the node that stays runs no later than the nodes merged into it
+  would have.
+
+  Only nodes whose op type is in `op_types` are merged. A node is also kept
+  if nothing consumes it, since it is presumably an output that is fetched
+  by name, if it is listed in `keep`, if a `gde.Variable` of the graph
+  refers to it, or if it is the head of a colocation group. The consumers of
+  a duplicate that is kept for one of these reasons can still be merged with
+  the consumers of the first node of its class.
+
+  Args:
+    g: `gde.Graph` to modify in place.
+    analyses: Optional `gde.Analyses` of `g`, used to avoid recomputing the
+      topological order and the colocation groups of the graph.
+    keep: Tensors and nodes that must not be removed, as `gde.Tensor` or
+      `gde.Node` objects or their names.
+    op_types: Op types that are known to be pure, that is, whose outputs
+      only depend on their inputs and attributes. Defaults to
+      `DEFAULT_PURE_OP_TYPES`.
+
+  Returns:
+    The number of nodes removed.
+  """
+  op_types = DEFAULT_PURE_OP_TYPES if op_types is None \
+    else frozenset(op_types)
+  # pylint: disable=protected-access
+  protected = graph._nodes_referenced_by_variables(g)
+  # pylint: enable=protected-access
+  for elem in keep:
+    if isinstance(elem, str):
+      elem = g[elem]
+    protected.add(elem.node if isinstance(elem, tensor.Tensor) else elem)
+  if analyses is not None and analyses.graph is g:
+    order = analyses.get("topological_order")
+    colocation_heads = analyses.get("colocation_groups")
+  else:
+    order = transform._topological_order(g.nodes)  # pylint: disable=protected-access
+    colocation_heads = g.colocation_groups
+
+  # First node of the equivalence class of each duplicate, merged or kept
+  first_of_class = {}
+  # Node that stays for each merged node
+  representative = {}
+  # First node of each equivalence class, by structural key
+  first_nodes = {}
+  for n in order:
+    if n.op_type not in op_types:
+      continue
+    key = _structural_key(n, first_of_class)
+    first = first_nodes.setdefault(key, n)
+    if first is n:
+      continue
+    first_of_class[n] = first
+    if n in protected or n.name in colocation_heads or \
+            len(g.node_consumers(n)) == 0:
+      continue
+    representative[n] = first
+  if len(representative) == 0:
+    return 0
+  duplicates = [n for n in order if n in representative]
+
+  # New control inputs of the remaining control consumers of merged nodes
+  new_control_inputs = {}
+  for n in duplicates:
+    for c in g.node_consumers(n):
+      if c in representative or c in new_control_inputs or \
+              n not in c.control_inputs:
+        continue
+      control_inputs = []
+      for d in c.control_inputs:
+        d = representative.get(d, d)
+        if d is not c and d not in control_inputs:
+          control_inputs.append(d)
+      new_control_inputs[c] = control_inputs
+
+  old_ts = [t for n in duplicates for t in n.outputs]
+  reroute.reroute_ts([representative[t.node].output(t.value_index)
+                      for t in old_ts], old_ts,
+                     cannot_modify=frozenset(duplicates))
+  for c, control_inputs in new_control_inputs.items():
+    c.set_control_inputs(control_inputs)
+  g.remove_nodes(duplicates)
+  return len(duplicates)
+
+
+################################################################################
+# Stuff below this line is private to this file.
+
+
+def _structural_key(n, first_of_class):
+  """
+  Returns a hashable value that is equal for two nodes if and only if they
+  have the same op type, attributes, device, and data and control inputs,
+  after mapping duplicates to the first nodes of their classes. Internal attributes,
+  whose names start with an underscore, are ignored, except for the
+  colocation groups in "_class".
+  """
+  inputs = []
+  for t in n.inputs:
+    producer = first_of_class.get(t.node, t.node)
+    inputs.append((producer.id_in_graph, t.value_index))
+  if n.op_type in _COMMUTATIVE_OP_TYPES and len(inputs) == 2:
+    inputs.sort()
+  control_inputs = sorted(set(first_of_class.get(c, c).id_in_graph
+                              for c in n.control_inputs))
+  node_def = n.to_node_def()
+  attrs = tuple((k, node_def.attr[k].SerializeToString(deterministic=True))
+                for k in sorted(node_def.attr)
+                if not k.startswith("_") or k == "_class")
+  return (n.op_type, n.device, tuple(inputs), tuple(control_inputs), attrs)
@@ -0,0 +1,632 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Constant folding: replacing subgraphs that only depend on constants with
+their precomputed values."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+from typing import Callable, Iterable, List, Optional, Union
+
+from graph_def_editor import dtypes, graph, pass_manager, protos, reroute, \
+  shape_functions, tensor_shape, transform, util
+
+__all__ = [
+  "KernelContext",
+  "register_numpy_kernel",
+  "unregister_numpy_kernel",
+  "get_numpy_kernel",
+  "fold_constants",
+]
+
+# Same limit as TensorFlow's own constant folding.
+DEFAULT_MAX_CONSTANT_SIZE = 10 * 1024 * 1024
+
+
+class KernelContext(shape_functions.ShapeContext):
+  """
+  Everything a NumPy kernel may look at: the node's op type and attributes,
+  and the values of its data inputs. Besides the methods of `ShapeContext`,
+  `input_value()` returns the value of every input, whatever its dtype.
+  """
+
+  def __init__(self, node_def, input_specs, input_values):
+    """
+    Do not call this constructor directly; `fold_constants()` creates
+    contexts as needed.
+
+    Args:
+      node_def: NodeDef of the node being evaluated.
+      input_specs: One tuple per data input, as described in
+        `inference_cache.node_def_signature()`.
+      input_values: numpy arrays holding the values of the data inputs.
+    """
+    super(KernelContext, self).__init__(node_def, input_specs)
+    self._input_values = list(input_values)
+
+  def input_value(self, index: int) -> np.ndarray:
+    return self._input_values[index]
+
+  def input_ints(self, index: int) -> List[int]:
+    """Returns the value of an integer input as a flat list of ints."""
+    return [int(i) for i in np.ravel(self._input_values[index])]
+
+
+NumpyKernel = Callable[[KernelContext], Optional[List[np.ndarray]]]
+
+# Dict[str, NumpyKernel]; key is op type
+_numpy_kernels = {}
+
+
+def register_numpy_kernel(op_types: Union[str, Iterable[str]],
+                          fn: NumpyKernel = None):
+  """
+  Register a function that evaluates one or more op types on constant inputs
+  with NumPy, replacing any function previously registered for those op
+  types.
+
+  Only register kernels for ops that always produce the same outputs from the
+  same inputs and have no side effects: `fold_constants()` treats every op
+  type with a kernel as safe to fold.
+
+  Can also be used as a decorator:
+
+  ```
+  @gde.register_numpy_kernel("MyOp")
+  def _my_op_kernel(ctx):
+    return [ctx.input_value(0) * ctx.attr_int("factor")]
+  ```
+
+  Args:
+    op_types: Op type string, or iterable of op type strings.
+    fn: Function that takes a `KernelContext` and returns a list of numpy
+      arrays, one per output, or None to defer to TensorFlow.
+      If None, this function returns a decorator.
+
+  Returns:
+    `fn`, or a decorator if `fn` is None.
+  """
+  if isinstance(op_types, str):
+    op_types = [op_types]
+  op_types = list(op_types)
+
+  def decorator(f):
+    for op_type in op_types:
+      _numpy_kernels[op_type] = f
+    return f
+
+  if fn is None:
+    return decorator
+  return decorator(fn)
+
+
+def unregister_numpy_kernel(op_type: str):
+  """
+  Remove the NumPy kernel registered for an op type, if any, so that constant
+  folding for that op type falls back on TensorFlow.
+  """
+  _numpy_kernels.pop(op_type, None)
+
+
+def get_numpy_kernel(op_type: str) -> Optional[NumpyKernel]:
+  """
+  Returns the NumPy kernel registered for an op type, or None if there is
+  none.
+  """
+  return _numpy_kernels.get(op_type)
+
+
+def fold_constants(g: 'graph.Graph', analyses: 'pass_manager.Analyses' = None,
+                   max_constant_size: int = DEFAULT_MAX_CONSTANT_SIZE,
+                   use_tensorflow: bool = True) -> int:
+  """
+  Replace every maximal subgraph whose outputs only depend on constants with
+  `Const` nodes holding the precomputed outputs.
+
+  A node can be folded if all its data inputs come from `Const` nodes or
+  from nodes that can be folded, and its op type is pure: it has a NumPy
+  kernel (see `register_numpy_kernel()`), or TensorFlow's op registry says
+  that it is not stateful. `Shape`, `Size` and `Rank` nodes can also be
+  folded if the static shape of their input is known well enough. Nodes in
+  the body of a control flow loop, placeholders and control flow ops are
+  never folded.
+
+  Nodes are evaluated with their NumPy kernels when there is one, and
+  otherwise one at a time in a CPU-only TensorFlow session. Nodes that fail
+  to evaluate, and nodes with an output larger than `max_constant_size`
+  bytes, are left alone.
+
+  Each output of a folded node that a node that cannot be folded consumes is
+  replaced with a new `Const` node on the same device, with a control
+  dependency on every node that the original subgraph had a control
+  dependency on. Folded nodes that nothing consumes any more are then
+  removed. Folded nodes that had no consumers to begin with are left in
+  place, since they are presumably outputs that are fetched by name.
+
+  To run this function in a `gde.PassManager`, add it as a function pass;
+  it then gets the graph's topological order from the pipeline's cache of
+  analyses.
+
+  Args:
+    g: `gde.Graph` to modify in place.
+    analyses: Optional `gde.Analyses` of `g`, used to avoid recomputing the
+      topological order of the graph.
+    max_constant_size: Maximum size in bytes of the value of a new `Const`.
+    use_tensorflow: If False, only fold nodes that have a NumPy kernel or
+      that only depend on static shapes, without importing TensorFlow.
+
+  Returns:
+    The number of tensors that were replaced with constants.
+  """
+  if analyses is not None and analyses.graph is g:
+    order = analyses.get("topological_order")
+  else:
+    order = transform._topological_order(g.nodes)  # pylint: disable=protected-access
+
+  folder = _ConstantFolder(g, max_constant_size, use_tensorflow)
+  for n in order:
+    folder.visit(n)
+
+  # Outputs of folded nodes that nodes that cannot be folded consume
+  replaced = []
+  for n in order:
+    if n not in folder.folded or n.op_type == "Const":
+      continue
+    for t in n.outputs:
+      if any(c not in folder.folded for c in t.consumers()):
+        replaced.append(t)
+  if len(replaced) == 0:
+    return 0
+
+  originally_consumed = [n for n in order if n in folder.folded and
+                         len(g.node_consumers(n)) > 0]
+  for t in replaced:
+    n = t.node
+    name = n.name + "/folded" if len(n.outputs) == 1 \
+      else "{}/folded_{}".format(n.name, t.value_index)
+    const = util.make_const(g, name, folder.values[t], uniquify_name=True)
+    const.device = n.device
+    const.set_control_inputs(sorted(folder.control_deps[n],
+                                    key=lambda c: c.id_in_graph))
+    reroute.reroute_ts([const.output(0)], [t])
+
+  for n in reversed(originally_consumed):
+    if len(g.node_consumers(n)) == 0:
+      g.remove_node(n)
+  return len(replaced)
+
+
+################################################################################
+# Stuff below this line is private to this file.
+
+
+# Ops whose outputs are not determined by their inputs alone, even though
+# TensorFlow does not mark all of them stateful.
+_UNFOLDABLE_OP_TYPES = frozenset([
+  "Placeholder", "PlaceholderV2", "PlaceholderWithDefault",
+  "Enter", "RefEnter", "Exit", "RefExit", "Merge", "RefMerge", "Switch",
+  "RefSwitch", "NextIteration", "RefNextIteration", "LoopCond",
+  "ControlTrigger", "NoOp",
+])
+
+_STATIC_SHAPE_OP_TYPES = frozenset(["Shape", "Size", "Rank"])
+
+
+class _ConstantFolder(object):
+  """State of one call to `fold_constants()`: which nodes can be folded,
+  their output values, and the control dependencies they inherit."""
+
+  def __init__(self, g, max_constant_size, use_tensorflow):
+    self._graph = g
+    self._max_constant_size = max_constant_size
+    self._use_tensorflow = use_tensorflow
+    self.folded = set()
+    # Dict[Tensor, np.ndarray]. Values of Const nodes are only decoded when
+    # a consumer needs them.
+    self.values = {}
+    # Dict[Node, FrozenSet[Node]]; nodes that cannot be folded and that a
+    # folded node must still run after
+    self.control_deps = {}
+
+  def visit(self, n):
+    """Decide whether `n` can be folded and if so compute its outputs.
+    Must be called on producers before consumers."""
+    g = self._graph
+    if n.op_type in _UNFOLDABLE_OP_TYPES or \
+            len(g.node_to_frame_names(n)) > 0 or \
+            not all(_is_foldable_dtype(t.dtype) for t in n.outputs):
+      return
+    if n.op_type == "Const":
+      if len(n.outputs) == 1:
+        self._fold(n, None)
+      return
+    if len(n.inputs) == 0 or len(n.outputs) == 0:
+      return
+    if all(t.node in self.folded for t in n.inputs):
+      if any(_static_num_bytes(t) > self._max_constant_size
+             for t in n.outputs):
+        return
+      outputs = self._evaluate(n)
+    elif n.op_type in _STATIC_SHAPE_OP_TYPES:
+      outputs = _evaluate_static_shape(n)
+    else:
+      return
+    if outputs is None or len(outputs) != len(n.outputs):
+      return
+    try:
+      outputs = [_conform(v, t) for v, t in zip(outputs, n.outputs)]
+    except (TypeError, ValueError):
+      return
+    if any(v is None or v.nbytes > self._max_constant_size for v in outputs):
+      return
+    self._fold(n, outputs)
+
+  def _fold(self, n, outputs):
+    self.folded.add(n)
+    if outputs is not None:
+      for t, v in zip(n.outputs, outputs):
+        self.values[t] = v
+    deps = set()
+    if n.op_type not in _STATIC_SHAPE_OP_TYPES or \
+            all(t.node in self.folded for t in n.inputs):
+      for t in n.inputs:
+        deps.update(self.control_deps[t.node])
+    for c in n.control_inputs:
+      if c in self.folded:
+        deps.update(self.control_deps[c])
+      else:
+        deps.add(c)
+    self.control_deps[n] = frozenset(deps)
+
+  def value(self, t):
+    if t not in self.values:
+      self.values[t] = t.node.get_attr("value")
+    return self.values[t]
+
+  def _evaluate(self, n):
+    """Returns the values of the outputs of `n`, or None if they cannot be
+    computed."""
+    input_values = [self.value(t) for t in n.inputs]
+    kernel = _numpy_kernels.get(n.op_type)
+    if kernel is not None:
+      ctx = KernelContext(
+        n.to_node_def(),
+        [(t.dtype, tensor_shape.TensorShape(v.shape), t.node.op_type, None)
+         for t, v in zip(n.inputs, input_values)],
+        input_values)
+      try:
+        with np.errstate(all="ignore"):
+          ret = kernel(ctx)
+      except Exception:  # pylint: disable=broad-except
+        # Anything the kernel cannot handle is TensorFlow's problem.
+        ret = None
+      if ret is not None:
+        return ret
+    if not self._use_tensorflow:
+      return None
+    return _evaluate_with_tensorflow(n, input_values)
+
+
+def _is_foldable_dtype(dtype) -> bool:
+  """True if values of `dtype` can be held in a plain numpy array."""
+  return (not dtype._is_ref_dtype  # pylint: disable=protected-access
+          and not dtype.is_quantized
+          and dtype.as_numpy_dtype not in (None, np.object_))
+
+
+def _static_num_bytes(t) -> int:
+  """Size of the value of `t` according to its static shape, or 0 if the
+  shape is not fully known."""
+  if not t.shape.is_fully_defined():
+    return 0
+  return t.shape.num_elements() * t.dtype.size
+
+
+def _conform(value, t) -> Optional[np.ndarray]:
+  """Returns `value` as an array of the dtype of `t`, or None if it does
+  not have the static shape of `t`."""
+  value = np.asarray(value, dtype=t.dtype.as_numpy_dtype)
+  if not t.shape.is_compatible_with(tensor_shape.TensorShape(value.shape)):
+    return None
+  return value
+
+
+def _evaluate_static_shape(n):
+  """Evaluate a `Shape`, `Size` or `Rank` node from the static shape of its
+  input, or return None if the shape is not known well enough."""
+  shape = n.inputs[0].shape
+  if n.op_type == "Rank":
+    return None if shape.ndims is None else [np.array(shape.ndims)]
+  if not shape.is_fully_defined():
+    return None
+  if n.op_type == "Shape":
+    return [np.array(shape.as_list())]
+  return [np.array(shape.num_elements())]
+
+
+def _evaluate_with_tensorflow(n, input_values):
+  """Run a single node in a CPU-only TensorFlow session. Returns None if the
+  node's op is stateful or fails to run."""
+  import tensorflow as tf  # pylint: disable=g-import-not-at-top
+  node_def = n.to_node_def()
+  del node_def.input[:]
+  node_def.device = ""
+  if "_class" in node_def.attr:
+    del node_def.attr["_class"]
+  temp_graph = tf.Graph()
+  try:
+    with temp_graph.as_default():
+      inputs = [tf.constant(v, dtype=t.dtype.as_datatype_enum)
+                for t, v in zip(n.inputs, input_values)]
+      op = tf.Operation(protos.to_tensorflow(node_def), temp_graph,
+                        inputs=inputs)
+      if op.op_def.is_stateful:
+        return None
+    config = tf.ConfigProto(device_count={"GPU": 0})
+    with tf.Session(graph=temp_graph, config=config) as sess:
+      return sess.run(list(op.outputs))
+  except Exception:  # pylint: disable=broad-except
+    # Unknown op, function call without its library, invalid inputs...
+    return None
+
+
+################################################################################
+# NumPy kernels
+
+
+def _identity(x):
+  return x
+
+
+def _floating_only(fn):
+  def wrapped(x):
+    if not np.issubdtype(x.dtype, np.floating):
+      raise TypeError("Only defined here for floating point inputs")
+    return fn(x)
+  return wrapped
+
+
+_UNARY_FUNCTIONS = {
+  "Abs": np.abs,
+  "Ceil": np.ceil,
+  "Exp": np.exp,
+  "Floor": np.floor,
+  "Identity": _identity,
+  "Log": np.log,
+  "Log1p": np.log1p,
+  "LogicalNot": np.logical_not,
+  "Neg": np.negative,
+  "OnesLike": np.ones_like,
+  "PreventGradient": _identity,
+  "Reciprocal": _floating_only(np.reciprocal),
+  "Relu": lambda x: np.maximum(x, np.zeros_like(x)),
+  "Relu6": lambda x: np.clip(x, 0, 6).astype(x.dtype),
+  "Round": np.round,
+  "Rsqrt": _floating_only(lambda x: np.reciprocal(np.sqrt(x))),
+  "Sigmoid": _floating_only(lambda x: np.reciprocal(1 + np.exp(-x))),
+  "Sign": np.sign,
+  "Snapshot": _identity,
+  "Sqrt": np.sqrt,
+  "Square": np.square,
+  "StopGradient": _identity,
+  "Tanh": np.tanh,
+  "ZerosLike": np.zeros_like,
+}
+
+
+def _nonzero_divisor(fn):
+  """TensorFlow fails on integer division by zero where numpy returns 0."""
+  def wrapped(x, y):
+    if np.issubdtype(y.dtype, np.integer) and not np.all(y):
+      raise ZeroDivisionError()
+    return fn(x, y)
+  return wrapped
+
+
+def _true_divide(x, y):
+  if not np.issubdtype(x.dtype, np.inexact):
+    raise TypeError("Integer division semantics differ from numpy")
+  return np.true_divide(x, y)
+
+
+_BINARY_FUNCTIONS = {
+  "Add": np.add,
+  "AddV2": np.add,
+  "Div": _true_divide,
+  "Equal": np.equal,
+  "FloorDiv": _nonzero_divisor(np.floor_divide),
+  "FloorMod": _nonzero_divisor(np.mod),
+  "Greater": np.greater,
+  "GreaterEqual": np.greater_equal,
+  "Less": np.less,
+  "LessEqual": np.less_equal,
+  "LogicalAnd": np.logical_and,
+  "LogicalOr": np.logical_or,
+  "Maximum": np.maximum,
+  "Minimum": np.minimum,
+  "Mul": np.multiply,
+  "NotEqual": np.not_equal,
+  "Pow": np.power,
+  "RealDiv": _true_divide,
+  "SquaredDifference": lambda x, y: np.square(x - y),
+  "Sub": np.subtract,
+}
+
+_REDUCTION_FUNCTIONS = {
+  "All": np.all,
+  "Any": np.any,
+  "Max": np.max,
+  "Mean": np.mean,
+  "Min": np.min,
+  "Prod": np.prod,
+  "Sum": np.sum,
+}
+
+
+def _np_dtype(ctx, key, default):
+  return ctx.attr_type(key, default).as_numpy_dtype
+
+
+@register_numpy_kernel(list(_UNARY_FUNCTIONS.keys()))
+def _unary_kernel(ctx):
+  return [_UNARY_FUNCTIONS[ctx.op_type](ctx.input_value(0))]
+
+
+@register_numpy_kernel(list(_BINARY_FUNCTIONS.keys()))
+def _binary_kernel(ctx):
+  return [_BINARY_FUNCTIONS[ctx.op_type](ctx.input_value(0),
+                                         ctx.input_value(1))]
+
+
+@register_numpy_kernel("BiasAdd")
+def _bias_add_kernel(ctx):
+  if ctx.attr_str("data_format", "NHWC") != "NHWC":
+    return None
+  return [ctx.input_value(0) + ctx.input_value(1)]
+
+
+@register_numpy_kernel(list(_REDUCTION_FUNCTIONS.keys()))
+def _reduction_kernel(ctx):
+  x = ctx.input_value(0)
+  if ctx.op_type == "Mean" and not np.issubdtype(x.dtype, np.inexact):
+    return None
+  kwargs = {"axis": tuple(ctx.input_ints(1)),
+            "keepdims": ctx.attr_bool("keep_dims", False)}
+  if ctx.op_type in ("Sum", "Prod"):
+    # Otherwise numpy widens small integer types.
+    kwargs["dtype"] = x.dtype
+  return [_REDUCTION_FUNCTIONS[ctx.op_type](x, **kwargs)]
+
+
+@register_numpy_kernel("Cast")
+def _cast_kernel(ctx):
+  return [ctx.input_value(0).astype(_np_dtype(ctx, "DstT", None))]
+
+
+@register_numpy_kernel("Shape")
+def _shape_kernel(ctx):
+  return [np.array(ctx.input_value(0).shape,
+                   dtype=_np_dtype(ctx, "out_type", dtypes.int32))]
+
+
+@register_numpy_kernel("Size")
+def _size_kernel(ctx):
+  return [np.array(ctx.input_value(0).size,
+                   dtype=_np_dtype(ctx, "out_type", dtypes.int32))]
+
+
+@register_numpy_kernel("Rank")
+def _rank_kernel(ctx):
+  return [np.array(ctx.input_value(0).ndim, dtype=np.int32)]
+
+
+@register_numpy_kernel("Reshape")
+def _reshape_kernel(ctx):
+  return [np.reshape(ctx.input_value(0), ctx.input_ints(1))]
+
+
+@register_numpy_kernel("Transpose")
+def _transpose_kernel(ctx):
+  return [np.transpose(ctx.input_value(0), ctx.input_ints(1))]
+
+
+@register_numpy_kernel("ExpandDims")
+def _expand_dims_kernel(ctx):
+  axis = ctx.input_ints(1)
+  if len(axis) != 1:
+    return None
+  return [np.expand_dims(ctx.input_value(0), axis[0])]
+
+
+@register_numpy_kernel("Squeeze")
+def _squeeze_kernel(ctx):
+  axis = ctx.attr_ints("squeeze_dims", [])
+  if len(axis) == 0:
+    return [np.squeeze(ctx.input_value(0))]
+  return [np.squeeze(ctx.input_value(0), axis=tuple(axis))]
+
+
+@register_numpy_kernel("Pack")
+def _pack_kernel(ctx):
+  return [np.stack([ctx.input_value(i) for i in range(ctx.num_inputs)],
+                   axis=ctx.attr_int("axis", 0))]
+
+
+@register_numpy_kernel(["Concat", "ConcatV2"])
+def _concat_kernel(ctx):
+  if ctx.op_type == "Concat":
+    axis_index, value_indices = 0, range(1, ctx.num_inputs)
+  else:
+    axis_index, value_indices = ctx.num_inputs - 1, range(ctx.num_inputs - 1)
+  return [np.concatenate([ctx.input_value(i) for i in value_indices],
+                         axis=ctx.input_ints(axis_index)[0])]
+
+
+@register_numpy_kernel("Fill")
+def _fill_kernel(ctx):
+  value = ctx.input_value(1)
+  return [np.full(ctx.input_ints(0), value, dtype=value.dtype)]
+
+
+@register_numpy_kernel("Range")
+def _range_kernel(ctx):
+  start, limit, delta = (ctx.input_value(i) for i in range(3))
+  return [np.arange(start, limit, delta).astype(start.dtype)]
+
+
+@register_numpy_kernel("Slice")
+def _slice_kernel(ctx):
+  x = ctx.input_value(0)
+  begin, size = ctx.input_ints(1), ctx.input_ints(2)
+  if len(begin) != x.ndim or len(size) != x.ndim:
+    return None
+  slices = []
+  for b, s, dim in zip(begin, size, x.shape):
+    end = dim if s == -1 else b + s
+    if b < 0 or end < b or end > dim:
+      return None
+    slices.append(slice(b, end))
+  return [x[tuple(slices)]]
+
+
+@register_numpy_kernel("Tile")
+def _tile_kernel(ctx):
+  return [np.tile(ctx.input_value(0), ctx.input_ints(1))]
+
+
+@register_numpy_kernel(["Gather", "GatherV2"])
+def _gather_kernel(ctx):
+  params, indices = ctx.input_value(0), ctx.input_value(1)
+  axis = 0 if ctx.op_type == "Gather" else ctx.input_ints(2)[0]
+  if ctx.attr_int("batch_dims", 0) != 0:
+    return None
+  if axis < 0:
+    axis += params.ndim
+  # numpy wraps negative indices around; TensorFlow rejects them.
+  if np.any(indices < 0) or np.any(indices >= params.shape[axis]):
+    return None
+  return [np.take(params, indices, axis=axis)]
+
+
+@register_numpy_kernel("MatMul")
+def _mat_mul_kernel(ctx):
+  a, b = ctx.input_value(0), ctx.input_value(1)
+  if ctx.attr_bool("transpose_a", False):
+    a = a.T
+  if ctx.attr_bool("transpose_b", False):
+    b = b.T
+  return [np.matmul(a, b)]
@@ -0,0 +1,318 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Lightweight stand-in for `tf.DType` that does not require TensorFlow.
+
+`DType` objects compare equal to, and hash the same as, the corresponding
+`tf.DType` objects and `DataType` enum values, so the two can be used
+interchangeably as dictionary keys and in comparisons.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+from graph_def_editor.protos import types_pb2
+
+
+__all__ = [
+  "DType",
+  "as_dtype",
+]
+
+
+_REF_OFFSET = 100
+
+# This module defines a `bool` constant, like TensorFlow's dtypes module.
+_PYTHON_BOOL = bool
+
+
+class DType(object):
+  """
+  Data type of the elements of a tensor. Corresponds to `tf.DType`, and
+  supports the subset of its API that GDE needs.
+
+  Use `as_dtype()` or the module-level constants (such as `dtypes.float32`)
+  to obtain instances; instances are interned, one per `DataType` enum value.
+  """
+
+  def __init__(self, type_enum: int):
+    """
+    Do not call this constructor directly; use `as_dtype()`.
+    """
+    type_enum = int(type_enum)
+    base_enum = type_enum - _REF_OFFSET if type_enum > _REF_OFFSET \
+      else type_enum
+    if base_enum not in _BASE_TYPE_INFO:
+      raise TypeError("{} is not a valid DataType enum value".format(
+        type_enum))
+    self._type_enum = type_enum
+
+  @property
+  def as_datatype_enum(self) -> int:
+    """Returns a `types_pb2.DataType` enum value based on this data type."""
+    return self._type_enum
+
+  @property
+  def _is_ref_dtype(self) -> bool:
+    return self._type_enum > _REF_OFFSET
+
+  @property
+  def _info(self):
+    return _BASE_TYPE_INFO[self.base_dtype.as_datatype_enum]
+
+  @property
+  def name(self) -> str:
+    name = self._info[0]
+    return name + "_ref" if self._is_ref_dtype else name
+
+  @property
+  def base_dtype(self) -> 'DType':
+    """Returns a non-reference `DType` based on this `DType`."""
+    if self._is_ref_dtype:
+      return _INTERN_TABLE[self._type_enum - _REF_OFFSET]
+    return self
+
+  @property
+  def as_numpy_dtype(self):
+    """
+    Returns the numpy type that corresponds to this `DType`, or None if
+    numpy has no equivalent (for example bfloat16 without the `ml_dtypes`
+    package).
+    """
+    return self._info[1]
+
+  @property
+  def size(self) -> int:
+    """Size in bytes of one element of this data type."""
+    return self._info[2]
+
+  @property
+  def is_bool(self) -> bool:
+    return self.base_dtype._type_enum == types_pb2.DT_BOOL
+
+  @property
+  def is_floating(self) -> bool:
+    return self.base_dtype._type_enum in _FLOATING_ENUMS
+
+  @property
+  def is_complex(self) -> bool:
+    return self.base_dtype._type_enum in (types_pb2.DT_COMPLEX64,
+                                          types_pb2.DT_COMPLEX128)
+
+  @property
+  def is_integer(self) -> bool:
+    return self.base_dtype._type_enum in _INTEGER_ENUMS
+
+  @property
+  def is_unsigned(self) -> bool:
+    return self.base_dtype._type_enum in _UNSIGNED_ENUMS
+
+  @property
+  def is_quantized(self) -> bool:
+    return self.base_dtype._type_enum in _QUANTIZED_ENUMS
+
+  def is_compatible_with(self, other) -> bool:
+    """
+    Returns True if a value of type `other` can be used where a value of
+    this type is expected; i.e. if the base types match and this type is not
+    a reference type unless `other` is.
+    """
+    other = as_dtype(other)
+    return self._type_enum in (other.as_datatype_enum,
+                               other.base_dtype.as_datatype_enum)
+
+  def __eq__(self, other):
+    if other is None:
+      return False
+    if not isinstance(other, DType):
+      try:
+        other = as_dtype(other)
+      except TypeError:
+        return False
+    return self._type_enum == other._type_enum
+
+  def __ne__(self, other):
+    return not self.__eq__(other)
+
+  def __hash__(self):
+    # Same as tf.DType, so that the two types can share dictionary keys.
+    return self._type_enum
+
+  def __str__(self):
+    return "<dtype: '{}'>".format(self.name)
+
+  def __repr__(self):
+    return "dtypes." + self.name
+
+  def __reduce__(self):
+    return as_dtype, (self._type_enum,)
+
+
+def as_dtype(type_value) -> DType:
+  """
+  Convert a value to a `DType`.
+
+  Args:
+    type_value: A `DType`, a `tf.DType`, a `DataType` enum value, a type
+      name string such as "float32", a numpy dtype or type, or one of the
+      Python types `bool`, `int`, `float` and `str`.
+
+  Returns:
+    The corresponding `DType`.
+
+  Raises:
+    TypeError if `type_value` cannot be converted.
+  """
+  if isinstance(type_value, DType):
+    return type_value
+  if hasattr(type_value, "as_datatype_enum"):
+    # tf.DType
+    return as_dtype(type_value.as_datatype_enum)
+  if isinstance(type_value, (int, np.integer)) and \
+          not isinstance(type_value, _PYTHON_BOOL):
+    ret = _INTERN_TABLE.get(int(type_value))
+    if ret is not None:
+      return ret
+  elif isinstance(type_value, str):
+    ret = _NAME_TO_DTYPE.get(type_value)
+    if ret is not None:
+      return ret
+  elif isinstance(type_value, type) and type_value in _PYTHON_TO_DTYPE:
+    return _PYTHON_TO_DTYPE[type_value]
+  else:
+    try:
+      np_type = np.dtype(type_value)
+    except TypeError:
+      np_type = None
+    if np_type is not None:
+      ret = _NUMPY_TO_DTYPE.get(np_type)
+      if ret is None and np_type.kind in ("U", "S", "O"):
+        ret = _INTERN_TABLE[types_pb2.DT_STRING]
+      if ret is not None:
+        return ret
+  raise TypeError("Cannot convert value {!r} to a DType.".format(type_value))
+
+
+################################################################################
+# Stuff below this line is private to this file.
+
+
+def _optional_numpy_type(name):
+  """Numpy types that only exist if the `ml_dtypes` package is installed."""
+  try:
+    import ml_dtypes  # pylint: disable=g-import-not-at-top
+  except ImportError:
+    return None
+  return getattr(ml_dtypes, name, None)
+
+
+# Quantized types are represented in numpy as single-field structs, as in
+# TensorFlow.
+_np_qint8 = np.dtype([("qint8", np.int8)])
+_np_quint8 = np.dtype([("quint8", np.uint8)])
+_np_qint16 = np.dtype([("qint16", np.int16)])
+_np_quint16 = np.dtype([("quint16", np.uint16)])
+_np_qint32 = np.dtype([("qint32", np.int32)])
+
+# Map from DataType enum to (name, numpy type, size in bytes)
+_BASE_TYPE_INFO = {
+  types_pb2.DT_FLOAT: ("float32", np.float32, 4),
+  types_pb2.DT_DOUBLE: ("float64", np.float64, 8),
+  types_pb2.DT_INT32: ("int32", np.int32, 4),
+  types_pb2.DT_UINT8: ("uint8", np.uint8, 1),
+  types_pb2.DT_INT16: ("int16", np.int16, 2),
+  types_pb2.DT_INT8: ("int8", np.int8, 1),
+  types_pb2.DT_STRING: ("string", np.object_, 0),
+  types_pb2.DT_COMPLEX64: ("complex64", np.complex64, 8),
+  types_pb2.DT_INT64: ("int64", np.int64, 8),
+  types_pb2.DT_BOOL: ("bool", np.bool_, 1),
+  types_pb2.DT_QINT8: ("qint8", _np_qint8, 1),
+  types_pb2.DT_QUINT8: ("quint8", _np_quint8, 1),
+  types_pb2.DT_QINT32: ("qint32", _np_qint32, 4),
+  types_pb2.DT_BFLOAT16: ("bfloat16", _optional_numpy_type("bfloat16"), 2),
+  types_pb2.DT_QINT16: ("qint16", _np_qint16, 2),
+  types_pb2.DT_QUINT16: ("quint16", _np_quint16, 2),
+  types_pb2.DT_UINT16: ("uint16", np.uint16, 2),
+  types_pb2.DT_COMPLEX128: ("complex128", np.complex128, 16),
+  types_pb2.DT_HALF: ("float16", np.float16, 2),
+  types_pb2.DT_RESOURCE: ("resource", np.object_, 0),
+  types_pb2.DT_VARIANT: ("variant", np.object_, 0),
+  types_pb2.DT_UINT32: ("uint32", np.uint32, 4),
+  types_pb2.DT_UINT64: ("uint64", np.uint64, 8),
+}
+
+_FLOATING_ENUMS = frozenset([types_pb2.DT_FLOAT, types_pb2.DT_DOUBLE,
+                             types_pb2.DT_BFLOAT16, types_pb2.DT_HALF])
+_UNSIGNED_ENUMS = frozenset([types_pb2.DT_UINT8, types_pb2.DT_UINT16,
+                             types_pb2.DT_UINT32, types_pb2.DT_UINT64])
+_INTEGER_ENUMS = _UNSIGNED_ENUMS | frozenset([
+  types_pb2.DT_INT8, types_pb2.DT_INT16, types_pb2.DT_INT32,
+  types_pb2.DT_INT64])
+_QUANTIZED_ENUMS = frozenset([types_pb2.DT_QINT8, types_pb2.DT_QUINT8,
+                              types_pb2.DT_QINT16, types_pb2.DT_QUINT16,
+                              types_pb2.DT_QINT32])
+
+_INTERN_TABLE = {}  # Dict[int, DType]
+for _enum in _BASE_TYPE_INFO:
+  _INTERN_TABLE[_enum] = DType(_enum)
+  _INTERN_TABLE[_enum + _REF_OFFSET] = DType(_enum + _REF_OFFSET)
+
+_NAME_TO_DTYPE = {d.name: d for d in _INTERN_TABLE.values()}
+_NAME_TO_DTYPE.update({
+  "half": _INTERN_TABLE[types_pb2.DT_HALF],
+  "float": _INTERN_TABLE[types_pb2.DT_FLOAT],
+  "double": _INTERN_TABLE[types_pb2.DT_DOUBLE],
+})
+
+_NUMPY_TO_DTYPE = {}  # Dict[np.dtype, DType]
+for _enum, (_, _np_type, _) in _BASE_TYPE_INFO.items():
+  if _np_type is not None and _np_type is not np.object_:
+    _NUMPY_TO_DTYPE[np.dtype(_np_type)] = _INTERN_TABLE[_enum]
+
+_PYTHON_TO_DTYPE = {
+  bool: _INTERN_TABLE[types_pb2.DT_BOOL],
+  int: _INTERN_TABLE[types_pb2.DT_INT32],
+  float: _INTERN_TABLE[types_pb2.DT_FLOAT],
+  str: _INTERN_TABLE[types_pb2.DT_STRING],
+  bytes: _INTERN_TABLE[types_pb2.DT_STRING],
+  object: _INTERN_TABLE[types_pb2.DT_STRING],
+}
+
+# Public constants, named as in TensorFlow
+float16 = half = _INTERN_TABLE[types_pb2.DT_HALF]
+float32 = _INTERN_TABLE[types_pb2.DT_FLOAT]
+float64 = double = _INTERN_TABLE[types_pb2.DT_DOUBLE]
+bfloat16 = _INTERN_TABLE[types_pb2.DT_BFLOAT16]
+complex64 = _INTERN_TABLE[types_pb2.DT_COMPLEX64]
+complex128 = _INTERN_TABLE[types_pb2.DT_COMPLEX128]
+int8 = _INTERN_TABLE[types_pb2.DT_INT8]
+int16 = _INTERN_TABLE[types_pb2.DT_INT16]
+int32 = _INTERN_TABLE[types_pb2.DT_INT32]
+int64 = _INTERN_TABLE[types_pb2.DT_INT64]
+uint8 = _INTERN_TABLE[types_pb2.DT_UINT8]
+uint16 = _INTERN_TABLE[types_pb2.DT_UINT16]
+uint32 = _INTERN_TABLE[types_pb2.DT_UINT32]
+uint64 = _INTERN_TABLE[types_pb2.DT_UINT64]
+qint8 = _INTERN_TABLE[types_pb2.DT_QINT8]
+quint8 = _INTERN_TABLE[types_pb2.DT_QUINT8]
+qint16 = _INTERN_TABLE[types_pb2.DT_QINT16]
+quint16 = _INTERN_TABLE[types_pb2.DT_QUINT16]
+qint32 = _INTERN_TABLE[types_pb2.DT_QINT32]
+string = _INTERN_TABLE[types_pb2.DT_STRING]
+bool = _INTERN_TABLE[types_pb2.DT_BOOL]  # pylint: disable=redefined-builtin
+resource = _INTERN_TABLE[types_pb2.DT_RESOURCE]
+variant = _INTERN_TABLE[types_pb2.DT_VARIANT]
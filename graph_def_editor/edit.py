@@ -40,8 +40,9 @@ def detach_control_inputs(sgv):
       subgraph using the same rules as the function subgraph.make_view.
   """
   sgv = subgraph.make_view(sgv)
+  ops = frozenset(sgv.ops)
   for op in sgv.ops:
-    cops = [cop for cop in op.control_inputs if cop not in sgv.ops]
+    cops = [cop for cop in op.control_inputs if cop not in ops]
     reroute.remove_control_inputs(op, cops)
 
 
@@ -58,9 +59,10 @@ def detach_control_outputs(sgv, control_outputs):
                     type(control_outputs))
   control_outputs.update()
   sgv = subgraph.make_view(sgv)
+  ops = frozenset(sgv.ops)
   for op in sgv.ops:
     for cop in control_outputs.get(op):
-      if cop not in sgv.ops:
+      if cop not in ops:
         reroute.remove_control_inputs(cop, op)
 
 
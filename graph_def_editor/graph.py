@@ -18,10 +18,16 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-import tensorflow as tf
-from typing import Tuple, Dict, FrozenSet, Iterable, Union
+import collections
+import heapq
+import logging
+import sys
+from typing import Tuple, Dict, FrozenSet, Iterable, Set, Union
 
-from graph_def_editor import node, util, tensor, variable
+from graph_def_editor import dtypes, inference_cache, node, protos, \
+  shape_functions, symbolic, tensor, tensor_shape, util, variable
+from graph_def_editor.protos import attr_value_pb2, graph_pb2, \
+  node_def_pb2, variable_pb2
 
 __all__ = [
   "Graph",
@@ -31,6 +37,22 @@ __all__ = [
 # see node_to_frame_name() for more information
 _FRAME_NAME_ATTR = "frame_name"
 
+# Prefix of the colocation group names in the "_class" attribute of a node
+_COLOCATION_PREFIX = "loc:@"
+
+# Op types that enter and exit control flow frames.
+_ENTER_OP_TYPES = frozenset(["Enter", "RefEnter"])
+_EXIT_OP_TYPES = frozenset(["Exit", "RefExit"])
+
+# Op types whose outputs form the back edges of while loops.
+_NEXT_ITERATION_OP_TYPES = frozenset(["NextIteration", "RefNextIteration"])
+
+# Maximum number of times that propagate_shapes() will go back around a cycle
+# to re-infer a node whose outputs keep changing.
+_MAX_SHAPE_PROPAGATION_REVISITS = 8
+
+_logger = logging.getLogger(__name__)
+
 
 class Graph(object):
   """
@@ -40,45 +62,94 @@ class Graph(object):
 
   Summary of internal data structures:
   * _node_name_to_node: Nodes in the graph, stored as a dictionary. Key is name.
+  * _lowercase_node_names: Lowercased names of all nodes, for case-insensitive
+                  collision checks
+  * _nodes_by_id: Nodes indexed by id_in_graph, with None in place of nodes
+                  that have been removed; used by `gde.OpSet`
+  * _removed_node_ids: ids of removed nodes, in order of removal
   * _version: Counter that increments every time the graph is modified
+  * _attr_version: Counter that increments every time a node's attributes
+                  change; attribute edits do not touch _version
   * _collections: Map from collection name to collection contents for all
                   collections
+  * _colocation_index: Disjoint-set index over colocation relationships,
+                  maintained incrementally as nodes join colocation groups
+  * _change_logs: Sets that collect the nodes passed to
+                  increment_version_counter(), for tools that react to edits
+                  incrementally. None in a set means "everything changed".
+  * _node_to_frame_names, _frame_name_to_nodes: Control flow frame tables.
+                  Kept across edits; nodes whose edges change are queued in
+                  _frame_dirty_nodes and re-analyzed on the next query.
+  * _topological_ranks: Map from node to a rank that is higher than the
+                  ranks of the node's producers, except along the back edges
+                  of cycles. Kept across edits; nodes whose edges change are
+                  queued in _rank_dirty_nodes, and the ranks around them are
+                  repaired on the next query.
   """
 
-  def __init__(self, g: tf.GraphDef = None, collections:
-               Iterable[tf.MetaGraphDef.CollectionDefEntry] = None):
+  def __init__(self, g=None, collections=None,
+               outputs: Iterable[str] = None):
     """
     Wrap a tf.GraphDef protocol buffer in a Graph object.
 
     Args:
       g: a tf.Graph or tf.GraphDef protobuf that represents a
         TensorFlow graph. If set to None, generate an empty
-        tf.GraphDef
+        tf.GraphDef. GraphDefs created with TensorFlow's protobuf bindings
+        and with GDE's own (see `graph_def_editor.protos`) are both
+        accepted; a GraphDef that does not use the bindings GDE loaded is
+        copied.
       collections: Optional iterable of tf.MetaGraphDef.CollectionDefEntry 
         objects containing information about collections in the graph.
         Note that this constructor will pull collection info out of `g` if
         it is a `tf.Graph` and `collections` is `None`.
+      outputs: Optional names of nodes and tensors, such as "logits" or
+        "logits:0", that the graph must compute. If provided, only these
+        nodes and the nodes they transitively depend on through data inputs,
+        control inputs and colocation groups are loaded; the others are
+        skipped before any `Node` objects are created or any shape
+        inference runs, as are variables that reference skipped nodes.
+        This is the same result as loading the whole graph and calling
+        `gde.prune()`, at a fraction of the cost when most of the graph is
+        not needed.
     """
     if g is None:
-      graph_def = tf.GraphDef()
-    elif isinstance(g, tf.GraphDef):
-      graph_def = g
-    elif isinstance(g, tf.Graph):
-      graph_def = g.as_graph_def()
+      graph_def = graph_pb2.GraphDef()
+    elif protos.is_message(g, graph_pb2.GraphDef):
+      graph_def = protos.as_message(g, graph_pb2.GraphDef)
+    elif _is_tf_graph(g):
+      graph_def = protos.as_message(g.as_graph_def(), graph_pb2.GraphDef)
       if collections is None:
         collections = _make_collection_defs(g)
     else:
       raise TypeError("Graph is of type {}. Expected a tf.Graph or GraphDef "
                       "proto".format(type(g)))
+    if outputs is not None:
+      graph_def = _extract_closure(graph_def, outputs)
     self._version = 0  # Must happen first; other init code needs self._version
+    self._attr_version = 0
     self._frozen = False
     self._graph_def = graph_def
     self._next_id = 1
     output_map = _decode_graph(graph_def)
     self._node_name_to_node = {}  # Dict[str, node.Node]; key is node name
-    self._node_to_frame_names = None
-    self._frame_name_to_nodes = None
+    self._lowercase_node_names = set()  # Set[str]; for _name_in_use()
+    self._nodes_by_id = [None]  # List[Node]; ids start at 1
+    self._removed_node_ids = []  # List[int]
+    self._change_logs = []  # List[Set[Node]]
+    self._node_to_frame_names = None  # Dict[Node, Tuple[str]]
+    self._frame_name_to_nodes = None  # Dict[str, Set[Node]]
+    self._frame_name_to_node_tuple = {}  # Dict[str, Tuple[Node]]
+    self._frame_dirty_nodes = set()  # Set[Node]
+    self._node_to_consumers = None  # Dict[Node, Set[Node]]
+    self._consumer_index_inputs = {}  # Dict[Node, Tuple[Node]]
+    self._consumer_dirty_nodes = set()  # Set[Node]
+    self._topological_ranks = None  # Dict[Node, int]
+    self._rank_dirty_nodes = set()  # Set[Node]
+    self._next_rank = 0
+    self._symbolic_input_shapes = {}  # Dict[Tensor, List]
     self._head_name_to_coloc_group = None  # Dict[str, FrozenList[str]]
+    self._colocation_index = None  # _ColocationIndex
     self._variable_name_to_variable = {}  # Dict[str, Variable]
 
     # Load nodes in three passes because the g may contain cycles.
@@ -93,9 +164,10 @@ class Graph(object):
     self._collections = {}
     if collections is not None:
       for c in collections:
-        self.add_collection_from_collection_def(c)
+        self.add_collection_from_collection_def(
+          c, skip_missing_nodes=outputs is not None)
 
-  def add_node_from_node_def(self, node_def: tf.NodeDef,
+  def add_node_from_node_def(self, node_def: node_def_pb2.NodeDef,
                              set_inputs: bool = False) -> 'node.Node':
     """
     Unpack a `tf.NodeDef` protobuf into a mutable `Node` object.'
@@ -118,16 +190,25 @@ class Graph(object):
       ret.set_inputs_from_strings(node_def.input, set_control_inputs=True)
     return ret
 
-  def add_collection_from_collection_def(self, collection_def:
-                                         tf.MetaGraphDef.CollectionDefEntry):
+  def add_collection_from_collection_def(
+          self, collection_def, skip_missing_nodes: bool = False):
     """
     Unpack a `tf.MetaGraphDef.CollectionDefEntry` of serialized variables 
     into a collection of variables in this graph. The collection must not exist. 
     Variables that do not already exist will be created.
+
+    If `skip_missing_nodes` is True, variables that reference nodes that are
+    not in this graph are silently left out instead of raising an error.
     """
     collection_name = collection_def.key
     for serialized_var in collection_def.value.bytes_list.value:
-      var = self.add_variable_from_variable_def(serialized_var,
+      variable_def = variable_pb2.VariableDef.FromString(serialized_var)
+      if skip_missing_nodes and not all(
+              _refers_to_node(self, name) for name in (
+                variable_def.variable_name, variable_def.initial_value_name,
+                variable_def.initializer_name, variable_def.snapshot_name)):
+        continue
+      var = self.add_variable_from_variable_def(variable_def,
                                                 skip_if_present=True)
       var.add_to_collection(collection_name)
 
@@ -197,10 +278,12 @@ class Graph(object):
                        .format(name))
     ret = node.Node(self, self._get_next_id(), name=name, op_name=op_name)
     self._node_name_to_node[name] = ret
-    self.increment_version_counter()
+    self._lowercase_node_names.add(name.lower())
+    self._nodes_by_id.append(ret)
+    self.increment_version_counter(ret)
     return ret
 
-  def add_node_from_node_def(self, node_def: tf.NodeDef,
+  def add_node_from_node_def(self, node_def: node_def_pb2.NodeDef,
                              set_inputs: bool = False,
                              set_control_inputs: bool = False) -> 'node.Node':
     """
@@ -234,6 +317,248 @@ class Graph(object):
     # Don't need to increment version counter; add_node() already did that.
     return ret
 
+  def remove_node(self, n: Union[str, 'node.Node']):
+    """
+    Removes a node from the graph. No other node may consume the outputs of
+    the node or have it as a control input.
+
+    Args:
+      n: Node in this graph, or the name of one.
+
+    Raises:
+      ValueError if the node is not in this graph or still has consumers.
+    """
+    if isinstance(n, str):
+      n = self.get_node_by_name(n)
+    elif self._node_name_to_node.get(n.name) is not n:
+      raise ValueError("Node '{}' is not in this graph".format(n.name))
+    consumers = self.node_consumers(n)
+    if len(consumers) > 0:
+      raise ValueError("Cannot remove node '{}' because nodes {} consume "
+                       "it".format(n.name, sorted(c.name for c in consumers)))
+    self._remove_nodes([n])
+
+  def remove_nodes(self, nodes: Iterable[Union[str, 'node.Node']]):
+    """
+    Removes a set of nodes from the graph at once. Nodes in the set may
+    consume each other's outputs, but no node outside the set may consume
+    the outputs of a node in the set or have it as a control input.
+
+    Takes time proportional to the number of removed nodes and of their
+    edges, so removing a large part of a graph is much cheaper than calling
+    `remove_node()` in a suitable order.
+
+    Args:
+      nodes: Nodes in this graph, or names of nodes.
+
+    Raises:
+      ValueError if a node is not in this graph or has consumers outside the
+      set. The graph is not modified if an exception is raised.
+    """
+    to_remove = {}  # Dict[Node, None]; ordered set
+    for n in nodes:
+      if isinstance(n, str):
+        n = self.get_node_by_name(n)
+      elif self._node_name_to_node.get(n.name) is not n:
+        raise ValueError("Node '{}' is not in this graph".format(n.name))
+      to_remove[n] = None
+    for n in to_remove:
+      consumers = [c for c in self.node_consumers(n) if c not in to_remove]
+      if len(consumers) > 0:
+        raise ValueError("Cannot remove node '{}' because nodes {} consume "
+                         "it".format(n.name,
+                                     sorted(c.name for c in consumers)))
+    self._remove_nodes(to_remove)
+
+  def _remove_nodes(self, nodes: Iterable['node.Node']):
+    """Removes nodes without checking for consumers."""
+    nodes = list(nodes)
+    if len(nodes) == 0:
+      return
+    for n in nodes:
+      # Drop the incoming edges first so that the incremental indexes forget
+      # them.
+      n.set_inputs([])
+      n.set_control_inputs([])
+    for n in nodes:
+      del self._node_name_to_node[n.name]
+      self._lowercase_node_names.discard(n.name.lower())
+      self._nodes_by_id[n.id_in_graph] = None
+      self._removed_node_ids.append(n.id_in_graph)
+      for t in n.outputs:
+        self._symbolic_input_shapes.pop(t, None)
+      if self._node_to_frame_names is not None:
+        for frame_name in self._node_to_frame_names.pop(n, ()):
+          members = self._frame_name_to_nodes[frame_name]
+          members.discard(n)
+          if 0 == len(members):
+            del self._frame_name_to_nodes[frame_name]
+          self._frame_name_to_node_tuple.pop(frame_name, None)
+    self._colocation_groups_replaced()
+    self.increment_version_counter(nodes)
+
+  def import_graph(self, other: Union['Graph', graph_pb2.GraphDef],
+                   prefix: str = "",
+                   input_map: Dict[str, Union[str, tensor.Tensor,
+                                              'node.Node']] = None,
+                   return_elements: Iterable[str] = None):
+    """
+    Copy the contents of another graph into this one. Counterpart of
+    `tf.import_graph_def()` that works directly on GDE graphs.
+
+    Nodes, variables, collections and colocation groups are copied with
+    `prefix` prepended to every name, and so are the names of the control
+    flow frames that the nodes of `other` define. The dtypes and shapes of
+    the copied tensors are taken from `other` as they are, without running
+    shape inference again, unless `input_map` replaces a tensor with one of
+    a different shape; in that case the new shapes are propagated
+    downstream with `propagate_shapes()`.
+
+    Args:
+      other: `gde.Graph` to import, or anything that the `Graph` constructor
+        accepts. Not modified.
+      prefix: Optional name scope to put the imported nodes under, such as
+        "preprocessing". If empty, the nodes keep their names.
+      input_map: Optional dictionary that replaces inputs of the imported
+        nodes with existing parts of this graph. Keys are names of tensors
+        in `other`, such as "input:0", or names of nodes prefixed with "^"
+        to replace control inputs. Values are `gde.Tensor` (respectively
+        `gde.Node`) objects in this graph or their names. The replaced
+        tensors and nodes are still imported.
+      return_elements: Optional list of names of nodes and tensors in
+        `other` whose counterparts in this graph should be returned.
+
+    Returns:
+      A list of the imported `gde.Node` and `gde.Tensor` objects that
+      correspond to `return_elements`, or None if `return_elements` is None.
+
+    Raises:
+      ValueError if any imported node or variable name is already in use in
+      this graph, if `input_map` or `return_elements` reference names that do
+      not exist, or if `input_map` replaces a tensor with one of a different
+      dtype. The graph is not modified if an exception is raised.
+    """
+    if not isinstance(other, Graph):
+      other = Graph(other)
+    prefix = util.scope_finalize(prefix)
+    other_nodes = other.nodes
+    other_variables = [other.name_to_variable(name)
+                       for name in other.variable_names]
+
+    # Check everything before making any changes.
+    for n in other_nodes:
+      if self._name_in_use(prefix + n.name):
+        raise ValueError("Cannot import node '{}' as '{}' because the name "
+                         "is already in use (Note that this check is "
+                         "case-insensitive).".format(n.name, prefix + n.name))
+    for v in other_variables:
+      if prefix + v.name in self._variable_name_to_variable:
+        raise ValueError("Cannot import variable '{}' as '{}' because the "
+                         "name is already in use".format(v.name,
+                                                         prefix + v.name))
+    tensor_map = {}  # Dict[Tensor, Tensor]; from other to self
+    control_map = {}  # Dict[Node, Node]; from other to self
+    for key, value in (input_map or {}).items():
+      if key.startswith("^"):
+        src = other.get_node_by_name(key[1:])
+        dst = self.get_node_by_name(value.lstrip("^")) \
+            if isinstance(value, str) else value
+        if dst.graph is not self:
+          raise ValueError("Replacement for '{}' is not a node of this "
+                           "graph".format(key))
+        control_map[src] = dst
+      else:
+        src = other.get_tensor_by_name(
+            key, "Invalid input_map key '{}': {}")
+        dst = self.get_tensor_by_name(value) if isinstance(value, str) \
+            else value
+        if dst.graph is not self:
+          raise ValueError("Replacement for '{}' is not a tensor of this "
+                           "graph".format(key))
+        if dst.dtype != src.dtype:
+          raise ValueError("Cannot replace '{}' of type {} with '{}' of type "
+                           "{}".format(key, src.dtype.name, dst.name,
+                                       dst.dtype.name))
+        tensor_map[src] = dst
+    return_names = list(return_elements) if return_elements is not None \
+        else None
+    for name in return_names or ():
+      if not other.contains_node(name):
+        other.get_tensor_by_name(name, "Invalid return element '{}': {}")
+
+    # Frames defined by the imported nodes are renamed along with them.
+    frame_name_attrs = set()  # Set[Node]; Enter nodes whose frame to rename
+    if len(prefix) > 0:
+      for n in other_nodes:
+        if n.op_type in _ENTER_OP_TYPES and \
+                _FRAME_NAME_ATTR in n.get_attr_keys():
+          frame_name_attrs.add(n)
+
+    # Create all the nodes before wiring them up, since the graph may
+    # contain cycles.
+    new_nodes = {}  # Dict[Node, Node]; from other to self
+    for n in other_nodes:
+      n_ = self.add_node(prefix + n.name, n.op_type)
+      n_.device = n.device
+      for key, value in n._attributes:  # pylint: disable=protected-access
+        if n in frame_name_attrs and key == _FRAME_NAME_ATTR:
+          value = attr_value_pb2.AttrValue(s=util.as_bytes(
+              prefix + util.as_str(n.get_attr(_FRAME_NAME_ATTR))))
+        n_.add_attr(key, _copy_attr_value(value))
+      n_.set_outputs_from_pairs([(t.dtype, t.shape) for t in n.outputs])
+      new_nodes[n] = n_
+
+    for n in other_nodes:
+      n_ = new_nodes[n]
+      n_.set_inputs([tensor_map[t] if t in tensor_map
+                     else new_nodes[t.node].output(t.value_index)
+                     for t in n.inputs])
+      n_.set_control_inputs([control_map[c] if c in control_map
+                             else new_nodes[c] for c in n.control_inputs])
+      for head_name in n.colocation_groups:
+        if other.contains_node(head_name):
+          head_name = prefix + head_name
+        n_.add_colocation_group(head_name, validate=False)
+      for t, t_ in zip(n.outputs, n_.outputs):
+        t_._symbolic_shape = t._symbolic_shape  # pylint: disable=protected-access
+
+    def new_tensor(t):
+      return new_nodes[t.node].output(t.value_index)
+
+    for t, dims in list(other._symbolic_input_shapes.items()):
+      if other._node_name_to_node.get(t.node.name) is t.node:
+        self._symbolic_input_shapes[new_tensor(t)] = dims
+
+    for v in other_variables:
+      variable_def = v.to_proto()
+      variable_def.variable_name = prefix + v.name
+      variable_def.initial_value_name = prefix + v.initial_value_name
+      variable_def.initializer_name = prefix + v.initializer_name
+      variable_def.snapshot_name = prefix + v.snapshot_name
+      v_ = self.add_variable_from_variable_def(variable_def)
+      for collection_name in sorted(v.collection_names):
+        v_.add_to_collection(collection_name)
+    for collection_name in list(other.get_all_collection_keys()):
+      self._collections.setdefault(collection_name, []).extend([
+        new_nodes[elem] if isinstance(elem, node.Node) else
+        new_tensor(elem) if isinstance(elem, tensor.Tensor) else elem
+        for elem in other.get_collection(collection_name)])
+
+    # Bring consumers of replaced tensors up to date if the replacements have
+    # different shapes.
+    reshaped = [t for t, t_ in tensor_map.items()
+                if not _same_dtype_and_shape((t.dtype, t.shape),
+                                             (t_.dtype, t_.shape))]
+    if len(reshaped) > 0:
+      self.propagate_shapes([new_nodes[c] for t in reshaped
+                             for c in t.consumers()])
+
+    if return_names is None:
+      return None
+    return [new_nodes[other[name]] if other.contains_node(name)
+            else new_tensor(other.get_tensor_by_name(name))
+            for name in return_names]
+
   def add_variable(self, name: str) -> variable.Variable:
     """
     Adds a new variable to the graph.
@@ -286,6 +611,20 @@ class Graph(object):
     """
     return self._variable_name_to_variable[name]
 
+  def remove_variable(self, name: str):
+    """
+    Removes a variable, and with it its collection memberships, from the
+    graph. The nodes that implement the variable are not affected.
+
+    Args:
+      name: Name of a variable in this graph.
+
+    Raises:
+      KeyError if there is no variable with the indicated name.
+    """
+    del self._variable_name_to_variable[name]
+    self.increment_version_counter()
+
   def _name_in_use(self, name: str) -> bool:
     """Check whether a name is in use, using the same collision semantics as
     TensorFlow: Exact lowercase string match.
@@ -295,7 +634,7 @@ class Graph(object):
 
     Returns True if the indicated name is currently in use, ignoring case.
     """
-    return name.lower() in [k.lower() for k in self._node_name_to_node.keys()]
+    return name.lower() in self._lowercase_node_names
 
   def unique_name(self, name: str):
     """Emulate the behavior of the method by the same name in `tf.Graph`.
@@ -409,9 +748,12 @@ class Graph(object):
   def to_graph_def(self):
     """
     Returns the `tf.GraphDef` serialization of this graph in its current
-    form.
+    form. The message uses the protobuf bindings in
+    `graph_def_editor.protos`, so it is a `tf.GraphDef` only if TensorFlow
+    was imported before GDE; otherwise use
+    `graph_def_editor.protos.to_tensorflow()` to pass it to TensorFlow APIs.
     """
-    ret = tf.GraphDef()
+    ret = graph_pb2.GraphDef()
     for op in self.nodes:
       op.to_node_def(ret.node.add())
     return ret
@@ -424,9 +766,10 @@ class Graph(object):
     Returns a fresh `tf.Graph` containing all the nodes and variables that
     this object represents.
     """
+    import tensorflow as tf  # pylint: disable=g-import-not-at-top
     ret = tf.Graph()
     with ret.as_default():
-      tf.import_graph_def(self.to_graph_def(), name="")
+      tf.import_graph_def(protos.to_tensorflow(self.to_graph_def()), name="")
       util.load_variables_to_tf_graph(self)
     return ret
 
@@ -449,17 +792,60 @@ class Graph(object):
   def frozen(self, value):
     self._frozen = value
 
-  def increment_version_counter(self):
+  def increment_version_counter(self, changed_nodes: Union[
+          'node.Node', Iterable['node.Node']] = None):
     """
     Mark the structure of this graph as "changed" and invalidate any cached
     information about the edges of the graph.
+
+    Args:
+      changed_nodes: Optional node, or iterable of nodes, whose edges were the
+        only thing that changed. If provided, cached analyses that can be
+        updated incrementally re-examine just the region of the graph around
+        these nodes. If None, all cached information is discarded.
     """
     if self.frozen:
       raise RuntimeError("Detected a change to a frozen graph")
     self._version += 1
-    self._node_to_frame_names = None
-    self._frame_name_to_nodes = None
-    self._head_name_to_coloc_group = None
+    if isinstance(changed_nodes, node.Node):
+      changed_nodes = (changed_nodes,)
+    elif changed_nodes is not None:
+      changed_nodes = list(changed_nodes)  # Might be a generator
+    for change_log in self._change_logs:
+      if changed_nodes is None:
+        change_log.add(None)
+      else:
+        change_log.update(changed_nodes)
+    if changed_nodes is None:
+      self._node_to_frame_names = None
+      self._frame_name_to_nodes = None
+      self._frame_name_to_node_tuple = {}
+      self._frame_dirty_nodes = set()
+      self._node_to_consumers = None
+      self._consumer_index_inputs = {}
+      self._consumer_dirty_nodes = set()
+      self._topological_ranks = None
+      self._rank_dirty_nodes = set()
+      return
+    if self._node_to_frame_names is not None:
+      self._frame_dirty_nodes.update(changed_nodes)
+    if self._node_to_consumers is not None:
+      self._consumer_dirty_nodes.update(changed_nodes)
+    if self._topological_ranks is not None:
+      self._rank_dirty_nodes.update(changed_nodes)
+
+  def _start_change_log(self) -> Set['node.Node']:
+    """
+    Returns a new set that collects every node passed to
+    `increment_version_counter()` from now on, and None if the whole graph
+    is marked as changed. Call `_stop_change_log()` when done with it.
+    """
+    change_log = set()
+    self._change_logs.append(change_log)
+    return change_log
+
+  def _stop_change_log(self, change_log: Set['node.Node']):
+    self._change_logs = [c for c in self._change_logs if c is not change_log]
 
   def get_collection(self, name: str):
     """Fetch the contents of a collection, similarly to the method in
@@ -523,19 +909,33 @@ class Graph(object):
     lead to graph topologies (for example, sharing a loop body among multiple
     while loops) that are impossible to build with TensorFlow's Python APIs.
 
+    In the tables that this class generates, "Enter" and "Exit" ops are
+    both considered to be inside the frame that they enter or exit, so that
+    the table for a while loop covers all the ops that make up the loop.
+
+    The tables are computed with a single breadth-first traversal over data
+    and control edges. After that, edits only cause the nodes whose edges
+    changed (and any downstream nodes whose frames change as a result) to be
+    re-analyzed, so editing the graph outside a while loop leaves the tables
+    for that loop intact.
+
     Args:
       n: Node in this graph
 
     Returns:
-      Dictionary mapping from nodes in this graph to the names of one or
-      more nested frames that will be active when reaching this node.
+      Tuple of the names of the nested frames that will be active when
+      reaching this node, outermost first. Nodes that are not nested inside
+      any while loops are mapped to an empty tuple.
+      Earlier versions of this method returned tuples that started with None
+      for the root frame, such as `(None,)` outside of any loop and
+      `(None, "while/while_context")` inside one, and considered "Exit" ops
+      to be outside the frame that they exit. Callers that compared against
+      those values need to drop the leading None.
       The returned value is only valid until this graph is modified, either
       by modifying the link structure of the graph or by changing the
-      "frame_name" attribute of an Enter node. Nodes that are not nested
-      inside any while loops are mapped to None.
+      "frame_name" attribute of an Enter node.
     """
-    if self._node_to_frame_names is None:
-      self._generate_node_to_frame_name()
+    self._update_frame_tables()
     return self._node_to_frame_names[n]
 
   def frame_name_to_nodes(self, frame_name: str) -> Tuple['node.Node']:
@@ -547,20 +947,52 @@ class Graph(object):
 
     Returns:
       All nodes that are tagged with the indicated frame, either as an
-      innermost frame or as a containing frame.
+      innermost frame or as a containing frame, in the order in which they
+      were added to the graph.
     """
-    if self._node_to_frame_names is None:
-      self._generate_node_to_frame_name()
-    return self._frame_name_to_nodes[frame_name]
+    self._update_frame_tables()
+    if frame_name not in self._frame_name_to_node_tuple:
+      self._frame_name_to_node_tuple[frame_name] = tuple(
+        sorted(self._frame_name_to_nodes[frame_name],
+               key=lambda n: n.id_in_graph))
+    return self._frame_name_to_node_tuple[frame_name]
 
   def get_frame_names(self) -> Tuple[str]:
     """
     Returns:
       Tuple of all the unique names of frames that occur in this graph.
     """
+    self._update_frame_tables()
+    return tuple(self._frame_name_to_nodes.keys())
+
+  def frames_touched_by(self, nodes: Iterable['node.Node']) -> FrozenSet[str]:
+    """
+    Find the control flow frames that contain any of a set of nodes, i.e. the
+    frames whose tables may need to change if those nodes are edited.
+
+    Args:
+      nodes: Nodes in this graph
+
+    Returns:
+      Names of all frames that contain at least one of the nodes, either as
+      an innermost frame or as a containing frame.
+    """
+    self._update_frame_tables()
+    ret = set()
+    for n in nodes:
+      ret.update(self._node_to_frame_names[n])
+    return frozenset(ret)
+
+  def _update_frame_tables(self):
+    """
+    Bring the tables behind node_to_frame_name() and frame_name_to_nodes()
+    up to date, either by rebuilding them from scratch or by re-analyzing
+    the nodes that have changed since they were last built.
+    """
     if self._node_to_frame_names is None:
       self._generate_node_to_frame_name()
-    return self._frame_name_to_nodes.keys()
+    elif len(self._frame_dirty_nodes) > 0:
+      self._propagate_frame_changes()
 
   def _generate_node_to_frame_name(self):
     """
@@ -570,57 +1002,377 @@ class Graph(object):
     ExecutorImpl::BuildControlFlowInfo() in
     tensorflow/core/common_runtime/executor.cc
     """
+    consumers = _make_consumer_map(self.nodes)
     new_node_to_frame_names = {}
-    new_frame_name_to_nodes = {}
 
-    # Use a Python list as a node queue for the breadth-first search.
     # Start with all of the nodes in the graph that have no inputs.
     # The maintainers of the TensorFlow scheduler like to call these nodes
     # "root nodes".
-    queue = [n for n in self.nodes if 0 == len(n.inputs)]
-    visited = set(queue)  # Invariant: visited == all nodes enqueued
-
-    # Use a second list to maintain a stack of frame names, a la the original
-    # code in executor.cc.
-    # We use None to represent the root frame.
-    frame_name_stack = [None]
-    frame_name_tuple = tuple()  # Immutable version for table
+    queue = collections.deque()
+    for n in self.nodes:
+      if 0 == len(n.inputs) and 0 == len(n.control_inputs):
+        new_node_to_frame_names[n] = tuple()
+        queue.append(n)
 
     # Breadth-first search; same algorithm as in the C++ code, except that
-    # instead of keeping a stack of parent ops we keep a stack of frame names.
+    # instead of keeping a pointer to a parent op we keep each node's tuple
+    # of frame names. Every node inherits the frames of the node that first
+    # reaches it. Invariant: visited == keys of new_node_to_frame_names
     while len(queue) > 0:
-      # Update data structures that track the stack
-      cur_node = queue.pop(0)
-      if cur_node.op_type in ["Enter", "RefEnter"]:
-        # Entering a while loop. Push a frame name onto the virtual stack
-        if _FRAME_NAME_ATTR not in cur_node.get_attr_keys():
-          raise ValueError("Node {} is of op type {} but does not have a "
-                           "value for its {}"
-                           " attribute".format(cur_node.name,
-                                               cur_node.op_type,
-                                               _FRAME_NAME_ATTR))
-        frame_name_stack.append(cur_node.get_attr(_FRAME_NAME_ATTR))
-        frame_name_tuple = tuple(frame_name_stack)
-      elif cur_node.op_type in ["Exit", "RefExit"]:
-        frame_name_stack.pop(-1)
-        frame_name_tuple = tuple(frame_name_stack)
-      # Update tables
-      new_node_to_frame_names[cur_node] = frame_name_tuple
-      for frame_name in frame_name_stack:
-        new_frame_name_to_nodes.setdefault(frame_name, []).append(cur_node)
-      # Prepare for next stage of search
-      for out_tensor in cur_node.outputs:
-        for out_node in out_tensor.consumers():
-          if out_node not in visited:
-            queue.append(out_node)
-            visited.add(out_node)
+      cur_node = queue.popleft()
+      out_frame_names = _frame_names_after(cur_node,
+                                           new_node_to_frame_names[cur_node])
+      for out_node in consumers.get(cur_node, ()):
+        if out_node not in new_node_to_frame_names:
+          new_node_to_frame_names[out_node] = _frame_names_at(
+            out_node, out_frame_names)
+          queue.append(out_node)
+
+    # Nodes that are only reachable through a cycle never get visited.
+    for n in self.nodes:
+      if n not in new_node_to_frame_names:
+        new_node_to_frame_names[n] = tuple()
+
+    new_frame_name_to_nodes = {}
+    for n, frame_names in new_node_to_frame_names.items():
+      for frame_name in frame_names:
+        new_frame_name_to_nodes.setdefault(frame_name, set()).add(n)
 
     self._node_to_frame_names = new_node_to_frame_names
-    # Reverse mapping was built a dict of lists to avoid O(n^2) behavior.
-    # Convert to dict of tuples.
-    self._frame_name_to_nodes = {
-      k: tuple(v) for k, v in new_frame_name_to_nodes.items()
-    }
+    self._frame_name_to_nodes = new_frame_name_to_nodes
+    self._frame_name_to_node_tuple = {}
+    self._frame_dirty_nodes = set()
+
+  def _propagate_frame_changes(self):
+    """
+    Incrementally update the frame tables after edits. Each node whose edges
+    have changed gets its frames recomputed from its inputs; if the result
+    differs from the cached value, the change propagates to the node's
+    consumers. Frames whose membership does not change keep their cached
+    tables.
+    """
+    dirty_nodes = sorted(self._frame_dirty_nodes, key=lambda n: n.id_in_graph)
+    self._frame_dirty_nodes = set()
+    queue = collections.deque(
+      n for n in dirty_nodes if self._node_name_to_node.get(n.name) is n)
+    consumers = None  # Only built if some node actually changes frames
+    # Malformed graphs can make frame assignments chase each other around a
+    # cycle. Bound the work and fall back on a full rebuild.
+    budget = 2 * len(self._node_name_to_node)
+    while len(queue) > 0:
+      budget -= 1
+      if budget < 0:
+        self._generate_node_to_frame_name()
+        return
+      cur_node = queue.popleft()
+      old_frame_names = self._node_to_frame_names.get(cur_node)
+      new_frame_names = self._frame_names_from_inputs(cur_node)
+      if old_frame_names == new_frame_names:
+        continue
+      self._node_to_frame_names[cur_node] = new_frame_names
+      old_set = set(old_frame_names) if old_frame_names is not None else set()
+      new_set = set(new_frame_names)
+      for frame_name in old_set - new_set:
+        members = self._frame_name_to_nodes[frame_name]
+        members.discard(cur_node)
+        if 0 == len(members):
+          del self._frame_name_to_nodes[frame_name]
+        self._frame_name_to_node_tuple.pop(frame_name, None)
+      for frame_name in new_set - old_set:
+        self._frame_name_to_nodes.setdefault(frame_name, set()).add(cur_node)
+        self._frame_name_to_node_tuple.pop(frame_name, None)
+      if consumers is None:
+        consumers = _make_consumer_map(self.nodes)
+      queue.extend(consumers.get(cur_node, ()))
+
+  def _frame_names_from_inputs(self, n: 'node.Node') -> Tuple[str]:
+    """
+    Compute the frames of a node from the cached frames of its inputs, using
+    the first data or control input that has already been analyzed.
+    """
+    for pred in [t.node for t in n.inputs] + list(n.control_inputs):
+      pred_frame_names = self._node_to_frame_names.get(pred)
+      if pred_frame_names is not None:
+        return _frame_names_at(n, _frame_names_after(pred, pred_frame_names))
+    return _frame_names_at(n, tuple())
+
+  def node_consumers(self, n: 'node.Node') -> FrozenSet['node.Node']:
+    """
+    Returns the nodes that consume any output of a node or have it as a
+    control input.
+
+    The underlying index is built on first use and afterwards kept up to date
+    incrementally as edges change, so repeated calls do not scan the graph.
+
+    Args:
+      n: Node in this graph
+
+    Returns:
+      Frozen set of `gde.Node` objects.
+    """
+    return frozenset(self._get_consumer_index().get(n, ()))
+
+  def _get_consumer_index(self) -> Dict['node.Node', Set['node.Node']]:
+    """
+    Returns the up-to-date map from node to the set of its consumers, building
+    it if necessary.
+    """
+    if self._node_to_consumers is None:
+      self._node_to_consumers = {}
+      self._consumer_index_inputs = {}
+      for n in self.nodes:
+        self._index_consumer(n)
+      self._consumer_dirty_nodes = set()
+    elif len(self._consumer_dirty_nodes) > 0:
+      for n in self._consumer_dirty_nodes:
+        for producer in self._consumer_index_inputs.pop(n, ()):
+          consumers = self._node_to_consumers[producer]
+          consumers.discard(n)
+          if 0 == len(consumers):
+            del self._node_to_consumers[producer]
+        if self._node_name_to_node.get(n.name) is n:
+          self._index_consumer(n)
+      self._consumer_dirty_nodes = set()
+    return self._node_to_consumers
+
+  def _index_consumer(self, n: 'node.Node'):
+    """Add the incoming edges of a node to the consumer index."""
+    producers = tuple(set([t.node for t in n.inputs] + list(n.control_inputs)))
+    self._consumer_index_inputs[n] = producers
+    for producer in producers:
+      self._node_to_consumers.setdefault(producer, set()).add(n)
+
+  def propagate_shapes(self, from_nodes: Iterable['node.Node']) -> \
+          Tuple[tensor.Tensor]:
+    """
+    Bring output dtypes and shapes up to date after edits.
+
+    Re-runs `Node.infer_outputs()` on the indicated nodes, then on their
+    consumers, and so on downstream in topological order, stopping along each
+    path as soon as a node's outputs come out unchanged. Each node is
+    re-inferred at most once, after all of its producers. Propagation follows
+    data and control flow edges, including those that enter and leave while
+    loop frames; inside a loop, nodes are re-inferred until the shapes around
+    the loop stop changing, up to a fixed number of times, after which a
+    warning is logged.
+
+    Output `Tensor` objects are updated in place, so consumers see the new
+    dtypes and shapes.
+
+    Args:
+      from_nodes: Nodes whose inputs or attributes changed, for example the
+        consumers of rerouted tensors, or a placeholder whose "shape"
+        attribute was modified.
+
+    Returns:
+      Tuple of the `gde.Tensor` objects whose dtype or shape changed, in the
+      order in which they were first changed.
+    """
+    if isinstance(from_nodes, node.Node):
+      from_nodes = [from_nodes]
+    consumer_index = self._get_consumer_index()
+    ranks = self._get_topological_ranks()
+    # Worklist of nodes to re-infer, ordered by topological rank, so that
+    # every node comes after all of its producers. Only consumers of nodes
+    # whose outputs changed are ever added.
+    heap = []
+    queued = set()
+    for n in from_nodes:
+      if n not in queued:
+        heapq.heappush(heap, (ranks[n], n.id_in_graph, n))
+        queued.add(n)
+    num_revisits = collections.Counter()
+    changed = collections.OrderedDict()  # Used as an ordered set of Tensors
+    while len(heap) > 0:
+      rank, _, n = heapq.heappop(heap)
+      queued.discard(n)
+      old_outputs = [(t.dtype, t.shape) for t in n.outputs]
+      n.infer_outputs()
+      node_changed = len(old_outputs) != len(n.outputs)
+      for i, t in enumerate(n.outputs):
+        if i >= len(old_outputs) or \
+                not _same_dtype_and_shape(old_outputs[i], (t.dtype, t.shape)):
+          changed[t] = None
+          node_changed = True
+      if not node_changed:
+        continue
+      for consumer in consumer_index.get(n, ()):
+        if consumer in queued:
+          continue
+        if ranks[consumer] <= rank:
+          # Back edge of a cycle; go around the cycle again.
+          num_revisits[consumer] += 1
+          if num_revisits[consumer] > _MAX_SHAPE_PROPAGATION_REVISITS:
+            _logger.warning("Shapes of node '%s' did not settle after %d "
+                            "passes around its cycle; leaving the outputs "
+                            "of the node and of its consumers as they are.",
+                            consumer.name, _MAX_SHAPE_PROPAGATION_REVISITS)
+            continue
+        heapq.heappush(heap, (ranks[consumer], consumer.id_in_graph,
+                              consumer))
+        queued.add(consumer)
+    return tuple(changed.keys())
+
+  def _get_topological_ranks(self) -> Dict['node.Node', int]:
+    """
+    Returns the up-to-date map from node to topological rank, building it if
+    necessary.
+
+    Edges out of NextIteration ops, the back edges of while loops, are
+    ignored. Any other edge that closes a cycle is ignored as well, so that
+    its consumer may have a lower rank than its producer. After edits, the
+    ranks are repaired around the nodes whose edges changed with the
+    Pearce-Kelly algorithm, which only touches the nodes whose ranks lie
+    between those of the two ends of an out-of-order edge.
+    """
+    consumer_index = self._get_consumer_index()
+    if self._topological_ranks is None:
+      self._build_topological_ranks(consumer_index)
+    elif len(self._rank_dirty_nodes) > 0:
+      ranks = self._topological_ranks
+      dirty_nodes = sorted(self._rank_dirty_nodes,
+                           key=lambda n: n.id_in_graph)
+      self._rank_dirty_nodes = set()
+      live_nodes = []
+      for n in dirty_nodes:
+        if self._node_name_to_node.get(n.name) is not n:
+          ranks.pop(n, None)  # Removed from the graph
+          continue
+        live_nodes.append(n)
+        for m in (n,) + self._consumer_index_inputs.get(n, ()):
+          if m not in ranks:
+            ranks[m] = self._next_rank
+            self._next_rank += 1
+      for n in live_nodes:
+        for producer in self._consumer_index_inputs.get(n, ()):
+          if producer.op_type not in _NEXT_ITERATION_OP_TYPES and \
+                  ranks[producer] >= ranks[n]:
+            self._reorder_ranks(producer, n, consumer_index)
+    return self._topological_ranks
+
+  def _build_topological_ranks(self, consumer_index):
+    """Compute the topological ranks of all nodes with Kahn's algorithm."""
+    num_pending = {}
+    for n in self.nodes:
+      num_pending[n] = sum(
+        1 for p in self._consumer_index_inputs.get(n, ())
+        if p.op_type not in _NEXT_ITERATION_OP_TYPES)
+    ready = [(n.id_in_graph, n) for n in num_pending if 0 == num_pending[n]]
+    heapq.heapify(ready)
+    # Nodes in id order, for breaking cycles that do not go through a
+    # NextIteration op at the earliest node that is still waiting.
+    by_id = iter(sorted(num_pending, key=lambda n: n.id_in_graph))
+    ranks = {}
+    while len(ranks) < len(num_pending):
+      if len(ready) > 0:
+        _, n = heapq.heappop(ready)
+      else:
+        n = next(m for m in by_id if m not in ranks)
+      ranks[n] = len(ranks)
+      if n.op_type in _NEXT_ITERATION_OP_TYPES:
+        continue
+      for consumer in consumer_index.get(n, ()):
+        if consumer not in ranks:
+          num_pending[consumer] -= 1
+          if 0 == num_pending[consumer]:
+            heapq.heappush(ready, (consumer.id_in_graph, consumer))
+    self._topological_ranks = ranks
+    self._rank_dirty_nodes = set()
+    self._next_rank = len(ranks)
+
+  def _reorder_ranks(self, producer, consumer, consumer_index):
+    """
+    Restore the order of the ranks after adding an edge from `producer` to
+    `consumer`, where `consumer` has the lower rank, by moving the
+    descendants of `consumer` after the ancestors of `producer` within the
+    range of ranks between the two (Pearce and Kelly, "A Dynamic Topological
+    Sort Algorithm for Directed Acyclic Graphs", 2006). If the edge closes a
+    cycle, the ranks are left as they are.
+
+    Both searches stay strictly inside that range, so that other edges that
+    are still out of order, and wait for their own call, cannot pull in
+    nodes from outside of it.
+    """
+    ranks = self._topological_ranks
+    lower, upper = ranks[consumer], ranks[producer]
+    forward = set([consumer])
+    stack = [consumer]
+    while len(stack) > 0:
+      n = stack.pop()
+      if n.op_type in _NEXT_ITERATION_OP_TYPES:
+        continue
+      for m in consumer_index.get(n, ()):
+        if m is producer:
+          return  # The new edge closes a cycle
+        if m not in forward and lower < ranks[m] < upper:
+          forward.add(m)
+          stack.append(m)
+    backward = set([producer])
+    stack = [producer]
+    while len(stack) > 0:
+      n = stack.pop()
+      for m in self._consumer_index_inputs.get(n, ()):
+        if m not in backward and m.op_type not in _NEXT_ITERATION_OP_TYPES \
+                and lower < ranks[m] < upper:
+          backward.add(m)
+          stack.append(m)
+    backward = sorted(backward, key=lambda n: ranks[n])
+    forward = sorted(forward, key=lambda n: ranks[n])
+    pool = sorted(ranks[n] for n in backward + forward)
+    for n, rank in zip(backward + forward, pool):
+      ranks[n] = rank
+
+  def set_symbolic_shape(self, t: Union[str, tensor.Tensor],
+                         dims: Iterable[Union[int, str, 'symbolic.SymbolicDim',
+                                              None]]):
+    """
+    Attach named symbols to the dimensions of a tensor, usually the output of
+    a placeholder. Call `infer_symbolic_shapes()` afterwards to carry the
+    symbols through the rest of the graph.
+
+    Args:
+      t: Tensor or tensor name, such as "input:0".
+      dims: One entry per dimension of the tensor: a string naming a symbol,
+        such as "batch", an int, a `gde.SymbolicDim` expression, or None
+        to use the tensor's concrete size. Pass None instead of a list to
+        remove the symbols of the tensor.
+
+    Raises:
+      ValueError if `dims` does not match the rank of the tensor.
+    """
+    if isinstance(t, str):
+      t = self.get_tensor_by_name(t)
+    if dims is None:
+      self._symbolic_input_shapes.pop(t, None)
+      return
+    dims = symbolic.normalize_symbolic_shape(dims)
+    if t.shape.ndims is not None and len(dims) != t.shape.ndims:
+      raise ValueError("Tensor {} has rank {}, but {} symbolic dimensions "
+                       "were provided".format(t.name, t.shape.ndims,
+                                              len(dims)))
+    self._symbolic_input_shapes[t] = dims
+
+  def infer_symbolic_shapes(self):
+    """
+    Propagate the symbols attached with `set_symbolic_shape()` through the
+    graph, so that the `symbolic_shape` property of every tensor expresses
+    its dimensions in terms of those symbols where possible. For example,
+    after attaching "batch" to the first dimension of a [None, 784] input,
+    the output of a Reshape to [-1, 28, 28] has symbolic shape
+    [batch, 28, 28], and the output of a ConcatV2 of two such tensors along
+    axis 0 has symbolic shape [2*batch, 28, 28].
+
+    Dimensions whose concrete size is known keep that size. Ops without a
+    symbolic shape function (see `gde.register_symbolic_shape_function()`)
+    do not propagate symbols.
+
+    Symbolic shapes are not updated automatically when the graph changes;
+    call this method again after edits.
+    """
+    self._symbolic_input_shapes = {
+      t: s for t, s in self._symbolic_input_shapes.items()
+      if self._node_name_to_node.get(t.node.name) is t.node}
+    symbolic.infer_symbolic_shapes(self.nodes, self._symbolic_input_shapes)
 
   @property
   def colocation_groups(self) -> Dict[str, FrozenSet['node.Node']]:
@@ -631,8 +1383,8 @@ class Graph(object):
     Returns:
       A dictionary with one entry per group. Key is the name of the
       "master" node in the group; value is a set of nodes.
-      The returned value will become invalid if colocation group info or
-      graph topology is updated.
+      The returned value will become invalid if colocation group info is
+      updated.
     """
     if self._head_name_to_coloc_group is None:
       # Cached table has been invalidated. Regenerate it.
@@ -644,11 +1396,159 @@ class Graph(object):
         k: frozenset(v) for k, v in head_name_to_coloc_group.items()}
     return self._head_name_to_coloc_group
 
+  def colocation_closure(self, nodes: Iterable['node.Node']) -> \
+          FrozenSet['node.Node']:
+    """
+    Compute the transitive closure of a set of nodes under colocation
+    constraints.
+
+    Two nodes are in the same colocation component if they are members of the
+    same colocation group, or if a chain of overlapping groups connects them.
+    This is the fixed point that you would reach by repeatedly adding every
+    group in `colocation_groups` that intersects the current set, but it is
+    answered from a disjoint-set index in time proportional to the size of the
+    result.
+
+    Note that, as with `colocation_groups`, the "head" node that gives a group
+    its name is not considered a member of the group unless it lists another
+    group that makes it one.
+
+    Args:
+      nodes: Nodes of this graph from which to start.
+
+    Returns:
+      The input nodes, plus every node that shares a colocation component with
+      at least one of them.
+    """
+    index = self._get_colocation_index()
+    ret = set(nodes)
+    roots = set()
+    for n in ret:
+      root = index.find(n)
+      if root is not None:
+        roots.add(root)
+    for root in roots:
+      ret.update(index.members(root))
+    return frozenset(ret)
+
+  def _get_colocation_index(self) -> '_ColocationIndex':
+    """
+    Returns the disjoint-set index over colocation relationships, building it
+    from the colocation groups of every node if it has been invalidated.
+    """
+    if self._colocation_index is None:
+      index = _ColocationIndex()
+      for n in self.nodes:
+        for head_name in n.colocation_groups:
+          index.add(n, head_name)
+      self._colocation_index = index
+    return self._colocation_index
+
+  def _colocation_group_added(self, n: 'node.Node', head_name: str):
+    """
+    Callback for `Node.add_colocation_group()`. Folds the new relationship
+    into the colocation index instead of rebuilding it.
+    """
+    if self._colocation_index is not None:
+      self._colocation_index.add(n, head_name)
+    self._head_name_to_coloc_group = None
+
+  def _colocation_groups_replaced(self):
+    """
+    Callback for the setter of `Node.colocation_groups`. Disjoint sets
+    cannot be split, so the index is discarded and rebuilt on next use.
+    """
+    self._colocation_index = None
+    self._head_name_to_coloc_group = None
+
 
 ################################################################################
 # Stuff below this line is private to this file.
 
 
+def _frame_names_at(n: 'node.Node', parent_frame_names: Tuple[str]) -> \
+        Tuple[str]:
+  """
+  Args:
+    n: A node that is reached from a node whose consumers run in the frames
+      `parent_frame_names`.
+    parent_frame_names: Tuple of frame names, outermost first.
+
+  Returns the frames that `n` itself is in.
+  """
+  if n.op_type in _ENTER_OP_TYPES:
+    # Entering a while loop. Push a frame name onto the virtual stack
+    if _FRAME_NAME_ATTR not in n.get_attr_keys():
+      raise ValueError("Node {} is of op type {} but does not have a "
+                       "value for its {}"
+                       " attribute".format(n.name, n.op_type,
+                                           _FRAME_NAME_ATTR))
+    return parent_frame_names + (n.get_attr(_FRAME_NAME_ATTR),)
+  return parent_frame_names
+
+
+def _frame_names_after(n: 'node.Node', frame_names: Tuple[str]) -> \
+        Tuple[str]:
+  """
+  Args:
+    n: A node in the frames `frame_names`.
+    frame_names: Tuple of frame names, outermost first.
+
+  Returns the frames that the consumers of `n` inherit.
+  """
+  if n.op_type in _EXIT_OP_TYPES:
+    return frame_names[:-1]
+  return frame_names
+
+
+def _same_dtype_and_shape(pair1, pair2) -> bool:
+  """
+  Compare two (dtype, shape) pairs, treating two unknown dimensions (or two
+  unknown ranks) as equal.
+  """
+  dtype1, shape1 = pair1
+  dtype2, shape2 = pair2
+  if dtype1 != dtype2 or shape1.ndims != shape2.ndims:
+    return False
+  return shape1.ndims is None or shape1.as_list() == shape2.as_list()
+
+
+def _copy_attr_value(value):
+  """
+  Returns a copy of the value of a node attribute that can be modified
+  without affecting the original, which may be a protobuf message or a
+  Python value.
+  """
+  if hasattr(value, "CopyFrom"):
+    ret = type(value)()
+    ret.CopyFrom(value)
+    return ret
+  elif isinstance(value, list):
+    return list(value)
+  return value
+
+
+def _make_consumer_map(nodes: Iterable['node.Node']) -> \
+        Dict['node.Node', list]:
+  """
+  Build a map from node to the nodes that consume its outputs or have it as
+  a control input, in a single pass over the graph.
+
+  Args:
+    nodes: All the nodes of a graph
+
+  Returns a dictionary from `gde.Node` to list of `gde.Node`. Nodes without
+  consumers do not appear in the dictionary.
+  """
+  ret = {}
+  for n in nodes:
+    for t in n.inputs:
+      ret.setdefault(t.node, []).append(n)
+    for c in n.control_inputs:
+      ret.setdefault(c, []).append(n)
+  return ret
+
+
 def _decode_graph(graph_def):
   """
   Use public TensorFlow APIs to decode the important information that is not
@@ -656,6 +1556,11 @@ def _decode_graph(graph_def):
   GraphDef in conjunction with additional data structures that TensorFlow
   generally keeps to itself.
 
+  If every node of the graph can be resolved with Python shape functions
+  (see `gde.register_shape_function()`) or from the inference cache (see
+  `gde.get_inference_cache()`), TensorFlow is not invoked at all. Otherwise
+  the results of TensorFlow's inference are added to the cache.
+
   Args:
     graph_def: tf.GraphDef protobuf that represents a TensorFlow graph.
       This graph must be runnable on the current version of TensorFlow;
@@ -666,6 +1571,13 @@ def _decode_graph(graph_def):
     A map from node name to a list of (type, shape) pairs that describe
     in turn each of the outputs of said node.
   """
+  # Output types of function calls depend on the function library.
+  has_functions = len(graph_def.library.function) > 0
+  if not has_functions:
+    output_map = _decode_graph_without_tf(graph_def)
+    if output_map is not None:
+      return output_map
+
   # The information in a NodeDef is not sufficient to determine output type
   # information. For that kind of type inference, you need access to the
   # corresponding OpDef protos. Unfortunately there is not a public API that
@@ -673,16 +1585,176 @@ def _decode_graph(graph_def):
   # graph_def describes. This approach makes things easier, but there will be
   # a reduction in forwards compatibility, because import_graph_def() does a
   # lot of sanity checks that aren't necessary when rewriting a graph_def.
+  import tensorflow as tf  # pylint: disable=g-import-not-at-top
   temp_graph = tf.Graph()
   with temp_graph.as_default():
-    tf.import_graph_def(graph_def, name="")
-  output_map = {op.name: [(t.dtype, t.shape) for t in op.outputs]
+    tf.import_graph_def(protos.to_tensorflow(graph_def), name="")
+  output_map = {op.name: [(dtypes.as_dtype(t.dtype),
+                           tensor_shape.TensorShape(t.shape))
+                          for t in op.outputs]
                 for op in temp_graph.get_operations()}
+
+  cache = inference_cache.get_inference_cache()
+  if cache is not None and not has_functions:
+    name_to_node_def = {n.name: n for n in graph_def.node}
+    entries = []
+    for node_def in graph_def.node:
+      if shape_functions.get_shape_function(node_def.op) is not None:
+        continue
+      input_specs = [_input_spec(name_to_node_def[t.op.name], t.dtype, t.shape)
+                     for t in temp_graph.get_operation_by_name(
+                       node_def.name).inputs]
+      signature = inference_cache.node_def_signature(node_def, input_specs)
+      if signature is not None:
+        entries.append((signature, output_map[node_def.name]))
+    cache.put_all(entries)
   return output_map
 
 
-def _make_collection_defs(tf_g: tf.Graph) -> Iterable[
-  tf.MetaGraphDef.CollectionDefEntry]:
+def _decode_graph_without_tf(graph_def):
+  """
+  Subroutine of `_decode_graph()` that attempts to compute the output map
+  using only Python shape functions and the inference cache.
+
+  Returns:
+    The same map as `_decode_graph()`, or None if any node could not be
+    resolved without TensorFlow.
+  """
+  name_to_node_def = {}
+  num_pending = {}  # Number of unresolved data inputs, by node name
+  consumers = collections.defaultdict(list)
+  for node_def in graph_def.node:
+    name_to_node_def[node_def.name] = node_def
+    data_inputs = [s for s in node_def.input if not s.startswith("^")]
+    num_pending[node_def.name] = len(data_inputs)
+    for s in data_inputs:
+      consumers[_input_string_to_name_and_index(s)[0]].append(node_def.name)
+
+  # Resolve nodes in topological order. Cycles (i.e. while loops) leave some
+  # nodes unresolved, in which case we fall back on TensorFlow.
+  output_map = {}
+  ready = collections.deque(name for name, count in num_pending.items()
+                            if count == 0)
+  while ready:
+    node_def = name_to_node_def[ready.popleft()]
+    input_specs = []
+    for s in node_def.input:
+      if s.startswith("^"):
+        continue
+      name, index = _input_string_to_name_and_index(s)
+      outputs = output_map[name]
+      if index >= len(outputs):
+        return None
+      dtype, shape = outputs[index]
+      input_specs.append(_input_spec(name_to_node_def[name], dtype, shape))
+    outputs, _ = inference_cache.lookup_outputs(node_def, input_specs)
+    if outputs is None:
+      return None
+    output_map[node_def.name] = outputs
+    for consumer_name in consumers[node_def.name]:
+      num_pending[consumer_name] -= 1
+      if num_pending[consumer_name] == 0:
+        ready.append(consumer_name)
+  if len(output_map) != len(name_to_node_def):
+    return None
+  return output_map
+
+
+def _extract_closure(graph_def, outputs):
+  """
+  Returns a copy of `graph_def` with only the nodes that the nodes and
+  tensors named in `outputs` transitively depend on through data inputs,
+  control inputs and colocation groups. Works on the input strings of the
+  NodeDefs, without decoding anything else.
+  """
+  name_to_node_def = {n.name: n for n in graph_def.node}
+  keep = set()
+  stack = []
+  for name in outputs:
+    node_name = _input_string_to_node_name(name)
+    if node_name not in name_to_node_def:
+      raise ValueError("Output '{}' does not correspond to any node in the "
+                       "graph".format(name))
+    stack.append(node_name)
+  while len(stack) > 0:
+    node_name = stack.pop()
+    if node_name in keep:
+      continue
+    keep.add(node_name)
+    node_def = name_to_node_def[node_name]
+    stack.extend(_input_string_to_node_name(s) for s in node_def.input)
+    if "_class" in node_def.attr:
+      for s in node_def.attr["_class"].list.s:
+        s = util.as_str(s)
+        if s.startswith(_COLOCATION_PREFIX) and \
+                s[len(_COLOCATION_PREFIX):] in name_to_node_def:
+          stack.append(s[len(_COLOCATION_PREFIX):])
+
+  ret = graph_pb2.GraphDef()
+  ret.versions.CopyFrom(graph_def.versions)
+  ret.library.CopyFrom(graph_def.library)
+  ret.node.extend(n for n in graph_def.node if n.name in keep)
+  return ret
+
+
+def _input_string_to_node_name(s):
+  """
+  Returns the name of the node that an input string from a NodeDef, such as
+  "foo", "foo:1" or "^foo", refers to.
+  """
+  if s.startswith("^"):
+    return s[1:]
+  return _input_string_to_name_and_index(s)[0]
+
+
+def _refers_to_node(g, name) -> bool:
+  """True if `name`, which may be empty or None, a node name or a tensor
+  name, does not reference a node that is missing from `g`."""
+  return not name or g.contains_node(_input_string_to_node_name(name))
+
+
+def _nodes_referenced_by_variables(g) -> Set['node.Node']:
+  """Returns the set of nodes of `g` that the variables of `g` refer to by
+  name, such as their initializers and snapshot tensors."""
+  ret = set()
+  for var_name in g.variable_names:
+    v = g.name_to_variable(var_name)
+    for name in (v.name, v.initial_value_name, v.initializer_name,
+                 v.snapshot_name):
+      if name and g.contains_node(_input_string_to_node_name(name)):
+        ret.add(g.get_node_by_name(_input_string_to_node_name(name)))
+  return ret
+
+
+def _input_spec(producer_node_def, dtype, shape):
+  """
+  Describe an input tensor in the format that
+  `inference_cache.node_def_signature()` expects.
+  """
+  const_value = None
+  if producer_node_def.op == "Const" and "value" in producer_node_def.attr:
+    const_value = producer_node_def.attr["value"]
+  return dtype, shape, producer_node_def.op, const_value
+
+
+def _input_string_to_name_and_index(s):
+  """
+  Parse a data input string from a NodeDef, such as "foo" or "foo:1", into a
+  (node name, output index) pair.
+  """
+  if ":" in s:
+    name, index = s.rsplit(":", 1)
+    return name, int(index)
+  return s, 0
+
+
+def _is_tf_graph(g) -> bool:
+  """True if `g` is a `tf.Graph`, without importing TensorFlow."""
+  tf = sys.modules.get("tensorflow")
+  return tf is not None and isinstance(g, tf.Graph)
+
+
+def _make_collection_defs(tf_g):
   """
   Convenience function to serialize all the collections in a TensorFlow graph.
 
@@ -695,6 +1767,7 @@ def _make_collection_defs(tf_g: tf.Graph) -> Iterable[
   the serialized
   contents of the collections.
   """
+  import tensorflow as tf  # pylint: disable=g-import-not-at-top
   ret = []
   for collection_name in tf_g.collections:
     if type(collection_name) is not str:
@@ -754,4 +1827,59 @@ def _decode_tensor_name(tensor_name: str, error_msg: str):
     node_name = tensor_name
     output_ix = 0
 
-  return node_name, output_ix
\ No newline at end of file
+  return node_name, output_ix
+
+class _ColocationIndex(object):
+  """
+  Union-find structure over colocation relationships.
+
+  Elements are either `gde.Node` objects or colocation group head names
+  (strings). Adding node N to the group of head H unions N with H, so that
+  nodes sharing a group, directly or through a chain of groups, end up with
+  the same root. Each root keeps the list of nodes in its component, so that
+  enumerating a component costs time proportional to its size.
+  """
+  def __init__(self):
+    self._parent = {}  # Dict[Union[Node, str], Union[Node, str]]
+    self._members = {}  # Dict[root element, List[Node]]
+
+  def _make_set(self, elem, is_node: bool):
+    if elem not in self._parent:
+      self._parent[elem] = elem
+      self._members[elem] = [elem] if is_node else []
+
+  def find(self, elem):
+    """
+    Returns the root of the component containing `elem`, or None if `elem`
+    has never been added to the index.
+    """
+    if elem not in self._parent:
+      return None
+    parent = self._parent
+    while parent[elem] is not elem:
+      # Path halving
+      parent[elem] = parent[parent[elem]]
+      elem = parent[elem]
+    return elem
+
+  def add(self, n: 'node.Node', head_name: str):
+    """
+    Record that node `n` is a member of the colocation group whose head is
+    the node named `head_name`.
+    """
+    self._make_set(n, True)
+    self._make_set(head_name, False)
+    root_a = self.find(n)
+    root_b = self.find(head_name)
+    if root_a is root_b:
+      return
+    # Union by size, measured in terms of the member lists that need to be
+    # merged.
+    if len(self._members[root_a]) < len(self._members[root_b]):
+      root_a, root_b = root_b, root_a
+    self._parent[root_b] = root_a
+    self._members[root_a].extend(self._members.pop(root_b))
+
+  def members(self, root):
+    """Returns the nodes in the component whose root is `root`."""
+    return self._members[root]
@@ -0,0 +1,385 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Memoization of output dtype and shape inference results."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import hashlib
+import json
+import sqlite3
+import sys
+from typing import Iterable, List, Optional, Tuple
+
+from graph_def_editor import dtypes, shape_functions, tensor_shape
+from graph_def_editor.protos import attr_value_pb2, node_def_pb2
+
+
+__all__ = [
+  "InferenceCache",
+  "get_inference_cache",
+  "set_inference_cache",
+]
+
+
+# Op types whose output values TensorFlow's shape functions can never see.
+# Integer tensors produced by any other op type may carry statically-known
+# values that affect the inferred shapes of their consumers (e.g. the second
+# input of Reshape), so nodes that consume them are not cached.
+_OPAQUE_VALUE_OP_TYPES = frozenset(["Placeholder"])
+
+# Op types whose output value is stored entirely in the "value" attribute.
+_CONST_OP_TYPES = frozenset(["Const"])
+
+_VALUE_SENSITIVE_DTYPES = frozenset([dtypes.int32, dtypes.int64])
+
+# Version of the signature format. Change it whenever the way signatures or
+# cached outputs are computed changes, so that entries written to on-disk
+# stores by older code stop matching.
+_SIGNATURE_FORMAT_VERSION = "1"
+
+
+class InferenceCache(object):
+  """
+  Cache of (dtype, shape) pairs describing the outputs of a node, keyed by a
+  signature that covers everything TensorFlow's inference looks at: the op
+  type, the node's attributes, and the dtypes and shapes of its inputs.
+
+  Entries live in a bounded in-memory LRU. If a path is provided, entries are
+  also written to a SQLite database at that location, which can be shared
+  across processes and across graph loads.
+  """
+
+  def __init__(self, max_entries: int = 4096, path: str = None):
+    """
+    Args:
+      max_entries: Maximum number of entries to keep in memory.
+      path: Optional path to an on-disk SQLite database that backs the
+        in-memory LRU. The file is created if it does not exist.
+    """
+    if max_entries <= 0:
+      raise ValueError("max_entries must be positive, got {}".format(
+        max_entries))
+    self._max_entries = max_entries
+    self._entries = collections.OrderedDict()  # Key is signature string
+    self._path = path
+    self._db = None
+    if path is not None:
+      self._db = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+      self._db.execute("CREATE TABLE IF NOT EXISTS inference "
+                       "(signature TEXT PRIMARY KEY, outputs TEXT NOT NULL)")
+      self._db.commit()
+    self.hits = 0
+    self.misses = 0
+
+  @property
+  def path(self) -> Optional[str]:
+    """Location of the on-disk store, or None if there is none."""
+    return self._path
+
+  def __len__(self):
+    return len(self._entries)
+
+  def get(self, signature: str) -> Optional[
+          List[Tuple[dtypes.DType, tensor_shape.TensorShape]]]:
+    """
+    Look up the cached outputs for a signature.
+
+    Args:
+      signature: String returned by `node_signature()` or
+        `node_def_signature()`.
+
+    Returns:
+      A list of (dtype, shape) pairs, one per output, or None on a miss.
+    """
+    ret = self._entries.get(signature)
+    if ret is not None:
+      self._entries.move_to_end(signature)
+    elif self._db is not None:
+      row = self._db.execute("SELECT outputs FROM inference "
+                             "WHERE signature = ?", (signature,)).fetchone()
+      if row is not None:
+        ret = _decode_outputs(row[0])
+        self._insert(signature, ret)
+    if ret is None:
+      self.misses += 1
+      return None
+    self.hits += 1
+    return list(ret)
+
+  def put(self, signature: str,
+          outputs: Iterable[Tuple[dtypes.DType, tensor_shape.TensorShape]]):
+    """
+    Add or replace a single entry.
+
+    Args:
+      signature: String returned by `node_signature()` or
+        `node_def_signature()`.
+      outputs: (dtype, shape) pairs describing the outputs of the node.
+    """
+    self.put_all([(signature, outputs)])
+
+  def put_all(self, entries: Iterable[
+          Tuple[str, Iterable[Tuple[dtypes.DType, tensor_shape.TensorShape]]]]):
+    """
+    Add or replace many entries at once, writing to the on-disk store (if
+    any) in a single transaction.
+
+    Args:
+      entries: Iterable of (signature, outputs) pairs, as in `put()`.
+    """
+    rows = []
+    for signature, outputs in entries:
+      outputs = tuple((dtypes.as_dtype(dtype), tensor_shape.TensorShape(shape))
+                      for dtype, shape in outputs)
+      self._insert(signature, outputs)
+      if self._db is not None:
+        rows.append((signature, _encode_outputs(outputs)))
+    if rows:
+      with self._db:
+        self._db.executemany("INSERT OR REPLACE INTO inference "
+                             "(signature, outputs) VALUES (?, ?)", rows)
+
+  def clear(self):
+    """
+    Remove all entries from memory and from the on-disk store.
+    """
+    self._entries.clear()
+    if self._db is not None:
+      with self._db:
+        self._db.execute("DELETE FROM inference")
+
+  def close(self):
+    """
+    Close the connection to the on-disk store, if any. The in-memory entries
+    remain usable.
+    """
+    if self._db is not None:
+      self._db.close()
+      self._db = None
+
+  def _insert(self, signature, outputs):
+    self._entries[signature] = outputs
+    self._entries.move_to_end(signature)
+    while len(self._entries) > self._max_entries:
+      self._entries.popitem(last=False)
+
+
+# Cache used by `Node.infer_outputs()`, graph loading and graph transforms.
+_inference_cache = InferenceCache()
+
+
+def get_inference_cache() -> Optional[InferenceCache]:
+  """
+  Returns the `InferenceCache` that GDE uses for dtype and shape inference,
+  or None if caching is disabled.
+  """
+  return _inference_cache
+
+
+def set_inference_cache(cache: Optional[InferenceCache]):
+  """
+  Replace the `InferenceCache` that GDE uses for dtype and shape inference.
+
+  Args:
+    cache: New cache, for example one backed by an on-disk store, or None
+      to disable caching.
+  """
+  global _inference_cache
+  _inference_cache = cache
+
+
+def lookup_outputs(node_def: node_def_pb2.NodeDef,
+                   input_specs: List[Tuple[
+                     dtypes.DType, tensor_shape.TensorShape, str,
+                     Optional[attr_value_pb2.AttrValue]]]
+                   ) -> Tuple[Optional[List[Tuple[dtypes.DType,
+                                                  tensor_shape.TensorShape]]],
+                              Optional[str]]:
+  """
+  Infer the outputs of a node without invoking TensorFlow, using the
+  registered Python shape function for the node's op type if there is one,
+  and the current inference cache otherwise.
+
+  Args:
+    node_def: NodeDef of the node.
+    input_specs: Description of the node's inputs, as in
+      `node_def_signature()`.
+
+  Returns:
+    A tuple `(outputs, signature)`. `outputs` is a list of (dtype, shape)
+    pairs, or None if the outputs could not be determined. In the latter
+    case, `signature` is the key under which the caller should `put()` the
+    outputs once it has computed them, or None if they should not be cached.
+  """
+  outputs = shape_functions.infer_outputs(node_def, input_specs)
+  if outputs is not None:
+    return outputs, None
+  cache = _inference_cache
+  if cache is None:
+    return None, None
+  signature = node_def_signature(node_def, input_specs)
+  if signature is None:
+    return None, None
+  return cache.get(signature), signature
+
+
+def node_signature(n) -> Optional[str]:
+  """
+  Compute the cache signature of a `gde.Node` from its current attributes and
+  inputs.
+
+  Args:
+    n: `gde.Node` whose outputs are to be inferred.
+
+  Returns:
+    Signature string, or None if the node's inferred outputs may depend on
+    more than its attributes and input dtypes and shapes.
+  """
+  return node_def_signature(n.to_node_def(), node_input_specs(n))
+
+
+def node_input_specs(n) -> List[Tuple[dtypes.DType, tensor_shape.TensorShape,
+                                      str, Optional[attr_value_pb2.AttrValue]]]:
+  """
+  Describe the data inputs of a `gde.Node` in the format that
+  `node_def_signature()` expects.
+  """
+  input_specs = []
+  for t in n.inputs:
+    producer = t.node
+    const_value = None
+    if (producer.op_type in _CONST_OP_TYPES
+            and t.dtype.base_dtype in _VALUE_SENSITIVE_DTYPES):
+      const_value = producer.to_node_def().attr["value"]
+    input_specs.append((t.dtype, t.shape, producer.op_type, const_value))
+  return input_specs
+
+
+def node_def_signature(node_def: node_def_pb2.NodeDef,
+                       input_specs: Iterable[Tuple[
+                         dtypes.DType, tensor_shape.TensorShape, str,
+                         Optional[attr_value_pb2.AttrValue]]]) -> Optional[str]:
+  """
+  Compute the cache signature of a node from its NodeDef and a description of
+  its inputs.
+
+  Args:
+    node_def: NodeDef of the node. Inputs and private ("_"-prefixed)
+      attributes are ignored.
+    input_specs: One tuple per data input, containing the dtype and shape of
+      the input, the op type of the node that produces it, and the "value"
+      attribute of that node if it is a constant (None otherwise). Constant
+      values only matter for integer inputs and may be omitted for others.
+
+  Returns:
+    Signature string, or None if the node's inferred outputs may depend on
+    more than its attributes and input dtypes and shapes.
+
+  Signatures also cover the version of the signature format, the version of
+  TensorFlow, and the Python shape function registered for the node's op
+  type, if any, so that entries in a shared on-disk store are not served
+  after any of these change.
+  """
+  h = hashlib.sha1()
+  h.update(_signature_salt().encode("utf-8"))
+  fn = shape_functions.get_shape_function(node_def.op)
+  if fn is not None:
+    h.update("\0{}.{}".format(getattr(fn, "__module__", ""),
+                              getattr(fn, "__qualname__", "")).encode("utf-8"))
+  h.update(b"\0" + node_def.op.encode("utf-8"))
+  for key in sorted(node_def.attr):
+    if key.startswith("_"):
+      continue
+    value = node_def.attr[key]
+    if value.HasField("func") or (value.HasField("list") and
+                                  len(value.list.func) > 0):
+      # Output types of function calls depend on the function library.
+      return None
+    h.update(b"\0" + key.encode("utf-8") + b"=")
+    h.update(value.SerializeToString(deterministic=True))
+  for dtype, shape, producer_op_type, const_value in input_specs:
+    dtype = dtypes.as_dtype(dtype)
+    h.update(b"\0" + "{}:{}".format(dtype.as_datatype_enum,
+                                     _shape_key(shape)).encode("utf-8"))
+    if dtype.base_dtype not in _VALUE_SENSITIVE_DTYPES:
+      continue
+    if producer_op_type in _CONST_OP_TYPES and const_value is not None:
+      h.update(const_value.SerializeToString(deterministic=True))
+    elif producer_op_type not in _OPAQUE_VALUE_OP_TYPES:
+      return None
+  return h.hexdigest()
+
+
+################################################################################
+# Stuff below this line is private to this file.
+
+
+_salt = None
+
+
+def _signature_salt():
+  """Returns the part of every signature that depends on the environment:
+  the signature format version and the version of TensorFlow."""
+  global _salt
+  if _salt is None:
+    _salt = "gde-inference-cache-v{};tensorflow={}".format(
+      _SIGNATURE_FORMAT_VERSION, _tensorflow_version())
+  return _salt
+
+
+def _tensorflow_version():
+  """Returns the version of TensorFlow, without importing it if possible."""
+  tf = sys.modules.get("tensorflow")
+  if tf is not None and hasattr(tf, "__version__"):
+    return tf.__version__
+  try:
+    from importlib import metadata  # pylint: disable=g-import-not-at-top
+  except ImportError:  # Python < 3.8
+    metadata = None
+  if metadata is not None:
+    for dist in ("tensorflow", "tensorflow-cpu", "tensorflow-gpu",
+                 "tf-nightly"):
+      try:
+        return metadata.version(dist)
+      except metadata.PackageNotFoundError:
+        pass
+  # Without package metadata, fall back on importing TensorFlow, which is
+  # needed anyway to compute the outputs that go into the cache.
+  try:
+    import tensorflow  # pylint: disable=g-import-not-at-top
+  except ImportError:
+    return "none"
+  return getattr(tensorflow, "__version__", "unknown")
+
+
+def _shape_key(shape):
+  shape = tensor_shape.TensorShape(shape)
+  if shape.ndims is None:
+    return "*"
+  return ",".join("?" if d is None else str(d) for d in shape.as_list())
+
+
+def _encode_outputs(outputs):
+  return json.dumps([[dtype.as_datatype_enum,
+                      None if shape.ndims is None else shape.as_list()]
+                     for dtype, shape in outputs])
+
+
+def _decode_outputs(s):
+  return tuple((dtypes.as_dtype(dtype), tensor_shape.TensorShape(dims))
+               for dtype, dims in json.loads(s))
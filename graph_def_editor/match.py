@@ -19,13 +19,18 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import weakref
+
 from six import string_types
+from typing import Any, Iterable, List
 
-from graph_def_editor import node, select
+from graph_def_editor import graph, node, select, tensor
 
 __all__ = [
     "op_type",
+    "op_attr",
     "OpMatcher",
+    "find_all",
 ]
 
 
@@ -47,18 +52,47 @@ def op_type(op_types, op=None):
     op: the operation to check (or None).
   Returns:
     if op is not None, return True if the op is of the correct type.
-    if op is None, return a lambda function which does the type checking.
+    if op is None, return a function which does the type checking. When used
+    as a filter of an `OpMatcher`, `find_all()` looks the types up in an
+    index instead of testing every node of the graph.
   """
-  if isinstance(op_types, string_types):
-    op_types = (op_types,)
+  type_filter = _OpTypeFilter(op_types)
   if op is None:
-    return lambda operator: operator.op_type in op_types
+    return type_filter
   else:
-    return op.node_def.op in op_types
+    return type_filter(op)
+
+
+def op_attr(key, value, op=None):
+  """Check if an op has an attribute with the given value.
+
+  Args:
+    key: name of the attribute, for instance "data_format".
+    value: value to compare against, as a native Python value such as those
+      returned by `gde.Node.get_attr()`. For instance: "NHWC"
+    op: the operation to check (or None).
+  Returns:
+    if op is not None, return True if the op has the attribute and its value
+    is equal to `value`.
+    if op is None, return a function which does the attribute checking. When
+    used as a filter of an `OpMatcher`, `find_all()` looks the value up in an
+    index instead of testing every node of the graph.
+  """
+  attr_filter = _AttrFilter(key, value)
+  if op is None:
+    return attr_filter
+  else:
+    return attr_filter(op)
 
 
 class OpMatcher(object):
-  """Graph match class."""
+  """Graph match class.
+
+  The first time an `OpMatcher` is used, it is compiled into a plan that
+  checks the cheapest conditions first: the number of inputs and outputs,
+  then op types, attributes, node names, and arbitrary filter functions, and
+  only then the matchers of neighboring ops.
+  """
 
   def __init__(self, positive_filter):
     """Graph match constructor."""
@@ -66,6 +100,7 @@ class OpMatcher(object):
     self.input_op_matches = None
     self.control_input_op_matches = None
     self.output_op_matches = None
+    self._plan = None
     positive_filter = self._finalize_positive_filter(positive_filter)
     self.positive_filters.append(positive_filter)
 
@@ -73,14 +108,13 @@ class OpMatcher(object):
   def _finalize_positive_filter(elem):
     """Convert to a filter function."""
     if select.can_be_regex(elem):
-      regex_ = select.make_regex(elem)
-      return lambda op, regex=regex_: regex.search(op.name) is not None
+      return _RegexFilter(select.make_regex(elem))
     elif isinstance(elem, node.Node):
-      return lambda op, match_op=elem: op is match_op
+      return _NodeFilter(elem)
     elif callable(elem):
       return elem
     elif elem is True:
-      return lambda op: True
+      return _match_any
     else:
       raise ValueError("Cannot finalize the positive filter: {}".format(elem))
 
@@ -88,42 +122,15 @@ class OpMatcher(object):
     """Evaluate if the op matches or not."""
     if not isinstance(op, node.Node):
       raise TypeError("Expect gde.Node, got: {}".format(type(op)))
-    for positive_filter in self.positive_filters:
-      if not positive_filter(op):
-        return False
-    if self.input_op_matches is not None:
-      if len(op.inputs) != len(self.input_op_matches):
-        return False
-      for input_t, input_op_match in zip(op.inputs, self.input_op_matches):
-        if input_op_match is None:
-          continue
-        if not input_op_match(input_t.node):
-          return False
-    if self.control_input_op_matches is not None:
-      if len(op.control_inputs) != len(self.control_input_op_matches):
-        return False
-      for cinput_op, cinput_op_match in zip(op.control_inputs,
-                                            self.control_input_op_matches):
-        if cinput_op_match is None:
-          continue
-        if not cinput_op_match(cinput_op):
-          return False
-    if self.output_op_matches is not None:
-      if len(op.outputs) != len(self.output_op_matches):
-        return False
-      for output_t, output_op_matches in zip(op.outputs,
-                                             self.output_op_matches):
-        if output_op_matches is None:
-          continue
-        if len(output_t.consumers()) != len(output_op_matches):
-          return False
-        for consumer_op, consumer_op_match in zip(output_t.consumers(),
-                                                  output_op_matches):
-          if consumer_op_match is None:
-            continue
-          if not consumer_op_match(consumer_op):
-            return False
-    return True
+    return self._get_plan().match(op, _MatchContext())
+
+  def _get_plan(self) -> '_MatchPlan':
+    """Returns the compiled form of this matcher, compiling it if it or any
+    of the matchers of its neighbors have changed since the last call."""
+    if self._plan is None or not self._plan.is_current():
+      self._plan = _MatchPlan(self, {})
+      self._plan.is_current()  # Record the state of the matchers
+    return self._plan
 
   def input_ops(self, *args):
     """Add input matches."""
@@ -132,6 +139,7 @@ class OpMatcher(object):
     self.input_op_matches = []
     for input_match in args:
       self.input_op_matches.append(_make_graph_match(input_match))
+    self._plan = None
     return self
 
   def control_input_ops(self, *args):
@@ -141,6 +149,7 @@ class OpMatcher(object):
     self.control_input_op_matches = []
     for input_match in args:
       self.control_input_op_matches.append(_make_graph_match(input_match))
+    self._plan = None
     return self
 
   def output_ops(self, *args):
@@ -151,9 +160,374 @@ class OpMatcher(object):
     for consumer_op_matches in args:
       if consumer_op_matches is None:
         self.output_op_matches.append(None)
+        continue
       if not isinstance(consumer_op_matches, list):
         consumer_op_matches = [consumer_op_matches]
       consumer_op_matches = [_make_graph_match(consumer_op_match)
                              for consumer_op_match in consumer_op_matches]
       self.output_op_matches.append(consumer_op_matches)
+    self._plan = None
     return self
+
+
+def find_all(g: 'graph.Graph', graph_match) -> List['node.Node']:
+  """
+  Find every node of a graph that a matcher matches, in a single pass.
+
+  Rather than testing each node of the graph in turn, `find_all()` uses
+  indexes of the graph's op types, attribute values and edges to narrow down
+  the candidates before running the matcher on them. The indexes are cached
+  with the graph and rebuilt after the graph changes.
+
+  Args:
+    g: `gde.Graph` to search.
+    graph_match: `OpMatcher`, or anything that can be passed to the
+      `OpMatcher` constructor.
+
+  Returns:
+    List of the matching `gde.Node`s, in the order in which they were added
+    to the graph.
+  """
+  plan = _make_graph_match(graph_match)._get_plan()
+  index = _get_index(g)
+  context = _MatchContext(index)
+  candidates = plan.candidates(index)
+  if candidates is None:
+    candidates = g.nodes
+  return [n for n in candidates if plan.match(n, context)]
+
+
+################################################################################
+# Stuff below this line is private to this file.
+
+
+class _OpTypeFilter(object):
+  """Filter function returned by `op_type()`."""
+
+  def __init__(self, op_types):
+    if isinstance(op_types, string_types):
+      op_types = (op_types,)
+    self.op_types = frozenset(op_types)
+
+  def __call__(self, op):
+    return op.op_type in self.op_types
+
+
+class _AttrFilter(object):
+  """Filter function returned by `op_attr()`."""
+
+  def __init__(self, key: str, value: Any):
+    self.key = key
+    self.value = value
+    self.index_key = _hashable_attr_value(value)
+
+  def __call__(self, op):
+    if self.key not in op.get_attr_keys():
+      return False
+    actual = op.get_attr(self.key)
+    if self.index_key is not None:
+      return _hashable_attr_value(actual) == self.index_key
+    return bool(actual == self.value)
+
+
+class _RegexFilter(object):
+  """Filter function that searches for a regular expression in node names."""
+
+  def __init__(self, regex):
+    self.regex = regex
+
+  def __call__(self, op):
+    return self.regex.search(op.name) is not None
+
+
+class _NodeFilter(object):
+  """Filter function that only accepts one particular node."""
+
+  def __init__(self, match_op: 'node.Node'):
+    self.node = match_op
+
+  def __call__(self, op):
+    return op is self.node
+
+
+def _match_any(_):
+  return True
+
+
+def _filter_cost(positive_filter) -> int:
+  """Rough relative cost of evaluating a filter function, used to order the
+  checks of a compiled matcher."""
+  if isinstance(positive_filter, _NodeFilter):
+    return 0
+  elif isinstance(positive_filter, _OpTypeFilter):
+    return 1
+  elif isinstance(positive_filter, _AttrFilter):
+    return 2
+  elif isinstance(positive_filter, _RegexFilter):
+    return 3
+  return 4
+
+
+def _hashable_attr_value(value):
+  """Returns a hashable key equal to `value` for indexing attributes by
+  value, or None if there is no such key."""
+  if isinstance(value, (list, tuple)):
+    elems = tuple(_hashable_attr_value(v) for v in value)
+    return None if any(e is None for e in elems) else elems
+  try:
+    hash(value)
+  except TypeError:
+    return None
+  return value
+
+
+class _MatchPlan(object):
+  """Compiled form of an `OpMatcher` and of the matchers of its neighbors."""
+
+  def __init__(self, matcher: OpMatcher, compiled):
+    """
+    Args:
+      matcher: `OpMatcher` to compile.
+      compiled: Dictionary from `OpMatcher` to plans already compiled as part
+        of the same root matcher, so that a matcher used in several places is
+        only compiled (and its results only memoized) once.
+    """
+    compiled[matcher] = self
+    self.filters = sorted([f for f in matcher.positive_filters
+                           if f is not _match_any], key=_filter_cost)
+    self.input_plans = _compile_all(matcher.input_op_matches, compiled)
+    self.control_input_plans = _compile_all(matcher.control_input_op_matches,
+                                            compiled)
+    self.num_inputs = _len_or_none(matcher.input_op_matches)
+    self.num_control_inputs = _len_or_none(matcher.control_input_op_matches)
+    self.num_outputs = _len_or_none(matcher.output_op_matches)
+    # (output index, number of consumers, plans for the consumers)
+    self.consumer_checks = []
+    for i, consumer_matches in enumerate(matcher.output_op_matches or ()):
+      if consumer_matches is not None:
+        self.consumer_checks.append(
+          (i, len(consumer_matches), _compile_all(consumer_matches, compiled)))
+    # Plans that look beyond the op itself are worth memoizing.
+    self.deep = (self.input_plans is not None or
+                 self.control_input_plans is not None or
+                 len(self.consumer_checks) > 0)
+    self.trivial = (not self.deep and len(self.filters) == 0 and
+                    self.num_inputs is None and
+                    self.num_control_inputs is None and
+                    self.num_outputs is None)
+    self._compiled = compiled
+    self._matcher_state = None
+
+  def is_current(self) -> bool:
+    """Returns True if none of the matchers that this plan was compiled from
+    have changed since."""
+    if self._matcher_state is None:
+      # Only taken for the root of each compiled tree of matchers.
+      self._matcher_state = [
+        (m, list(m.positive_filters), m.input_op_matches,
+         m.control_input_op_matches, m.output_op_matches)
+        for m in self._compiled]
+      return True
+    for m, filters, inputs, control_inputs, outputs in self._matcher_state:
+      if (m.positive_filters != filters or m.input_op_matches is not inputs or
+              m.control_input_op_matches is not control_inputs or
+              m.output_op_matches is not outputs):
+        return False
+    return True
+
+  def match(self, op: 'node.Node', context: '_MatchContext') -> bool:
+    if self.num_inputs is not None and len(op.inputs) != self.num_inputs:
+      return False
+    if (self.num_control_inputs is not None and
+            len(op.control_inputs) != self.num_control_inputs):
+      return False
+    if self.num_outputs is not None and len(op.outputs) != self.num_outputs:
+      return False
+    for positive_filter in self.filters:
+      if not positive_filter(op):
+        return False
+    if not self.deep:
+      return True
+    consumer_lists = []
+    if len(self.consumer_checks) > 0:
+      outputs = op.outputs
+      for i, num_consumers, _ in self.consumer_checks:
+        consumers = context.consumers(outputs[i])
+        if len(consumers) != num_consumers:
+          return False
+        consumer_lists.append(consumers)
+    if self.input_plans is not None:
+      for input_t, input_plan in zip(op.inputs, self.input_plans):
+        if input_plan is not None and \
+                not context.match(input_plan, input_t.node):
+          return False
+    if self.control_input_plans is not None:
+      for cinput_op, cinput_plan in zip(op.control_inputs,
+                                        self.control_input_plans):
+        if cinput_plan is not None and \
+                not context.match(cinput_plan, cinput_op):
+          return False
+    for consumers, (_, _, consumer_plans) in zip(consumer_lists,
+                                                 self.consumer_checks):
+      for consumer_op, consumer_plan in zip(consumers, consumer_plans):
+        if consumer_plan is not None and \
+                not context.match(consumer_plan, consumer_op):
+          return False
+    return True
+
+  def candidates(self, index: '_GraphIndex'):
+    """
+    Returns the nodes that this plan could possibly match according to the
+    indexes, in id order, or None if the indexes do not narrow them down.
+    """
+    best = None
+    for positive_filter in self.filters:
+      found = None
+      if isinstance(positive_filter, _NodeFilter):
+        found = [positive_filter.node] \
+          if positive_filter.node.graph is index.graph else []
+      elif isinstance(positive_filter, _OpTypeFilter):
+        found = index.nodes_of_types(positive_filter.op_types)
+      elif isinstance(positive_filter, _AttrFilter):
+        found = index.nodes_with_attr(positive_filter.key,
+                                      positive_filter.index_key)
+      if found is not None and (best is None or len(found) < len(best)):
+        best = found
+    if best is None and self.input_plans is not None:
+      # Nothing to go on for the op itself; use the ops that feed it instead.
+      for i, input_plan in enumerate(self.input_plans):
+        producers = None if input_plan is None \
+          else input_plan.candidates(index)
+        if producers is None:
+          continue
+        found = set()
+        for producer in producers:
+          for t in producer.outputs:
+            for consumer in index.consumers(t):
+              if len(consumer.inputs) > i and consumer.inputs[i] is t:
+                found.add(consumer)
+        if best is None or len(found) < len(best):
+          best = sorted(found, key=lambda n: n.id_in_graph)
+    return best
+
+
+def _compile_all(matchers, compiled):
+  """Compiles a list of `OpMatcher`s or Nones, reusing plans in `compiled`.
+  Matchers that accept any op compile to None."""
+  if matchers is None:
+    return None
+  ret = []
+  for m in matchers:
+    plan = None
+    if m is not None:
+      plan = compiled[m] if m in compiled else _MatchPlan(m, compiled)
+    ret.append(None if plan is None or plan.trivial else plan)
+  return ret
+
+
+def _len_or_none(matches):
+  return None if matches is None else len(matches)
+
+
+class _MatchContext(object):
+  """State shared by the evaluations of plans during one search: consumer
+  lists and the results of matching neighboring ops, which different
+  candidates often share."""
+
+  def __init__(self, index: '_GraphIndex' = None):
+    self.index = index
+    self._consumers = {}
+    self._results = {}
+
+  def consumers(self, t: 'tensor.Tensor') -> List['node.Node']:
+    if self.index is not None:
+      return self.index.consumers(t)
+    if t not in self._consumers:
+      self._consumers[t] = t.consumers()
+    return self._consumers[t]
+
+  def match(self, plan: _MatchPlan, op: 'node.Node') -> bool:
+    if not plan.deep:
+      return plan.match(op, self)
+    key = (plan, op)
+    ret = self._results.get(key)
+    if ret is None:
+      ret = self._results[key] = plan.match(op, self)
+    return ret
+
+
+class _GraphIndex(object):
+  """Indexes of one version of a graph, built lazily."""
+
+  def __init__(self, g: 'graph.Graph'):
+    self.graph = g
+    self.version = g.version
+    self.attr_version = g._attr_version  # pylint: disable=protected-access
+    self._nodes_by_type = None  # Dict[str, List[Node]]
+    self._nodes_by_attr = {}  # Dict[str, Dict[Any, List[Node]]]
+    self._unindexed_by_attr = {}  # Dict[str, List[Node]]
+    self._consumers = None  # Dict[Tensor, List[Node]]
+
+  def nodes_of_types(self, op_types: Iterable[str]) -> List['node.Node']:
+    if self._nodes_by_type is None:
+      self._nodes_by_type = {}
+      for n in self.graph.nodes:
+        self._nodes_by_type.setdefault(n.op_type, []).append(n)
+    ret = []
+    for t in op_types:
+      ret.extend(self._nodes_by_type.get(t, ()))
+    if len(op_types) > 1:
+      ret.sort(key=lambda n: n.id_in_graph)
+    return ret
+
+  def nodes_with_attr(self, key: str, index_key: Any):
+    """Returns the nodes whose attribute `key` might equal the value with
+    hashable form `index_key`, or None if `index_key` is None."""
+    if index_key is None:
+      return None
+    g = self.graph
+    if self.attr_version != g._attr_version:  # pylint: disable=protected-access
+      self._nodes_by_attr = {}
+      self._unindexed_by_attr = {}
+      self.attr_version = g._attr_version  # pylint: disable=protected-access
+    if key not in self._nodes_by_attr:
+      by_value = {}
+      unindexed = []
+      for n in g.nodes:
+        if key in n.get_attr_keys():
+          value = _hashable_attr_value(n.get_attr(key))
+          if value is None:
+            unindexed.append(n)
+          else:
+            by_value.setdefault(value, []).append(n)
+      self._nodes_by_attr[key] = by_value
+      self._unindexed_by_attr[key] = unindexed
+    ret = self._nodes_by_attr[key].get(index_key, [])
+    unindexed = self._unindexed_by_attr[key]
+    if len(unindexed) > 0:
+      ret = sorted(ret + unindexed, key=lambda n: n.id_in_graph)
+    return ret
+
+  def consumers(self, t: 'tensor.Tensor') -> List['node.Node']:
+    """Same as `t.consumers()`, from an adjacency table built in one pass
+    over the graph."""
+    if self._consumers is None:
+      self._consumers = {}
+      for n in self.graph.nodes:
+        for input_t in n.inputs:
+          consumers = self._consumers.setdefault(input_t, [])
+          if len(consumers) == 0 or consumers[-1] is not n:
+            consumers.append(n)
+    return self._consumers.get(t, [])
+
+
+# Most recent index of each graph.
+_graph_indexes = weakref.WeakKeyDictionary()
+
+
+def _get_index(g: 'graph.Graph') -> _GraphIndex:
+  index = _graph_indexes.get(g)
+  if index is None or index.version != g.version:
+    index = _GraphIndex(g)
+    _graph_indexes[g] = index
+  return index
@@ -18,10 +18,11 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-import tensorflow as tf
 from typing import Tuple, List, Iterable, Any
 
-from graph_def_editor import graph, tensor, util
+from graph_def_editor import dtypes, graph, inference_cache, protos, \
+  tensor, tensor_shape, util
+from graph_def_editor.protos import attr_value_pb2, node_def_pb2
 
 # Magical attribute name that TensorFlow uses to store colocation groups.
 # See colocation_groups property below for more information.
@@ -153,7 +154,7 @@ class Node(object):
       raise IndexError("Received input index {}, but node has {} "
                        "inputs".format(index, len(self._inputs)))
     self._inputs[index] = new_input
-    self._graph.increment_version_counter()
+    self._graph.increment_version_counter(self)
 
   def set_inputs(self, new_inputs: Iterable[tensor.Tensor]):
     """
@@ -167,7 +168,7 @@ class Node(object):
         raise ValueError("Tensor {} points to graph {}, but this node is in a "
                          "different graph {}".format(t, t.graph, self.graph))
     self._inputs = list(new_inputs)
-    self._graph.increment_version_counter()  # New edges added to graph
+    self._graph.increment_version_counter(self)  # New edges added to graph
 
   @property
   def control_inputs(self) -> Tuple['Node']:
@@ -291,10 +292,11 @@ class Node(object):
       if not self._graph.contains_node(s):
         raise ValueError("Graph does not contain a node with name '{}'".format(
           s))
-    self._colocation_groups = value
+    self._colocation_groups = list(value)
     # Invalidate any cached information that the parent Graph may have
     # generated about colocation constraints.
-    self.graph.increment_version_counter()
+    self.graph._colocation_groups_replaced()  # pylint: disable=protected-access
+    self.graph.increment_version_counter(self)
 
   def add_colocation_group(self, head_node_name: str, validate: bool = True):
     """
@@ -312,8 +314,6 @@ class Node(object):
     Raises:
       ValueError if there is a problem with `head_node_name`
     """
-    # TODO(frreiss): Invalidate any cached information that the parent Graph
-    #  may have generated about colocation constraints.
     if validate and not self._graph.contains_node(head_node_name):
         raise ValueError("Graph does not contain a node with name '{}'".format(
           head_node_name))
@@ -321,8 +321,10 @@ class Node(object):
       raise ValueError("Already have colocation group with '{}'".format(
         head_node_name))
     self._colocation_groups.append(head_node_name)
+    # Let the parent Graph fold the new constraint into its colocation index.
+    self._graph._colocation_group_added(self, head_node_name)  # pylint: disable=protected-access
 
-  def to_node_def(self, target: tf.NodeDef = None):
+  def to_node_def(self, target: node_def_pb2.NodeDef = None):
     """
     Args:
       target: optional preallocated, empty NodeDef object to fill in. If not
@@ -333,7 +335,7 @@ class Node(object):
         vice versa.
     """
     if target is None:
-      target = tf.NodeDef()
+      target = node_def_pb2.NodeDef()
     target.name = self.name
     target.op = self.op_type
     for input_tensor in self.inputs:
@@ -379,7 +381,7 @@ class Node(object):
       raise ValueError("Node {} has more than one attribute "
                        "under key '{}'".format(self, key))
     ret = matches[0]
-    if isinstance(ret, tf.AttrValue):
+    if protos.is_message(ret, attr_value_pb2.AttrValue):
       return util.attr_value_to_python_type(ret)
     else:
       return ret
@@ -415,14 +417,14 @@ class Node(object):
         raise ValueError("Tried to set special '{}' attribute when the "
                          "Node already has colocation "
                          "groups".format(_COLOCATION_ATTR_NAME))
-      elif isinstance(value, tf.AttrValue):
+      elif protos.is_message(value, attr_value_pb2.AttrValue):
         # Internal TF type; convert to iterable of Python strings
         if value.list.s is None:
           raise ValueError("Tried to set special '{}' attribute using "
                            "tf.AttrValue object, and the object's 'list.s' "
                            "attribute was not populated. Value: '{}'".format(
                               _COLOCATION_ATTR_NAME, str(value)))
-        value = [tf.compat.as_str(s_i) for s_i in value.list.s]
+        value = [util.as_str(s_i) for s_i in value.list.s]
       elif not isinstance(value, list) and not isinstance(value, tuple):
         raise ValueError("Tried to set special '{}' attribute with a type "
                          "other than list or tuple. Type is '{}' and value "
@@ -441,12 +443,14 @@ class Node(object):
       raise ValueError("Already have an attribute called '{}'".format(key))
     else:
       self._attributes.append((key, value))
+      self._graph._attr_version += 1  # pylint: disable=protected-access
 
   def clear_attrs(self):
     """
     Remove any attributes that are attached to this node.
     """
     self._attributes.clear()
+    self._graph._attr_version += 1  # pylint: disable=protected-access
 
   def _attr_names(self):
     return [a[0] for a in self._attributes]
@@ -460,26 +464,42 @@ class Node(object):
       new_control_inputs: Iterable of `Node` objects in this node's parent graph
     """
     self._control_inputs = list(new_control_inputs)
+    self._graph.increment_version_counter(self)  # New edges added to graph
 
   def set_outputs_from_pairs(self,
-                             new_outputs: Iterable[Tuple[tf.DType,
-                                                         tf.TensorShape]]):
+                             new_outputs: Iterable[Tuple[
+                               dtypes.DType, tensor_shape.TensorShape]]):
     """
     Set all outputs at once, removing anything that was there previously.
 
+    Existing `Tensor` objects are updated in place, so that other nodes that
+    consume them see the new dtypes and shapes. Outputs beyond the end of
+    `new_outputs` are removed.
+
     Note that information about outputs is not stored in the serialized graph.
     When instantiating a serialized graph, TensorFlow will use its own shape
     inference to infer the number, type, and shape of the node's outputs.
 
     Args:
-      new_outputs: Iterable of (dtype, shape) pairs that describe the outputs
+      new_outputs: Iterable of (dtype, shape) pairs that describe the outputs.
+        `tf.DType` and `tf.TensorShape` objects are converted to their GDE
+        counterparts.
     """
+    old_outputs = self._outputs
     self._outputs = []
-    i = 0
-    for (dtype, shape) in new_outputs:
-      self._outputs.append(tensor.Tensor(self, i, dtype, shape))
-      i += 1
-    self._graph.increment_version_counter()  # Just in case
+    for i, (dtype, shape) in enumerate(new_outputs):
+      dtype = dtypes.as_dtype(dtype)
+      shape = tensor_shape.as_shape(shape)
+      if i < len(old_outputs):
+        t = old_outputs[i]
+        # pylint: disable=protected-access
+        t._dtype = dtype
+        t._shape = shape
+        # pylint: enable=protected-access
+      else:
+        t = tensor.Tensor(self, i, dtype, shape)
+      self._outputs.append(t)
+    self._graph.increment_version_counter(self)  # Just in case
 
   def infer_outputs(self):
     """
@@ -494,26 +514,43 @@ class Node(object):
 
     Overwrites the previous value of the `outputs` property.
 
+    Common ops are handled by the Python shape functions registered with
+    `gde.register_shape_function()`, without invoking TensorFlow. Other
+    results are memoized in the cache returned by `gde.get_inference_cache()`,
+    so repeated inference on nodes with the same op type, attributes and input
+    dtypes/shapes only invokes TensorFlow once.
+
     Raises:
       TBD
     """
+    node_def = self.to_node_def()
+    pairs, signature = inference_cache.lookup_outputs(
+      node_def, inference_cache.node_input_specs(self))
+    if pairs is not None:
+      self.set_outputs_from_pairs(pairs)
+      return
+
     # TF lack a supported API for invoking shape inference directly,
     # so we instantiate a dummy graph and create a dummy Operation object
+    import tensorflow as tf  # pylint: disable=g-import-not-at-top
     temp_graph = tf.Graph()
     with temp_graph.as_default():
-      input_placeholders = [tf.placeholder(shape=t.shape, dtype=t.dtype) for
-                            t in self._inputs]
+      dummy_inputs = [util.make_inference_input(t) for t in self._inputs]
+      node_def.name = temp_graph.unique_name(node_def.name)
       # See the docs for tf.Operation for important notes about the semantics
       # of each arg to the following constructor.
-      dummy_op = tf.Operation(self.to_node_def(), temp_graph,
-                              inputs=input_placeholders)
-      self.set_outputs_from_pairs([(o.dtype, o.shape)
-                                   for o in dummy_op.outputs])
+      dummy_op = tf.Operation(protos.to_tensorflow(node_def),
+                              temp_graph, inputs=dummy_inputs)
+      pairs = [(dtypes.as_dtype(o.dtype), tensor_shape.TensorShape(o.shape))
+               for o in dummy_op.outputs]
+      self.set_outputs_from_pairs(pairs)
       # set_outputs_from_pairs() increments the version counter, so we don't
       # need to. Also, we haven't added edges to the graph until these
       # outputs are connected to another node's inputs.
 
       # TODO(frreiss): If this op has a "T" attribute, set that too.
+    if signature is not None:
+      inference_cache.get_inference_cache().put(signature, pairs)
 
   def set_inputs_from_strings(self, new_inputs: Iterable[str],
                               set_control_inputs: bool = True):
@@ -533,7 +570,7 @@ class Node(object):
     self._inputs = _decode_inputs(new_inputs, self._graph)
     if set_control_inputs:
       self._control_inputs = _decode_control_inputs(new_inputs, self._graph)
-    self._graph.increment_version_counter()  # New edges added to graph
+    self._graph.increment_version_counter(self)  # New edges added to graph
 
 
 
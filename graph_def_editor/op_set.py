@@ -0,0 +1,249 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Compact sets of nodes of a single graph."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+from typing import Iterable, Iterator
+
+from graph_def_editor import graph, node
+
+__all__ = [
+  "OpSet",
+]
+
+
+class OpSet(object):
+  """
+  Immutable set of nodes of one `gde.Graph`, stored as a bitmap indexed by
+  the nodes' `id_in_graph`.
+
+  Set algebra between two `OpSet`s operates on whole bitmaps at once without
+  touching individual `Node` objects, so combining large selections is much
+  cheaper than with Python sets. Membership tests take constant time, and
+  iteration returns nodes in the order in which they were added to the graph.
+
+  `OpSet` supports the operators and methods of `frozenset` (`|`, `&`, `-`,
+  `^`, `<=`, `union()`, `isdisjoint()`, and so on). The other operand may be
+  any iterable of nodes of the same graph. APIs that accept a collection of
+  ops, such as the functions in `gde.select`, `gde.reroute` and the
+  constructor of `gde.SubGraphView`, also accept an `OpSet`.
+
+  Nodes that are removed from the graph after an `OpSet` is created drop out
+  of the set.
+  """
+
+  def __init__(self, g: 'graph.Graph', ops: Iterable['node.Node'] = ()):
+    """
+    Args:
+      g: Graph that the nodes belong to.
+      ops: Nodes of `g` to put in the set, as an `OpSet` or any other
+        iterable of `gde.Node`.
+
+    Raises:
+      ValueError if one of the nodes is not in `g`.
+    """
+    self._graph = g
+    # pylint: disable=protected-access
+    self._num_removed = len(g._removed_node_ids)
+    # pylint: enable=protected-access
+    if isinstance(ops, OpSet):
+      if ops.graph is not g:
+        raise ValueError("OpSet is for a different graph")
+      self._bits = ops._get_bits()
+      return
+    ids = []
+    for op in ops:
+      if op.graph is not g:
+        raise ValueError("Node {} is not in graph {}".format(op, g))
+      ids.append(op.id_in_graph)
+    bits = np.zeros(_bitmap_size(g), dtype=np.bool_)
+    bits[ids] = True
+    self._bits = _freeze(bits)
+
+  @classmethod
+  def all_ops(cls, g: 'graph.Graph') -> 'OpSet':
+    """Returns an `OpSet` of all the nodes in `g`."""
+    # pylint: disable=protected-access
+    bits = np.array([n is not None for n in g._nodes_by_id], dtype=np.bool_)
+    # pylint: enable=protected-access
+    return cls._from_bits(g, bits)
+
+  @classmethod
+  def _from_bits(cls, g, bits) -> 'OpSet':
+    ret = cls.__new__(cls)
+    ret._graph = g
+    ret._num_removed = len(g._removed_node_ids)  # pylint: disable=protected-access
+    ret._bits = _freeze(bits)
+    return ret
+
+  @property
+  def graph(self) -> 'graph.Graph':
+    """The graph that the nodes in this set belong to."""
+    return self._graph
+
+  def _get_bits(self) -> np.ndarray:
+    """Returns the bitmap, after clearing the bits of any nodes that were
+    removed from the graph since the last call."""
+    removed_ids = self._graph._removed_node_ids  # pylint: disable=protected-access
+    if len(removed_ids) > self._num_removed:
+      stale = [i for i in removed_ids[self._num_removed:]
+               if i < len(self._bits)]
+      if len(stale) > 0 and self._bits[stale].any():
+        bits = self._bits.copy()
+        bits[stale] = False
+        self._bits = _freeze(bits)
+      self._num_removed = len(removed_ids)
+    return self._bits
+
+  def ids(self) -> np.ndarray:
+    """Returns the `id_in_graph` values of the nodes in this set, in
+    ascending order, as a numpy array."""
+    return np.flatnonzero(self._get_bits())
+
+  def __contains__(self, op) -> bool:
+    bits = self._get_bits()
+    op_id = getattr(op, "id_in_graph", None)
+    return (op_id is not None and op_id < len(bits) and bool(bits[op_id])
+            and op.graph is self._graph)
+
+  def __iter__(self) -> Iterator['node.Node']:
+    nodes_by_id = self._graph._nodes_by_id  # pylint: disable=protected-access
+    return iter([nodes_by_id[i] for i in self.ids()])
+
+  def __len__(self):
+    return int(np.count_nonzero(self._get_bits()))
+
+  def __bool__(self):
+    return bool(self._get_bits().any())
+
+  # Python 3 wants __bool__, Python 2.7 wants __nonzero__
+  __nonzero__ = __bool__
+
+  def __repr__(self):
+    return "OpSet({})".format([n.name for n in self])
+
+  def _coerce(self, other) -> np.ndarray:
+    """Returns the bitmap of `other`, converting it to an `OpSet` first if
+    necessary."""
+    if not isinstance(other, OpSet):
+      other = OpSet(self._graph, other)
+    elif other.graph is not self._graph:
+      raise ValueError("Cannot combine OpSets of different graphs")
+    return other._get_bits()
+
+  def _combine(self, other, ufunc) -> 'OpSet':
+    a, b = _align(self._get_bits(), self._coerce(other))
+    return OpSet._from_bits(self._graph, ufunc(a, b))
+
+  def union(self, *others) -> 'OpSet':
+    ret = self
+    for other in others:
+      ret = ret._combine(other, np.logical_or)
+    return ret
+
+  def intersection(self, *others) -> 'OpSet':
+    ret = self
+    for other in others:
+      ret = ret._combine(other, np.logical_and)
+    return ret
+
+  def difference(self, *others) -> 'OpSet':
+    ret = self
+    for other in others:
+      ret = ret._combine(other, _and_not)
+    return ret
+
+  def symmetric_difference(self, other) -> 'OpSet':
+    return self._combine(other, np.logical_xor)
+
+  def complement(self) -> 'OpSet':
+    """Returns an `OpSet` of all the nodes of the graph that are not in this
+    set."""
+    return OpSet.all_ops(self._graph).difference(self)
+
+  def issubset(self, other) -> bool:
+    a, b = _align(self._get_bits(), self._coerce(other))
+    return not _and_not(a, b).any()
+
+  def issuperset(self, other) -> bool:
+    a, b = _align(self._get_bits(), self._coerce(other))
+    return not _and_not(b, a).any()
+
+  def isdisjoint(self, other) -> bool:
+    a, b = _align(self._get_bits(), self._coerce(other))
+    return not np.logical_and(a, b).any()
+
+  __or__ = __ror__ = union
+  __and__ = __rand__ = intersection
+  __sub__ = difference
+  __xor__ = __rxor__ = symmetric_difference
+  __le__ = issubset
+  __ge__ = issuperset
+
+  def __rsub__(self, other):
+    return OpSet(self._graph, other).difference(self)
+
+  def __lt__(self, other):
+    return self.issubset(other) and self != OpSet(self._graph, other)
+
+  def __gt__(self, other):
+    return self.issuperset(other) and self != OpSet(self._graph, other)
+
+  def __eq__(self, other):
+    if not isinstance(other, OpSet):
+      return NotImplemented
+    if other.graph is not self._graph:
+      return False
+    a, b = _align(self._get_bits(), other._get_bits())
+    return bool(np.array_equal(a, b))
+
+  def __ne__(self, other):
+    ret = self.__eq__(other)
+    return ret if ret is NotImplemented else not ret
+
+  def __hash__(self):
+    return hash((id(self._graph), self.ids().tobytes()))
+
+
+################################################################################
+# Stuff below this line is private to this file.
+
+
+def _bitmap_size(g) -> int:
+  """Number of bits needed to cover every id that `g` has handed out."""
+  return len(g._nodes_by_id)  # pylint: disable=protected-access
+
+
+def _freeze(bits: np.ndarray) -> np.ndarray:
+  bits.flags.writeable = False
+  return bits
+
+
+def _align(a: np.ndarray, b: np.ndarray):
+  """Pads the shorter of two bitmaps with zeros so they have equal lengths.
+  Bitmaps are shorter if the graph had fewer nodes when they were made."""
+  if len(a) < len(b):
+    a = np.concatenate([a, np.zeros(len(b) - len(a), dtype=np.bool_)])
+  elif len(b) < len(a):
+    b = np.concatenate([b, np.zeros(len(a) - len(b), dtype=np.bool_)])
+  return a, b
+
+
+def _and_not(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+  return np.logical_and(a, np.logical_not(b))
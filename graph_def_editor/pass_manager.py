@@ -0,0 +1,546 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Pipelines of graph optimization passes."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+import os
+import re
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+from graph_def_editor import graph, rewrite, transform
+
+__all__ = [
+  "Analyses",
+  "Pass",
+  "PassRecord",
+  "PassManager",
+  "register_analysis",
+  "unregister_analysis",
+]
+
+_logger = logging.getLogger(__name__)
+
+# Special value for `Pass.preserves` that stands for every analysis.
+ALL_ANALYSES = "*"
+
+
+class Analyses(object):
+  """
+  Cache of the analyses of one graph, shared by the passes of a
+  `PassManager` run.
+
+  An analysis is a function of the graph registered under a name with
+  `register_analysis()`. `get()` computes an analysis the first time it is
+  requested and returns the cached result afterwards, until a pass that
+  does not preserve the analysis changes the graph.
+
+  Built-in analyses:
+    * "topological_order": List of the nodes of the graph, with each node
+      after the producers of its inputs except along the back edges of
+      loops.
+    * "frames": Dictionary from node to the tuple of names of the control
+      flow frames that contain it.
+    * "colocation_groups": Same as `gde.Graph.colocation_groups`.
+  """
+
+  def __init__(self, g: 'graph.Graph'):
+    self._graph = g
+    self._results = {}  # Dict[str, Any]
+
+  @property
+  def graph(self) -> 'graph.Graph':
+    return self._graph
+
+  def get(self, name: str) -> Any:
+    """
+    Returns the result of the analysis called `name`, computing it if there
+    is no valid cached result.
+
+    Raises:
+      ValueError if no analysis is registered under `name`.
+    """
+    if name not in self._results:
+      if name not in _analyses:
+        raise ValueError("No analysis registered under the name '{}'. "
+                         "Registered analyses: {}".format(
+                           name, sorted(_analyses.keys())))
+      self._results[name] = _analyses[name](self._graph)
+    return self._results[name]
+
+  def is_cached(self, name: str) -> bool:
+    return name in self._results
+
+  def invalidate(self, names: Iterable[str] = None):
+    """
+    Discard cached results.
+
+    Args:
+      names: Names of the analyses to discard, or None to discard all of
+        them.
+    """
+    if names is None:
+      self._results.clear()
+    else:
+      for name in names:
+        self._results.pop(name, None)
+
+  def keep_only(self, names: Iterable[str]):
+    """Discard the cached results of all analyses not in `names`."""
+    names = frozenset(names)
+    for name in list(self._results.keys()):
+      if name not in names:
+        del self._results[name]
+
+
+class Pass(object):
+  """
+  Base class of graph optimization passes.
+
+  Subclasses implement `run()`, and may set `preserves` or `invalidates` to
+  tell the `PassManager` which cached analyses remain valid after the pass
+  changes the graph. By default a pass that changes the graph invalidates
+  every analysis. A pass that leaves the graph unchanged preserves every
+  analysis.
+  """
+
+  def __init__(self, name: str = None, preserves: Iterable[str] = None,
+               invalidates: Iterable[str] = None):
+    """
+    Args:
+      name: Name of the pass in records and dumps. Defaults to the name of
+        the class.
+      preserves: Names of the analyses that stay valid when this pass
+        changes the graph, or "*" for all of them. Mutually exclusive with
+        `invalidates`.
+      invalidates: Names of the only analyses that this pass invalidates.
+        Mutually exclusive with `preserves`.
+    """
+    if preserves is not None and invalidates is not None:
+      raise ValueError("Cannot specify both preserves and invalidates")
+    self._name = name if name is not None else type(self).__name__
+    if preserves is not None and preserves != ALL_ANALYSES:
+      preserves = frozenset(preserves)
+    self._preserves = preserves
+    self._invalidates = None if invalidates is None \
+      else frozenset(invalidates)
+
+  @property
+  def name(self) -> str:
+    return self._name
+
+  @property
+  def preserves(self):
+    """Names of the analyses that this pass preserves, "*" for all, or None
+    if not declared."""
+    return self._preserves
+
+  @property
+  def invalidates(self):
+    """Names of the only analyses that this pass invalidates, or None if not
+    declared."""
+    return self._invalidates
+
+  def run(self, g: 'graph.Graph', analyses: Analyses) -> Any:
+    """
+    Run the pass on a graph, modifying it in place.
+
+    Args:
+      g: `gde.Graph` to optimize.
+      analyses: Cache of analyses of `g`.
+
+    Returns:
+      True or a nonzero count if the pass changed the graph; False or zero
+      if it did not; or None to let the caller tell from `g.version`.
+    """
+    raise NotImplementedError()
+
+  def __repr__(self):
+    return "{}({})".format(type(self).__name__, self._name)
+
+
+class PassRecord(object):
+  """Measurements of one run of one pass."""
+
+  def __init__(self, name: str, iteration: int, wall_time: float,
+               changed: bool, nodes_before: int, nodes_after: int,
+               edges_before: int, edges_after: int,
+               memory_peak: int = None, memory_delta: int = None,
+               dump_path: str = None):
+    self.name = name
+    self.iteration = iteration  # Iteration of the enclosing fixed point loop
+    self.wall_time = wall_time  # Seconds
+    self.changed = changed
+    # Node and edge counts, if the PassManager counts them
+    self.nodes_before = nodes_before
+    self.nodes_after = nodes_after
+    self.edges_before = edges_before  # Data and control edges
+    self.edges_after = edges_after
+    # Bytes of Python memory, if the PassManager tracks memory
+    self.memory_peak = memory_peak
+    self.memory_delta = memory_delta
+    self.dump_path = dump_path  # GraphDef written after the pass, if any
+
+  @property
+  def node_delta(self) -> Optional[int]:
+    if self.nodes_before is None:
+      return None
+    return self.nodes_after - self.nodes_before
+
+  @property
+  def edge_delta(self) -> Optional[int]:
+    if self.edges_before is None:
+      return None
+    return self.edges_after - self.edges_before
+
+  def __repr__(self):
+    return ("PassRecord({}, iteration={}, wall_time={:.6f}, changed={}, "
+            "node_delta={}, edge_delta={})".format(
+              self.name, self.iteration, self.wall_time, self.changed,
+              self.node_delta, self.edge_delta))
+
+
+class PassManager(Pass):
+  """
+  Runs a pipeline of passes over a graph, either once in sequence or
+  repeatedly until no pass changes the graph.
+
+  Analyses computed by one pass are reused by later passes as long as the
+  passes in between preserve them. Each run of each pass is recorded in a
+  `PassRecord`, and the graph can be written out after every pass that
+  changes it.
+
+  A `PassManager` is itself a `Pass`, so a pipeline can contain, for
+  example, a sub-pipeline that runs to a fixed point.
+  """
+
+  def __init__(self, passes: Iterable[Any] = (), name: str = None,
+               fixed_point: bool = False, max_iterations: int = 20,
+               count_graph_size: bool = False, track_memory: bool = False,
+               dump_dir: str = None):
+    """
+    Args:
+      passes: Passes to run, in order. See `add()` for what is accepted.
+      name: Name of the pipeline, when used as a pass of another pipeline.
+      fixed_point: If True, run the passes repeatedly until an iteration
+        does not change the graph.
+      max_iterations: Limit on the number of iterations when `fixed_point`
+        is True. Reaching it logs a warning.
+      count_graph_size: If True, record the number of nodes and edges of the
+        graph before and after each pass. Takes time proportional to the
+        size of the graph for every pass.
+      track_memory: If True, record the peak and net amount of memory that
+        Python allocates during each pass, using `tracemalloc`. Slows the
+        passes down considerably. Before Python 3.9, the peak is not
+        recorded if something else already traces memory allocations,
+        including an enclosing `PassManager` that tracks memory.
+      dump_dir: If not None, directory in which to write the input graph and
+        the graph after each pass that changes it, as binary `GraphDef`
+        files named after the order and name of the pass.
+    """
+    super(PassManager, self).__init__(name)
+    self._passes = []
+    for p in passes:
+      self.add(p)
+    self._fixed_point = fixed_point
+    self._max_iterations = max_iterations
+    self._count_graph_size = count_graph_size
+    self._track_memory = track_memory
+    self._dump_dir = dump_dir
+    self._records = []
+    self._num_dumps = 0
+
+  def add(self, p: Any, name: str = None, preserves: Iterable[str] = None,
+          invalidates: Iterable[str] = None) -> 'PassManager':
+    """
+    Append a pass to the pipeline.
+
+    Args:
+      p: A `Pass`; a `gde.RewriteRule` or `gde.RewriteDriver`, which runs
+        its rules to a fixed point; or a function that takes a `gde.Graph`
+        and an `Analyses` and returns a value as described in `Pass.run()`.
+      name: Name of the pass. Only for rules and functions; defaults to the
+        name of the rule or function.
+      preserves: As in `Pass`. Only for rules and functions.
+      invalidates: As in `Pass`. Only for rules and functions.
+
+    Returns:
+      This `PassManager`, so that calls can be chained.
+    """
+    if isinstance(p, Pass):
+      if name is not None or preserves is not None or invalidates is not None:
+        raise ValueError("Set name, preserves and invalidates on the Pass "
+                         "object itself")
+    elif isinstance(p, (rewrite.RewriteRule, rewrite.RewriteDriver)):
+      p = _RewritePass(p, name, preserves, invalidates)
+    elif callable(p):
+      p = _FunctionPass(p, name, preserves, invalidates)
+    else:
+      raise TypeError("Cannot use {} as a pass".format(type(p)))
+    self._passes.append(p)
+    return self
+
+  @property
+  def passes(self) -> List[Pass]:
+    return list(self._passes)
+
+  @property
+  def records(self) -> List[PassRecord]:
+    """
+    Records of the passes run by this `PassManager`, in order, including the
+    passes of nested pipelines with their names prefixed by the name of the
+    pipeline.
+    """
+    return list(self._records)
+
+  def run(self, g: 'graph.Graph', analyses: Analyses = None) -> bool:
+    """
+    Run the pipeline on a graph.
+
+    Args:
+      g: `gde.Graph` to optimize in place.
+      analyses: Optional cache of analyses of `g` to start from, for example
+        when the caller has already computed some analyses.
+
+    Returns:
+      True if any pass changed the graph.
+    """
+    if analyses is None:
+      analyses = Analyses(g)
+    elif analyses.graph is not g:
+      raise ValueError("Analyses are for a different graph")
+    if self._dump_dir is not None and self._num_dumps == 0:
+      self._dump(g, "input")
+    changed_any = False
+    iteration = 0
+    while True:
+      changed = False
+      for p in self._passes:
+        changed = self._run_pass(p, g, analyses, iteration) or changed
+      changed_any = changed_any or changed
+      iteration += 1
+      if not self._fixed_point or not changed:
+        break
+      if iteration >= self._max_iterations:
+        _logger.warning("Pipeline %s did not reach a fixed point after %d "
+                        "iterations", self.name, iteration)
+        break
+    return changed_any
+
+  def summary(self) -> str:
+    """
+    Returns a table with one line per pass, with the number of runs, total
+    wall time and changes in node and edge counts, slowest pass first.
+    Changes in counts show as "-" unless the pipeline counts nodes and
+    edges.
+    """
+    totals = {}  # Dict[str, List]
+    order = []
+    for r in self._records:
+      if r.name not in totals:
+        totals[r.name] = [0, 0.0, None, None]
+        order.append(r.name)
+      t = totals[r.name]
+      t[0] += 1
+      t[1] += r.wall_time
+      if r.node_delta is not None:
+        t[2] = (t[2] or 0) + r.node_delta
+        t[3] = (t[3] or 0) + r.edge_delta
+    names = sorted(order, key=lambda n: -totals[n][1])
+    width = max([len("pass")] + [len(n) for n in names])
+    lines = ["{:<{w}}  {:>5}  {:>10}  {:>8}  {:>8}".format(
+      "pass", "runs", "time (s)", "nodes", "edges", w=width)]
+    for n in names:
+      runs, wall_time, node_delta, edge_delta = totals[n]
+      lines.append("{:<{w}}  {:>5}  {:>10.4f}  {:>8}  {:>8}".format(
+        n, runs, wall_time, _format_delta(node_delta),
+        _format_delta(edge_delta), w=width))
+    return "\n".join(lines)
+
+  def _run_pass(self, p: Pass, g: 'graph.Graph', analyses: Analyses,
+                iteration: int) -> bool:
+    nodes_before, edges_before = _count_nodes_and_edges(g) \
+      if self._count_graph_size else (None, None)
+    version_before = g.version
+    started_tracing = False
+    has_peak = False
+    if self._track_memory:
+      if not tracemalloc.is_tracing():
+        tracemalloc.start()
+        started_tracing = has_peak = True
+      elif hasattr(tracemalloc, "reset_peak"):  # Python 3.9 and later
+        tracemalloc.reset_peak()
+        has_peak = True
+      memory_before = tracemalloc.get_traced_memory()[0]
+    start_time = time.perf_counter()
+    if isinstance(p, PassManager):
+      num_records = len(p._records)  # pylint: disable=protected-access
+      result = p.run(g, analyses)
+      for r in p._records[num_records:]:  # pylint: disable=protected-access
+        r.name = "{}/{}".format(p.name, r.name)
+        self._records.append(r)
+    else:
+      result = p.run(g, analyses)
+    wall_time = time.perf_counter() - start_time
+    memory_peak = memory_delta = None
+    if self._track_memory:
+      memory_after, memory_peak = tracemalloc.get_traced_memory()
+      memory_peak = memory_peak - memory_before if has_peak else None
+      memory_delta = memory_after - memory_before
+      if started_tracing:
+        tracemalloc.stop()
+    changed = g.version != version_before if result is None \
+      else bool(result)
+
+    if changed:
+      if p.preserves == ALL_ANALYSES:
+        pass
+      elif p.preserves is not None:
+        analyses.keep_only(p.preserves)
+      elif p.invalidates is not None:
+        analyses.invalidate(p.invalidates)
+      else:
+        analyses.invalidate()
+    elif g.version != version_before:
+      # The pass touched the graph without changing its meaning, but cached
+      # results may refer to nodes that it replaced.
+      analyses.invalidate()
+
+    nodes_after, edges_after = _count_nodes_and_edges(g) \
+      if self._count_graph_size else (None, None)
+    dump_path = None
+    if changed and self._dump_dir is not None and \
+            not isinstance(p, PassManager):
+      dump_path = self._dump(g, p.name)
+    record = PassRecord(p.name, iteration, wall_time, changed, nodes_before,
+                        nodes_after, edges_before, edges_after, memory_peak,
+                        memory_delta, dump_path)
+    self._records.append(record)
+    _logger.debug("%s", record)
+    return changed
+
+  def _dump(self, g: 'graph.Graph', name: str) -> str:
+    os.makedirs(self._dump_dir, exist_ok=True)
+    path = os.path.join(self._dump_dir, "{:03d}_{}.pb".format(
+      self._num_dumps, re.sub(r"[^A-Za-z0-9_.-]", "_", name)))
+    self._num_dumps += 1
+    with open(path, "wb") as f:
+      f.write(g.to_graph_def().SerializeToString())
+    return path
+
+
+def register_analysis(name: str, fn: Callable[['graph.Graph'], Any] = None):
+  """
+  Register a function that computes an analysis of a graph, replacing any
+  function previously registered under the same name.
+
+  Can also be used as a decorator:
+
+  ```
+  @gde.register_analysis("op_type_counts")
+  def _op_type_counts(g):
+    return collections.Counter(n.op_type for n in g.nodes)
+  ```
+
+  Args:
+    name: Name under which passes request the analysis from `Analyses.get()`.
+    fn: Function that takes a `gde.Graph` and returns the result of the
+      analysis. If None, this function returns a decorator.
+
+  Returns:
+    `fn`, or a decorator if `fn` is None.
+  """
+  if fn is None:
+    def decorator(f):
+      register_analysis(name, f)
+      return f
+    return decorator
+  _analyses[name] = fn
+  return fn
+
+
+def unregister_analysis(name: str):
+  """Remove the analysis registered under `name`, if any."""
+  _analyses.pop(name, None)
+
+
+################################################################################
+# Stuff below this line is private to this file.
+
+
+class _FunctionPass(Pass):
+  """Pass that calls a function."""
+
+  def __init__(self, fn, name, preserves, invalidates):
+    super(_FunctionPass, self).__init__(
+      name if name is not None else getattr(fn, "__name__", "function"),
+      preserves, invalidates)
+    self._fn = fn
+
+  def run(self, g, analyses):
+    return self._fn(g, analyses)
+
+
+class _RewritePass(Pass):
+  """Pass that applies rewrite rules until none of them matches."""
+
+  def __init__(self, rules: Union['rewrite.RewriteRule',
+                                  'rewrite.RewriteDriver'],
+               name, preserves, invalidates):
+    if isinstance(rules, rewrite.RewriteRule):
+      default_name = rules.name
+      rules = rewrite.RewriteDriver([rules])
+    else:
+      default_name = "+".join(r.name for r in rules.rules)
+    super(_RewritePass, self).__init__(
+      name if name is not None else default_name, preserves, invalidates)
+    self._driver = rules
+
+  def run(self, g, analyses):
+    return self._driver.run(g)
+
+
+def _format_delta(delta):
+  return "-" if delta is None else "{:+}".format(delta)
+
+
+def _count_nodes_and_edges(g):
+  nodes = g.nodes
+  return len(nodes), sum(len(n.inputs) + len(n.control_inputs)
+                         for n in nodes)
+
+
+def _topological_order(g):
+  return transform._topological_order(g.nodes)  # pylint: disable=protected-access
+
+
+def _frames(g):
+  return {n: g.node_to_frame_names(n) for n in g.nodes}
+
+
+def _colocation_groups(g):
+  return g.colocation_groups
+
+
+_analyses: Dict[str, Callable[['graph.Graph'], Any]] = {
+  "topological_order": _topological_order,
+  "frames": _frames,
+  "colocation_groups": _colocation_groups,
+}
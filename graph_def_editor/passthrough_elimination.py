@@ -0,0 +1,227 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Removal of ops that pass their inputs through unchanged at inference
+time."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from typing import Iterable, Union
+
+from graph_def_editor import graph, node, pass_manager, reroute, tensor
+
+__all__ = [
+  "eliminate_passthrough_ops",
+]
+
+# Op types whose i-th output is their i-th data input
+_PASSTHROUGH_OP_TYPES = frozenset([
+  "Identity", "IdentityN", "StopGradient", "PreventGradient", "Snapshot",
+])
+
+# Identity nodes next to these ops are control flow pivots or frame
+# boundaries, and bypassing them can change which ops run.
+_CONTROL_FLOW_OP_TYPES = frozenset([
+  "Switch", "RefSwitch", "Merge", "RefMerge", "Enter", "RefEnter", "Exit",
+  "RefExit", "NextIteration", "RefNextIteration", "LoopCond",
+])
+
+
+def eliminate_passthrough_ops(
+        g: 'graph.Graph', analyses: 'pass_manager.Analyses' = None,
+        keep: Iterable[Union[str, 'tensor.Tensor', 'node.Node']] = (),
+        remove_placeholders_with_default: bool = True) -> int:
+  """
+  Bypass and remove the ops that do nothing at inference time: `Identity`,
+  `IdentityN`, `StopGradient`, `PreventGradient` and `Snapshot` nodes,
+  `PlaceholderWithDefault` nodes whose default value is a `Const`, and
+  `NoOp` nodes with at most one control input.
+
+  The consumers of all such nodes are rewired to the nodes' inputs with a
+  single bulk call to `gde.reroute_ts()`. Control dependencies are forwarded:
+  a node that consumed the output of a removed node gets a control
+  dependency on the control inputs of the removed node, and a node that had
+  a control dependency on a removed node gets a control dependency on the
+  producer of the removed node's input and on the removed node's control
+  inputs instead. Chains of removed nodes are collapsed in one pass.
+
+  A node is left in place if:
+    * nothing consumes it, since it is presumably an output that is fetched
+      by name, or it is listed in `keep`;
+    * a `gde.Variable` of the graph refers to it, as is the case for the
+      snapshot tensor `v/read` of a variable `v`;
+    * it reads a ref tensor, or is placed on a different device than the
+      producer of its input, since it then copies its input;
+    * it is adjacent to a control flow op, or is the head of a colocation
+      group.
+
+  Removed nodes and their outputs are also removed from the graph's
+  collections.
+
+  Note that once a `PlaceholderWithDefault` is removed, its value can no
+  longer be fed; list it in `keep` or pass
+  `remove_placeholders_with_default=False` if it must stay feedable.
+
+  Args:
+    g: `gde.Graph` to modify in place.
+    analyses: Optional `gde.Analyses` of `g`, used to avoid recomputing the
+      colocation groups of the graph.
+    keep: Tensors and nodes that must not be removed, as `gde.Tensor` or
+      `gde.Node` objects or their names.
+    remove_placeholders_with_default: If False, leave all
+      `PlaceholderWithDefault` nodes in place.
+
+  Returns:
+    The number of nodes removed.
+  """
+  # pylint: disable=protected-access
+  protected = graph._nodes_referenced_by_variables(g)
+  # pylint: enable=protected-access
+  for elem in keep:
+    if isinstance(elem, str):
+      elem = g[elem]
+    protected.add(elem.node if isinstance(elem, tensor.Tensor) else elem)
+  if analyses is not None and analyses.graph is g:
+    colocation_heads = analyses.get("colocation_groups")
+  else:
+    colocation_heads = g.colocation_groups
+
+  removed = [n for n in g.nodes if n not in protected and
+             n.name not in colocation_heads and
+             _can_bypass(g, n, remove_placeholders_with_default)]
+  if len(removed) == 0:
+    return 0
+  removed_set = frozenset(removed)
+
+  # What to read instead of each output of a removed node
+  replacement = {}
+  # Nodes that consumers of the outputs of a removed node must run after
+  data_deps = {}
+  # Nodes that control consumers of a removed node must run after
+  control_deps = {}
+  for n in _dependency_order(removed, removed_set):
+    deps = set()
+    for c in n.control_inputs:
+      deps.update(control_deps[c] if c in removed_set else (c,))
+    if n.op_type == "NoOp":
+      data_deps[n] = deps
+      control_deps[n] = deps
+      continue
+    for t in n.outputs:
+      source = n.inputs[t.value_index if n.op_type == "IdentityN" else 0]
+      if source.node in removed_set:
+        deps.update(data_deps[source.node])
+        source = replacement[source]
+      replacement[t] = source
+    data_deps[n] = deps
+    control_deps[n] = deps | set(replacement[t].node for t in n.outputs)
+
+  # Control inputs to add to each remaining consumer, computed before the
+  # data inputs are rewired
+  new_control_inputs = {}
+  for n in removed:
+    for c in g.node_consumers(n):
+      if c in removed_set or c in new_control_inputs:
+        continue
+      deps = set()
+      for t in c.inputs:
+        if t.node in removed_set:
+          deps.update(data_deps[t.node])
+      for d in c.control_inputs:
+        if d in removed_set:
+          deps.update(control_deps[d])
+      new_control_inputs[c] = deps
+
+  old_ts = list(replacement.keys())
+  reroute.reroute_ts([replacement[t] for t in old_ts], old_ts,
+                     cannot_modify=removed_set)
+
+  for c, deps in new_control_inputs.items():
+    control_inputs = [d for d in c.control_inputs if d not in removed_set]
+    deps.difference_update(control_inputs)
+    deps.difference_update(t.node for t in c.inputs)
+    deps.discard(c)
+    c.set_control_inputs(control_inputs + sorted(
+      deps, key=lambda d: d.id_in_graph))
+
+  g.remove_nodes(removed)
+
+  # pylint: disable=protected-access
+  for collection_name, elems in list(g._collections.items()):
+    g._collections[collection_name] = [
+      e for e in elems
+      if not isinstance(e, (node.Node, tensor.Tensor)) or
+      (e.node if isinstance(e, tensor.Tensor) else e) not in removed_set]
+  # pylint: enable=protected-access
+  return len(removed)
+
+
+################################################################################
+# Stuff below this line is private to this file.
+
+
+def _can_bypass(g, n, remove_placeholders_with_default):
+  """
+  Returns True if `n` passes its inputs through unchanged and it is safe to
+  rewire its consumers to its inputs.
+  """
+  consumers = g.node_consumers(n)
+  if len(consumers) == 0:
+    return False
+  if n.op_type == "NoOp":
+    return len(n.inputs) == 0 and len(n.control_inputs) <= 1
+  if n.op_type == "PlaceholderWithDefault":
+    if not remove_placeholders_with_default or \
+            n.inputs[0].node.op_type != "Const":
+      return False
+  elif n.op_type not in _PASSTHROUGH_OP_TYPES:
+    return False
+  if len(n.inputs) != len(n.outputs) or len(n.inputs) == 0:
+    return False
+  for t in n.inputs:
+    producer = t.node
+    if t.dtype._is_ref_dtype:  # pylint: disable=protected-access
+      return False
+    if producer.op_type in _CONTROL_FLOW_OP_TYPES:
+      return False
+    if n.device != producer.device:
+      return False
+  return not any(c.op_type in _CONTROL_FLOW_OP_TYPES for c in consumers)
+
+
+def _dependency_order(nodes, node_set):
+  """
+  Order `nodes` so that each node comes after the nodes of `node_set` that
+  it takes a data or control input from.
+  """
+  ret = []
+  done = set()
+  for root in nodes:
+    stack = [root]
+    while len(stack) > 0:
+      n = stack[-1]
+      if n in done:
+        stack.pop()
+        continue
+      pending = [d for d in list(n.control_inputs) + [t.node for t in n.inputs]
+                 if d in node_set and d not in done]
+      if len(pending) > 0:
+        stack.extend(pending)
+      else:
+        done.add(n)
+        ret.append(n)
+        stack.pop()
+  return ret
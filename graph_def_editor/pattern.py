@@ -0,0 +1,508 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Declarative patterns that match multi-node subgraphs.
+
+A pattern describes a subgraph by its root op and, recursively, the ops that
+produce the root's inputs. For example, the pattern
+
+    Op("Relu", name="relu", inputs=[
+      Op(("Add", "AddV2"), name="add", commutative=True, inputs=[
+        Input("x"),
+        Op("Const", name="bias")])])
+
+matches a `Relu` of an addition of any tensor and a constant, and binds
+"relu", "add" and "bias" to the matched nodes and "x" to the tensor that
+feeds the addition.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import itertools
+from six import string_types
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from graph_def_editor import graph, match, node, tensor
+
+__all__ = [
+  "Pattern",
+  "Op",
+  "Input",
+  "optional",
+  "repeated",
+]
+
+
+class Pattern(object):
+  """
+  Base class of the elements of a pattern. Use `Op`, `Input`, `optional()`
+  and `repeated()` to build patterns.
+  """
+
+  def __init__(self, name: str = None):
+    if name is not None and not isinstance(name, string_types):
+      raise TypeError("Pattern name must be a string, got {}".format(
+        type(name)))
+    self._name = name
+
+  @property
+  def name(self) -> str:
+    """Name under which matches of this pattern are captured, or None."""
+    return self._name
+
+  def _match_tensor(self, t: tensor.Tensor, state: '_MatchState'):
+    """Returns an iterator over the ways in which this pattern can match the
+    tensor `t` when `state` already holds the bindings made elsewhere."""
+    raise NotImplementedError()
+
+  def _extent(self):
+    """
+    Returns a pair (depth, op_types) that bounds the nodes a match of this
+    pattern can contain: they are at most `depth` - 1 edges upstream of the
+    root (None if unbounded), and all have types in `op_types` (None if any
+    type is possible).
+    """
+    raise NotImplementedError()
+
+
+class Op(Pattern):
+  """
+  Pattern that matches a single node and, optionally, the producers of its
+  inputs.
+
+  Used as an input of another `Op`, the pattern matches the node that
+  produces the input tensor. Every node that an `Op` matches belongs to the
+  match; a node cannot be matched by two different `Op`s unless they have
+  the same name, which is how patterns with shared nodes are written.
+  """
+
+  def __init__(self,
+               op_types: Iterable[str] = None,
+               inputs: Iterable[Pattern] = None,
+               name: str = None,
+               attrs: Dict[str, Any] = None,
+               predicate: Callable[['node.Node'], bool] = None,
+               commutative: bool = False,
+               output_index: int = None):
+    """
+    Args:
+      op_types: Op type, or iterable of op types, that the node may have.
+        None to accept any type.
+      inputs: Patterns for the inputs of the node, in order. If not None, the
+        node must have exactly this many inputs; None entries accept any
+        input. If None, the inputs of the node are not examined.
+      name: Name under which to capture the matched `gde.Node`.
+      attrs: Dictionary from attribute name to the value that the node's
+        attribute must have, as returned by `gde.Node.get_attr()`.
+      predicate: Optional function that receives the node and returns True if
+        it matches. Only evaluated after all the other checks on the node
+        pass.
+      commutative: If True, the input patterns may match the inputs of the
+        node in any order.
+      output_index: When the pattern is used as an input of another `Op`,
+        the output of this node that the input must be. None to accept any
+        output.
+    """
+    super(Op, self).__init__(name)
+    if isinstance(op_types, string_types):
+      op_types = (op_types,)
+    self._op_types = None if op_types is None else frozenset(op_types)
+    self._inputs = None if inputs is None else tuple(inputs)
+    self._attrs = dict(attrs or {})
+    self._predicate = predicate
+    self._commutative = commutative
+    self._output_index = output_index
+    if self._inputs is not None:
+      for p in self._inputs:
+        if p is not None and not isinstance(p, Pattern):
+          raise TypeError("Inputs of a pattern must be patterns or None, "
+                          "got {}".format(type(p)))
+    # Checks on the node itself, cheapest first.
+    self._filters = []
+    if self._op_types is not None:
+      self._filters.append(match.op_type(self._op_types))
+    for key, value in sorted(self._attrs.items()):
+      self._filters.append(match.op_attr(key, value))
+    if predicate is not None:
+      self._filters.append(predicate)
+    # Orders in which to try the input patterns.
+    if self._inputs is None:
+      self._input_orders = []
+    elif commutative:
+      self._input_orders = list(itertools.permutations(self._inputs))
+    else:
+      self._input_orders = [self._inputs]
+
+  @property
+  def op_types(self):
+    """Frozen set of the op types that this pattern accepts, or None."""
+    return self._op_types
+
+  @property
+  def inputs(self):
+    """Tuple of the input patterns, or None if inputs are not examined."""
+    return self._inputs
+
+  def match(self, n: 'node.Node') -> Dict[str, Any]:
+    """
+    Match this pattern with `n` as the root.
+
+    Args:
+      n: `gde.Node` to match against the root of the pattern.
+
+    Returns:
+      Dictionary of bindings from the names in the pattern to the matched
+      nodes and tensors, or None if the pattern does not match. Where several
+      matches are possible, the first one found is returned; inputs are tried
+      in order, and `repeated()` patterns match as many nodes as possible.
+    """
+    result = self._match_root(n)
+    return None if result is None else result[0]
+
+  def find_matches(self, g: 'graph.Graph') -> List[Dict[str, Any]]:
+    """
+    Find every node of a graph where this pattern matches.
+
+    The candidates for the root are narrowed down with `gde.find_all()`,
+    which looks up op types, attributes and the types of neighboring ops in
+    indexes of the graph before the full pattern is checked.
+
+    Args:
+      g: `gde.Graph` to search.
+
+    Returns:
+      List of dictionaries of bindings, one per matching root, ordered by
+      root in the order in which nodes were added to the graph. Matches may
+      overlap.
+    """
+    return [r[0] for r in self._find_matches(g)]
+
+  def _match_root(self, n: 'node.Node') -> Tuple[Dict[str, Any],
+                                                 Tuple['node.Node']]:
+    """Match the pattern at `n`, returning the bindings and the nodes that
+    belong to the match (root first), or None."""
+    if not isinstance(n, node.Node):
+      raise TypeError("Expected gde.Node, got {}".format(type(n)))
+    for state in self._match_node(n, _MatchState()):
+      return state.result()
+    return None
+
+  def _find_matches(self, g: 'graph.Graph'):
+    """Like `find_matches()`, but returns (bindings, nodes) pairs as in
+    `_match_root()`."""
+    ret = []
+    for n in match.find_all(g, self._op_matcher()):
+      result = self._match_root(n)
+      if result is not None:
+        ret.append(result)
+    return ret
+
+  def _op_matcher(self) -> 'match.OpMatcher':
+    """Returns an `OpMatcher` that accepts a superset of the nodes that this
+    pattern accepts as its root."""
+    if len(self._filters) == 0:
+      matcher = match.OpMatcher(True)
+    else:
+      matcher = match.OpMatcher(self._filters[0])
+      matcher.positive_filters.extend(self._filters[1:])
+    if self._inputs is not None:
+      if self._commutative:
+        matcher.input_ops(*[None] * len(self._inputs))
+      else:
+        matcher.input_ops(*[p._op_matcher() if isinstance(p, Op) else None
+                            for p in self._inputs])
+    return matcher
+
+  def _extent(self):
+    depth, op_types = 0, self._op_types
+    for p in self._inputs or ():
+      if p is None:
+        continue
+      input_depth, input_types = p._extent()  # pylint: disable=protected-access
+      depth = None if depth is None or input_depth is None \
+        else max(depth, input_depth)
+      op_types = None if op_types is None or input_types is None \
+        else op_types | input_types
+    return (None if depth is None else depth + 1), op_types
+
+  def _match_tensor(self, t: tensor.Tensor, state: '_MatchState'):
+    if self._output_index is not None and \
+            t.value_index != self._output_index:
+      return iter(())
+    return self._match_node(t.node, state)
+
+  def _match_node(self, n: 'node.Node', state: '_MatchState',
+                  owner=None):
+    """Returns an iterator over the ways this pattern can match `n`.
+
+    Args:
+      n: Node to match.
+      state: Bindings made so far.
+      owner: Key under which the node is recorded as belonging to the match.
+        None to use the pattern's name, or the pattern itself if it has no
+        name, and to capture the node under the name.
+    """
+    capture = owner is None
+    if owner is None:
+      owner = self if self._name is None else self._name
+    previous_owner = state.owners.get(n)
+    if previous_owner is not None:
+      if previous_owner is owner or (previous_owner == owner and
+                                     isinstance(owner, string_types)):
+        # Same node reached along a second path through the pattern.
+        return iter((state,))
+      return iter(())
+    if capture and self._name is not None and self._name in state.bindings:
+      # Name bound to a different node.
+      return iter(())
+    if self._inputs is not None and len(n.inputs) != len(self._inputs):
+      return iter(())
+    for node_filter in self._filters:
+      if not node_filter(n):
+        return iter(())
+    state = state.add_node(n, owner, self._name if capture else None)
+    return self._match_inputs(n, state)
+
+  def _match_inputs(self, n: 'node.Node', state: '_MatchState'):
+    seen = set()
+    for input_patterns in self._input_orders:
+      for result in _match_all(input_patterns, n.inputs, 0, state):
+        if self._commutative:
+          # Different orders of identical input patterns find the same match.
+          key = result.key()
+          if key in seen:
+            continue
+          seen.add(key)
+        yield result
+    if self._inputs is None:
+      yield state
+
+
+class Input(Pattern):
+  """
+  Pattern that matches any tensor without making its producer part of the
+  match. Used for the inputs of the subgraph that a pattern describes.
+
+  If the same name appears in several `Input`s of a pattern, they must all
+  match the same tensor.
+  """
+
+  def __init__(self, name: str = None,
+               predicate: Callable[['tensor.Tensor'], bool] = None):
+    """
+    Args:
+      name: Name under which to capture the matched `gde.Tensor`.
+      predicate: Optional function that receives the tensor and returns True
+        if it matches.
+    """
+    super(Input, self).__init__(name)
+    self._predicate = predicate
+
+  def _match_tensor(self, t: tensor.Tensor, state: '_MatchState'):
+    if self._name is not None and self._name in state.bindings:
+      if state.bindings[self._name] is t:
+        yield state
+      return
+    if self._predicate is not None and not self._predicate(t):
+      return
+    if self._name is not None:
+      state = state.bind(self._name, t)
+    yield state
+
+  def _extent(self):
+    return 0, frozenset()
+
+
+def optional(pattern: Op) -> Pattern:
+  """
+  Pattern for a node that may or may not be present.
+
+  `pattern` must be an `Op` with at least one input pattern. If the input
+  tensor is produced by a node that matches `pattern`, the node belongs to
+  the match and its first input continues the chain. Otherwise the first
+  input pattern of `pattern` is matched directly against the input tensor,
+  and the name of `pattern` is bound to None. For example,
+
+      Op("Relu", inputs=[optional(Op("BiasAdd", name="bias_add",
+                                     inputs=[Op("Conv2D"), Input("bias")]))])
+
+  matches a `Relu` of a `Conv2D`, with or without a `BiasAdd` in between.
+
+  Args:
+    pattern: `Op` for the optional node.
+
+  Returns:
+    Pattern to use as an input of another `Op`.
+  """
+  return _Repeated(pattern, 0, 1, single=True)
+
+
+def repeated(pattern: Op, min_count: int = 1,
+             max_count: int = None) -> Pattern:
+  """
+  Pattern for a chain of nodes that each match `pattern`.
+
+  `pattern` must be an `Op` with at least one input pattern. Each node of the
+  chain consumes the next one through its first input, and the last node's
+  first input is matched against the first input pattern of `pattern`. The
+  other input patterns must match for every node of the chain and may not
+  capture names. The name of `pattern` is bound to the list of nodes in the
+  chain, starting from the consumer end. The longest possible chain is tried
+  first.
+
+  Args:
+    pattern: `Op` for each node of the chain.
+    min_count: Minimum number of nodes in the chain.
+    max_count: Maximum number of nodes in the chain, or None for no limit.
+
+  Returns:
+    Pattern to use as an input of another `Op`.
+  """
+  return _Repeated(pattern, min_count, max_count, single=False)
+
+
+################################################################################
+# Stuff below this line is private to this file.
+
+
+class _Repeated(Pattern):
+  """Pattern returned by `optional()` and `repeated()`."""
+
+  def __init__(self, pattern: Op, min_count: int, max_count: int,
+               single: bool):
+    if not isinstance(pattern, Op):
+      raise TypeError("Expected an Op pattern, got {}".format(type(pattern)))
+    if pattern.inputs is None or len(pattern.inputs) == 0 or \
+            pattern.inputs[0] is None:
+      raise ValueError("Pattern for repeated nodes needs a pattern for the "
+                       "first input of each node")
+    if pattern._commutative:  # pylint: disable=protected-access
+      raise ValueError("Pattern for repeated nodes cannot be commutative")
+    if not single:
+      for p in pattern.inputs[1:]:
+        if len(_captured_names(p)) > 0:
+          raise ValueError("Side inputs of repeated nodes cannot capture "
+                           "names; got {}".format(sorted(_captured_names(p))))
+    if min_count < 0 or (max_count is not None and max_count < min_count):
+      raise ValueError("Invalid repeat counts {} and {}".format(min_count,
+                                                                max_count))
+    super(_Repeated, self).__init__(pattern.name)
+    self._pattern = pattern
+    self._min_count = min_count
+    self._max_count = max_count
+    self._single = single
+    # Pattern for the parts of each node of the chain other than the first
+    # input.
+    # pylint: disable=protected-access
+    self._link = Op(pattern.op_types, [None] + list(pattern.inputs[1:]),
+                    attrs=pattern._attrs, predicate=pattern._predicate)
+    # pylint: enable=protected-access
+
+  def _match_tensor(self, t: tensor.Tensor, state: '_MatchState'):
+    return self._match_chain(t, state, [])
+
+  def _extent(self):
+    # pylint: disable=protected-access
+    link_depth, link_types = self._link._extent()
+    tail_depth, tail_types = self._pattern.inputs[0]._extent()
+    # pylint: enable=protected-access
+    depth = None
+    if self._max_count is not None and tail_depth is not None:
+      depth = self._max_count * link_depth + tail_depth
+    op_types = None if link_types is None or tail_types is None \
+      else link_types | tail_types
+    return depth, op_types
+
+  def _match_chain(self, t, state, chain):
+    # pylint: disable=protected-access
+    output_index = self._pattern._output_index
+    if self._max_count is None or len(chain) < self._max_count:
+      n = t.node
+      if n not in chain and (output_index is None or
+                             t.value_index == output_index):
+        for link_state in self._link._match_node(n, state, owner=self):
+          for result in self._match_chain(n.inputs[0], link_state,
+                                          chain + [n]):
+            yield result
+    if len(chain) >= self._min_count:
+      if self._name is not None:
+        if self._single:
+          state = state.bind(self._name, chain[0] if len(chain) > 0 else None)
+        else:
+          state = state.bind(self._name, chain)
+      for result in self._pattern.inputs[0]._match_tensor(t, state):
+        yield result
+    # pylint: enable=protected-access
+
+
+def _captured_names(pattern: Pattern) -> set:
+  """Returns the names that `pattern` or any pattern inside it captures."""
+  if pattern is None:
+    return set()
+  ret = set() if pattern.name is None else {pattern.name}
+  if isinstance(pattern, _Repeated):
+    ret |= _captured_names(pattern._pattern)  # pylint: disable=protected-access
+  elif isinstance(pattern, Op) and pattern.inputs is not None:
+    for p in pattern.inputs:
+      ret |= _captured_names(p)
+  return ret
+
+
+def _match_all(patterns, ts, i, state):
+  """Match `patterns[i:]` against `ts[i:]`, yielding each combined result."""
+  if i == len(patterns):
+    yield state
+    return
+  if patterns[i] is None:
+    for result in _match_all(patterns, ts, i + 1, state):
+      yield result
+    return
+  for partial_state in patterns[i]._match_tensor(ts[i], state):  # pylint: disable=protected-access
+    for result in _match_all(patterns, ts, i + 1, partial_state):
+      yield result
+
+
+class _MatchState(object):
+  """Bindings and nodes of a partial match. Never modified in place, so that
+  backtracking can return to an earlier state."""
+
+  def __init__(self, bindings=None, owners=None, nodes=()):
+    self.bindings = bindings if bindings is not None else {}
+    # Dict[Node, Any]; key under which each node of the match was recorded
+    self.owners = owners if owners is not None else {}
+    self.nodes = nodes  # Tuple[Node], in the order they were matched
+
+  def bind(self, name: str, value) -> '_MatchState':
+    bindings = dict(self.bindings)
+    bindings[name] = value
+    return _MatchState(bindings, self.owners, self.nodes)
+
+  def add_node(self, n: 'node.Node', owner, name: str) -> '_MatchState':
+    owners = dict(self.owners)
+    owners[n] = owner
+    bindings = self.bindings
+    if name is not None:
+      bindings = dict(bindings)
+      bindings[name] = n
+    return _MatchState(bindings, owners, self.nodes + (n,))
+
+  def key(self):
+    """Hashable summary of the state, for detecting duplicate matches."""
+    return (frozenset(self.nodes),
+            tuple(sorted((k, id(v)) for k, v in self.bindings.items())))
+
+  def result(self):
+    return dict(self.bindings), self.nodes
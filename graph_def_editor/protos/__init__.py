@@ -0,0 +1,136 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Protocol buffer bindings used throughout GDE.
+
+The bindings are chosen once and do not change afterwards. Although this
+module is only loaded on first use, the choice depends on what had been
+imported when `graph_def_editor` itself was imported:
+
+* If TensorFlow had already been imported, GDE uses TensorFlow's own
+  bindings, so that protobuf messages pass freely between the two libraries.
+* Otherwise GDE uses the copies in `protos.vendored`, which only require the
+  `protobuf` package, version 3.20 or later. Importing TensorFlow later on
+  does not switch GDE over to TensorFlow's bindings.
+* With older versions of `protobuf`, which cannot load the vendored copies,
+  GDE imports TensorFlow and uses its bindings.
+
+The choice therefore depends on import order, and it is visible to callers:
+`Graph.to_graph_def()` returns an instance of `protos.graph_pb2.GraphDef`,
+which is `tf.GraphDef` only in the first and third cases, and
+`isinstance(x, tf.GraphDef)` checks on GDE's messages fail otherwise. Import
+TensorFlow before GDE to always get TensorFlow's classes.
+
+Messages of the two kinds are wire-compatible but of different Python
+classes. GDE accepts both as input; a message of the other kind is converted
+with a serialize and parse round trip, so GDE works on a copy and later
+changes to the caller's message are not seen. Use `as_message()` and
+`to_tensorflow()` to convert messages explicitly.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import importlib
+
+import graph_def_editor
+
+
+def _can_load_vendored_bindings() -> bool:
+  """Returns True if the installed `protobuf` package can load the bindings
+  in `protos.vendored`, which use the `builder` module of protobuf 3.20."""
+  try:
+    importlib.import_module("google.protobuf.internal.builder")
+  except ImportError:
+    return False
+  return True
+
+
+if (graph_def_editor._TENSORFLOW_LOADED_FIRST or
+    not _can_load_vendored_bindings()):
+  # pylint: disable=g-import-not-at-top
+  from tensorflow.core.framework import attr_value_pb2
+  from tensorflow.core.framework import graph_pb2
+  from tensorflow.core.framework import node_def_pb2
+  from tensorflow.core.framework import tensor_pb2
+  from tensorflow.core.framework import tensor_shape_pb2
+  from tensorflow.core.framework import types_pb2
+  from tensorflow.core.framework import variable_pb2
+else:
+  from graph_def_editor.protos.vendored import attr_value_pb2
+  from graph_def_editor.protos.vendored import graph_pb2
+  from graph_def_editor.protos.vendored import node_def_pb2
+  from graph_def_editor.protos.vendored import tensor_pb2
+  from graph_def_editor.protos.vendored import tensor_shape_pb2
+  from graph_def_editor.protos.vendored import types_pb2
+  from graph_def_editor.protos.vendored import variable_pb2
+
+
+def is_message(value, message_class) -> bool:
+  """
+  Returns True if `value` is a protobuf message of the same type as
+  `message_class`, regardless of which bindings created it.
+  """
+  if isinstance(value, message_class):
+    return True
+  descriptor = getattr(value, "DESCRIPTOR", None)
+  return (descriptor is not None and
+          getattr(descriptor, "full_name", None) ==
+          message_class.DESCRIPTOR.full_name and
+          hasattr(value, "SerializeToString"))
+
+
+def as_message(value, message_class):
+  """
+  Convert a protobuf message to an instance of `message_class`, for example
+  to hand a `GraphDef` created with GDE's bindings to TensorFlow.
+
+  Args:
+    value: Protobuf message of the same type as `message_class`.
+    message_class: Generated protobuf message class to convert to.
+
+  Returns:
+    `value` if it is already an instance of `message_class`, or a copy of
+    `value` as an instance of `message_class`.
+
+  Raises:
+    TypeError if `value` is not a message of the right type.
+  """
+  if isinstance(value, message_class):
+    return value
+  if not is_message(value, message_class):
+    raise TypeError("Expected a {} protobuf message, got {}".format(
+      message_class.DESCRIPTOR.full_name, type(value)))
+  return message_class.FromString(value.SerializeToString())
+
+
+def to_tensorflow(value):
+  """
+  Convert a protobuf message to an instance of TensorFlow's own bindings for
+  the same message type, importing TensorFlow if necessary. Used when handing
+  messages to TensorFlow APIs such as `tf.import_graph_def()`, which reject
+  messages created with GDE's vendored bindings.
+
+  Args:
+    value: Protobuf message of a top-level message type defined in one of
+      TensorFlow's .proto files, such as `GraphDef` or `NodeDef`.
+
+  Returns:
+    `value` or a copy of `value` as an instance of TensorFlow's class.
+  """
+  file_name = value.DESCRIPTOR.file.name
+  module_name = file_name[:-len(".proto")].replace("/", ".") + "_pb2"
+  module = importlib.import_module(module_name)
+  return as_message(value, getattr(module, value.DESCRIPTOR.name))
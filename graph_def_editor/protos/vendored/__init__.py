@@ -0,0 +1,28 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Python bindings for TensorFlow's GraphDef-related .proto files.
+
+The `*_pb2` modules in this package are generated by
+`scripts/generate_protos.sh`; do not edit them by hand. Their descriptors
+live in `POOL` rather than in protobuf's default pool, so they never
+conflict with the bindings that TensorFlow registers when it is imported,
+whatever version of TensorFlow that is.
+
+Loading these modules requires `protobuf` 3.20 or later.
+"""
+
+from google.protobuf import descriptor_pool
+
+POOL = descriptor_pool.DescriptorPool()
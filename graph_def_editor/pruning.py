@@ -0,0 +1,109 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Removal of the parts of a graph that requested outputs do not need."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from typing import Iterable, Union
+
+from graph_def_editor import graph, node, tensor
+
+__all__ = [
+  "prune",
+]
+
+
+def prune(g: 'graph.Graph',
+          keep_outputs: Iterable[Union[str, 'tensor.Tensor', 'node.Node']],
+          keep_control: bool = True) -> int:
+  """
+  Remove from a graph every node that the given tensors and nodes do not
+  depend on. In-place counterpart of TensorFlow's
+  `graph_util.extract_sub_graph()`.
+
+  A single backward traversal from `keep_outputs` marks the nodes to keep,
+  following data inputs, control inputs if `keep_control` is True, and the
+  head nodes of the colocation groups of the nodes it reaches. Everything
+  else is then removed in bulk, in time proportional to the size of the
+  graph.
+
+  Variables that reference a removed node, for example because their
+  initializer is not needed to compute `keep_outputs`, are removed along
+  with their collection memberships, and so are the entries for removed
+  nodes and tensors in the graph's collections.
+
+  Args:
+    g: `gde.Graph` to modify in place.
+    keep_outputs: Tensors and nodes to keep, as `gde.Tensor` or `gde.Node`
+      objects or their names.
+    keep_control: If False, do not follow control inputs, and drop the
+      control inputs of kept nodes on nodes that are removed.
+
+  Returns:
+    The number of nodes removed.
+
+  Raises:
+    ValueError if `keep_outputs` references something that is not in `g`.
+  """
+  roots = []
+  for elem in keep_outputs:
+    if isinstance(elem, str):
+      elem = g[elem]
+    n = elem.node if isinstance(elem, tensor.Tensor) else elem
+    if not isinstance(n, node.Node) or n.graph is not g or \
+            not g.contains_node(n.name) or g.get_node_by_name(n.name) is not n:
+      raise ValueError("{} is not a node or tensor of this graph".format(elem))
+    roots.append(n)
+
+  keep = set()
+  stack = roots
+  while len(stack) > 0:
+    n = stack.pop()
+    if n in keep:
+      continue
+    keep.add(n)
+    stack.extend(t.node for t in n.inputs)
+    if keep_control:
+      stack.extend(n.control_inputs)
+    for head_name in n.colocation_groups:
+      if g.contains_node(head_name):
+        stack.append(g.get_node_by_name(head_name))
+
+  removed = [n for n in g.nodes if n not in keep]
+  if len(removed) == 0:
+    return 0
+  if not keep_control:
+    for n in keep:
+      if any(c not in keep for c in n.control_inputs):
+        n.set_control_inputs([c for c in n.control_inputs if c in keep])
+  g.remove_nodes(removed)
+
+  # pylint: disable=protected-access
+  for name in list(g.variable_names):
+    v = g.name_to_variable(name)
+    if not all(graph._refers_to_node(g, ref) for ref in
+               (v.name, v.initial_value_name, v.initializer_name,
+                v.snapshot_name)):
+      g.remove_variable(name)
+  for collection_name, elems in list(g._collections.items()):
+    g._collections[collection_name] = [
+      e for e in elems
+      if not isinstance(e, (node.Node, tensor.Tensor)) or
+      (e.node if isinstance(e, tensor.Tensor) else e) in keep]
+  # pylint: enable=protected-access
+  return len(removed)
+
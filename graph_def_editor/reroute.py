@@ -18,7 +18,7 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-from graph_def_editor import node, subgraph, util
+from graph_def_editor import node, op_set, subgraph, util
 
 _allowed_symbols = [
     "swap_ts",
@@ -94,41 +94,8 @@ class _RerouteMode(object):
       raise ValueError("Unknown _RerouteMode: {}".format(mode))
 
 
-def _reroute_t(t0, t1, consumers1, can_modify=None, cannot_modify=None):
-  """Reroute the end of the tensors (t0,t1).
-
-  Warning: this function is directly manipulating the internals of the
-  `tf.Graph`.
-
-  Args:
-    t0: a tf.Tensor.
-    t1: a tf.Tensor.
-    consumers1: The consumers of t1 which needs to be rerouted.
-    can_modify: iterable of operations which can be modified. Any operation
-      outside within_ops will be left untouched by this function.
-    cannot_modify: iterable of operations which cannot be modified.
-      Any operation within cannot_modify will be left untouched by this
-      function.
-  Returns:
-    The number of individual modifications made by the function.
-  """
-  nb_update_inputs = 0
-  if can_modify is not None:
-    consumers1 &= can_modify
-  if cannot_modify is not None:
-    consumers1 -= cannot_modify
-  consumers1_indices = {}
-  for consumer1 in consumers1:
-    consumers1_indices[consumer1] = [i for i, t in enumerate(consumer1.inputs)
-                                     if t is t1]
-  for consumer1 in consumers1:
-    for i in consumers1_indices[consumer1]:
-      consumer1.replace_input(i, t0)
-      nb_update_inputs += 1
-  return nb_update_inputs
-
-
-def _reroute_ts(ts0, ts1, mode, can_modify=None, cannot_modify=None):
+def _reroute_ts(ts0, ts1, mode, can_modify=None, cannot_modify=None,
+                return_changes=False):
   """Reroute the end of the tensors in each pair (t0,t1) in ts0 x ts1.
 
   This function is the back-bone of the Graph-Editor. It is essentially a thin
@@ -166,8 +133,47 @@ def _reroute_ts(ts0, ts1, mode, can_modify=None, cannot_modify=None):
     cannot_modify: iterable of operations which cannot be modified.
       Any operation within cannot_modify will be left untouched by this
       function.
+    return_changes: if True, return the change record of `_bulk_reroute`
+      instead of the number of modifications.
+  Returns:
+    The number of individual modifications made by the function, or the
+    change record if `return_changes` is True.
+  Raises:
+    TypeError: if `ts0` or `ts1` cannot be converted to a list of `tf.Tensor`.
+    TypeError: if `can_modify` or `cannot_modify` is not `None` and cannot be
+      converted to a list of `tf.Operation`.
+  """
+  changes = _bulk_reroute(ts0, ts1, mode, can_modify, cannot_modify)
+  return changes if return_changes else len(changes)
+
+
+def _bulk_reroute(ts0, ts1, mode, can_modify=None, cannot_modify=None):
+  """Batched implementation of `_reroute_ts`.
+
+  Finds every (consumer, input slot) pair that reads one of the tensors in
+  `ts0` or `ts1` using the graph's index of consumers, computes all of the
+  slot rewrites against the state of the graph before any change is made,
+  then applies them in one batch and invalidates the graph's cached edge
+  information once.
+
+  Because all rewrites are computed up front, a consumer that reads both
+  tensors of a pair is swapped correctly, and repeated tensors in `ts0` or
+  `ts1` are handled the same way as the per-tensor implementation: when two
+  pairs rewrite the same slot, the first pair wins, since once it has been
+  rewired the slot no longer reads the source tensor of the later pair.
+
+  Args:
+    ts0: an object convertible to a list of `gde.Tensor`.
+    ts1: an object convertible to a list of `gde.Tensor`.
+    mode: what to do with those tensors; see `_reroute_ts`.
+    can_modify: iterable of operations which can be modified. Any operation
+      outside within_ops will be left untouched by this function.
+    cannot_modify: iterable of operations which cannot be modified.
+      Any operation within cannot_modify will be left untouched by this
+      function.
   Returns:
-    The number of individual modifications made by the function.
+    A tuple of `(consumer, index, old_tensor, new_tensor)` records, one per
+    input slot that was rewritten, in the order the rewrites were applied.
   Raises:
     TypeError: if `ts0` or `ts1` cannot be converted to a list of `tf.Tensor`.
     TypeError: if `can_modify` or `cannot_modify` is not `None` and cannot be
@@ -177,31 +183,60 @@ def _reroute_ts(ts0, ts1, mode, can_modify=None, cannot_modify=None):
   ts0 = util.make_list_of_t(ts0)
   ts1 = util.make_list_of_t(ts1)
   _check_ts_compatibility(ts0, ts1)
-  if cannot_modify is not None:
+  if cannot_modify is not None and \
+          not isinstance(cannot_modify, op_set.OpSet):
     cannot_modify = frozenset(util.make_list_of_op(cannot_modify))
-  if can_modify is not None:
+  if can_modify is not None and not isinstance(can_modify, op_set.OpSet):
     can_modify = frozenset(util.make_list_of_op(can_modify))
-  nb_update_inputs = 0
-  precomputed_consumers = []
-  # precompute consumers to avoid issue with repeated tensors:
+
+  # Pairs of (source, destination): every slot that reads source is rewritten
+  # to read destination.
+  redirects = []
   for t0, t1 in zip(ts0, ts1):
-    consumers0 = set(t0.consumers())
-    consumers1 = set(t1.consumers())
-    precomputed_consumers.append((consumers0, consumers1))
-  for t0, t1, consumers in zip(ts0, ts1, precomputed_consumers):
     if t0 is t1:
       continue  # Silently ignore identical tensors.
-    consumers0, consumers1 = consumers
     if a2b:
-      nb_update_inputs += _reroute_t(t0, t1, consumers1, can_modify,
-                                     cannot_modify)
+      redirects.append((t1, t0))
     if b2a:
-      nb_update_inputs += _reroute_t(t1, t0, consumers0, can_modify,
-                                     cannot_modify)
-  return nb_update_inputs
-
-
-def swap_ts(ts0, ts1, can_modify=None, cannot_modify=None):
+      redirects.append((t0, t1))
+  if not redirects:
+    return tuple()
+
+  # Find the consumer slots of every tensor through the graph's consumer
+  # index, so that the cost depends on the number of consumers rather than
+  # on the size of the graph. Tensors compare by identity, so they can serve
+  # directly as dict keys.
+  slots = {src: [] for src, _ in redirects}
+  g = redirects[0][0].graph
+  candidates = set()
+  for src in slots:
+    candidates.update(g.node_consumers(src.node))
+  for n in sorted(candidates, key=lambda n: n.id_in_graph):
+    if can_modify is not None and n not in can_modify:
+      continue
+    if cannot_modify is not None and n in cannot_modify:
+      continue
+    for i, t in enumerate(n.inputs):
+      if t in slots:
+        slots[t].append((n, i))
+
+  # Resolve all rewrites against the original graph before touching it.
+  rewrites = {}
+  for src, dst in redirects:
+    for consumer, i in slots[src]:
+      rewrites.setdefault((consumer, i), (src, dst))
+
+  record = []
+  for (consumer, i), (src, dst) in rewrites.items():
+    consumer._inputs[i] = dst  # pylint: disable=protected-access
+    record.append((consumer, i, src, dst))
+  if record:
+    g.increment_version_counter(set(r[0] for r in record))
+  return tuple(record)
+
+
+def swap_ts(ts0, ts1, can_modify=None, cannot_modify=None,
+            return_changes=False):
   """For each tensor's pair, swap the end of (t0,t1).
 
       B0 B1     B0 B1
@@ -216,17 +251,23 @@ def swap_ts(ts0, ts1, can_modify=None, cannot_modify=None):
     cannot_modify: iterable of operations which cannot be modified.
       Any operation within cannot_modify will be left untouched by this
       function.
+    return_changes: if True, return a record of the modifications instead
+      of their number.
   Returns:
-    The number of individual modifications made by the function.
+    The number of individual modifications made by the function or, if
+    `return_changes` is True, a tuple of `(consumer, index, old_tensor,
+    new_tensor)` records, one per input slot that was rewritten.
   Raises:
     TypeError: if ts0 or ts1 cannot be converted to a list of tf.Tensor.
     TypeError: if can_modify or cannot_modify is not None and cannot be
       converted to a list of tf.Operation.
   """
-  return _reroute_ts(ts0, ts1, _RerouteMode.swap, can_modify, cannot_modify)
+  return _reroute_ts(ts0, ts1, _RerouteMode.swap, can_modify, cannot_modify,
+                     return_changes)
 
 
-def reroute_ts(ts0, ts1, can_modify=None, cannot_modify=None):
+def reroute_ts(ts0, ts1, can_modify=None, cannot_modify=None,
+               return_changes=False):
   """For each tensor's pair, replace the end of t1 by the end of t0.
 
       B0 B1     B0 B1
@@ -242,14 +283,19 @@ def reroute_ts(ts0, ts1, can_modify=None, cannot_modify=None):
       outside within_ops will be left untouched by this function.
     cannot_modify: iterable of operations which cannot be modified. Any
       operation within cannot_modify will be left untouched by this function.
+    return_changes: if True, return a record of the modifications instead
+      of their number.
   Returns:
-    The number of individual modifications made by the function.
+    The number of individual modifications made by the function or, if
+    `return_changes` is True, a tuple of `(consumer, index, old_tensor,
+    new_tensor)` records, one per input slot that was rewritten.
   Raises:
     TypeError: if ts0 or ts1 cannot be converted to a list of tf.Tensor.
     TypeError: if can_modify or cannot_modify is not None and cannot be
       converted to a list of tf.Operation.
   """
-  return _reroute_ts(ts0, ts1, _RerouteMode.a2b, can_modify, cannot_modify)
+  return _reroute_ts(ts0, ts1, _RerouteMode.a2b, can_modify, cannot_modify,
+                     return_changes)
 
 
 def _reroute_sgv_remap(sgv0, sgv1, mode):
@@ -289,10 +335,12 @@ def _reroute_sgv_remap(sgv0, sgv1, mode):
   # Update the passthrough outputs as well.
   def update_passthrough_outputs(a, b):
     # pylint: disable=protected-access
-    for i, t in enumerate(b._output_ts):
+    output_ts = list(b._output_ts)
+    for i, t in enumerate(output_ts):
       if t in a._passthrough_ts:
         ii = a._input_ts.index(t)
-        b._output_ts[i] = b._input_ts[ii]
+        output_ts[i] = b._input_ts[ii]
+    b._output_ts = output_ts
     # pylint: enable=protected-access
 
   if a2b:
@@ -0,0 +1,348 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Rewrite rules that replace matches of a pattern in a graph."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import heapq
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from graph_def_editor import graph, match, pattern, reroute, tensor
+
+__all__ = [
+  "RewriteRule",
+  "RewriteDriver",
+]
+
+
+class RewriteRule(object):
+  """
+  Rule that finds the matches of a pattern in a graph and replaces each of
+  them with a subgraph built by a Python function.
+
+  The replacement function receives the graph and the dictionary of
+  bindings of one match (see `gde.pattern`). It adds whatever nodes it needs
+  and returns the tensors that replace the outputs of the root of the match:
+  a single `gde.Tensor` if the root has one output, or a list with one entry
+  per output, where None leaves that output alone. It may instead return
+  None to leave the match unchanged.
+
+  After the consumers of the root are rerouted to the replacements, the
+  nodes of the match that nothing consumes any more are removed from the
+  graph.
+
+  Matches never overlap: a node belongs to at most one rewritten match.
+  A match is skipped if any of its nodes has a control input from outside
+  the match, or if a node other than the root has consumers outside the
+  match, since the rewrite could not remove such nodes. Matches whose root
+  has no consumers at all are also skipped, because the root is then
+  presumably an output of the graph that is fetched by name.
+  """
+
+  def __init__(self, p: 'pattern.Op',
+               replacement_fn: Callable[['graph.Graph', Dict[str, Any]],
+                                        Any],
+               name: str = None):
+    """
+    Args:
+      p: `gde.pattern.Op` that describes the subgraph to replace.
+      replacement_fn: Function that builds the replacement of one match, as
+        described above.
+      name: Name of the rule, for messages. Defaults to the name of
+        `replacement_fn`.
+    """
+    if not isinstance(p, pattern.Op):
+      raise TypeError("Expected a gde.pattern.Op, got {}".format(type(p)))
+    self._pattern = p
+    self._replacement_fn = replacement_fn
+    self._name = name if name is not None \
+      else getattr(replacement_fn, "__name__", "RewriteRule")
+
+  @property
+  def pattern(self) -> 'pattern.Op':
+    return self._pattern
+
+  @property
+  def name(self) -> str:
+    return self._name
+
+  def __repr__(self):
+    return "RewriteRule({})".format(self._name)
+
+  def apply(self, g: 'graph.Graph') -> int:
+    """
+    Rewrite all the non-overlapping matches of the rule's pattern in a graph.
+
+    Matches are found in one pass over the graph and rewritten in the order
+    in which their roots were added to the graph. Each match is checked
+    again just before it is rewritten, because earlier rewrites may have
+    changed its surroundings.
+
+    Args:
+      g: `gde.Graph` to modify in place.
+
+    Returns:
+      The number of matches that were rewritten.
+    """
+    num_rewrites = 0
+    used = set()
+    matches = self._pattern._find_matches(g)  # pylint: disable=protected-access
+    version = g.version
+    for bindings, nodes in matches:
+      root = nodes[0]
+      if g.version != version:
+        if not _in_graph(g, root):
+          continue
+        result = self._pattern._match_root(root)  # pylint: disable=protected-access
+        if result is None:
+          continue
+        bindings, nodes = result
+      if self.rewrite_match(g, bindings, nodes, used):
+        num_rewrites += 1
+    return num_rewrites
+
+  def rewrite_match(self, g: 'graph.Graph', bindings: Dict[str, Any],
+                    nodes, used: set = None) -> bool:
+    """
+    Rewrite a single match of the rule's pattern.
+
+    Args:
+      g: `gde.Graph` that contains the match.
+      bindings: Dictionary of bindings of the match.
+      nodes: Sequence of the nodes that belong to the match, root first.
+      used: Optional set of nodes that earlier rewrites have claimed. The
+        match is skipped if it contains any of them, and its own nodes are
+        added to the set if it is rewritten.
+
+    Returns:
+      True if the match was rewritten.
+    """
+    if used is not None and any(n in used for n in nodes):
+      return False
+    if not _is_self_contained(g, nodes):
+      return False
+    root = nodes[0]
+    replacements = self._replacement_fn(g, bindings)
+    if replacements is None:
+      return False
+    if isinstance(replacements, tensor.Tensor):
+      replacements = [replacements]
+    replacements = list(replacements)
+    if len(replacements) != len(root.outputs):
+      raise ValueError("Rule {} replaced the {} outputs of {} with {} "
+                       "tensors".format(self._name, len(root.outputs), root,
+                                        len(replacements)))
+    for old_t, new_t in zip(root.outputs, replacements):
+      if new_t is not None and new_t is not old_t:
+        reroute.reroute_ts([new_t], [old_t])
+    # Nodes that ran after the root must now run after its replacements.
+    new_producers = [t.node for t in replacements if t is not None]
+    for consumer in g.node_consumers(root):
+      if root in consumer.control_inputs:
+        consumer.set_control_inputs(
+          [c for c in consumer.control_inputs if c is not root] +
+          [p for p in new_producers if p not in consumer.control_inputs and
+           p is not consumer])
+    _remove_dead_nodes(g, nodes)
+    if used is not None:
+      used.update(nodes)
+    return True
+
+
+class RewriteDriver(object):
+  """
+  Applies a set of `RewriteRule`s to a graph until none of them matches.
+
+  Instead of scanning the whole graph once per round, the driver keeps a
+  worklist of nodes that could be the root of a match. It starts from the
+  nodes that the rules' patterns accept as roots. After each rewrite, it
+  adds only the nodes whose neighborhood the rewrite changed, as far
+  downstream of the edit as the deepest pattern reaches. The cost of running
+  to a fixed point is therefore proportional to the number of edits rather
+  than to the number of rounds times the size of the graph.
+
+  The worklist is processed in the order in which nodes were added to the
+  graph, and the rules are tried in the order given, so the result is
+  deterministic.
+  """
+
+  def __init__(self, rules: Iterable[RewriteRule], max_rewrites: int = None):
+    """
+    Args:
+      rules: `RewriteRule`s to apply. When several rules match at the same
+        node, the first one in this list wins.
+      max_rewrites: Optional limit on the number of rewrites in one call to
+        `run()`.
+    """
+    self._rules = list(rules)
+    for rule in self._rules:
+      if not isinstance(rule, RewriteRule):
+        raise TypeError("Expected RewriteRule, got {}".format(type(rule)))
+    self._max_rewrites = max_rewrites
+    self._history = []
+    # The nodes of any match are at most depth - 1 edges upstream of its
+    # root and have types in op_types; None means unbounded or any.
+    self._depth, self._op_types = 1, frozenset()
+    for rule in self._rules:
+      depth, op_types = rule.pattern._extent()  # pylint: disable=protected-access
+      self._depth = None if self._depth is None or depth is None \
+        else max(self._depth, depth)
+      self._op_types = None if self._op_types is None or op_types is None \
+        else self._op_types | op_types
+
+  @property
+  def rules(self) -> List[RewriteRule]:
+    return list(self._rules)
+
+  @property
+  def history(self) -> List[Tuple[str, str]]:
+    """
+    (rule name, root node name) pairs for all the rewrites made so far by
+    this driver, in the order in which they were made.
+    """
+    return list(self._history)
+
+  def run(self, g: 'graph.Graph') -> int:
+    """
+    Rewrite a graph until no rule matches, or until the budget of rewrites
+    runs out.
+
+    Args:
+      g: `gde.Graph` to modify in place.
+
+    Returns:
+      The number of rewrites made.
+    """
+    num_rewrites = 0
+    worklist = []
+    queued = set()
+    self._push(worklist, queued, self._initial_candidates(g))
+    change_log = g._start_change_log()  # pylint: disable=protected-access
+    try:
+      while len(worklist) > 0:
+        if self._max_rewrites is not None and \
+                num_rewrites >= self._max_rewrites:
+          break
+        _, n = heapq.heappop(worklist)
+        queued.discard(n)
+        if not _in_graph(g, n):
+          continue
+        for rule in self._rules:
+          result = rule.pattern._match_root(n)  # pylint: disable=protected-access
+          if result is None:
+            continue
+          bindings, nodes = result
+          change_log.clear()
+          # Nodes that may lose consumers, and with them the reason why
+          # they did not match.
+          seeds = list(nodes)
+          for m in nodes:
+            seeds.extend(t.node for t in m.inputs)
+            seeds.extend(m.control_inputs)
+          rewritten = rule.rewrite_match(g, bindings, nodes)
+          if rewritten:
+            num_rewrites += 1
+            self._history.append((rule.name, n.name))
+          if len(change_log) > 0:
+            self._push(worklist, queued, self._affected_nodes(
+              g, seeds, change_log))
+          if rewritten:
+            break
+    finally:
+      g._stop_change_log(change_log)  # pylint: disable=protected-access
+    return num_rewrites
+
+  def _initial_candidates(self, g):
+    candidates = set()
+    for rule in self._rules:
+      candidates.update(match.find_all(g, rule.pattern._op_matcher()))  # pylint: disable=protected-access
+    return candidates
+
+  @staticmethod
+  def _push(worklist, queued, nodes):
+    for n in nodes:
+      if n not in queued:
+        queued.add(n)
+        heapq.heappush(worklist, (n.id_in_graph, n))
+
+  def _affected_nodes(self, g, seeds, change_log):
+    """Returns the nodes that could have become the root of a match because
+    of the edits recorded in `change_log`."""
+    if None in change_log:
+      return g.nodes
+    seeds = list(seeds) + list(change_log)
+    for n in change_log:
+      if _in_graph(g, n):
+        seeds.extend(t.node for t in n.inputs)
+        seeds.extend(n.control_inputs)
+    frontier = [n for n in set(seeds) if _in_graph(g, n)]
+    reached = set(frontier)
+    steps = 0
+    while len(frontier) > 0 and (self._depth is None or
+                                 steps < self._depth - 1):
+      next_frontier = []
+      for n in frontier:
+        for consumer in g.node_consumers(n):
+          if consumer not in reached and (self._op_types is None or
+                                          consumer.op_type in self._op_types):
+            reached.add(consumer)
+            next_frontier.append(consumer)
+      frontier = next_frontier
+      steps += 1
+    return [n for n in reached
+            if self._op_types is None or n.op_type in self._op_types]
+
+
+################################################################################
+# Stuff below this line is private to this file.
+
+
+def _in_graph(g, n) -> bool:
+  return g.contains_node(n.name) and g.get_node_by_name(n.name) is n
+
+
+def _is_self_contained(g, nodes) -> bool:
+  """Returns True if no node of the match has control inputs from outside
+  the match, and only the root, which must have some, has consumers outside
+  the match."""
+  if len(g.node_consumers(nodes[0])) == 0:
+    return False
+  node_set = frozenset(nodes)
+  for n in nodes:
+    if any(c not in node_set for c in n.control_inputs):
+      return False
+    if n is not nodes[0] and \
+            any(c not in node_set for c in g.node_consumers(n)):
+      return False
+  return True
+
+
+def _remove_dead_nodes(g, nodes):
+  """Remove the nodes in `nodes` that nothing consumes, including ones that
+  only become dead when others are removed."""
+  remaining = list(nodes)
+  removed_any = True
+  while removed_any:
+    removed_any = False
+    still_remaining = []
+    for n in remaining:
+      if len(g.node_consumers(n)) == 0:
+        g.remove_node(n)
+        removed_any = True
+      else:
+        still_remaining.append(n)
+    remaining = still_remaining
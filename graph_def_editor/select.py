@@ -24,7 +24,7 @@ import re
 from six import iteritems
 from six import string_types
 
-from graph_def_editor import util
+from graph_def_editor import op_set, util
 from graph_def_editor.graph import Graph
 from graph_def_editor.tensor import Tensor
 
@@ -114,6 +114,21 @@ def _get_output_ts(ops):
   return ts
 
 
+def _as_op_container(ops):
+  """Convert ops to a collection with fast membership tests.
+
+  Args:
+    ops: an object convertible to a list of `tf.Operation`, or a `gde.OpSet`.
+  Returns:
+    `ops` itself if it is a `gde.OpSet`, otherwise a frozenset of the ops.
+  Raises:
+    TypeError: if ops cannot be converted to a list of `tf.Operation`.
+  """
+  if isinstance(ops, op_set.OpSet):
+    return ops
+  return frozenset(util.make_list_of_op(ops, allow_graph=False))
+
+
 def filter_ts(ops, positive_filter):
   """Get all the tensors which are input or output of an op in ops.
 
@@ -300,23 +315,26 @@ def compute_boundary_ts(ops):
     TypeError: if ops cannot be converted to a list of tf.Operation.
   """
   ops = util.make_list_of_op(ops)
-  input_ts = _get_input_ts(ops)
-  output_ts = _get_output_ts(ops)
-  output_ts_set = frozenset(output_ts)
+  # Same as _get_input_ts() and _get_output_ts(), without checking ops again
+  input_ts = util.concatenate_unique([], [t for op in ops for t in op.inputs])
+  output_ts = [t for op in ops for t in op.outputs]
   ops_set = frozenset(ops)
+  node_consumers = ops[0].graph.node_consumers if ops else None
 
   # Compute inside tensors.
   inside_ts = []
   only_inside_ts = []
   for t in input_ts:
     # Skip if the input tensor is not also an output tensor.
-    if t not in output_ts_set:
+    if t.node not in ops_set:
       continue
     # Mark as "inside".
     inside_ts.append(t)
     # Mark as "only inside" if the tensor is not both inside and output.
-    consumers = frozenset(t.consumers())
-    if consumers - ops_set:
+    # Only nodes that consume outputs of the producer can consume the tensor,
+    # and usually those are all in ops.
+    if any(t in c.inputs for c in node_consumers(t.node)
+           if c not in ops_set):
       continue
     only_inside_ts.append(t)
 
@@ -424,15 +442,15 @@ def get_forward_walk_ops(seed_ops,
   seed_ops = frozenset(seed_ops)
   stop_at_ts = frozenset(util.make_list_of_t(stop_at_ts))
   if within_ops:
-    within_ops = util.make_list_of_op(within_ops, allow_graph=False)
-    within_ops = frozenset(within_ops)
-    seed_ops &= within_ops
+    within_ops = _as_op_container(within_ops)
+    seed_ops = frozenset(op for op in seed_ops if op in within_ops)
 
   def is_within(operator):
     return (within_ops is None or operator in within_ops) and (
         within_ops_fn is None or within_ops_fn(operator))
 
   result = list(seed_ops)
+  result_set = set(seed_ops)
   wave = set(seed_ops)
   while wave:
     new_wave = set()
@@ -441,13 +459,14 @@ def get_forward_walk_ops(seed_ops,
         if new_t in stop_at_ts:
           continue
         for new_op in new_t.consumers():
-          if new_op not in result and is_within(new_op):
+          if new_op not in result_set and is_within(new_op):
             new_wave.add(new_op)
       if control_outputs is not None:
         for new_op in control_outputs.get(op):
-          if new_op not in result and is_within(new_op):
+          if new_op not in result_set and is_within(new_op):
             new_wave.add(new_op)
     util.concatenate_unique(result, new_wave)
+    result_set.update(new_wave)
     wave = new_wave
   if not inclusive:
     result = [op for op in result if op not in seed_ops]
@@ -494,15 +513,15 @@ def get_backward_walk_ops(seed_ops,
   stop_at_ts = frozenset(util.make_list_of_t(stop_at_ts))
   seed_ops = frozenset(util.make_list_of_op(seed_ops))
   if within_ops:
-    within_ops = util.make_list_of_op(within_ops, allow_graph=False)
-    within_ops = frozenset(within_ops)
-    seed_ops &= within_ops
+    within_ops = _as_op_container(within_ops)
+    seed_ops = frozenset(op for op in seed_ops if op in within_ops)
 
   def is_within(operator):
     return (within_ops is None or operator in within_ops) and (
         within_ops_fn is None or within_ops_fn(operator))
 
   result = list(seed_ops)
+  result_set = set(seed_ops)
   wave = set(seed_ops)
   while wave:
     new_wave = set()
@@ -510,13 +529,14 @@ def get_backward_walk_ops(seed_ops,
       for new_t in op.inputs:
         if new_t in stop_at_ts:
           continue
-        if new_t.op not in result and is_within(new_t.op):
+        if new_t.op not in result_set and is_within(new_t.op):
           new_wave.add(new_t.op)
       if control_inputs:
         for new_op in op.control_inputs:
-          if new_op not in result and is_within(new_op):
+          if new_op not in result_set and is_within(new_op):
             new_wave.add(new_op)
     util.concatenate_unique(result, new_wave)
+    result_set.update(new_wave)
     wave = new_wave
   if not inclusive:
     result = [op for op in result if op not in seed_ops]
@@ -579,6 +599,7 @@ def get_walks_intersection_ops(forward_seed_ops,
       within_ops=within_ops,
       within_ops_fn=within_ops_fn,
       control_inputs=control_inputs)
+  backward_ops = frozenset(backward_ops)
   return [op for op in forward_ops if op in backward_ops]
 
 
@@ -0,0 +1,700 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Pure-Python output dtype and shape functions for common ops.
+
+Each shape function receives a `ShapeContext` describing a node and its
+inputs, and returns a list of (dtype, shape) pairs, one per output of the
+node. A shape function may return None to indicate that it cannot compute a
+result at least as precise as TensorFlow's own shape inference; GDE then falls
+back on TensorFlow for that node.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+from typing import Callable, Iterable, List, Optional, Tuple, Union
+
+from graph_def_editor import dtypes, tensor_shape, tensor_util
+from graph_def_editor.protos import attr_value_pb2, node_def_pb2
+
+
+__all__ = [
+  "ShapeContext",
+  "register_shape_function",
+  "unregister_shape_function",
+  "get_shape_function",
+]
+
+
+class ShapeContext(object):
+  """
+  Read-only view of everything a shape function may look at: the node's op
+  type and attributes, and the dtypes, shapes and (for constant integer
+  inputs) values of its data inputs.
+  """
+
+  def __init__(self, node_def: node_def_pb2.NodeDef,
+               input_specs: Iterable[Tuple[
+                 dtypes.DType, tensor_shape.TensorShape, str,
+                 Optional[attr_value_pb2.AttrValue]]]):
+    """
+    Do not call this constructor directly; GDE creates contexts as needed.
+
+    Args:
+      node_def: NodeDef of the node whose outputs are being inferred.
+      input_specs: One tuple per data input, as described in
+        `inference_cache.node_def_signature()`.
+    """
+    self._node_def = node_def
+    self._input_specs = list(input_specs)
+
+  @property
+  def op_type(self) -> str:
+    return self._node_def.op
+
+  @property
+  def name(self) -> str:
+    return self._node_def.name
+
+  @property
+  def num_inputs(self) -> int:
+    return len(self._input_specs)
+
+  def input_dtype(self, index: int) -> dtypes.DType:
+    """Returns the dtype of the indicated input, minus any reference type."""
+    return dtypes.as_dtype(self._input_specs[index][0]).base_dtype
+
+  def input_shape(self, index: int) -> tensor_shape.TensorShape:
+    return tensor_shape.TensorShape(self._input_specs[index][1])
+
+  def input_value(self, index: int) -> Optional[np.ndarray]:
+    """
+    Returns the value of the indicated input as a numpy array if the input
+    is an integer tensor produced by a `Const` op, or None otherwise.
+    """
+    const_value = self._input_specs[index][3]
+    if const_value is None or not const_value.HasField("tensor"):
+      return None
+    return tensor_util.make_ndarray(const_value.tensor)
+
+  def attr(self, key: str) -> Optional[attr_value_pb2.AttrValue]:
+    """Returns the raw `AttrValue` stored under a key, or None."""
+    if key in self._node_def.attr:
+      return self._node_def.attr[key]
+    return None
+
+  def attr_type(self, key: str, default: dtypes.DType = None) -> dtypes.DType:
+    value = self.attr(key)
+    return default if value is None else dtypes.as_dtype(value.type)
+
+  def attr_int(self, key: str, default: int = None) -> int:
+    value = self.attr(key)
+    return default if value is None else value.i
+
+  def attr_bool(self, key: str, default: bool = None) -> bool:
+    value = self.attr(key)
+    return default if value is None else value.b
+
+  def attr_str(self, key: str, default: str = None) -> str:
+    value = self.attr(key)
+    return default if value is None else value.s.decode("utf-8")
+
+  def attr_ints(self, key: str, default: List[int] = None) -> List[int]:
+    value = self.attr(key)
+    return default if value is None else list(value.list.i)
+
+  def attr_shape(self, key: str,
+                 default: tensor_shape.TensorShape = None
+                 ) -> tensor_shape.TensorShape:
+    value = self.attr(key)
+    return default if value is None else tensor_shape.TensorShape(value.shape)
+
+
+ShapeFunction = Callable[
+  [ShapeContext],
+  Optional[List[Tuple[dtypes.DType, tensor_shape.TensorShape]]]]
+
+# Dict[str, ShapeFunction]; key is op type
+_shape_functions = {}
+
+
+def register_shape_function(op_types: Union[str, Iterable[str]],
+                            fn: ShapeFunction = None):
+  """
+  Register a Python shape function for one or more op types, replacing any
+  function previously registered for those op types.
+
+  Can also be used as a decorator:
+
+  ```
+  @gde.register_shape_function("MyOp")
+  def _my_op_shape(ctx):
+    return [(ctx.input_dtype(0), ctx.input_shape(0))]
+  ```
+
+  Args:
+    op_types: Op type string, or iterable of op type strings.
+    fn: Function that takes a `ShapeContext` and returns a list of
+      (dtype, shape) pairs, one per output, or None to defer to TensorFlow.
+      If None, this function returns a decorator.
+
+  Returns:
+    `fn`, or a decorator if `fn` is None.
+  """
+  if isinstance(op_types, str):
+    op_types = [op_types]
+  op_types = list(op_types)
+
+  def decorator(f):
+    for op_type in op_types:
+      _shape_functions[op_type] = f
+    return f
+
+  if fn is None:
+    return decorator
+  return decorator(fn)
+
+
+def unregister_shape_function(op_type: str):
+  """
+  Remove the Python shape function registered for an op type, if any, so that
+  inference for that op type falls back on TensorFlow.
+  """
+  _shape_functions.pop(op_type, None)
+
+
+def get_shape_function(op_type: str) -> Optional[ShapeFunction]:
+  """
+  Returns the Python shape function registered for an op type, or None if
+  there is none.
+  """
+  return _shape_functions.get(op_type)
+
+
+def infer_outputs(node_def: node_def_pb2.NodeDef,
+                  input_specs: Iterable[Tuple[
+                    dtypes.DType, tensor_shape.TensorShape, str,
+                    Optional[attr_value_pb2.AttrValue]]]
+                  ) -> Optional[List[Tuple[dtypes.DType,
+                                           tensor_shape.TensorShape]]]:
+  """
+  Run the registered shape function for a node, if there is one.
+
+  Args:
+    node_def: NodeDef of the node.
+    input_specs: One tuple per data input, as described in
+      `inference_cache.node_def_signature()`.
+
+  Returns:
+    A list of (dtype, shape) pairs, or None if there is no shape function
+    for the node's op type or the shape function deferred to TensorFlow.
+  """
+  fn = _shape_functions.get(node_def.op)
+  if fn is None:
+    return None
+  try:
+    ret = fn(ShapeContext(node_def, input_specs))
+  except _DeferToTensorFlow:
+    return None
+  if ret is None:
+    return None
+  return [(dtypes.as_dtype(dtype), tensor_shape.TensorShape(shape))
+          for dtype, shape in ret]
+
+
+################################################################################
+# Stuff below this line is private to this file.
+
+
+class _DeferToTensorFlow(Exception):
+  """
+  Raised by the helpers below when the inputs are invalid or when a precise
+  answer needs information that only TensorFlow's inference has.
+  """
+  pass
+
+
+_UNKNOWN_SHAPE = tensor_shape.TensorShape(None)
+
+
+def _dims(shape):
+  """Returns the dims of a shape as a list of ints/None, or None if the rank
+  is unknown."""
+  if shape.ndims is None:
+    return None
+  return shape.as_list()
+
+
+def _merge_dim(d1, d2):
+  if d1 is None:
+    return d2
+  if d2 is not None and d1 != d2:
+    raise _DeferToTensorFlow()
+  return d1
+
+
+def _normalize_axis(axis, rank):
+  axis = int(axis)
+  if axis < -rank or axis >= rank:
+    raise _DeferToTensorFlow()
+  return axis + rank if axis < 0 else axis
+
+
+def _const_input(ctx, index):
+  value = ctx.input_value(index)
+  if value is None:
+    raise _DeferToTensorFlow()
+  return value
+
+
+def _broadcast_shapes(shape_x, shape_y):
+  """Numpy-style broadcasting, with the same handling of unknown dims as
+  TensorFlow's BroadcastBinaryOpShapeFn."""
+  x, y = _dims(shape_x), _dims(shape_y)
+  if x is None or y is None:
+    return _UNKNOWN_SHAPE
+  rank = max(len(x), len(y))
+  x = [1] * (rank - len(x)) + x
+  y = [1] * (rank - len(y)) + y
+  dims = []
+  for dx, dy in zip(x, y):
+    if dx == 1:
+      dims.append(dy)
+    elif dy == 1:
+      dims.append(dx)
+    elif dx is None or dy is None or dx == dy:
+      dims.append(dx if dx is not None else dy)
+    else:
+      raise _DeferToTensorFlow()
+  return tensor_shape.TensorShape(dims)
+
+
+def _window_output_dim(in_dim, window, stride, dilation, padding):
+  """Output size of a convolution or pooling along one spatial dimension."""
+  if in_dim is None:
+    return None
+  if padding == "SAME":
+    return (in_dim + stride - 1) // stride
+  if window is None:
+    return None
+  effective_window = (window - 1) * dilation + 1
+  ret = (in_dim - effective_window + stride) // stride
+  if ret < 0:
+    raise _DeferToTensorFlow()
+  return ret
+
+
+def _spatial_params(ctx, key, default=None):
+  """Returns (batch, height, width, channel) indices and the height and width
+  entries of a 4-element attribute such as "strides"."""
+  data_format = ctx.attr_str("data_format", "NHWC")
+  values = ctx.attr_ints(key, default)
+  if values is None or len(values) != 4:
+    raise _DeferToTensorFlow()
+  if data_format == "NHWC":
+    indices = (0, 1, 2, 3)
+  elif data_format == "NCHW":
+    indices = (0, 2, 3, 1)
+  else:
+    raise _DeferToTensorFlow()
+  return indices, values[indices[1]], values[indices[2]]
+
+
+def _rank4_dims(shape):
+  dims = _dims(shape)
+  if dims is None:
+    return [None] * 4
+  if len(dims) != 4:
+    raise _DeferToTensorFlow()
+  return dims
+
+
+def _assemble_nhwc(indices, n, h, w, c):
+  dims = [None] * 4
+  for index, value in zip(indices, (n, h, w, c)):
+    dims[index] = value
+  return tensor_shape.TensorShape(dims)
+
+
+def _padding(ctx):
+  padding = ctx.attr_str("padding")
+  if padding not in ("SAME", "VALID"):
+    raise _DeferToTensorFlow()
+  return padding
+
+
+_PASSTHROUGH_OP_TYPES = [
+  # Identity-like ops
+  "Identity", "StopGradient", "PreventGradient", "Snapshot", "CheckNumerics",
+  # Control flow passthroughs
+  "Exit", "NextIteration", "LoopCond",
+  # Elementwise unary ops
+  "Abs", "Ceil", "Elu", "Exp", "Floor", "Log", "Log1p", "LogicalNot",
+  "LogSoftmax", "Neg", "OnesLike", "Reciprocal", "Relu", "Relu6", "Round",
+  "Rsqrt", "Selu", "Sigmoid", "Sign", "Softmax", "Softplus", "Softsign", "Sqrt",
+  "Square", "Tanh", "ZerosLike",
+]
+
+_BROADCAST_OP_TYPES = [
+  "Add", "AddV2", "BiasAddV1", "Div", "DivNoNan", "FloorDiv", "FloorMod",
+  "Maximum", "Minimum", "Mul", "Pow", "RealDiv", "SquaredDifference", "Sub",
+  "TruncateDiv",
+]
+
+_COMPARISON_OP_TYPES = [
+  "Equal", "Greater", "GreaterEqual", "Less", "LessEqual", "LogicalAnd",
+  "LogicalOr", "NotEqual",
+]
+
+_REDUCTION_OP_TYPES = ["All", "Any", "Max", "Mean", "Min", "Prod", "Sum"]
+
+
+@register_shape_function(_PASSTHROUGH_OP_TYPES)
+def _passthrough_shape(ctx):
+  return [(ctx.input_dtype(0), ctx.input_shape(0))]
+
+
+@register_shape_function(_BROADCAST_OP_TYPES)
+def _broadcast_shape(ctx):
+  return [(ctx.input_dtype(0),
+           _broadcast_shapes(ctx.input_shape(0), ctx.input_shape(1)))]
+
+
+@register_shape_function(_COMPARISON_OP_TYPES)
+def _comparison_shape(ctx):
+  return [(dtypes.bool,
+           _broadcast_shapes(ctx.input_shape(0), ctx.input_shape(1)))]
+
+
+@register_shape_function("NoOp")
+def _no_op_shape(ctx):
+  return []
+
+
+@register_shape_function("Const")
+def _const_shape(ctx):
+  value = ctx.attr("value")
+  if value is None:
+    raise _DeferToTensorFlow()
+  return [(ctx.attr_type("dtype"),
+           tensor_shape.TensorShape(value.tensor.tensor_shape))]
+
+
+@register_shape_function(["Placeholder", "PlaceholderWithDefault"])
+def _placeholder_shape(ctx):
+  return [(ctx.attr_type("dtype"), ctx.attr_shape("shape", _UNKNOWN_SHAPE))]
+
+
+@register_shape_function("Cast")
+def _cast_shape(ctx):
+  return [(ctx.attr_type("DstT"), ctx.input_shape(0))]
+
+
+@register_shape_function("Shape")
+def _shape_shape(ctx):
+  return [(ctx.attr_type("out_type", dtypes.int32),
+           tensor_shape.TensorShape([ctx.input_shape(0).ndims]))]
+
+
+@register_shape_function("Size")
+def _size_shape(ctx):
+  return [(ctx.attr_type("out_type", dtypes.int32),
+           tensor_shape.TensorShape([]))]
+
+
+@register_shape_function("Rank")
+def _rank_shape(ctx):
+  return [(dtypes.int32, tensor_shape.TensorShape([]))]
+
+
+@register_shape_function("Enter")
+def _enter_shape(ctx):
+  # TensorFlow only passes the shape of loop-invariant tensors into the frame.
+  if ctx.attr_bool("is_constant", False):
+    return [(ctx.input_dtype(0), ctx.input_shape(0))]
+  return [(ctx.input_dtype(0), _UNKNOWN_SHAPE)]
+
+
+@register_shape_function("Switch")
+def _switch_shape(ctx):
+  return [(ctx.input_dtype(0), ctx.input_shape(0))] * 2
+
+
+@register_shape_function("Merge")
+def _merge_shape(ctx):
+  dims = _dims(ctx.input_shape(0))
+  for i in range(1, ctx.num_inputs):
+    other = _dims(ctx.input_shape(i))
+    if dims is None or other is None or len(dims) != len(other):
+      dims = None
+      break
+    dims = [d if d == o else None for d, o in zip(dims, other)]
+  return [(ctx.input_dtype(0), tensor_shape.TensorShape(dims)),
+          (dtypes.int32, tensor_shape.TensorShape([]))]
+
+
+@register_shape_function("BiasAdd")
+def _bias_add_shape(ctx):
+  dims = _dims(ctx.input_shape(0))
+  if dims is None:
+    return [(ctx.input_dtype(0), _UNKNOWN_SHAPE)]
+  bias_dims = _dims(ctx.input_shape(1))
+  bias_dim = None if bias_dims is None or len(bias_dims) != 1 else bias_dims[0]
+  if ctx.attr_str("data_format", "NHWC") == "NHWC":
+    channel_index = len(dims) - 1
+  elif len(dims) >= 3:
+    channel_index = len(dims) - 3
+  else:
+    raise _DeferToTensorFlow()
+  dims[channel_index] = _merge_dim(dims[channel_index], bias_dim)
+  return [(ctx.input_dtype(0), tensor_shape.TensorShape(dims))]
+
+
+@register_shape_function("MatMul")
+def _mat_mul_shape(ctx):
+  a = _dims(ctx.input_shape(0))
+  b = _dims(ctx.input_shape(1))
+  if (a is not None and len(a) != 2) or (b is not None and len(b) != 2):
+    raise _DeferToTensorFlow()
+  if a is None:
+    a = [None, None]
+  if b is None:
+    b = [None, None]
+  m = a[1] if ctx.attr_bool("transpose_a", False) else a[0]
+  n = b[0] if ctx.attr_bool("transpose_b", False) else b[1]
+  return [(ctx.input_dtype(0), tensor_shape.TensorShape([m, n]))]
+
+
+@register_shape_function(["BatchMatMul", "BatchMatMulV2", "BatchMatMulV3"])
+def _batch_mat_mul_shape(ctx):
+  dtype = ctx.attr_type("Tout", ctx.input_dtype(0))
+  a, b = ctx.input_shape(0), ctx.input_shape(1)
+  if a.ndims is None or b.ndims is None:
+    return [(dtype, _UNKNOWN_SHAPE)]
+  if a.ndims < 2 or b.ndims < 2:
+    raise _DeferToTensorFlow()
+  if ctx.op_type == "BatchMatMul":
+    if a.ndims != b.ndims:
+      raise _DeferToTensorFlow()
+    batch = [_merge_dim(x, y) for x, y in zip(a.as_list()[:-2],
+                                              b.as_list()[:-2])]
+  else:
+    batch = _broadcast_shapes(a[:-2], b[:-2]).as_list()
+  a, b = a.as_list(), b.as_list()
+  m = a[-1] if ctx.attr_bool("adj_x", False) else a[-2]
+  n = b[-2] if ctx.attr_bool("adj_y", False) else b[-1]
+  return [(dtype, tensor_shape.TensorShape(batch + [m, n]))]
+
+
+@register_shape_function(["Conv2D", "DepthwiseConv2dNative"])
+def _conv_2d_shape(ctx):
+  indices, stride_h, stride_w = _spatial_params(ctx, "strides")
+  _, dilation_h, dilation_w = _spatial_params(ctx, "dilations", [1, 1, 1, 1])
+  padding = _padding(ctx)
+  in_dims = _rank4_dims(ctx.input_shape(0))
+  filter_h, filter_w, filter_in, filter_out = _rank4_dims(ctx.input_shape(1))
+  n, h, w, c = [in_dims[i] for i in indices]
+  if ctx.op_type == "Conv2D":
+    out_c = filter_out
+  else:
+    in_c = c if c is not None else filter_in
+    out_c = None if in_c is None or filter_out is None else in_c * filter_out
+  out_h = _window_output_dim(h, filter_h, stride_h, dilation_h, padding)
+  out_w = _window_output_dim(w, filter_w, stride_w, dilation_w, padding)
+  return [(ctx.input_dtype(0),
+           _assemble_nhwc(indices, n, out_h, out_w, out_c))]
+
+
+@register_shape_function(["AvgPool", "MaxPool"])
+def _pool_shape(ctx):
+  indices, stride_h, stride_w = _spatial_params(ctx, "strides")
+  _, window_h, window_w = _spatial_params(ctx, "ksize")
+  padding = _padding(ctx)
+  in_dims = _rank4_dims(ctx.input_shape(0))
+  n, h, w, c = [in_dims[i] for i in indices]
+  out_h = _window_output_dim(h, window_h, stride_h, 1, padding)
+  out_w = _window_output_dim(w, window_w, stride_w, 1, padding)
+  return [(ctx.input_dtype(0), _assemble_nhwc(indices, n, out_h, out_w, c))]
+
+
+@register_shape_function("Reshape")
+def _reshape_shape(ctx):
+  target = [int(d) for d in _const_input(ctx, 1).flatten()]
+  if target.count(-1) > 1:
+    raise _DeferToTensorFlow()
+  if -1 in target:
+    # TensorFlow can sometimes resolve the -1 from partially-known inputs.
+    in_shape = ctx.input_shape(0)
+    if not in_shape.is_fully_defined():
+      raise _DeferToTensorFlow()
+    known = int(np.prod([d for d in target if d != -1]))
+    num_elements = in_shape.num_elements()
+    if known == 0 or num_elements % known != 0:
+      raise _DeferToTensorFlow()
+    target[target.index(-1)] = num_elements // known
+  return [(ctx.input_dtype(0), tensor_shape.TensorShape(target))]
+
+
+@register_shape_function("Transpose")
+def _transpose_shape(ctx):
+  perm = [int(p) for p in _const_input(ctx, 1).flatten()]
+  dims = _dims(ctx.input_shape(0))
+  if dims is None:
+    dims = [None] * len(perm)
+  if len(dims) != len(perm) or sorted(perm) != list(range(len(perm))):
+    raise _DeferToTensorFlow()
+  return [(ctx.input_dtype(0),
+           tensor_shape.TensorShape([dims[p] for p in perm]))]
+
+
+@register_shape_function(["Concat", "ConcatV2"])
+def _concat_shape(ctx):
+  if ctx.op_type == "Concat":
+    axis_index, value_indices = 0, range(1, ctx.num_inputs)
+  else:
+    axis_index, value_indices = ctx.num_inputs - 1, range(ctx.num_inputs - 1)
+  axis = int(_const_input(ctx, axis_index))
+  shapes = [_dims(ctx.input_shape(i)) for i in value_indices]
+  ranks = set(len(s) for s in shapes if s is not None)
+  if len(ranks) == 0:
+    return [(ctx.input_dtype(value_indices[0]), _UNKNOWN_SHAPE)]
+  if len(ranks) > 1:
+    raise _DeferToTensorFlow()
+  rank = ranks.pop()
+  axis = _normalize_axis(axis, rank)
+  dims = [None] * rank
+  axis_dim = 0
+  for s in shapes:
+    if s is None:
+      axis_dim = None
+      continue
+    for i in range(rank):
+      if i != axis:
+        dims[i] = _merge_dim(dims[i], s[i])
+    axis_dim = None if axis_dim is None or s[axis] is None \
+      else axis_dim + s[axis]
+  dims[axis] = axis_dim
+  return [(ctx.input_dtype(value_indices[0]),
+           tensor_shape.TensorShape(dims))]
+
+
+@register_shape_function("Pack")
+def _pack_shape(ctx):
+  dims = None
+  for i in range(ctx.num_inputs):
+    other = _dims(ctx.input_shape(i))
+    if other is None:
+      continue
+    if dims is None:
+      dims = other
+    elif len(dims) != len(other):
+      raise _DeferToTensorFlow()
+    else:
+      dims = [_merge_dim(d, o) for d, o in zip(dims, other)]
+  if dims is None:
+    return [(ctx.input_dtype(0), _UNKNOWN_SHAPE)]
+  axis = _normalize_axis(ctx.attr_int("axis", 0), len(dims) + 1)
+  dims.insert(axis, ctx.num_inputs)
+  return [(ctx.input_dtype(0), tensor_shape.TensorShape(dims))]
+
+
+@register_shape_function("Split")
+def _split_shape(ctx):
+  num_split = ctx.attr_int("num_split")
+  axis = int(_const_input(ctx, 0))
+  dims = _dims(ctx.input_shape(1))
+  if dims is not None:
+    axis = _normalize_axis(axis, len(dims))
+    if dims[axis] is not None:
+      if dims[axis] % num_split != 0:
+        raise _DeferToTensorFlow()
+      dims[axis] //= num_split
+  return [(ctx.input_dtype(1), tensor_shape.TensorShape(dims))] * num_split
+
+
+@register_shape_function(_REDUCTION_OP_TYPES)
+def _reduction_shape(ctx):
+  axes = [int(a) for a in _const_input(ctx, 1).flatten()]
+  dims = _dims(ctx.input_shape(0))
+  if dims is None:
+    return [(ctx.input_dtype(0), _UNKNOWN_SHAPE)]
+  axes = set(_normalize_axis(a, len(dims)) for a in axes)
+  if ctx.attr_bool("keep_dims", False):
+    dims = [1 if i in axes else d for i, d in enumerate(dims)]
+  else:
+    dims = [d for i, d in enumerate(dims) if i not in axes]
+  return [(ctx.input_dtype(0), tensor_shape.TensorShape(dims))]
+
+
+@register_shape_function(["ArgMax", "ArgMin"])
+def _arg_max_shape(ctx):
+  dtype = ctx.attr_type("output_type", dtypes.int64)
+  axis = int(_const_input(ctx, 1))
+  dims = _dims(ctx.input_shape(0))
+  if dims is None:
+    return [(dtype, _UNKNOWN_SHAPE)]
+  del dims[_normalize_axis(axis, len(dims))]
+  return [(dtype, tensor_shape.TensorShape(dims))]
+
+
+@register_shape_function(["Gather", "GatherV2"])
+def _gather_shape(ctx):
+  if ctx.op_type == "Gather":
+    axis, batch_dims = 0, 0
+  else:
+    axis = int(_const_input(ctx, 2))
+    batch_dims = ctx.attr_int("batch_dims", 0)
+  params = _dims(ctx.input_shape(0))
+  indices = _dims(ctx.input_shape(1))
+  if params is None or indices is None:
+    return [(ctx.input_dtype(0), _UNKNOWN_SHAPE)]
+  axis = _normalize_axis(axis, len(params))
+  if batch_dims < 0 or batch_dims > axis or batch_dims > len(indices):
+    raise _DeferToTensorFlow()
+  dims = params[:axis] + indices[batch_dims:] + params[axis + 1:]
+  return [(ctx.input_dtype(0), tensor_shape.TensorShape(dims))]
+
+
+@register_shape_function("ExpandDims")
+def _expand_dims_shape(ctx):
+  axis = _const_input(ctx, 1).flatten()
+  if len(axis) != 1:
+    raise _DeferToTensorFlow()
+  dims = _dims(ctx.input_shape(0))
+  if dims is None:
+    return [(ctx.input_dtype(0), _UNKNOWN_SHAPE)]
+  dims.insert(_normalize_axis(axis[0], len(dims) + 1), 1)
+  return [(ctx.input_dtype(0), tensor_shape.TensorShape(dims))]
+
+
+@register_shape_function("Squeeze")
+def _squeeze_shape(ctx):
+  dims = _dims(ctx.input_shape(0))
+  if dims is None:
+    return [(ctx.input_dtype(0), _UNKNOWN_SHAPE)]
+  axes = ctx.attr_ints("squeeze_dims", [])
+  if len(axes) == 0:
+    if None in dims:
+      # Unknown dims might be 1.
+      return [(ctx.input_dtype(0), _UNKNOWN_SHAPE)]
+    dims = [d for d in dims if d != 1]
+  else:
+    axes = set(_normalize_axis(a, len(dims)) for a in axes)
+    if any(dims[a] not in (1, None) for a in axes):
+      raise _DeferToTensorFlow()
+    dims = [d for i, d in enumerate(dims) if i not in axes]
+  return [(ctx.input_dtype(0), tensor_shape.TensorShape(dims))]
@@ -22,10 +22,9 @@ from __future__ import print_function
 
 import copy
 import six
-from six import iteritems
 from six import StringIO
 
-from graph_def_editor import select, util
+from graph_def_editor import op_set, select, util
 
 __all__ = [
     "SubGraphView",
@@ -47,6 +46,15 @@ def _finalize_indices(list_of_index_or_t, ts):
   return [_finalize_index(index_or_t, ts) for index_or_t in list_of_index_or_t]
 
 
+def _first_indices(ts):
+  """Returns a dictionary from each element of `ts` to the index of its first
+  occurrence."""
+  ret = {}
+  for i, t in enumerate(ts):
+    ret.setdefault(t, i)
+  return ret
+
+
 def _check_within_range(mapping, n, repetition):
   """Check is the mapping is valid.
 
@@ -68,6 +76,51 @@ def _check_within_range(mapping, n, repetition):
     raise ValueError("Found repetition in mapping: {}".format(mapping))
 
 
+class _ViewOps(object):
+  """The ops of a subgraph view and facts derived from them.
+
+  Instances are never modified after construction, apart from filling in
+  the lazily computed fields, so they are shared by a view and all the
+  copies and remappings made from it.
+  """
+
+  def __init__(self, ops, ops_set=None):
+    self.ops = ops  # List[Node]
+    # frozenset, or gde.OpSet if the view was made from one
+    self.ops_set = frozenset(ops) if ops_set is None else ops_set
+    self._boundary = None  # Tuple[List[Tensor], List[Tensor]]
+    self._name_to_ops = None  # Dict[str, List[Node]]
+
+  def boundary(self):
+    """Returns the input and output tensors of the ops, as computed by
+    `select.compute_boundary_ts()`."""
+    if self._boundary is None:
+      inputs, outputs, _ = select.compute_boundary_ts(self.ops)
+      self._boundary = (inputs, outputs)
+    return self._boundary
+
+  def unconnected_ts(self, ts):
+    """Returns the elements of `ts` that are not connected to any of the
+    ops, that is, neither produced nor consumed by one of them."""
+    if not ts:
+      return []
+    input_ts = set()
+    for op in self.ops:
+      input_ts.update(op.inputs)
+    return [t for t in ts if t.node not in self.ops_set and t not in input_ts]
+
+  def name_to_ops(self):
+    """Returns a dictionary from op name to the ops with that name."""
+    if self._name_to_ops is None:
+      self._name_to_ops = {}
+      for op in self.ops:
+        self._name_to_ops.setdefault(op.name, []).append(op)
+    return self._name_to_ops
+
+
+_EMPTY_VIEW_OPS = _ViewOps([])
+
+
 class SubGraphView(object):
   """A subgraph view on an existing `tf.Graph`.
 
@@ -161,6 +214,11 @@ class SubGraphView(object):
   that the life time of subgraph views are kept very short. One way to achieve
   this is to use subgraphs within a "with make_sgv(...) as sgv:" Python context.
 
+  The input and output tensors of a view are computed from the graph the
+  first time they are needed, or when the view is copied or remapped, rather
+  than when the view is created. Creating a view is therefore cheap, and
+  edits that happen in between are reflected in the view.
+
   To alleviate the out-of-sync problem, some functions are granted the right to
   modified subgraph in place. This is typically the case of graph manipulation
   functions which, given some subgraphs as arguments, can modify the underlying
@@ -175,8 +233,8 @@ class SubGraphView(object):
     """Create a subgraph containing the given ops and the "passthrough" tensors.
 
     Args:
-      inside_ops: an object convertible to a list of `tf.Operation`. This list
-        defines all the operations in the subgraph.
+      inside_ops: an object convertible to a list of `tf.Operation`, such as
+        a `gde.OpSet`. This list defines all the operations in the subgraph.
       passthrough_ts: an object convertible to a list of `tf.Tensor`. This list
         define all the "passthrough" tensors. A passthrough tensor is a tensor
         which goes directly from the input of the subgraph to it output, without
@@ -187,29 +245,65 @@ class SubGraphView(object):
         or if `passthrough_ts` cannot be converted to a list of `tf.Tensor`.
     """
 
+    inside_op_set = inside_ops if isinstance(inside_ops, op_set.OpSet) \
+        else None
     inside_ops = util.make_list_of_op(inside_ops)
     passthrough_ts = util.make_list_of_t(passthrough_ts)
     ops_and_ts = inside_ops + passthrough_ts
     if ops_and_ts:
       self._graph = util.get_unique_graph(ops_and_ts)
-      self._ops = inside_ops
-
-      # Compute inside and outside tensor
-      inputs, outputs, insides = select.compute_boundary_ts(inside_ops)
-
-      # Compute passthrough tensors, silently ignoring the non-passthrough ones.
-      all_tensors = frozenset(inputs + outputs + list(insides))
-      self._passthrough_ts = [t for t in passthrough_ts if t not in all_tensors]
-
-      # Set inputs and outputs.
-      self._input_ts = inputs + self._passthrough_ts
-      self._output_ts = outputs + self._passthrough_ts
+      self._view_ops = _ViewOps(inside_ops, inside_op_set)
+      # Silently ignore the tensors that cannot be passthrough tensors.
+      self._passthrough_ts = self._view_ops.unconnected_ts(passthrough_ts)
     else:
       self._graph = None
+      self._view_ops = _EMPTY_VIEW_OPS
       self._passthrough_ts = []
-      self._input_ts = []
-      self._output_ts = []
-      self._ops = []
+    # Inputs and outputs are computed on first use; None stands for the
+    # default mapping.
+    self._input_ts_or_none = None
+    self._output_ts_or_none = None
+    # Lazily built (list, dictionary from tensor to index in list) pairs
+    self._input_index = None
+    self._output_index = None
+
+  # Views are used like immutable objects, and the lists and _ViewOps object
+  # that make up a view are never modified in place once assigned, so copies
+  # share them. Private methods that modify a view in place do so by
+  # assigning new objects to these properties.
+
+  @property
+  def _ops(self):
+    return self._view_ops.ops
+
+  @_ops.setter
+  def _ops(self, ops):
+    # Changing the ops does not change the inputs and outputs.
+    self._input_ts_or_none = self._input_ts
+    self._output_ts_or_none = self._output_ts
+    self._view_ops = _ViewOps(list(ops))
+
+  @property
+  def _input_ts(self):
+    if self._input_ts_or_none is None:
+      inputs, _ = self._view_ops.boundary()
+      self._input_ts_or_none = inputs + self._passthrough_ts
+    return self._input_ts_or_none
+
+  @_input_ts.setter
+  def _input_ts(self, ts):
+    self._input_ts_or_none = list(ts)
+
+  @property
+  def _output_ts(self):
+    if self._output_ts_or_none is None:
+      _, outputs = self._view_ops.boundary()
+      self._output_ts_or_none = outputs + self._passthrough_ts
+    return self._output_ts_or_none
+
+  @_output_ts.setter
+  def _output_ts(self, ts):
+    self._output_ts_or_none = list(ts)
 
   def __copy__(self):
     """Create a copy of this subgraph.
@@ -220,13 +314,13 @@ class SubGraphView(object):
     Returns:
       A new identical instance of the original subgraph view.
     """
+    # Compute the inputs and outputs now, so that the two views share them
+    # and agree even if the graph is edited before they are used.
+    self._input_ts  # pylint: disable=pointless-statement
+    self._output_ts  # pylint: disable=pointless-statement
     cls = self.__class__
     result = cls.__new__(cls)
-    for k, v in iteritems(self.__dict__):
-      if k == "_graph":
-        setattr(result, k, v)
-      else:
-        setattr(result, k, list(v))  # copy the list
+    result.__dict__.update(self.__dict__)
     return result
 
   def _assign_from(self, other):
@@ -241,13 +335,7 @@ class SubGraphView(object):
     """
     if not isinstance(other, SubGraphView):
       raise TypeError("Expected SubGraphView, got: {}".format(type(other)))
-    # pylint: disable=protected-access
-    self._graph = other._graph
-    self._ops = list(other._ops)
-    self._passthrough_ts = list(other._passthrough_ts)
-    self._input_ts = list(other._input_ts)
-    self._output_ts = list(other._output_ts)
-    # pylint: enable=protected-access
+    self.__dict__.update(other.__dict__)
 
   def copy(self):
     """Return a copy of itself.
@@ -270,12 +358,10 @@ class SubGraphView(object):
     if not remove_input_map and not remove_output_map:
       return
 
-    # Compute inside and outside tensor
-    inputs, outputs, _ = select.compute_boundary_ts(self._ops)
     if remove_input_map:
-      self._input_ts = list(inputs) + self._passthrough_ts
+      self._input_ts_or_none = None
     if remove_output_map:
-      self._output_ts = list(outputs) + self._passthrough_ts
+      self._output_ts_or_none = None
 
   def remap_default(self, remove_input_map=True, remove_output_map=True):
     """Remap the inputs and/or outputs to the default mapping.
@@ -307,17 +393,15 @@ class SubGraphView(object):
 
   def _remap_outputs_make_unique(self):
     """Remap the outputs in place so that all the tensors appears only once."""
-    output_ts = list(self._output_ts)
-    self._output_ts = []
-    util.concatenate_unique(self._output_ts, output_ts)
+    self._output_ts = util.concatenate_unique([], self._output_ts)
 
   def _remap_outputs_to_consumers(self):
     """Remap the outputs in place to match the number of consumers."""
     self._remap_outputs_make_unique()
-    output_ts = list(self._output_ts)
-    self._output_ts = []
-    for t in output_ts:
-      self._output_ts += [t] * len(t.consumers())
+    output_ts = []
+    for t in self._output_ts:
+      output_ts += [t] * len(t.consumers())
+    self._output_ts = output_ts
 
   def remap_outputs_make_unique(self):
     """Remap the outputs so that all the tensors appears only once."""
@@ -339,11 +423,11 @@ class SubGraphView(object):
     Returns:
       A new subgraph view which only contains used operations.
     """
-    ops = select.get_walks_union_ops(
+    ops = frozenset(select.get_walks_union_ops(
         self.connected_inputs,
         self.connected_outputs,
-        within_ops=self._ops,
-        control_inputs=control_inputs)
+        within_ops=self._view_ops.ops_set,
+        control_inputs=control_inputs))
     self._ops = [op for op in self._ops if op in ops]
 
   def remove_unused_ops(self, control_inputs=True):
@@ -443,7 +527,7 @@ class SubGraphView(object):
       ValueError: if the op_type could not be found.
       AssertionError: if the name was found multiple time.
     """
-    res = [op for op in self._ops if op.name == op_name]
+    res = self._view_ops.name_to_ops().get(op_name)
     if not res:
       raise ValueError("{} not in subgraph.".format(op_name))
     if len(res) > 1:
@@ -458,7 +542,7 @@ class SubGraphView(object):
       return op.name
 
     def tensor_name(t):
-      if t in self._passthrough_ts:
+      if self.is_passthrough(t):
         return "{} *".format(t.name)
       else:
         return t.name
@@ -496,7 +580,8 @@ class SubGraphView(object):
   @property
   def connected_inputs(self):
     """The connected input tensors of this subgraph view."""
-    return [t for t in self._input_ts if t not in self._passthrough_ts]
+    passthrough_ts = frozenset(self._passthrough_ts)
+    return [t for t in self._input_ts if t not in passthrough_ts]
 
   @property
   def outputs(self):
@@ -506,7 +591,8 @@ class SubGraphView(object):
   @property
   def connected_outputs(self):
     """The connected output tensors of this subgraph view."""
-    return [t for t in self._output_ts if t not in self._passthrough_ts]
+    passthrough_ts = frozenset(self._passthrough_ts)
+    return [t for t in self._output_ts if t not in passthrough_ts]
 
   @property
   def passthroughs(self):
@@ -558,12 +644,11 @@ class SubGraphView(object):
     Raises:
       Error: if t in not an input tensor.
     """
-    try:
-      subgraph_id = self._input_ts.index(t)
-    except:
-      raise ValueError("Can't find {} in inputs of subgraph {}.".format(
-          t.name, self.name))
-    return subgraph_id
+    if self._input_index is None or self._input_index[0] is not self._input_ts:
+      self._input_index = (self._input_ts, _first_indices(self._input_ts))
+    if t not in self._input_index[1]:
+      raise ValueError("Can't find {} in inputs of subgraph.".format(t.name))
+    return self._input_index[1][t]
 
   def output_index(self, t):
     """Find the output index corresponding to given output tensor t.
@@ -575,12 +660,12 @@ class SubGraphView(object):
     Raises:
       Error: if t in not an output tensor.
     """
-    try:
-      subgraph_id = self._output_ts.index(t)
-    except:
-      raise ValueError("Can't find {} in outputs of subgraph {}.".format(
-          t.name, self.name))
-    return subgraph_id
+    if self._output_index is None or \
+            self._output_index[0] is not self._output_ts:
+      self._output_index = (self._output_ts, _first_indices(self._output_ts))
+    if t not in self._output_index[1]:
+      raise ValueError("Can't find {} in outputs of subgraph.".format(t.name))
+    return self._output_index[1][t]
 
   def consumers(self):
     """Return a Python set of all the consumers of this subgraph view.
@@ -591,9 +676,9 @@ class SubGraphView(object):
     Returns:
       A list of `tf.Operation` which are the consumers of this subgraph view.
     """
-    ops_set = frozenset(self._ops)
+    ops_set = self._view_ops.ops_set
     res = []
-    for output in self._output_ts:
+    for output in util.concatenate_unique([], self._output_ts):
       consumers = [op for op in output.consumers() if op not in ops_set]
       util.concatenate_unique(res, consumers)
     return res
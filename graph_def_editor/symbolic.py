@@ -0,0 +1,678 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Symbolic tensor dimensions, for batch-size-agnostic graph analysis.
+
+A symbolic shape is a list with one entry per dimension. Each entry is an
+`int` for a dimension whose size is known, a `SymbolicDim` for a size that is
+an expression over named symbols such as "batch", or None for a size that is
+unknown. The rank of a symbolic shape is unknown if the shape itself is None.
+
+Symbols are attached to the outputs of nodes (usually placeholders) with
+`Graph.set_symbolic_shape()`, and `Graph.infer_symbolic_shapes()` carries them
+through the rest of the graph.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, \
+  Tuple, Union
+
+from graph_def_editor import inference_cache, node, shape_functions, tensor, \
+  tensor_shape
+
+
+__all__ = [
+  "SymbolicDim",
+  "SymbolicShapeContext",
+  "register_symbolic_shape_function",
+  "symbolic_num_elements",
+  "evaluate_symbolic_shape",
+]
+
+
+class SymbolicDim(object):
+  """
+  Immutable polynomial over named symbols with integer coefficients, used to
+  describe a tensor dimension whose size depends on symbols such as "batch"
+  or "seq_len".
+
+  Supports addition and multiplication with other `SymbolicDim` objects and
+  with ints, as well as exact division by ints and monomials.
+  """
+
+  def __init__(self, terms: Dict[Tuple[str], int] = None):
+    """
+    Most code should use `SymbolicDim.symbol()` and arithmetic operators
+    instead of calling this constructor directly.
+
+    Args:
+      terms: Map from monomial (sorted tuple of symbol names, with repeats
+        for powers; the empty tuple is the constant term) to its coefficient.
+    """
+    self._terms = {m: c for m, c in (terms or {}).items() if c != 0}
+
+  @staticmethod
+  def symbol(name: str) -> 'SymbolicDim':
+    """Returns a `SymbolicDim` consisting of a single named symbol."""
+    return SymbolicDim({(name,): 1})
+
+  @staticmethod
+  def constant(value: int) -> 'SymbolicDim':
+    return SymbolicDim({tuple(): int(value)})
+
+  @property
+  def symbols(self) -> FrozenSet[str]:
+    """Names of all the symbols that this expression depends on."""
+    return frozenset(s for m in self._terms for s in m)
+
+  @property
+  def is_constant(self) -> bool:
+    return all(len(m) == 0 for m in self._terms)
+
+  def evaluate(self, bindings: Dict[str, int]) -> int:
+    """
+    Compute the value of this expression for particular symbol values.
+
+    Args:
+      bindings: Map from symbol name to value. Must cover every symbol in
+        `self.symbols`.
+
+    Returns:
+      The value of the expression as an int.
+    """
+    ret = 0
+    for monomial, coefficient in self._terms.items():
+      value = coefficient
+      for s in monomial:
+        if s not in bindings:
+          raise ValueError("No value provided for symbol '{}'".format(s))
+        value *= bindings[s]
+      ret += value
+    return ret
+
+  def exact_div(self, divisor: Union[int, 'SymbolicDim']) -> \
+          Optional['SymbolicDim']:
+    """
+    Divide by an int or by a single-term `SymbolicDim` (such as `12` or
+    `3 * batch`).
+
+    Returns:
+      The quotient, or None if it is not a polynomial with integer
+      coefficients.
+    """
+    divisor = _as_symbolic(divisor)
+    if len(divisor._terms) != 1:
+      return None
+    (d_monomial, d_coefficient), = divisor._terms.items()
+    ret = {}
+    for monomial, coefficient in self._terms.items():
+      if coefficient % d_coefficient != 0:
+        return None
+      remaining = list(monomial)
+      for s in d_monomial:
+        if s not in remaining:
+          return None
+        remaining.remove(s)
+      ret[tuple(remaining)] = coefficient // d_coefficient
+    return SymbolicDim(ret)
+
+  def __add__(self, other):
+    other = _as_symbolic(other)
+    terms = dict(self._terms)
+    for monomial, coefficient in other._terms.items():
+      terms[monomial] = terms.get(monomial, 0) + coefficient
+    return SymbolicDim(terms)
+
+  __radd__ = __add__
+
+  def __mul__(self, other):
+    other = _as_symbolic(other)
+    terms = {}
+    for m1, c1 in self._terms.items():
+      for m2, c2 in other._terms.items():
+        monomial = tuple(sorted(m1 + m2))
+        terms[monomial] = terms.get(monomial, 0) + c1 * c2
+    return SymbolicDim(terms)
+
+  __rmul__ = __mul__
+
+  def __eq__(self, other):
+    if isinstance(other, int):
+      other = SymbolicDim.constant(other)
+    if not isinstance(other, SymbolicDim):
+      return NotImplemented
+    return self._terms == other._terms
+
+  def __ne__(self, other):
+    ret = self.__eq__(other)
+    return ret if ret is NotImplemented else not ret
+
+  def __hash__(self):
+    if self.is_constant:
+      return hash(self._terms.get(tuple(), 0))
+    return hash(frozenset(self._terms.items()))
+
+  def __str__(self):
+    if len(self._terms) == 0:
+      return "0"
+    parts = []
+    # Highest-degree terms first, constant term last
+    for monomial in sorted(self._terms, key=lambda m: (-len(m), m)):
+      coefficient = self._terms[monomial]
+      factors = list(monomial)
+      if coefficient != 1 or len(factors) == 0:
+        factors.insert(0, str(coefficient))
+      parts.append("*".join(factors))
+    return " + ".join(parts).replace("+ -", "- ")
+
+  def __repr__(self):
+    return "SymbolicDim({})".format(self)
+
+
+Dim = Union[int, SymbolicDim, None]
+SymbolicShape = Optional[List[Dim]]
+
+
+class SymbolicShapeContext(shape_functions.ShapeContext):
+  """
+  `ShapeContext` for symbolic shape functions. In addition to everything a
+  regular shape function can see, provides the symbolic shapes of the inputs
+  and the concrete (already inferred) shapes of the outputs.
+  """
+
+  def __init__(self, node_def, input_specs, input_symbolic_shapes,
+               output_shapes):
+    """
+    Do not call this constructor directly; GDE creates contexts as needed.
+    """
+    super(SymbolicShapeContext, self).__init__(node_def, input_specs)
+    self._input_symbolic_shapes = input_symbolic_shapes
+    self._output_shapes = output_shapes
+
+  def input_symbolic_shape(self, index: int) -> SymbolicShape:
+    """Returns a copy of the symbolic shape of the indicated input."""
+    ret = self._input_symbolic_shapes[index]
+    return None if ret is None else list(ret)
+
+  def output_shape(self, index: int) -> tensor_shape.TensorShape:
+    """Returns the concrete shape of the indicated output."""
+    return self._output_shapes[index]
+
+  @property
+  def num_outputs(self) -> int:
+    return len(self._output_shapes)
+
+
+SymbolicShapeFunction = Callable[[SymbolicShapeContext],
+                                 Optional[List[SymbolicShape]]]
+
+# Dict[str, SymbolicShapeFunction]; key is op type
+_symbolic_shape_functions = {}
+
+
+def register_symbolic_shape_function(op_types: Union[str, Iterable[str]],
+                                     fn: SymbolicShapeFunction = None):
+  """
+  Register a function that computes the symbolic shapes of the outputs of
+  one or more op types. Can also be used as a decorator, like
+  `gde.register_shape_function()`.
+
+  Ops without a symbolic shape function get the concrete shapes of their
+  outputs, so symbols do not propagate through them.
+
+  Args:
+    op_types: Op type string, or iterable of op type strings.
+    fn: Function that takes a `SymbolicShapeContext` and returns a list of
+      symbolic shapes, one per output, or None to use the concrete shapes.
+      If None, this function returns a decorator.
+
+  Returns:
+    `fn`, or a decorator if `fn` is None.
+  """
+  if isinstance(op_types, str):
+    op_types = [op_types]
+  op_types = list(op_types)
+
+  def decorator(f):
+    for op_type in op_types:
+      _symbolic_shape_functions[op_type] = f
+    return f
+
+  if fn is None:
+    return decorator
+  return decorator(fn)
+
+
+def symbolic_num_elements(shape: SymbolicShape) -> Dim:
+  """
+  Returns the number of elements of a tensor with the indicated symbolic
+  shape, as an int or `SymbolicDim`, or None if it is not known. For
+  example, multiplying the result by `t.dtype.size` gives a memory estimate
+  for tensor `t` as a function of the batch size.
+  """
+  if shape is None:
+    return None
+  return _dim_product(shape)
+
+
+def evaluate_symbolic_shape(shape: SymbolicShape,
+                            bindings: Dict[str, int]
+                            ) -> tensor_shape.TensorShape:
+  """
+  Substitute values for symbols in a symbolic shape.
+
+  Args:
+    shape: Symbolic shape, for example the `symbolic_shape` property of a
+      `gde.Tensor`.
+    bindings: Map from symbol name to value.
+
+  Returns:
+    A `tensor_shape.TensorShape`.
+  """
+  if shape is None:
+    return tensor_shape.TensorShape(None)
+  return tensor_shape.TensorShape(
+    [d.evaluate(bindings) if isinstance(d, SymbolicDim) else d
+     for d in shape])
+
+
+def normalize_symbolic_shape(dims: Iterable[Union[int, str, SymbolicDim,
+                                                  None]]) -> SymbolicShape:
+  """
+  Convert a user-provided list of dimensions, in which strings stand for
+  symbols, into canonical form.
+  """
+  if dims is None:
+    return None
+  return [_simplify(SymbolicDim.symbol(d) if isinstance(d, str) else d)
+          for d in dims]
+
+
+def infer_symbolic_shapes(nodes: Iterable['node.Node'],
+                          input_shapes: Dict[tensor.Tensor, SymbolicShape]):
+  """
+  Compute the symbolic shapes of the outputs of all the indicated nodes and
+  store them in the corresponding `gde.Tensor` objects.
+
+  Nodes are visited in topological order; nodes that are only reachable
+  through cycles (i.e. while loops) are visited afterwards in graph order.
+
+  Args:
+    nodes: All the nodes of the graph.
+    input_shapes: Symbolic shapes provided by the user, by tensor.
+  """
+  nodes = list(nodes)
+  num_pending = {}
+  consumers = collections.defaultdict(list)
+  for n in nodes:
+    num_pending[n] = len(n.inputs)
+    for t in n.inputs:
+      consumers[t.node].append(n)
+    for t in n.outputs:
+      t._symbolic_shape = None  # pylint: disable=protected-access
+
+  ready = collections.deque(n for n in nodes if num_pending[n] == 0)
+  visited = set()
+  while len(ready) > 0:
+    n = ready.popleft()
+    visited.add(n)
+    _infer_node(n, input_shapes)
+    for consumer in consumers[n]:
+      num_pending[consumer] -= 1
+      if num_pending[consumer] == 0:
+        ready.append(consumer)
+  for n in sorted(nodes, key=lambda n: n.id_in_graph):
+    if n not in visited:
+      _infer_node(n, input_shapes)
+
+
+################################################################################
+# Stuff below this line is private to this file.
+
+
+def _as_symbolic(value):
+  if isinstance(value, SymbolicDim):
+    return value
+  if isinstance(value, int):
+    return SymbolicDim.constant(value)
+  raise TypeError("Expected int or SymbolicDim, got {}".format(type(value)))
+
+
+def _simplify(d):
+  """Canonical form of a dimension: constant expressions become ints."""
+  if isinstance(d, SymbolicDim) and d.is_constant:
+    return d.evaluate({})
+  return d
+
+
+def _dim_add(a, b):
+  if a is None or b is None:
+    return None
+  return _simplify(_as_symbolic(a) + b)
+
+
+def _dim_product(dims):
+  ret = 1
+  for d in dims:
+    if d is None:
+      return None
+    ret = _simplify(_as_symbolic(ret) * d)
+  return ret
+
+
+def _dim_div(a, b):
+  if a is None or b is None:
+    return None
+  ret = _as_symbolic(a).exact_div(b)
+  return None if ret is None else _simplify(ret)
+
+
+def _is_symbolic(shape):
+  return shape is not None and any(isinstance(d, SymbolicDim) for d in shape)
+
+
+def _reconcile(symbolic_shape, shape):
+  """
+  Combine a computed symbolic shape with the concrete shape that shape
+  inference produced for the same tensor. Known concrete sizes always win.
+
+  Returns:
+    The combined symbolic shape, or None if it carries no information beyond
+    the concrete shape.
+  """
+  if symbolic_shape is None or shape.ndims is None or \
+          len(symbolic_shape) != shape.ndims:
+    return None
+  ret = [c if c is not None else _simplify(s)
+         for s, c in zip(symbolic_shape, shape.as_list())]
+  return ret if _is_symbolic(ret) else None
+
+
+def _infer_node(n, input_shapes):
+  """Compute and store the symbolic shapes of the outputs of one node."""
+  user_shapes = [input_shapes.get(t) for t in n.outputs]
+  if any(s is not None for s in user_shapes):
+    for t, s in zip(n.outputs, user_shapes):
+      t._symbolic_shape = _reconcile(s, t.shape)  # pylint: disable=W0212
+    return
+  input_symbolic_shapes = [t.symbolic_shape for t in n.inputs]
+  if not any(_is_symbolic(s) for s in input_symbolic_shapes):
+    return  # Nothing symbolic to propagate
+  fn = _symbolic_shape_functions.get(n.op_type)
+  if fn is None:
+    return
+  ctx = SymbolicShapeContext(n.to_node_def(),
+                             inference_cache.node_input_specs(n),
+                             input_symbolic_shapes,
+                             [t.shape for t in n.outputs])
+  try:
+    result = fn(ctx)
+  except _DeferToConcrete:
+    return
+  if result is None:
+    return
+  for t, s in zip(n.outputs, result):
+    t._symbolic_shape = _reconcile(s, t.shape)  # pylint: disable=W0212
+
+
+class _DeferToConcrete(Exception):
+  """
+  Raised by the helpers below when a symbolic answer is not available.
+  """
+  pass
+
+
+def _const_input(ctx, index):
+  value = ctx.input_value(index)
+  if value is None:
+    raise _DeferToConcrete()
+  return [int(v) for v in value.flatten()]
+
+
+def _normalize_axis(axis, rank):
+  if axis < -rank or axis >= rank:
+    raise _DeferToConcrete()
+  return axis + rank if axis < 0 else axis
+
+
+def _input_dims(ctx, index):
+  dims = ctx.input_symbolic_shape(index)
+  if dims is None:
+    raise _DeferToConcrete()
+  return dims
+
+
+def _broadcast_dims(x, y):
+  """Broadcasting over symbolic dims. Symbols are assumed to be greater than
+  1, and known sizes win over symbols."""
+  rank = max(len(x), len(y))
+  x = [1] * (rank - len(x)) + x
+  y = [1] * (rank - len(y)) + y
+  ret = []
+  for dx, dy in zip(x, y):
+    if dx == 1 or dx is None:
+      ret.append(dy if dx == 1 or isinstance(dy, SymbolicDim) else None)
+    elif dy == 1 or dy is None:
+      ret.append(dx)
+    elif isinstance(dx, int):
+      ret.append(dx)
+    elif isinstance(dy, int) or dx == dy:
+      ret.append(dy)
+    else:
+      ret.append(None)
+  return ret
+
+
+_PASSTHROUGH_OP_TYPES = [
+  "Abs", "BiasAdd", "Cast", "Ceil", "CheckNumerics", "Elu", "Exit", "Exp",
+  "Floor", "Identity", "Log", "Log1p", "LogicalNot", "LogSoftmax", "Neg",
+  "NextIteration", "OnesLike", "PreventGradient", "Reciprocal", "Relu",
+  "Relu6", "Round", "Rsqrt", "Selu", "Sigmoid", "Sign", "Snapshot", "Softmax",
+  "Softplus", "Softsign", "Sqrt", "Square", "StopGradient", "Tanh",
+  "ZerosLike",
+]
+
+_BROADCAST_OP_TYPES = [
+  "Add", "AddV2", "Div", "DivNoNan", "Equal", "FloorDiv", "FloorMod",
+  "Greater", "GreaterEqual", "Less", "LessEqual", "LogicalAnd", "LogicalOr",
+  "Maximum", "Minimum", "Mul", "NotEqual", "Pow", "RealDiv",
+  "SquaredDifference", "Sub", "TruncateDiv",
+]
+
+_REDUCTION_OP_TYPES = ["All", "Any", "Max", "Mean", "Min", "Prod", "Sum"]
+
+
+@register_symbolic_shape_function(_PASSTHROUGH_OP_TYPES)
+def _passthrough(ctx):
+  return [ctx.input_symbolic_shape(0)]
+
+
+@register_symbolic_shape_function("Enter")
+def _enter(ctx):
+  if ctx.attr_bool("is_constant", False):
+    return [ctx.input_symbolic_shape(0)]
+  return None
+
+
+@register_symbolic_shape_function("Switch")
+def _switch(ctx):
+  return [ctx.input_symbolic_shape(0)] * 2
+
+
+@register_symbolic_shape_function(_BROADCAST_OP_TYPES)
+def _broadcast(ctx):
+  return [_broadcast_dims(_input_dims(ctx, 0), _input_dims(ctx, 1))]
+
+
+@register_symbolic_shape_function("MatMul")
+def _mat_mul(ctx):
+  a, b = _input_dims(ctx, 0), _input_dims(ctx, 1)
+  m = a[1] if ctx.attr_bool("transpose_a", False) else a[0]
+  n = b[0] if ctx.attr_bool("transpose_b", False) else b[1]
+  return [[m, n]]
+
+
+@register_symbolic_shape_function(["BatchMatMul", "BatchMatMulV2",
+                                   "BatchMatMulV3"])
+def _batch_mat_mul(ctx):
+  a, b = _input_dims(ctx, 0), _input_dims(ctx, 1)
+  m = a[-1] if ctx.attr_bool("adj_x", False) else a[-2]
+  n = b[-2] if ctx.attr_bool("adj_y", False) else b[-1]
+  return [_broadcast_dims(a[:-2], b[:-2]) + [m, n]]
+
+
+@register_symbolic_shape_function(["AvgPool", "Conv2D",
+                                   "DepthwiseConv2dNative", "MaxPool"])
+def _conv_or_pool(ctx):
+  # Batch passes through; spatial dims only stay symbolic for stride 1.
+  in_dims = _input_dims(ctx, 0)
+  out_shape = ctx.output_shape(0)
+  if len(in_dims) != 4 or out_shape.ndims != 4:
+    raise _DeferToConcrete()
+  if ctx.attr_str("data_format", "NHWC") == "NHWC":
+    spatial = (1, 2)
+  else:
+    spatial = (2, 3)
+  out_dims = out_shape.as_list()
+  out_dims[0] = in_dims[0]
+  strides = ctx.attr_ints("strides")
+  if ctx.op_type in ("AvgPool", "MaxPool"):
+    windows = [ctx.attr_ints("ksize")[i] for i in spatial]
+    dilations = [1, 1]
+  else:
+    filter_shape = ctx.input_shape(1)
+    windows = [filter_shape[i] if filter_shape.ndims == 4 else None
+               for i in (0, 1)]
+    dilations = [ctx.attr_ints("dilations", [1, 1, 1, 1])[i]
+                 for i in spatial]
+  padding = ctx.attr_str("padding")
+  for i, window, dilation in zip(spatial, windows, dilations):
+    if strides[i] != 1:
+      continue
+    if padding == "SAME":
+      out_dims[i] = in_dims[i]
+    elif padding == "VALID" and window is not None:
+      out_dims[i] = _dim_add(in_dims[i], 1 - ((window - 1) * dilation + 1))
+  return [out_dims]
+
+
+@register_symbolic_shape_function("Reshape")
+def _reshape(ctx):
+  target = _const_input(ctx, 1)
+  if target.count(-1) != 1:
+    return [target]
+  in_dims = _input_dims(ctx, 0)
+  known = 1
+  for d in target:
+    if d != -1:
+      known *= d
+  ret = list(target)
+  ret[target.index(-1)] = None if known == 0 \
+    else _dim_div(_dim_product(in_dims), known)
+  return [ret]
+
+
+@register_symbolic_shape_function("Transpose")
+def _transpose(ctx):
+  perm = _const_input(ctx, 1)
+  dims = _input_dims(ctx, 0)
+  if sorted(perm) != list(range(len(dims))):
+    raise _DeferToConcrete()
+  return [[dims[p] for p in perm]]
+
+
+@register_symbolic_shape_function(["Concat", "ConcatV2"])
+def _concat(ctx):
+  if ctx.op_type == "Concat":
+    axis_index, value_indices = 0, range(1, ctx.num_inputs)
+  else:
+    axis_index, value_indices = ctx.num_inputs - 1, range(ctx.num_inputs - 1)
+  shapes = [_input_dims(ctx, i) for i in value_indices]
+  rank = len(shapes[0])
+  axis = _normalize_axis(_const_input(ctx, axis_index)[0], rank)
+  ret = []
+  for i in range(rank):
+    if i == axis:
+      total = 0
+      for s in shapes:
+        total = _dim_add(total, s[i])
+      ret.append(total)
+    else:
+      ret.append(next((s[i] for s in shapes if s[i] is not None), None))
+  return [ret]
+
+
+@register_symbolic_shape_function("Pack")
+def _pack(ctx):
+  dims = _input_dims(ctx, 0)
+  dims.insert(_normalize_axis(ctx.attr_int("axis", 0), len(dims) + 1),
+              ctx.num_inputs)
+  return [dims]
+
+
+@register_symbolic_shape_function("Split")
+def _split(ctx):
+  num_split = ctx.attr_int("num_split")
+  dims = _input_dims(ctx, 1)
+  axis = _normalize_axis(_const_input(ctx, 0)[0], len(dims))
+  dims[axis] = _dim_div(dims[axis], num_split)
+  return [dims] * num_split
+
+
+@register_symbolic_shape_function(_REDUCTION_OP_TYPES)
+def _reduction(ctx):
+  dims = _input_dims(ctx, 0)
+  axes = set(_normalize_axis(a, len(dims)) for a in _const_input(ctx, 1))
+  if ctx.attr_bool("keep_dims", False):
+    return [[1 if i in axes else d for i, d in enumerate(dims)]]
+  return [[d for i, d in enumerate(dims) if i not in axes]]
+
+
+@register_symbolic_shape_function(["ArgMax", "ArgMin"])
+def _arg_max(ctx):
+  dims = _input_dims(ctx, 0)
+  del dims[_normalize_axis(_const_input(ctx, 1)[0], len(dims))]
+  return [dims]
+
+
+@register_symbolic_shape_function(["Gather", "GatherV2"])
+def _gather(ctx):
+  params, indices = _input_dims(ctx, 0), _input_dims(ctx, 1)
+  if ctx.op_type == "Gather":
+    axis, batch_dims = 0, 0
+  else:
+    axis = _normalize_axis(_const_input(ctx, 2)[0], len(params))
+    batch_dims = ctx.attr_int("batch_dims", 0)
+  return [params[:axis] + indices[batch_dims:] + params[axis + 1:]]
+
+
+@register_symbolic_shape_function("ExpandDims")
+def _expand_dims(ctx):
+  dims = _input_dims(ctx, 0)
+  dims.insert(_normalize_axis(_const_input(ctx, 1)[0], len(dims) + 1), 1)
+  return [dims]
+
+
+@register_symbolic_shape_function("Squeeze")
+def _squeeze(ctx):
+  dims = _input_dims(ctx, 0)
+  axes = ctx.attr_ints("squeeze_dims", [])
+  if len(axes) == 0:
+    raise _DeferToConcrete()
+  axes = set(_normalize_axis(a, len(dims)) for a in axes)
+  return [[d for i, d in enumerate(dims) if i not in axes]]
@@ -13,7 +13,7 @@
 # limitations under the License.
 # ==============================================================================
 
-import tensorflow as tf
+from graph_def_editor import dtypes, tensor_shape
 
 __all__ = [
   "Tensor",
@@ -26,7 +26,8 @@ class Tensor(object):
   a tf.Tensor in the TensorFlow Python API, though serialized TensorFlow graphs
   do not contain any separate objects that represent tensors.
   """
-  def __init__(self, node, index, dtype: tf.DType, shape: tf.shape):
+  def __init__(self, node, index, dtype: dtypes.DType,
+               shape: tensor_shape.TensorShape):
     """
     Args:
       node: gde.Node object that represents the graph node that produces this
@@ -39,6 +40,9 @@ class Tensor(object):
     self._index = index
     self._dtype = dtype
     self._shape = shape
+    # Symbolic shape computed by Graph.infer_symbolic_shapes(), or None if
+    # the tensor has no symbolic dimensions.
+    self._symbolic_shape = None
 
   def __str__(self):
     return "Tensor '{}' (dtype {}, shape {})".format(self.name, self.dtype,
@@ -67,13 +71,30 @@ class Tensor(object):
     return self._index
 
   @property
-  def dtype(self) -> tf.DType:
+  def dtype(self) -> dtypes.DType:
     return self._dtype
 
   @property
-  def shape(self):
+  def shape(self) -> tensor_shape.TensorShape:
     return self._shape
 
+  @property
+  def symbolic_shape(self):
+    """
+    Shape of the tensor as a list with one entry per dimension: an int if the
+    size of the dimension is known, a `gde.SymbolicDim` if it is an expression
+    over named symbols, or None if it is unknown. None if the rank is unknown.
+
+    Symbolic dimensions are only present after a call to
+    `Graph.infer_symbolic_shapes()`; other tensors report their concrete
+    shape in this format.
+    """
+    if self._symbolic_shape is not None:
+      return list(self._symbolic_shape)
+    if self._shape.ndims is None:
+      return None
+    return self._shape.as_list()
+
   @property
   def graph(self):
     """Returns the `gde.Graph` object representing the graph in which the
@@ -83,14 +104,9 @@ class Tensor(object):
   def consumers(self):
     """Returns the `gde.Node` objects representing the ops that consume the
     tensor that this object represents."""
-    # TODO: Maintain a lookup table of graph edges.
-    # For now we do linear search for correctness.
-    ret = []
-    for n in self.graph.nodes:
-      if self in n.inputs:
-        ret.append(n)
-
-    return ret
+    candidates = sorted(self.graph.node_consumers(self.node),
+                        key=lambda n: n.id_in_graph)
+    return [n for n in candidates if self in n.inputs]
 
   @property
   def name(self):
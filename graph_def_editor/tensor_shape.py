@@ -0,0 +1,237 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Lightweight stand-in for `tf.TensorShape` that does not require TensorFlow.
+
+`TensorShape` objects compare equal to `tf.TensorShape` objects and lists
+with the same dimensions.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from typing import List, Optional
+
+from graph_def_editor.protos import tensor_shape_pb2
+
+
+__all__ = [
+  "TensorShape",
+]
+
+
+class TensorShape(object):
+  """
+  Immutable, possibly partially-known shape of a tensor. Corresponds to
+  `tf.TensorShape` with TensorFlow 2.x dimension semantics (dimensions are
+  ints or None), and supports the subset of its API that GDE needs.
+  """
+
+  def __init__(self, dims=None):
+    """
+    Args:
+      dims: None for a shape of unknown rank; an iterable of ints and Nones;
+        a single int for a vector shape; a `TensorShapeProto`; or a
+        `TensorShape` or `tf.TensorShape`.
+    """
+    if dims is None:
+      self._dims = None
+    elif hasattr(dims, "unknown_rank") and hasattr(dims, "dim"):
+      # TensorShapeProto
+      if dims.unknown_rank:
+        self._dims = None
+      else:
+        self._dims = tuple(None if d.size == -1 else int(d.size)
+                           for d in dims.dim)
+    elif hasattr(dims, "ndims") and hasattr(dims, "as_list"):
+      # TensorShape or tf.TensorShape
+      self._dims = None if dims.ndims is None else tuple(dims.as_list())
+    elif isinstance(dims, int):
+      self._dims = (_as_dimension(dims),)
+    else:
+      self._dims = tuple(_as_dimension(d) for d in dims)
+
+  @property
+  def ndims(self) -> Optional[int]:
+    """Number of dimensions, or None if the rank is unknown."""
+    return None if self._dims is None else len(self._dims)
+
+  @property
+  def rank(self) -> Optional[int]:
+    """Alias for `ndims`."""
+    return self.ndims
+
+  @property
+  def dims(self) -> Optional[List[Optional[int]]]:
+    """Sizes of the dimensions as a list of ints and Nones, or None if the
+    rank is unknown."""
+    return None if self._dims is None else list(self._dims)
+
+  def as_list(self) -> List[Optional[int]]:
+    """
+    Returns the sizes of the dimensions as a list of ints and Nones.
+
+    Raises:
+      ValueError if the rank is unknown.
+    """
+    if self._dims is None:
+      raise ValueError("as_list() is not defined on an unknown TensorShape.")
+    return list(self._dims)
+
+  def as_proto(self) -> tensor_shape_pb2.TensorShapeProto:
+    """Returns this shape as a `TensorShapeProto`."""
+    if self._dims is None:
+      return tensor_shape_pb2.TensorShapeProto(unknown_rank=True)
+    return tensor_shape_pb2.TensorShapeProto(dim=[
+      tensor_shape_pb2.TensorShapeProto.Dim(size=-1 if d is None else d)
+      for d in self._dims])
+
+  def is_fully_defined(self) -> bool:
+    return self._dims is not None and all(d is not None for d in self._dims)
+
+  def num_elements(self) -> Optional[int]:
+    """Returns the total number of elements, or None if the shape is not
+    fully defined."""
+    if not self.is_fully_defined():
+      return None
+    ret = 1
+    for d in self._dims:
+      ret *= d
+    return ret
+
+  def is_compatible_with(self, other) -> bool:
+    """Returns True if `other` could describe the same tensor as `self`."""
+    other = as_shape(other)
+    if self._dims is None or other._dims is None:
+      return True
+    if len(self._dims) != len(other._dims):
+      return False
+    return all(a is None or b is None or a == b
+               for a, b in zip(self._dims, other._dims))
+
+  def merge_with(self, other) -> 'TensorShape':
+    """
+    Returns a shape combining the information in `self` and `other`.
+
+    Raises:
+      ValueError if the shapes are not compatible.
+    """
+    other = as_shape(other)
+    if not self.is_compatible_with(other):
+      raise ValueError("Shapes {} and {} are not compatible".format(self,
+                                                                     other))
+    if self._dims is None:
+      return other
+    if other._dims is None:
+      return self
+    return TensorShape([a if a is not None else b
+                        for a, b in zip(self._dims, other._dims)])
+
+  def concatenate(self, other) -> 'TensorShape':
+    """Returns the concatenation of the dimensions of `self` and `other`."""
+    other = as_shape(other)
+    if self._dims is None or other._dims is None:
+      return TensorShape(None)
+    return TensorShape(self._dims + other._dims)
+
+  def __add__(self, other):
+    return self.concatenate(other)
+
+  def __radd__(self, other):
+    return as_shape(other).concatenate(self)
+
+  def __len__(self):
+    if self._dims is None:
+      raise ValueError("Cannot take the length of shape with unknown rank.")
+    return len(self._dims)
+
+  def __iter__(self):
+    if self._dims is None:
+      raise ValueError("Cannot iterate over a shape with unknown rank.")
+    return iter(self._dims)
+
+  def __getitem__(self, key):
+    if self._dims is None:
+      if isinstance(key, slice):
+        return TensorShape(None)
+      return None
+    if isinstance(key, slice):
+      return TensorShape(self._dims[key])
+    return self._dims[key]
+
+  def __bool__(self):
+    return self._dims is not None
+
+  __nonzero__ = __bool__
+
+  def __eq__(self, other):
+    try:
+      other = as_shape(other)
+    except (TypeError, ValueError):
+      return NotImplemented
+    return self._dims == other._dims
+
+  def __ne__(self, other):
+    ret = self.__eq__(other)
+    return ret if ret is NotImplemented else not ret
+
+  def __hash__(self):
+    return hash(self._dims)
+
+  def __str__(self):
+    if self._dims is None:
+      return "<unknown>"
+    if len(self._dims) == 1:
+      return "({},)".format(self._dims[0])
+    return "({})".format(", ".join(str(d) for d in self._dims))
+
+  def __repr__(self):
+    if self._dims is None:
+      return "TensorShape(None)"
+    return "TensorShape({})".format(list(self._dims))
+
+  def __reduce__(self):
+    return TensorShape, (self.dims,)
+
+
+def as_shape(shape) -> TensorShape:
+  """Converts `shape` to a `TensorShape`, if it is not one already."""
+  if isinstance(shape, TensorShape):
+    return shape
+  return TensorShape(shape)
+
+
+def unknown_shape() -> TensorShape:
+  """Returns a `TensorShape` of unknown rank."""
+  return TensorShape(None)
+
+
+################################################################################
+# Stuff below this line is private to this file.
+
+
+def _as_dimension(d):
+  if d is None:
+    return None
+  if hasattr(d, "value"):
+    # tf.compat.v1.Dimension
+    d = d.value
+    if d is None:
+      return None
+  ret = int(d)
+  if ret != d or ret < 0:
+    raise ValueError("Dimension {} must be a nonnegative integer or "
+                     "None".format(d))
+  return ret
@@ -0,0 +1,153 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Conversion between numpy arrays and `TensorProto` messages, without
+TensorFlow. Counterparts of `tf.make_ndarray()` and `tf.make_tensor_proto()`.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import sys
+from typing import Any
+
+from graph_def_editor import dtypes, tensor_shape
+from graph_def_editor.protos import tensor_pb2, types_pb2
+
+
+def make_ndarray(tensor_proto: tensor_pb2.TensorProto) -> np.ndarray:
+  """
+  Convert a `TensorProto` to a numpy array.
+
+  Args:
+    tensor_proto: `TensorProto` message, for example the "value" attribute of
+      a `Const` node.
+
+  Returns:
+    A numpy array with the same dtype, shape and contents as the tensor.
+
+  Raises:
+    TypeError if numpy cannot represent the tensor's dtype.
+  """
+  shape = [d.size for d in tensor_proto.tensor_shape.dim]
+  num_elements = int(np.prod(shape, dtype=np.int64))
+  dtype = dtypes.as_dtype(tensor_proto.dtype)
+  np_dtype = dtype.as_numpy_dtype
+  if np_dtype is None:
+    raise TypeError("Cannot convert a tensor of type {} to a numpy "
+                    "array".format(dtype.name))
+
+  if tensor_proto.tensor_content:
+    ret = np.frombuffer(tensor_proto.tensor_content, dtype=np_dtype).copy()
+    if sys.byteorder == "big":
+      ret.byteswap(inplace=True)  # Serialized tensors are little-endian
+    return ret.reshape(shape)
+
+  if dtype.base_dtype == dtypes.string:
+    values = np.array(list(tensor_proto.string_val), dtype=object)
+  elif dtype.base_dtype in (dtypes.float16, dtypes.bfloat16):
+    # Stored as the bit patterns of the values
+    values = np.array(tensor_proto.half_val, dtype=np.uint16).view(np_dtype)
+  elif dtype.base_dtype in (dtypes.complex64, dtypes.complex128):
+    field = tensor_proto.scomplex_val if dtype.base_dtype == dtypes.complex64 \
+      else tensor_proto.dcomplex_val
+    pairs = np.array(field, dtype=np.float64)
+    values = (pairs[0::2] + 1j * pairs[1::2]).astype(np_dtype)
+  else:
+    field_name = _VALUE_FIELDS.get(dtype.base_dtype.as_datatype_enum)
+    if field_name is None:
+      raise TypeError("Unsupported tensor type {}".format(dtype.name))
+    values = np.array(getattr(tensor_proto, field_name))
+    if dtype.is_quantized:
+      values = values.astype(np_dtype[0]).view(np_dtype)
+    else:
+      values = values.astype(np_dtype)
+
+  if values.size == 0:
+    return np.zeros(shape, dtype=np_dtype)
+  if values.size < num_elements:
+    # Trailing elements repeat the last value that was stored.
+    values = np.concatenate(
+      [values, np.repeat(values[-1:], num_elements - values.size)])
+  return values.reshape(shape)
+
+
+def make_tensor_proto(values: Any, dtype=None) -> tensor_pb2.TensorProto:
+  """
+  Convert a numpy array or a value that numpy can convert to an array into a
+  `TensorProto`.
+
+  Args:
+    values: numpy array, Python scalar, or nested list of scalars.
+    dtype: Optional data type of the result, as anything that
+      `gde.dtypes.as_dtype()` accepts. If None, the type is derived from
+      `values`.
+
+  Returns:
+    A `TensorProto` message.
+  """
+  if dtype is not None:
+    dtype = dtypes.as_dtype(dtype)
+    if dtype.base_dtype == dtypes.string:
+      nparray = np.array(values, dtype=object)
+    else:
+      nparray = np.asarray(values, dtype=dtype.as_numpy_dtype)
+  else:
+    nparray = np.asarray(values)
+    dtype = dtypes.as_dtype(nparray.dtype)
+  ret = tensor_pb2.TensorProto(
+    dtype=dtype.as_datatype_enum,
+    tensor_shape=tensor_shape.TensorShape(nparray.shape).as_proto())
+  if dtype.base_dtype == dtypes.string:
+    ret.string_val.extend([_as_bytes(v) for v in nparray.flat])
+  else:
+    nparray = nparray.astype(dtype.as_numpy_dtype, copy=False)
+    if sys.byteorder == "big":
+      nparray = nparray.byteswap()  # Serialized tensors are little-endian
+    ret.tensor_content = nparray.tobytes()
+  return ret
+
+
+################################################################################
+# Stuff below this line is private to this file.
+
+
+# Fields of TensorProto that hold values of different types, keyed by
+# DataType enum
+_VALUE_FIELDS = {
+  types_pb2.DT_FLOAT: "float_val",
+  types_pb2.DT_DOUBLE: "double_val",
+  types_pb2.DT_INT32: "int_val",
+  types_pb2.DT_UINT8: "int_val",
+  types_pb2.DT_INT16: "int_val",
+  types_pb2.DT_INT8: "int_val",
+  types_pb2.DT_UINT16: "int_val",
+  types_pb2.DT_QINT8: "int_val",
+  types_pb2.DT_QUINT8: "int_val",
+  types_pb2.DT_QINT16: "int_val",
+  types_pb2.DT_QUINT16: "int_val",
+  types_pb2.DT_QINT32: "int_val",
+  types_pb2.DT_INT64: "int64_val",
+  types_pb2.DT_UINT32: "uint32_val",
+  types_pb2.DT_UINT64: "uint64_val",
+  types_pb2.DT_BOOL: "bool_val",
+}
+
+
+def _as_bytes(value):
+  if isinstance(value, bytes):
+    return value
+  return str(value).encode("utf-8")
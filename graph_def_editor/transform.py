@@ -21,16 +21,19 @@ from __future__ import division
 from __future__ import print_function
 
 from functools import partial
+import heapq
+import logging
 from six import iteritems
 from six import iterkeys
 from six import string_types
 from six import StringIO
-import tensorflow as tf
 from typing import Iterable
 
-from graph_def_editor import select, subgraph, util
+from graph_def_editor import dtypes, inference_cache, protos, select, \
+  subgraph, tensor_shape, util
 from graph_def_editor.node import Node
 from graph_def_editor.graph import Graph
+from graph_def_editor.protos import attr_value_pb2
 from graph_def_editor.tensor import Tensor
 
 
@@ -44,6 +47,7 @@ __all__ = [
     "TransformerInfo",
     "copy",
     "copy_with_input_replacements",
+    "replicate",
     "graph_replace",
 ]
 
@@ -56,6 +60,11 @@ _COLOCATION_ATTR_NAME = "_class"
 # group names.
 _COLOCATION_PREFIX = "loc:@"
 
+# Attribute of "Enter" nodes that holds the name of their control flow frame.
+_FRAME_NAME_ATTR = "frame_name"
+
+_logger = logging.getLogger(__name__)
+
 def replace_t_with_placeholder_handler(info, t):
   """Transform a tensor into a placeholder tensor.
 
@@ -68,7 +77,11 @@ def replace_t_with_placeholder_handler(info, t):
   Returns:
     The tensor generated by the newly created place holder.
   """
-  return util.make_placeholder_from_tensor(info.graph_, t, scope=info.scope_)
+  t_ = util.make_placeholder_from_tensor(info.graph_, t,
+                                         scope=info.scope_).output(0)
+  # The placeholder stands in for `t`, so it is assumed to carry its value.
+  info.same_value_ts[t_] = t
+  return t_
 
 
 def keep_t_if_possible_handler(info, t):
@@ -172,10 +185,10 @@ def copy_op_handler(info, op: Node, new_inputs: Iterable[Tensor],
       raise ValueError("Invalid colocation group info '{}'".format(cg_attr))
     cg_attr_list = cg_attr.list.s
     for i in range(len(cg_attr_list)):
-      old_cg_str = tf.compat.as_str(cg_attr_list[i])
+      old_cg_str = util.as_str(cg_attr_list[i])
       old_node_name = old_cg_str[len(_COLOCATION_PREFIX):]
       new_node_name = info.new_name(old_node_name)
-      cg_attr_list[i] = tf.compat.as_bytes(_COLOCATION_PREFIX + new_node_name)
+      cg_attr_list[i] = util.as_bytes(_COLOCATION_PREFIX + new_node_name)
 
   # Mutate NodeDef if requested:
   if nodedef_fn is not None:
@@ -187,10 +200,16 @@ def copy_op_handler(info, op: Node, new_inputs: Iterable[Tensor],
   # set of inputs.
   op_.set_inputs(new_inputs)
   # Output type and shape information is not stored in the NodeDef.
-  if copy_shape_and_dtype:
+  # If nothing that could affect inference has changed, the original op's
+  # output metadata is still valid.
+  if copy_shape_and_dtype or (nodedef_fn is None and
+                              _same_input_specs(op, op_,
+                                                info.same_value_ts)):
     op_.set_outputs_from_pairs([(t.dtype, t.shape) for t in op.outputs])
   else:
-    op_.infer_outputs()
+    info.shape_inference.infer_outputs(op_)
+  if nodedef_fn is None:
+    _record_same_values(op, op_, info.same_value_ts)
 
   return op_, op_.outputs
 
@@ -342,14 +361,21 @@ class _TmpInfo(object):
                             for key in self.graph.get_all_collection_keys())
     self.cyclic_ops = []
     self.transform_original_op_handler = transform_op_if_inside_handler
-    # The graph is transformed op by op, in the same order the original ops
-    # were created. However, this is sometimes not possible due to cycles
-    # (i.e. while loops). So when the transformer creates a new op whose
-    # inputs do not exist yet, temporary placeholders are created and stored
-    # in this `tmp_cyclic_ts` container. During a second pass,
-    # those temporary tensors are replaced by the proper transformed tensors
-    # (see the function `_finalize_cycles`).
+    # The graph is transformed op by op, in topological order. However, this
+    # is not possible along cycles (i.e. while loops). So when the
+    # transformer creates a new op whose inputs do not exist yet, temporary
+    # tensors are used instead and stored in this `tmp_cyclic_ts` container.
+    # During a second pass, those temporary tensors are replaced by the
+    # proper transformed tensors (see the function `_finalize_cycles`).
     self.tmp_cyclic_ts = []
+    # Placeholders created to serve as temporary tensors; removed from the
+    # destination graph once the cycles are reconnected.
+    self.tmp_placeholders = []
+    # Shared scratch graph for inferring the outputs of the copied ops.
+    self.shape_inference = _ScratchShapeInference()
+    # Maps tensors of the destination graph to the tensors of the source
+    # graph whose values they are known to carry (see _same_input_specs).
+    self.same_value_ts = {}
 
   def new_name(self, name):
     """Compute a destination name from a source name.
@@ -462,8 +488,7 @@ class Transformer(object):
 
   def _copy_ops(self, info):
     """Copy ops without connecting them."""
-    sorted_ops = sorted(info.sgv.ops, key=lambda n: n.id_in_graph)
-    for op in sorted_ops:
+    for op in _topological_order(info.sgv.ops):
       new_inputs = [self._transformed_t(info, t, op) for t in op.inputs]
       op_, op_outputs_ = self.transform_op_handler(info, op, new_inputs)
       if op is op_:
@@ -491,11 +516,14 @@ class Transformer(object):
       consumer_op_ = info.transformed_ops[consumer_op]
       t_index_ = list(consumer_op_.inputs).index(tmp_t_)
       consumer_op_.replace_input(t_index_, t_)
+    for tmp_t_ in info.tmp_placeholders:
+      if not info.graph_.node_consumers(tmp_t_.node):
+        info.graph_.remove_node(tmp_t_.node)
 
   def _connect_control_inputs(self, info):
     """Connect the previously copied ops."""
     for op in info.sgv.ops:
-      tf.logging.debug("Connecting control inputs of op: %s", op.name)
+      _logger.debug("Connecting control inputs of op: %s", op.name)
       op_ = info.transformed_ops[op]
 
       # Finalize control inputs:
@@ -557,7 +585,7 @@ class Transformer(object):
     elif t.node in info.ops:
       # `t` is an internal tensor but is not transformed yet because it
       # belongs to a graph cycle.
-      tf.logging.debug("Cyclic tensor: t.name = %s", t.name)
+      _logger.debug("Cyclic tensor: t.name = %s", t.name)
       # Try to find an existing tensor we can use for now,
       # otherwise create one. We'll rewire this later.
       if consumer_op.op_type == "Merge":
@@ -569,8 +597,10 @@ class Transformer(object):
       else:
         tmp_t_ = util.make_placeholder_from_tensor(info.graph_, t,
                                                    scope=info.scope_,
-                                                   prefix="geph_tmp")
-        tf.logging.debug("Created temporary placeholder: %s.", tmp_t_.name)
+                                                   prefix="geph_tmp").output(0)
+        _logger.debug("Created temporary placeholder: %s.", tmp_t_.name)
+        info.tmp_placeholders.append(tmp_t_)
+        info.same_value_ts[tmp_t_] = t
       # Register as temporary and return.
       info.tmp_cyclic_ts.append((t, tmp_t_, consumer_op))
       return tmp_t_
@@ -664,6 +694,452 @@ def copy_with_input_replacements(sgv, replacement_ts,
       sgv, dst_graph, dst_scope, src_scope, reuse_dst_scope=reuse_dst_scope)
 
 
+def replicate(sgv, n, scope_fn=None, input_bindings=None, dst_graph=None,
+              src_scope="", reuse_dst_scope=False):
+  """Make several copies of a subgraph, for example one per tower of a
+  data-parallel model or one per member of an ensemble.
+
+  Equivalent to calling `copy()` (if `input_bindings` is None) or
+  `copy_with_input_replacements()` `n` times, but much faster: the subgraph
+  is analyzed once, and each copy is then stamped out by renaming nodes and
+  rebinding inputs. Shapes and dtypes are copied from the original nodes
+  instead of being inferred again, unless a bound input differs in dtype or
+  shape from the tensor it replaces.
+
+  Beyond what `copy()` does, control flow frames that lie entirely inside
+  the subgraph get a distinct name in every copy, so that the copies of a
+  while loop do not share a frame at runtime.
+
+  Args:
+    sgv: the source subgraph-view. This argument is converted to a subgraph
+      using the same rules as the function subgraph.make_view.
+    n: Number of copies to make.
+    scope_fn: Function that maps the index of a copy (from 0 to n-1) to its
+      destination scope. Defaults to "replica_<index>". As in `copy()`,
+      scopes that are already in use are made unique unless
+      `reuse_dst_scope` is True.
+    input_bindings: Optional replacements for the inputs of the subgraph,
+      either as a list of `n` dictionaries or as a function that maps the
+      index of a copy to a dictionary. Each dictionary maps tensors in
+      `sgv.inputs` to tensors in the destination graph, in the same way as
+      the `replacement_ts` argument of `copy_with_input_replacements()`.
+      If None, every copy receives new placeholders for its inputs, as in
+      `copy()`.
+    dst_graph: the destination graph. Defaults to the graph of `sgv`.
+    src_scope: the source scope.
+    reuse_dst_scope: if True the scopes that `scope_fn` returns are re-used
+      if they already exist.
+  Returns:
+    A tuple `(sgvs, infos)` of two lists of length `n`, where:
+      `sgvs[i]` is the subgraph view of the i-th copy. Its inputs and
+      outputs correspond one-to-one to those of `sgv`;
+      `infos[i]` is an instance of TransformerInfo mapping between
+      original and copied tensors and operations.
+  Raises:
+    TypeError: if `dst_graph` is not a `gde.Graph`.
+    ValueError: if `n` is negative or `input_bindings` does not have `n`
+      elements.
+  """
+  sgv = subgraph.make_view(sgv)
+  if dst_graph is None:
+    dst_graph = sgv.graph
+  if not isinstance(dst_graph, Graph):
+    raise TypeError("Expected a gde.Graph, got: {}".format(type(dst_graph)))
+  if n < 0:
+    raise ValueError("Number of copies must be nonnegative, got "
+                     "{}".format(n))
+  if scope_fn is None:
+    scope_fn = "replica_{}".format
+  if input_bindings is not None and not callable(input_bindings):
+    input_bindings = list(input_bindings)
+    if len(input_bindings) != n:
+      raise ValueError("Expected {} sets of input bindings, got {}".format(
+          n, len(input_bindings)))
+
+  template = _ReplicationTemplate(sgv, util.scope_finalize(src_scope))
+  sgvs = []
+  infos = []
+  for i in range(n):
+    dst_scope = util.scope_finalize(scope_fn(i))
+    if dst_scope and not reuse_dst_scope:
+      dst_scope = util.scope_finalize(dst_graph.unique_name(dst_scope[:-1]))
+    if input_bindings is None:
+      bindings = None
+    elif callable(input_bindings):
+      bindings = input_bindings(i)
+    else:
+      bindings = input_bindings[i]
+    sgv_, info = template.stamp(dst_graph, dst_scope, bindings)
+    sgvs.append(sgv_)
+    infos.append(info)
+  return sgvs, infos
+
+
+def _same_input_specs(op, op_, same_value_ts):
+  """Returns True if two nodes have inputs with identical dtypes and shapes,
+  and integer inputs that are known to have identical values.
+
+  Integer inputs, such as the shape of a Reshape or the axes of a Sum, can
+  determine the output shapes through their values. They only count as
+  identical if they carry the same value (see `_same_value()`), or if both
+  are outputs of placeholders, whose values are unknown to shape inference,
+  following the same rules as the signatures of the inference cache.
+
+  Args:
+    op: the original node.
+    op_: the copied node.
+    same_value_ts: dictionary from tensors of the copy to the original
+      tensors whose values they carry.
+  """
+  if len(op.inputs) != len(op_.inputs) or not op.outputs:
+    return False
+  # pylint: disable=protected-access
+  for t, t_ in zip(op.inputs, op_.inputs):
+    if t.dtype != t_.dtype:
+      return False
+    shape, shape_ = t.shape, t_.shape
+    if shape.ndims is None or shape_.ndims is None:
+      if shape.ndims != shape_.ndims:
+        return False
+    elif shape.as_list() != shape_.as_list():
+      return False
+    if t.dtype.base_dtype not in inference_cache._VALUE_SENSITIVE_DTYPES or \
+            _same_value(t, t_, same_value_ts):
+      continue
+    if t.node.op_type not in inference_cache._OPAQUE_VALUE_OP_TYPES or \
+            t_.node.op_type not in inference_cache._OPAQUE_VALUE_OP_TYPES:
+      return False
+  # pylint: enable=protected-access
+  return True
+
+
+def _same_value(t, t_, same_value_ts):
+  """Returns True if tensor `t_` is known to carry the same value as `t`:
+  it is `t` itself, it is recorded in `same_value_ts` as carrying the value
+  of `t`, or both are outputs of `Const` nodes with equal values."""
+  if t_ is t or same_value_ts.get(t_) is t:
+    return True
+  # pylint: disable=protected-access
+  if t.node.op_type not in inference_cache._CONST_OP_TYPES or \
+          t_.node.op_type not in inference_cache._CONST_OP_TYPES:
+    return False
+  # pylint: enable=protected-access
+  value = t.node.to_node_def().attr["value"]
+  value_ = t_.node.to_node_def().attr["value"]
+  return value.SerializeToString(deterministic=True) == \
+      value_.SerializeToString(deterministic=True)
+
+
+def _record_same_values(op, op_, same_value_ts):
+  """Record the outputs of the copy `op_` as carrying the values of the
+  outputs of `op` if all of their inputs carry the same values."""
+  if all(_same_value(t, t_, same_value_ts)
+         for t, t_ in zip(op.inputs, op_.inputs)):
+    same_value_ts.update(zip(op_.outputs, op.outputs))
+
+
+def _topological_order(ops):
+  """Order nodes so that each node comes after the producers of its data
+  inputs, except along cycles.
+
+  Among the nodes that are ready, the one with the lowest `id_in_graph` goes
+  first, so the result matches creation order whenever creation order is
+  already topological. If every remaining node is waiting on another
+  remaining node, the nodes form a cycle, and the order continues from a
+  node on the cycle; its pending inputs are the back edges of the cycle.
+  Loop-entry `Merge` nodes are preferred here, so that the back edges are
+  the `NextIteration` inputs of while loops.
+
+  Args:
+    ops: Iterable of `gde.Node`.
+
+  Returns:
+    List of the same nodes.
+  """
+  ops = sorted(ops, key=lambda n: n.id_in_graph)
+  op_set = frozenset(ops)
+  num_pending = {}
+  internal_consumers = {}
+  for op in ops:
+    producers = set(t.node for t in op.inputs if t.node in op_set)
+    num_pending[op] = len(producers)
+    for producer in producers:
+      internal_consumers.setdefault(producer, []).append(op)
+
+  ready = [(op.id_in_graph, op) for op in ops if num_pending[op] == 0]
+  heapq.heapify(ready)
+  ret = []
+  visited = set()
+  while len(ret) < len(ops):
+    if not ready:
+      # Only cycles remain. Break one at a Merge node with an input that is
+      # already available, if there is one.
+      remaining = [op for op in ops if op not in visited]
+      entry_merges = [op for op in remaining if op.op_type == "Merge" and any(
+          t.node not in op_set or t.node in visited for t in op.inputs)]
+      op = entry_merges[0] if entry_merges else remaining[0]
+      heapq.heappush(ready, (op.id_in_graph, op))
+    _, op = heapq.heappop(ready)
+    if op in visited:
+      continue
+    visited.add(op)
+    ret.append(op)
+    for consumer in internal_consumers.get(op, ()):
+      num_pending[consumer] -= 1
+      if num_pending[consumer] == 0 and consumer not in visited:
+        heapq.heappush(ready, (consumer.id_in_graph, consumer))
+  return ret
+
+
+class _ScratchShapeInference(object):
+  """Infers the outputs of many copied nodes using a single scratch graph.
+
+  `Node.infer_outputs()` builds a new `tf.Graph` for every call. When copying
+  a subgraph, the nodes arrive in topological order (except for the back edges
+  of cycles), so this class instead adds each node to one scratch graph,
+  wiring its inputs to the scratch counterparts of already-inferred nodes,
+  to copies of constants, and to placeholders for everything else. Python
+  shape functions and the inference cache are consulted first, as in
+  `Node.infer_outputs()`.
+  """
+
+  def __init__(self):
+    self._graph = None
+    # Maps gde.Tensor in the destination graph to tf.Tensor in self._graph.
+    self._scratch_ts = {}
+
+  def infer_outputs(self, n: Node):
+    """Equivalent to `n.infer_outputs()`, using the shared scratch graph."""
+    node_def = n.to_node_def()
+    pairs, signature = inference_cache.lookup_outputs(
+        node_def, inference_cache.node_input_specs(n))
+    if pairs is not None:
+      n.set_outputs_from_pairs(pairs)
+      return
+    import tensorflow as tf  # pylint: disable=g-import-not-at-top
+    if self._graph is None:
+      self._graph = tf.Graph()
+    with self._graph.as_default():
+      inputs = [self._scratch_t(t) for t in n.inputs]
+      node_def.name = self._graph.unique_name(node_def.name)
+      # Control inputs do not participate in inference.
+      del node_def.input[:]
+      dummy_op = tf.Operation(protos.to_tensorflow(node_def), self._graph,
+                              inputs=inputs)
+    pairs = [(dtypes.as_dtype(o.dtype), tensor_shape.TensorShape(o.shape))
+             for o in dummy_op.outputs]
+    n.set_outputs_from_pairs(pairs)
+    for t, o in zip(n.outputs, dummy_op.outputs):
+      self._scratch_ts[t] = o
+    if signature is not None:
+      inference_cache.get_inference_cache().put(signature, pairs)
+
+  def _scratch_t(self, t):
+    if t not in self._scratch_ts:
+      self._scratch_ts[t] = util.make_inference_input(t)
+    return self._scratch_ts[t]
+
+
+class _ReplicaInfo(object):
+  """Counterpart of `_TmpInfo` for one copy made by `replicate()`.
+
+  Provides the attributes that the default Transformer handlers and
+  `TransformerInfo` use, without the per-call analysis of the source graph
+  that `_TmpInfo` performs.
+  """
+
+  def __init__(self, sgv, dst_graph, dst_scope, src_scope, collections):
+    self.sgv = sgv
+    self.graph = sgv.graph
+    self.scope = src_scope
+    self.graph_ = dst_graph
+    self.scope_ = dst_scope
+    self.transformed_ops = {}
+    self.transformed_ts = {}
+    self.collections = collections
+    self.same_value_ts = {}
+
+  new_name = _TmpInfo.new_name
+
+
+class _ReplicationTemplate(object):
+  """Everything about a subgraph that `replicate()` needs to stamp out
+  copies of it, computed once.
+
+  Nodes are stored in the same order that `Transformer` copies them in.
+  Inputs of nodes are stored as `(node index, output index)` pairs for
+  tensors produced inside the subgraph, and as the original `Tensor`
+  otherwise; control inputs are stored likewise as node indices or `Node`
+  objects.
+  """
+
+  def __init__(self, sgv, src_scope):
+    self.sgv = sgv
+    self.graph = sgv.graph
+    self.scope = src_scope
+    self.ops = _topological_order(sgv.ops)
+    self.input_set = frozenset(sgv.inputs)
+    op_to_index = {op: i for i, op in enumerate(self.ops)}
+    info = _ReplicaInfo(sgv, self.graph, "", src_scope, None)
+    self.relative_names = [info.new_name(op.name) for op in self.ops]
+    self.frame_names = self._frames_to_rename(op_to_index)
+
+    self.attrs = []  # List[List[Tuple[str, Union[AttrValue, str]]]]
+    self.colocation_groups = []  # List[List[Union[int, str]]]
+    self.inputs = []  # List[List[Union[Tuple[int, int], Tensor]]]
+    self.control_inputs = []  # List[List[Union[int, Node]]]
+    self.output_pairs = []  # List[List[Tuple[DType, TensorShape]]]
+    for op in self.ops:
+      attrs = []
+      node_def = op.to_node_def()
+      for key in node_def.attr:
+        if key == _COLOCATION_ATTR_NAME:
+          continue  # Handled separately below
+        value = node_def.attr[key]
+        if key == _FRAME_NAME_ATTR and op.op_type == "Enter":
+          frame_name = util.as_str(value.s)
+          if frame_name in self.frame_names:
+            # Relative name; the destination scope is prepended per copy.
+            value = info.new_name(frame_name)
+        attrs.append((key, value))
+      self.attrs.append(attrs)
+      self.colocation_groups.append(
+          [op_to_index[self.graph[head]]
+           if self.graph.contains_node(head) and
+           self.graph[head] in op_to_index else head
+           for head in op.colocation_groups])
+      self.inputs.append(
+          [(op_to_index[t.node], t.value_index) if t.node in op_to_index
+           else t for t in op.inputs])
+      self.control_inputs.append(
+          [op_to_index.get(ci, ci) for ci in op.control_inputs])
+      self.output_pairs.append([(t.dtype, t.shape) for t in op.outputs])
+
+    # Collection memberships, as (original element, index of node) pairs.
+    # Graphs rarely have collections that contain nodes or tensors, so the
+    # collections handler is only called for elements that need it.
+    self.collections = dict((key, self.graph.get_collection(key))
+                            for key in self.graph.get_all_collection_keys())
+    self.collection_elems = []
+    for op in self.ops:
+      for elem in [op] + list(op.outputs):
+        if any(elem in c for c in self.collections.values()):
+          self.collection_elems.append(elem)
+
+  def _frames_to_rename(self, op_to_index):
+    """Returns the names of control flow frames whose nodes are all in the
+    subgraph."""
+    ret = set()
+    for op in self.ops:
+      if op.op_type != "Enter" or _FRAME_NAME_ATTR not in op.get_attr_keys():
+        continue
+      frame_name = util.as_str(op.get_attr(_FRAME_NAME_ATTR))
+      if frame_name in ret or not frame_name.startswith(self.scope):
+        continue
+      if all(n in op_to_index
+             for n in self.graph.frame_name_to_nodes(frame_name)):
+        ret.add(frame_name)
+    return ret
+
+  def stamp(self, dst_graph, dst_scope, bindings):
+    """Make one copy of the subgraph.
+
+    Args:
+      dst_graph: Graph to add the copy to.
+      dst_scope: Finalized scope for the names of the copied nodes.
+      bindings: Dictionary of input replacements, or None to replace the
+        inputs of the subgraph with placeholders.
+
+    Returns:
+      A tuple `(sgv, info)`, as described in `replicate()`.
+    """
+    info = _ReplicaInfo(self.sgv, dst_graph, dst_scope, self.scope,
+                        self.collections)
+    same_graph = dst_graph is self.graph
+    external_ts = {}  # Dict[Tensor, Tensor]; counterparts of outside tensors
+
+    def external_t(t):
+      if t not in external_ts:
+        if bindings is not None and t in bindings:
+          external_ts[t] = bindings[t]
+        elif bindings is None and t in self.input_set:
+          external_ts[t] = replace_t_with_placeholder_handler(info, t)
+        else:
+          external_ts[t] = keep_t_if_possible_handler(info, t)
+      return external_ts[t]
+
+    # Create placeholders for the inputs in order, so that their names do
+    # not depend on the order of the nodes.
+    for t in self.sgv.inputs:
+      external_t(t)
+
+    ops_ = []
+    for i, op in enumerate(self.ops):
+      op_ = dst_graph.add_node(
+          dst_graph.unique_name(dst_scope + self.relative_names[i]),
+          op.op_type)
+      op_.device = op.device
+      for key, value in self.attrs[i]:
+        if isinstance(value, str):
+          value_ = attr_value_pb2.AttrValue(s=util.as_bytes(dst_scope + value))
+        else:
+          value_ = attr_value_pb2.AttrValue()
+          value_.CopyFrom(value)
+        op_.add_attr(key, value_)
+      op_.set_outputs_from_pairs(self.output_pairs[i])
+      ops_.append(op_)
+      info.transformed_ops[op] = op_
+
+    # Connect the copies only after they all exist, so that cycles need no
+    # temporary placeholders.
+    for i, op_ in enumerate(ops_):
+      op_.set_inputs([ops_[ref[0]].output(ref[1]) if isinstance(ref, tuple)
+                      else external_t(ref) for ref in self.inputs[i]])
+      op_.set_control_inputs(
+          [ops_[ci] if isinstance(ci, int) else ci
+           for ci in self.control_inputs[i]
+           if isinstance(ci, int) or same_graph])
+      for head in self.colocation_groups[i]:
+        if isinstance(head, int):
+          op_.add_colocation_group(ops_[head].name, validate=False)
+        elif same_graph:
+          op_.add_colocation_group(head, validate=False)
+
+    rebound = any(not _same_value(t, t_, info.same_value_ts)
+                  for t, t_ in external_ts.items())
+    if rebound:
+      # Some inputs may have changed type, shape or value; redo inference
+      # where needed, visiting producers before consumers, as Transformer
+      # does.
+      shape_inference = _ScratchShapeInference()
+      for op, op_ in zip(self.ops, ops_):
+        if not _same_input_specs(op, op_, info.same_value_ts):
+          shape_inference.infer_outputs(op_)
+        _record_same_values(op, op_, info.same_value_ts)
+
+    for op, op_ in zip(self.ops, ops_):
+      info.transformed_ts.update(zip(op.outputs, op_.outputs))
+    for elem in self.collection_elems:
+      elem_ = info.transformed_ops[elem] if isinstance(elem, Node) \
+          else info.transformed_ts[elem]
+      assign_renamed_collections_handler(info, elem, elem_)
+    info.transformed_ts.update(external_ts)
+
+    def counterpart(t):
+      return info.transformed_ts[t] if t in info.transformed_ts \
+          else external_t(t)
+    sgv_ = subgraph.SubGraphView()
+    # pylint: disable=protected-access
+    sgv_._graph = dst_graph
+    sgv_._ops = ops_
+    sgv_._input_ts = [counterpart(t) for t in self.sgv.inputs]
+    sgv_._output_ts = [counterpart(t) for t in self.sgv.outputs]
+    sgv_._passthrough_ts = [counterpart(t)
+                            for t in self.sgv._passthrough_ts]
+    # pylint: enable=protected-access
+    return sgv_, TransformerInfo(info)
+
+
 def _add_control_flow_ops(ops, control_ios):
   """Complete `ops` so that the transformed graph is valid.
 
@@ -689,17 +1165,14 @@ def _add_control_flow_ops(ops, control_ios):
   for frame_name in frame_names:
     new_ops.update(g.frame_name_to_nodes(frame_name))
   # Add in any nodes that the target nodes expect to be collocated with.
-  num_before = -1  # Always execute while loop below at least once.
-  # Colocation groups may overlap. Repeat until we reach a fixed point.
-  all_ops = new_ops.union(set(ops))
-  while num_before != len(all_ops):
-    num_before = len(all_ops)
-    for group in g.colocation_groups.values():
-      if len(all_ops.intersection(group)) > 0:
-        all_ops.update(group)
+  # Colocation groups may overlap, so we need the full colocation component
+  # of every op, not just the groups that the ops belong to directly.
+  all_ops = g.colocation_closure(new_ops.union(ops))
   # Add any ops that weren't in the list before
-  for op in all_ops.difference(ops):
-    ops.append(op)
+  ops_set = set(ops)
+  for op in all_ops:
+    if op not in ops_set:
+      ops.append(op)
 
 
 def _flatten_tree(tree, leaves=None):
@@ -26,9 +26,10 @@ from typing import Any
 
 import numpy as np
 from six import iteritems
-import tensorflow as tf
 
-from graph_def_editor import graph, node, tensor
+from graph_def_editor import dtypes, graph, node, op_set, protos, tensor, \
+  tensor_shape, tensor_util
+from graph_def_editor.protos import attr_value_pb2
 
 
 __all__ = [
@@ -234,8 +235,8 @@ def make_list_of_op(ops, check_graph=True, allow_graph=True, ignore_ts=False):
   """Convert ops to a list of `gde.Node`.
 
   Args:
-    ops: can be an iterable of `gde.Node`, a `tf.Graph` or a single
-      Node.
+    ops: can be an iterable of `gde.Node` (including a `gde.OpSet`), a
+      `tf.Graph` or a single Node.
     check_graph: if `True` check if all the nodes belong to the same graph.
     allow_graph: if `False` a `gde.Graph` cannot be converted.
     ignore_ts: if True, silently ignore `tf.Tensor`.
@@ -251,6 +252,9 @@ def make_list_of_op(ops, check_graph=True, allow_graph=True, ignore_ts=False):
       return ops.nodes
     else:
       raise TypeError("allow_graph is False: cannot convert a tf.Graph.")
+  elif isinstance(ops, op_set.OpSet):
+    # Always from a single graph
+    return list(ops)
   else:
     if not is_iterable(ops):
       ops = [ops]
@@ -484,11 +488,39 @@ def make_placeholder_from_dtype_and_shape(g, dtype, shape=None, scope=None,
                           name=placeholder_name(scope=scope, prefix=prefix))
 
 
+def make_inference_input(t: tensor.Tensor):
+  """Create a stand-in for a `gde.Tensor` in the default `tf.Graph`, for use
+  as the input of a dummy op during shape inference.
+
+  Constants are copied so that shape functions can look at their values (for
+  example the target shape of a Reshape); anything else becomes a
+  placeholder with the same dtype and shape.
+
+  Args:
+    t: a `gde.Tensor`.
+  Returns:
+    A `tf.Tensor` in the current default graph.
+  """
+  import tensorflow as tf  # pylint: disable=g-import-not-at-top
+  if t.node.op_type == "Const":
+    tf_g = tf.get_default_graph()
+    node_def = t.node.to_node_def()
+    node_def.name = tf_g.unique_name(node_def.name)
+    del node_def.input[:]  # Drop control inputs
+    return tf.Operation(protos.to_tensorflow(node_def),
+                        tf_g).outputs[t.value_index]
+  return tf.placeholder(shape=None if t.shape.ndims is None
+                        else t.shape.as_list(),
+                        dtype=tf.as_dtype(t.dtype.as_datatype_enum),
+                        name=_DEFAULT_PLACEHOLDER_PREFIX)
+
+
 _INTERNAL_VARIABLE_RE = re.compile(r"^__\w+__$")
 
 
 def get_predefined_collection_names():
   """Return all the predefined collection names."""
+  import tensorflow as tf  # pylint: disable=g-import-not-at-top
   return [getattr(tf.GraphKeys, key) for key in dir(tf.GraphKeys)
           if not _INTERNAL_VARIABLE_RE.match(key)]
 
@@ -556,8 +588,29 @@ def find_corresponding(targets, dst_graph, dst_scope="", src_scope=""):
   return transform_tree(targets, func)
 
 
-def _python_type_to_attr_list_elem(list_value: tf.AttrValue.ListValue,
-                                   elem: Any):
+def as_bytes(s) -> bytes:
+  """Converts a `str` to UTF-8 `bytes`; `bytes` pass through unchanged."""
+  return s if isinstance(s, bytes) else s.encode("utf-8")
+
+
+def as_str(s) -> str:
+  """Converts UTF-8 `bytes` to a `str`; `str` passes through unchanged."""
+  return s.decode("utf-8") if isinstance(s, bytes) else s
+
+
+def _is_dtype(value) -> bool:
+  """True for `gde.dtypes.DType` and `tf.DType` objects."""
+  return isinstance(value, dtypes.DType) or hasattr(value, "as_datatype_enum")
+
+
+def _is_tensor_shape(value) -> bool:
+  """True for `gde.TensorShape` and `tf.TensorShape` objects."""
+  return isinstance(value, tensor_shape.TensorShape) or (
+      hasattr(value, "as_proto") and hasattr(value, "ndims"))
+
+
+def _python_type_to_attr_list_elem(
+        list_value: attr_value_pb2.AttrValue.ListValue, elem: Any):
   """
   Subroutine of python_type_to_attr_value(). Converts one element of a Python
   list to one element of a `tf.AttrValue.ListValue` protobuf.
@@ -568,26 +621,27 @@ def _python_type_to_attr_list_elem(list_value: tf.AttrValue.ListValue,
     elem: Original value to convert.
   """
   if isinstance(elem, str):
-    list_value.s.append(tf.compat.as_bytes(elem))
+    list_value.s.append(as_bytes(elem))
+  elif isinstance(elem, bool):
+    # Before int, because bool is a subclass of int
+    list_value.b.append(elem)
   elif isinstance(elem, int):
     list_value.i.append(elem)
   elif isinstance(elem, float):
     list_value.f.append(elem)
-  elif isinstance(elem, bool):
-    list_value.b.append(elem)
-  elif isinstance(elem, tf.DType):
+  elif _is_dtype(elem):
     list_value.type.append(elem.as_datatype_enum)
-  elif isinstance(elem, tf.TensorShape):
-    list_value.shape.append(elem.as_proto())
+  elif _is_tensor_shape(elem):
+    list_value.shape.append(tensor_shape.as_shape(elem).as_proto())
   elif isinstance(elem, np.ndarray):
-    list_value.tensor.append(tf.make_tensor_proto(values=elem))
+    list_value.tensor.append(tensor_util.make_tensor_proto(values=elem))
   # TODO(frreiss): Populate the "func" field of the union here
   else:
     raise ValueError("Don't know how to convert a {} to "
                      "tf.AttrValue.ListValue".format(type(elem)))
 
 
-def python_type_to_attr_value(value: Any) -> tf.AttrValue:
+def python_type_to_attr_value(value: Any) -> attr_value_pb2.AttrValue:
   """
   Convert a Python object or scalar value to a TensorFlow `tf.AttrValue`
   protocol buffer message.
@@ -601,32 +655,36 @@ def python_type_to_attr_value(value: Any) -> tf.AttrValue:
   """
   if isinstance(value, list) or isinstance(value, tuple):
     if 0 == len(value):
-      return tf.AttrValue(list=tf.AttrValue.ListValue())
+      return attr_value_pb2.AttrValue(
+        list=attr_value_pb2.AttrValue.ListValue())
     else:
       # Nonempty list
-      list_value = tf.AttrValue.ListValue()
+      list_value = attr_value_pb2.AttrValue.ListValue()
       for elem in value:
         # TODO(frreiss): Should we disallow heterogeneous types in lists?
         _python_type_to_attr_list_elem(list_value, elem)
-      return tf.AttrValue(list=list_value)
-  elif isinstance(value, tf.AttrValue):
+      return attr_value_pb2.AttrValue(list=list_value)
+  elif protos.is_message(value, attr_value_pb2.AttrValue):
     # TODO(frreiss): Should this case result in an error?
-    return value
+    return protos.as_message(value, attr_value_pb2.AttrValue)
   # Scalar types, in the order they appear in the .proto file
   elif isinstance(value, str):
-    return tf.AttrValue(s=tf.compat.as_bytes(value))
+    return attr_value_pb2.AttrValue(s=as_bytes(value))
+  elif isinstance(value, bool):
+    # Before int, because bool is a subclass of int
+    return attr_value_pb2.AttrValue(b=value)
   elif isinstance(value, int):
-    return tf.AttrValue(i=value)
+    return attr_value_pb2.AttrValue(i=value)
   elif isinstance(value, float):
-    return tf.AttrValue(f=value)
-  elif isinstance(value, bool):
-    return tf.AttrValue(b=value)
-  elif isinstance(value, tf.DType):
-    return tf.AttrValue(type=value.as_datatype_enum)
-  elif isinstance(value, tf.TensorShape):
-    return tf.AttrValue(shape=value.as_proto())
+    return attr_value_pb2.AttrValue(f=value)
+  elif _is_dtype(value):
+    return attr_value_pb2.AttrValue(type=value.as_datatype_enum)
+  elif _is_tensor_shape(value):
+    return attr_value_pb2.AttrValue(
+      shape=tensor_shape.as_shape(value).as_proto())
   elif isinstance(value, np.ndarray):
-    return tf.AttrValue(tensor=tf.make_tensor_proto(values=value))
+    return attr_value_pb2.AttrValue(
+      tensor=tensor_util.make_tensor_proto(values=value))
   # TODO(frreiss): Populate the "func" and "placeholder" fields of the union
   #  here
   else:
@@ -634,7 +692,7 @@ def python_type_to_attr_value(value: Any) -> tf.AttrValue:
                      "tf.AttrValue".format(type(value)))
 
 
-def attr_value_to_python_type(attr_value: tf.AttrValue) -> Any:
+def attr_value_to_python_type(attr_value: attr_value_pb2.AttrValue) -> Any:
   """
   Inverse of python_type_to_attr_value().
 
@@ -648,7 +706,7 @@ def attr_value_to_python_type(attr_value: tf.AttrValue) -> Any:
   # TODO(frreiss): Handle AttrValues that are lists
   if attr_value.HasField("s"):          # str
     # TODO(frreiss): Should we return the binary value here?
-    return tf.compat.as_str(attr_value.s)
+    return as_str(attr_value.s)
   elif attr_value.HasField("i"):        # int
     return attr_value.i
   elif attr_value.HasField("f"):        # float
@@ -656,13 +714,11 @@ def attr_value_to_python_type(attr_value: tf.AttrValue) -> Any:
   elif attr_value.HasField("b"):        # bool
     return attr_value.b
   elif attr_value.HasField("type"):     # DType
-    return tf.DType(attr_value.type)
+    return dtypes.as_dtype(attr_value.type)
   elif attr_value.HasField("shape"):    # TensorShape
-    # Undocumented behavior of public API: tf.TensorShape constructor accepts
-    # a TensorShapeProto.
-    return tf.TensorShape(attr_value.shape)
+    return tensor_shape.TensorShape(attr_value.shape)
   elif attr_value.HasField("tensor"):   # TensorProto
-    return tf.make_ndarray(attr_value.tensor)
+    return tensor_util.make_ndarray(attr_value.tensor)
   # TODO(frreiss): Convert the "func" and "placeholder" fields of the union
   #  here
   else:
@@ -680,9 +736,10 @@ def load_variables_to_tf_graph(g: 'graph.Graph'):
     g: `gde.Graph` object from which all variables and variable collections
       should be loaded
   """
+  import tensorflow as tf  # pylint: disable=g-import-not-at-top
   for var_name in g.variable_names:
     var = g.name_to_variable(var_name)
-    tf_var = tf.Variable.from_proto(var.to_proto())
+    tf_var = tf.Variable.from_proto(protos.to_tensorflow(var.to_proto()))
     tf.add_to_collections(var.collection_names, tf_var)
 
 
@@ -701,16 +758,16 @@ def make_const(g: 'graph.Graph', name: str, value: np.ndarray,
 
   Returns `gde.Node` object representing the new node.
   """
-  dtype = tf.as_dtype(value.dtype)
+  dtype = dtypes.as_dtype(value.dtype)
   ret = g.add_node(name, "Const", uniquify_name=uniquify_name)
   ret.add_attr("dtype", dtype)
   ret.add_attr("value", value)
-  ret.set_outputs_from_pairs([(dtype, tf.TensorShape(value.shape))])
+  ret.set_outputs_from_pairs([(dtype, tensor_shape.TensorShape(value.shape))])
   return ret
 
 
-def make_placeholder(g: 'graph.Graph', name: str, dtype: tf.DType,
-                     shape: tf.TensorShape,
+def make_placeholder(g: 'graph.Graph', name: str, dtype: dtypes.DType,
+                     shape: tensor_shape.TensorShape,
                      uniquify_name: bool = False):
   """
   Convenience method to add a `Placeholder` op to a `gde.Graph`.
@@ -718,8 +775,10 @@ def make_placeholder(g: 'graph.Graph', name: str, dtype: tf.DType,
   Args:
     g: The graph that the new node should be added to
     name: Name for the new node
-    dtype: `tf.DType` holding the dtype of the placeholder
-    shape: `tf.TensorShape` representing the shape returned by the placeholder
+    dtype: `gde.dtypes.DType` or `tf.DType` holding the dtype of the
+      placeholder
+    shape: `gde.TensorShape` or `tf.TensorShape` representing the shape
+      returned by the placeholder
     uniquify_name: if True, generate unique names by appending a numeric
       suffix in the event of a name collision. Otherwise name collisions
       result in an error.
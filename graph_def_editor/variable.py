@@ -13,10 +13,6 @@
 # limitations under the License.
 # ==============================================================================
 
-# TODO: Move this protobuf into this project so we don't depend on
-#  tf.core.framework
-from tensorflow.core.framework import variable_pb2
-
 from typing import AbstractSet, Union
 
 
@@ -25,6 +21,7 @@ __all__ = [
 ]
 
 from graph_def_editor import graph
+from graph_def_editor.protos import variable_pb2
 
 
 class Variable(object):
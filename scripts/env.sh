@@ -16,6 +16,11 @@
 
 PYTHON_VERSION=3.6
 
+# GDE's vendored protobuf bindings need protobuf 3.20 or later, which in
+# turn needs Python 3.7 or later. With the older protobuf that this
+# environment gets, GDE falls back to TensorFlow's bindings, so TensorFlow
+# must be installed.
+
 ############################
 # HACK ALERT *** HACK ALERT 
 # The friendly folks at Anaconda thought it would be a good idea to make the
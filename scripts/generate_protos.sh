@@ -0,0 +1,51 @@
+#! /bin/bash
+
+################################################################################
+# generate_protos.sh
+#
+# Regenerate the vendored protocol buffer bindings in
+# graph_def_editor/protos/vendored from TensorFlow's .proto files.
+#
+# Run this script from the root of the project, i.e.
+#   ./scripts/generate_protos.sh <path to tensorflow source tree>
+#
+# The .proto files also ship with the TensorFlow pip package, under
+# site-packages/tensorflow/include.
+#
+# Requires protoc.
+################################################################################
+
+if [ -z "$1" ]
+then
+    echo "Usage: $0 <path to tensorflow source tree>"
+    exit 1
+fi
+
+TF_ROOT=$1
+OUT_DIR=./graph_def_editor/protos/vendored
+TMP_DIR=$(mktemp -d)
+
+PROTOS="attr_value full_type function graph graph_debug_info node_def op_def \
+    resource_handle tensor tensor_shape types variable versions"
+
+PROTO_FILES=""
+for p in ${PROTOS}
+do
+    PROTO_FILES="${PROTO_FILES} tensorflow/core/framework/${p}.proto"
+done
+
+(cd ${TF_ROOT} && protoc --python_out=${TMP_DIR} ${PROTO_FILES}) || exit 1
+
+# Point imports at the vendored package and register descriptors in the
+# vendored package's private pool instead of the default pool, so that the
+# bindings never conflict with the ones that TensorFlow itself loads.
+for p in ${PROTOS}
+do
+    sed -e "s/^from tensorflow.core.framework import /from graph_def_editor.protos.vendored import /" \
+        -e "s/^from google.protobuf import descriptor_pool as _descriptor_pool$/from graph_def_editor.protos.vendored import POOL as _POOL/" \
+        -e "s/_descriptor_pool.Default()/_POOL/" \
+        -e "s/'tensorflow\.core\.framework\.\([a-z_]*_pb2\)'/'graph_def_editor.protos.vendored.\1'/" \
+        ${TMP_DIR}/tensorflow/core/framework/${p}_pb2.py > ${OUT_DIR}/${p}_pb2.py
+done
+
+rm -rf ${TMP_DIR}
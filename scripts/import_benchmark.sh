@@ -0,0 +1,49 @@
+#! /bin/bash
+
+################################################################################
+# import_benchmark.sh
+#
+# Measure the cold-start cost of importing GDE, using Python's -X importtime
+# option. Reports the total import time of an empty interpreter, of
+# `import graph_def_editor` by itself, and of the first access to
+# `graph_def_editor.Graph`, followed by the slowest imports that the latter
+# triggers.
+#
+# Run this script from the root of the project, i.e.
+#   ./scripts/import_benchmark.sh [python executable]
+#
+# Each measurement runs in a fresh interpreter with -I, so that the user's
+# site customizations and PYTHONPATH do not affect the results.
+################################################################################
+
+PYTHON=${1:-./env/bin/python}
+NUM_SLOWEST=15
+
+# -X importtime, and the lazy loading of submodules that this script
+# measures, both need Python 3.7 or later.
+if ! ${PYTHON} -c "import sys; sys.exit(sys.version_info < (3, 7))"
+then
+    echo "Error: ${PYTHON} is older than Python 3.7"
+    exit 1
+fi
+
+# Usage: import_times <python statements>
+import_times() {
+    ${PYTHON} -I -X importtime -c \
+        "import sys; sys.path.insert(0, '$PWD'); $1" 2>&1 >/dev/null \
+        | grep "^import time:" | grep -v "self \[us\]"
+}
+
+# Usage: total_ms <python statements>
+total_ms() {
+    import_times "$1" | sed 's/^import time://' \
+        | awk -F'|' '{ total += $1 } END { printf "%.1f", total / 1000 }'
+}
+
+echo "interpreter startup only:           $(total_ms 'pass') ms"
+echo "import graph_def_editor:            $(total_ms 'import graph_def_editor') ms"
+echo "import graph_def_editor; gde.Graph: $(total_ms 'import graph_def_editor as gde; gde.Graph') ms"
+echo
+echo "Slowest imports (cumulative us) triggered by gde.Graph:"
+import_times 'import graph_def_editor as gde; gde.Graph' \
+    | sort -t'|' -k2 -n -r | head -n ${NUM_SLOWEST}
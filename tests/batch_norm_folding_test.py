@@ -0,0 +1,159 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for batch_norm_folding.py in the GraphDef Editor."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+import unittest
+
+import graph_def_editor as gde
+
+
+class BatchNormFoldingTest(unittest.TestCase):
+
+  def setUp(self):
+    rng = np.random.RandomState(0)
+    tf_graph = tf.Graph()
+    with tf_graph.as_default():
+      x = tf.placeholder(tf.float32, shape=[2, 5, 5, 3], name="x")
+      kernel = tf.identity(tf.constant(
+        rng.randn(3, 3, 3, 4).astype(np.float32), name="kernel"),
+        name="kernel_read")
+      conv = tf.nn.conv2d(x, kernel, strides=[1, 1, 1, 1], padding="SAME",
+                          name="conv")
+      params = [tf.constant(v.astype(np.float32), name=name) for name, v in (
+        ("gamma", rng.rand(4) + 0.5), ("beta", rng.randn(4)),
+        ("mean", rng.randn(4)), ("variance", rng.rand(4) + 0.5))]
+      bn, _, _ = tf.nn.fused_batch_norm(conv, *params, epsilon=0.001,
+                                        is_training=False, name="bn")
+      depthwise = tf.nn.depthwise_conv2d_native(
+        tf.nn.relu(bn), tf.constant(rng.randn(3, 3, 4, 2).astype(np.float32),
+                                    name="depthwise_kernel"),
+        strides=[1, 1, 1, 1], padding="VALID", name="depthwise")
+      bn2, _, _ = tf.nn.fused_batch_norm(
+        depthwise, *[tf.constant(v.astype(np.float32)) for v in (
+          rng.rand(8) + 0.5, rng.randn(8), rng.randn(8), rng.rand(8) + 0.5)],
+        is_training=False, name="bn2")
+      flat = tf.reshape(bn2, [2, 72], name="flat")
+      dense = tf.matmul(flat, tf.constant(
+        rng.randn(10, 72).astype(np.float32), name="dense_kernel"),
+                        transpose_b=True, name="dense")
+      scaled = tf.multiply(tf.constant(rng.rand(10).astype(np.float32),
+                                       name="dense_scale"), dense,
+                           name="scaled")
+      tf.nn.softmax(scaled, name="out")
+    self.graph = gde.Graph(tf_graph)
+    self.feed = {"x:0": rng.randn(2, 5, 5, 3).astype(np.float32)}
+
+  def _run(self, g):
+    with tf.Session(graph=g.to_tf_graph()) as sess:
+      return sess.run("out:0", feed_dict=self.feed)
+
+  def test_fold_batch_norms(self):
+    g = self.graph
+    expected = self._run(g)
+    self.assertEqual(3, gde.fold_batch_norms(g))
+    for name in ("bn", "bn2", "scaled", "kernel", "kernel_read", "gamma",
+                 "dense_kernel", "dense_scale"):
+      self.assertFalse(g.contains_node(name), name)
+    self.assertEqual("BiasAdd", g["bn/folded"].op_type)
+    self.assertIs(g["bn/folded_weights:0"], g["conv"].inputs[1])
+    self.assertIs(g["conv:0"], g["bn/folded"].inputs[0])
+    self.assertIs(g["bn2/folded_weights:0"], g["depthwise"].inputs[1])
+    self.assertIs(g["scaled/folded_weights:0"], g["dense"].inputs[1])
+    self.assertIs(g["dense:0"], g["out"].inputs[0])
+    np.testing.assert_allclose(expected, self._run(g), rtol=1e-5, atol=1e-6)
+    self.assertEqual(0, gde.fold_batch_norms(g))
+
+  def test_no_match(self):
+    g = self.graph
+    # Batch normalization with its batch statistics in use, and a
+    # convolution whose output is also used elsewhere, stay.
+    for name, t in (("mean_used", g["bn2:1"]), ("conv_used", g["conv:0"])):
+      neg = g.add_node(name, "Neg")
+      neg.add_attr("T", gde.dtypes.float32)
+      neg.set_inputs([t])
+      neg.infer_outputs()
+    # A factor that does not broadcast per channel stays too.
+    bad_scale = gde.util.make_const(g, "bad_scale",
+                                    np.ones([2, 10], dtype=np.float32))
+    g["scaled"].replace_input(0, bad_scale.output(0))
+    self.assertEqual(0, gde.fold_batch_norms(g))
+    for name in ("bn", "bn2", "scaled", "kernel", "dense_kernel"):
+      self.assertTrue(g.contains_node(name), name)
+
+  def test_stripped_default_attrs(self):
+    rng = np.random.RandomState(1)
+    tf_graph = tf.Graph()
+    with tf_graph.as_default():
+      x = tf.placeholder(tf.float32, shape=[2, 5, 5, 3], name="x")
+      conv = tf.nn.conv2d(
+        x, tf.constant(rng.randn(3, 3, 3, 4).astype(np.float32)),
+        strides=[1, 1, 1, 1], padding="SAME", name="conv")
+      bn, _, _ = tf.nn.fused_batch_norm(
+        conv, *[tf.constant(v.astype(np.float32)) for v in (
+          rng.rand(4) + 0.5, rng.randn(4), rng.randn(4), rng.rand(4) + 0.5)],
+        epsilon=0.0001, is_training=False, name="bn")
+      # Batch normalization in training mode is never folded.
+      conv2 = tf.nn.conv2d(
+        x, tf.constant(rng.randn(1, 1, 3, 4).astype(np.float32)),
+        strides=[1, 1, 1, 1], padding="SAME", name="conv2")
+      train_bn, _, _ = tf.nn.fused_batch_norm(
+        conv2, tf.constant(np.ones(4, dtype=np.float32)),
+        tf.constant(np.zeros(4, dtype=np.float32)), epsilon=0.0001,
+        is_training=True, name="train_bn")
+      tf.reshape(bn + train_bn, [2, 100], name="flat")
+      tf.constant(rng.randn(100, 10).astype(np.float32), name="dense_kernel")
+      tf.constant(rng.rand(10).astype(np.float32), name="dense_scale")
+    g = gde.Graph(tf_graph)
+    # Remove the attributes whose values are TensorFlow's defaults, as
+    # exporting a SavedModel does.
+    for n in (g["bn"], g["train_bn"]):
+      attrs = [(k, n.get_attr(k)) for k in n.get_attr_keys()
+               if k not in ("epsilon", "data_format") and
+               not (k == "is_training" and n.get_attr(k))]
+      n.clear_attrs()
+      for k, v in attrs:
+        n.add_attr(k, v)
+    # MatMul without "transpose_a" and "transpose_b"
+    dense = g.add_node("dense", "MatMul")
+    dense.add_attr("T", gde.dtypes.float32)
+    dense.set_inputs([g["flat:0"], g["dense_kernel:0"]])
+    dense.infer_outputs()
+    scaled = g.add_node("scaled", "Mul")
+    scaled.add_attr("T", gde.dtypes.float32)
+    scaled.set_inputs([dense.output(0), g["dense_scale:0"]])
+    scaled.infer_outputs()
+    out = g.add_node("out", "Neg")
+    out.add_attr("T", gde.dtypes.float32)
+    out.set_inputs([scaled.output(0)])
+    out.infer_outputs()
+    self.assertEqual(("T",), dense.get_attr_keys())
+    self.assertNotIn("epsilon", g["bn"].get_attr_keys())
+    self.assertNotIn("is_training", g["train_bn"].get_attr_keys())
+    expected = self._run(g)
+
+    self.assertEqual(2, gde.fold_batch_norms(g))
+    self.assertFalse(g.contains_node("bn"))
+    self.assertTrue(g.contains_node("train_bn"))
+    self.assertIs(g["scaled/folded_weights:0"], g["dense"].inputs[1])
+    np.testing.assert_allclose(expected, self._run(g), rtol=1e-5, atol=1e-5)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,94 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for common_subexpression_elimination.py in the GraphDef Editor."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+import unittest
+
+import graph_def_editor as gde
+
+
+class CommonSubexpressionEliminationTest(unittest.TestCase):
+
+  def setUp(self):
+    tf_graph = tf.Graph()
+    with tf_graph.as_default():
+      x = tf.placeholder(tf.float32, shape=[2], name="x")
+      casts = []
+      for i in range(2):
+        with tf.name_scope("tower_{}".format(i)):
+          scale = tf.constant([1., 2.], name="scale")
+          # Same product, with the inputs in a different order
+          y = tf.multiply(x, scale, name="y") if i == 0 \
+            else tf.multiply(scale, x, name="y")
+          casts.append(tf.cast(y, tf.int32, name="cast"))
+          tf.add(casts[-1], tf.constant(i), name="out")
+      with tf.control_dependencies([casts[1].op]):
+        tf.identity(x, name="after")
+      with tf.control_dependencies([x.op]):
+        guarded = tf.constant([1., 2.], name="guarded")
+      tf.multiply(x, guarded, name="guarded_out")
+    self.graph = gde.Graph(tf_graph)
+
+  def _run(self, g):
+    with tf.Session(graph=g.to_tf_graph()) as sess:
+      return sess.run(["tower_0/out:0", "tower_1/out:0", "guarded_out:0"],
+                      feed_dict={"x:0": np.array([1., 2.])})
+
+  def test_eliminate_common_subexpressions(self):
+    g = self.graph
+    expected = self._run(g)
+    self.assertEqual(3, gde.eliminate_common_subexpressions(g))
+    for name in ("scale", "y", "cast"):
+      self.assertTrue(g.contains_node("tower_0/" + name))
+      self.assertFalse(g.contains_node("tower_1/" + name))
+    self.assertIs(g["tower_0/cast:0"], g["tower_1/out"].inputs[0])
+    # Control consumers move to the node that stays.
+    self.assertEqual([g["tower_0/cast"]], list(g["after"].control_inputs))
+    # Nodes with different control inputs are not equivalent.
+    self.assertTrue(g.contains_node("guarded"))
+    for e, a in zip(expected, self._run(g)):
+      np.testing.assert_allclose(e, a)
+    self.assertEqual(0, gde.eliminate_common_subexpressions(g))
+
+  def test_kept_duplicate(self):
+    g = self.graph
+    expected = self._run(g)
+    # The product in tower_1 must stay, but the cast after it still merges.
+    self.assertEqual(2, gde.eliminate_common_subexpressions(
+      g, keep=["tower_1/y:0"]))
+    self.assertFalse(g.contains_node("tower_1/scale"))
+    self.assertIs(g["tower_0/scale:0"], g["tower_1/y"].inputs[0])
+    self.assertTrue(g.contains_node("tower_1/y"))
+    self.assertFalse(g.contains_node("tower_1/cast"))
+    self.assertIs(g["tower_0/cast:0"], g["tower_1/out"].inputs[0])
+    self.assertEqual([g["tower_0/cast"]], list(g["after"].control_inputs))
+    for e, a in zip(expected, self._run(g)):
+      np.testing.assert_allclose(e, a)
+
+  def test_options(self):
+    g = self.graph
+    self.assertEqual(0, gde.eliminate_common_subexpressions(
+      g, op_types=["Mul", "Cast"]))
+    self.assertEqual(1, gde.eliminate_common_subexpressions(
+      g, op_types=["Const"]))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,125 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for constant_folding.py in the GraphDef Editor."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+import unittest
+
+import graph_def_editor as gde
+
+
+class ConstantFoldingTest(unittest.TestCase):
+
+  def setUp(self):
+    tf_graph = tf.Graph()
+    with tf_graph.as_default():
+      tf.set_random_seed(42)
+      x = tf.placeholder(tf.float32, shape=[3, 2], name="x")
+      w = tf.constant(np.arange(6, dtype=np.float32).reshape([3, 2]),
+                      name="w")
+      w_t = tf.transpose(tf.reshape(w, [2, 3], name="w_reshape"), name="w_t")
+      scale = tf.sqrt(tf.constant(4., name="four"), name="scale")
+      y = tf.multiply(x, w_t * scale, name="y")
+      # Shape arithmetic on a tensor with a static shape
+      num_rows = tf.strided_slice(tf.shape(y, name="y_shape"), [0], [1],
+                                  [1], name="num_rows")
+      flat = tf.reshape(y, tf.multiply(num_rows, 2, name="flat_shape"),
+                        name="flat")
+      with tf.control_dependencies([x.op]):
+        offset = tf.add(tf.constant(1., name="one"),
+                        tf.constant(2., name="two"), name="offset")
+      noise = tf.random_uniform([6], name="noise")
+      tf.add(flat + offset, noise, name="out")
+      tf.add(tf.constant(5, name="five"), 1, name="unconsumed")
+    self.graph = gde.Graph(tf_graph)
+
+  def _run(self, g):
+    with tf.Session(graph=g.to_tf_graph()) as sess:
+      return sess.run(["out:0", "unconsumed:0"], feed_dict={
+        "x:0": np.arange(6, dtype=np.float32).reshape([3, 2])})
+
+  def test_fold_constants(self):
+    g = self.graph
+    expected = self._run(g)
+    self.assertEqual(3, gde.fold_constants(g))
+    self.assertIs(g["mul/folded:0"], g["y"].inputs[1])
+    np.testing.assert_array_equal(2. * np.arange(6).reshape([2, 3]).T,
+                                  g["mul/folded"].get_attr("value"))
+    # StridedSlice has no NumPy kernel and goes through TensorFlow.
+    np.testing.assert_array_equal([6], g["flat_shape/folded"].get_attr("value"))
+    # Control dependencies carry over to the new constant.
+    self.assertEqual([g["x"]], list(g["offset/folded"].control_inputs))
+    for name in ("w", "w_reshape", "w_t", "four", "scale", "mul", "y_shape",
+                 "num_rows", "flat_shape", "one", "two", "offset"):
+      self.assertFalse(g.contains_node(name), name)
+    # Stateful ops stay, and so do outputs that nothing consumes.
+    self.assertEqual("RandomUniform", g["noise/RandomUniform"].op_type)
+    self.assertEqual("Const", g["five"].op_type)
+    self.assertTrue(g.contains_node("unconsumed"))
+    actual = self._run(g)
+    for e, a in zip(expected, actual):
+      np.testing.assert_allclose(e, a)
+    self.assertEqual(0, gde.fold_constants(g))
+
+  def test_options(self):
+    g = self.graph
+    # TensorFlow turns tf.shape() into a constant when it can, so make a
+    # Shape node by hand.
+    shape = g.add_node("dynamic_shape", "Shape")
+    shape.add_attr("T", gde.dtypes.float32)
+    shape.add_attr("out_type", gde.dtypes.int32)
+    shape.set_inputs([g["y:0"]])
+    shape.infer_outputs()
+    g["num_rows"].replace_input(0, shape.output(0))
+
+    # Without TensorFlow, the StridedSlice stays and so does its consumer,
+    # but the shape of y is known statically.
+    self.assertEqual(3, gde.fold_constants(g, use_tensorflow=False))
+    self.assertEqual("StridedSlice", g["num_rows"].op_type)
+    self.assertIs(g["dynamic_shape/folded:0"], g["num_rows"].inputs[0])
+    np.testing.assert_array_equal(
+      [3, 2], g["dynamic_shape/folded"].get_attr("value"))
+    self.assertTrue(g.contains_node("flat_shape"))
+
+    # Nothing larger than the limit is materialized.
+    self.setUp()
+    g = self.graph
+    self.assertEqual(3, gde.fold_constants(g, max_constant_size=20))
+    self.assertEqual("Const", g["scale/folded"].op_type)
+    self.assertTrue(g.contains_node("w_t"))
+    self.assertTrue(g.contains_node("mul"))
+
+  def test_register_numpy_kernel(self):
+    @gde.register_numpy_kernel("Sqrt")
+    def _fake_sqrt(ctx):
+      return [ctx.input_value(0) * 10.]
+
+    try:
+      self.assertIs(_fake_sqrt, gde.get_numpy_kernel("Sqrt"))
+      gde.fold_constants(self.graph)
+      np.testing.assert_array_equal(
+        40. * np.arange(6).reshape([2, 3]).T,
+        self.graph["mul/folded"].get_attr("value"))
+    finally:
+      gde.unregister_numpy_kernel("Sqrt")
+    self.assertIsNone(gde.get_numpy_kernel("Sqrt"))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,362 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for graph.py in the GraphDef Editor."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+import unittest
+from unittest import mock
+
+import graph_def_editor as gde
+
+
+class GraphTest(unittest.TestCase):
+
+  def test_colocation_closure(self):
+    tf_g = tf.Graph()
+    with tf_g.as_default():
+      a = tf.constant(1.0, name="a")
+      b = tf.constant(2.0, name="b")
+      with tf.colocate_with(a):
+        c = tf.identity(a, name="c")
+      with tf.colocate_with(b):
+        with tf.colocate_with(a):
+          # Member of the groups of both "a" and "b"
+          d = tf.identity(c, name="d")
+      with tf.colocate_with(b):
+        e = tf.identity(b, name="e")
+      f = tf.identity(e, name="f")
+    g = gde.Graph(tf_g)
+
+    # Groups of "a" and "b" overlap at "d", so they form one component.
+    self.assertEqual(
+      frozenset([g[c.op.name], g[d.op.name], g[e.op.name]]),
+      g.colocation_closure([g[c.op.name]]))
+    # Nodes outside any group come back unchanged.
+    self.assertEqual(frozenset([g[f.op.name]]),
+                     g.colocation_closure([g[f.op.name]]))
+
+    # Adding a node to a group updates the index in place.
+    g[f.op.name].add_colocation_group("a")
+    self.assertIn(g[f.op.name], g.colocation_closure([g[e.op.name]]))
+    self.assertIn(g[f.op.name], g.colocation_groups["a"])
+
+    # Replacing a node's groups splits the component again.
+    g[d.op.name].colocation_groups = ["a"]
+    self.assertEqual(
+      frozenset([g[c.op.name], g[d.op.name], g[f.op.name]]),
+      g.colocation_closure([g[c.op.name]]))
+
+  def test_frames(self):
+    tf_g = tf.Graph()
+    with tf_g.as_default():
+      max_index = tf.placeholder(dtype=tf.int32, shape=tuple(), name="max")
+      _, result = tf.while_loop(
+          cond=lambda i, unused_s: i <= max_index,
+          body=lambda i, s: (i + 1, s + i),
+          loop_vars=[tf.constant(1), tf.constant(0)])
+      after = tf.identity(result, name="after")
+      a = tf.constant(1.0, name="a")
+      tf.identity(a, name="b")
+    g = gde.Graph(tf_g)
+
+    frame_names = g.get_frame_names()
+    self.assertEqual(1, len(frame_names))
+    frame_name = frame_names[0]
+    loop_nodes = g.frame_name_to_nodes(frame_name)
+    op_types = set(n.op_type for n in loop_nodes)
+    for op_type in ["Enter", "Merge", "Switch", "NextIteration", "Exit"]:
+      self.assertIn(op_type, op_types)
+    self.assertEqual((frame_name,), g.node_to_frame_names(g[result.op.name]))
+    self.assertEqual(tuple(), g.node_to_frame_names(g[after.op.name]))
+    self.assertEqual(tuple(), g.node_to_frame_names(g["b"]))
+    self.assertEqual(frozenset([frame_name]),
+                     g.frames_touched_by([g["b"], g[result.op.name]]))
+    self.assertEqual(frozenset(), g.frames_touched_by([g["b"]]))
+
+    # Edits outside the loop leave the loop's table alone.
+    g["b"].replace_input(0, g["max"].output(0))
+    self.assertIs(loop_nodes, g.frame_name_to_nodes(frame_name))
+
+    # Edits that pull a node into the loop are picked up incrementally.
+    g["b"].replace_input(0, g[result.op.name].inputs[0])
+    self.assertEqual((frame_name,), g.node_to_frame_names(g["b"]))
+    self.assertIn(g["b"], g.frame_name_to_nodes(frame_name))
+
+  def test_frame_names_format(self):
+    # Frame tuples have no leading None for the root frame, and Exit ops
+    # belong to the frame that they exit.
+    tf_g = tf.Graph()
+    with tf_g.as_default():
+      result = tf.while_loop(cond=lambda i: i < 10, body=lambda i: i + 1,
+                             loop_vars=[tf.constant(0, name="start")])
+    g = gde.Graph(tf_g)
+    frame_name = g.get_frame_names()[0]
+    self.assertEqual((frame_name,), tuple(g.get_frame_names()))
+    self.assertEqual(tuple(), g.node_to_frame_names(g["start"]))
+    exit_node = g[result.op.name]
+    self.assertEqual("Exit", exit_node.op_type)
+    self.assertEqual((frame_name,), g.node_to_frame_names(exit_node))
+    self.assertIn(exit_node, g.frame_name_to_nodes(frame_name))
+
+  def test_remove_node(self):
+    tf_g = tf.Graph()
+    with tf_g.as_default():
+      max_index = tf.placeholder(dtype=tf.int32, shape=tuple(), name="max")
+      _, result = tf.while_loop(
+          cond=lambda i, unused_s: i <= max_index,
+          body=lambda i, s: (i + 1, s + i),
+          loop_vars=[tf.constant(1), tf.constant(0)])
+      tf.identity(result, name="after")
+    g = gde.Graph(tf_g)
+    frame_name = g.get_frame_names()[0]
+    num_loop_nodes = len(g.frame_name_to_nodes(frame_name))
+
+    with self.assertRaisesRegex(ValueError, "consume"):
+      g.remove_node(result.op.name)
+    g.remove_node("after")
+    self.assertFalse(g.contains_node("after"))
+    self.assertNotIn(g[result.op.name], g.node_consumers(g[result.op.name]))
+    self.assertEqual(0, len(g[result.op.name].output(0).consumers()))
+    # Removing a node frees its name.
+    self.assertEqual("after", g.unique_name("after"))
+
+    # Removed loop nodes disappear from the frame tables.
+    g.remove_node(result.op.name)
+    self.assertEqual(num_loop_nodes - 1,
+                     len(g.frame_name_to_nodes(frame_name)))
+    with self.assertRaises(ValueError):
+      g.remove_node("after")
+
+  def test_remove_nodes(self):
+    tf_g = tf.Graph()
+    with tf_g.as_default():
+      max_index = tf.placeholder(dtype=tf.int32, shape=tuple(), name="max")
+      _, result = tf.while_loop(
+          cond=lambda i, unused_s: i <= max_index,
+          body=lambda i, s: (i + 1, s + i),
+          loop_vars=[tf.constant(1), tf.constant(0)])
+      tf.identity(result, name="after")
+    g = gde.Graph(tf_g)
+    frame_name = g.get_frame_names()[0]
+    loop_nodes = list(g.frame_name_to_nodes(frame_name))
+
+    # The loop has consumers outside the set.
+    with self.assertRaisesRegex(ValueError, "consume"):
+      g.remove_nodes(loop_nodes)
+    self.assertEqual(len(loop_nodes), len(g.frame_name_to_nodes(frame_name)))
+
+    # Nodes in the set may consume each other, even around a cycle.
+    g.remove_nodes([n for n in g.nodes if n.name != "max"])
+    self.assertEqual(["max"], [n.name for n in g.nodes])
+    self.assertEqual(0, len(g.get_frame_names()))
+    self.assertEqual(0, len(g.node_consumers(g["max"])))
+
+  def test_load_outputs(self):
+    tf_g = tf.Graph()
+    with tf_g.as_default():
+      x = tf.placeholder(tf.float32, shape=[2], name="x")
+      v = tf.Variable([1., 2.], name="v")
+      head = tf.constant(0., name="head")
+      with tf.colocate_with(head):
+        a = tf.multiply(x, 2., name="a")
+      with tf.control_dependencies([tf.identity(a, name="check")]):
+        b = tf.add(a, v, name="b")
+      tf.identity(b, name="out")
+      tf.assign_add(v, b, name="update")
+
+    g = gde.Graph(tf_g, outputs=["out:0"])
+    full = gde.Graph(tf_g)
+    gde.prune(full, ["out:0"])
+    self.assertEqual(sorted(n.name for n in full.nodes),
+                     sorted(n.name for n in g.nodes))
+    self.assertIn("head", [n.name for n in g.nodes])
+    self.assertEqual(0, len(g.variable_names))
+
+    g = gde.Graph(tf_g, outputs=["update", "^v/Assign"])
+    self.assertEqual(1, len(g.variable_names))
+    self.assertTrue(g.contains_node("v/initial_value"))
+    with self.assertRaises(ValueError):
+      gde.Graph(tf_g, outputs=["no_such_node"])
+
+  def test_import_graph(self):
+    tf_pre = tf.Graph()
+    with tf_pre.as_default():
+      raw = tf.placeholder(tf.float32, shape=[2, 3], name="raw")
+      tf.identity(raw * 2.0, name="prep")
+    tf_model = tf.Graph()
+    with tf_model.as_default():
+      x = tf.placeholder(tf.float32, shape=[None, 3], name="x")
+      v = tf.Variable(tf.ones([3]), name="v")
+      with tf.colocate_with(v):
+        scaled = tf.multiply(x, v, name="scaled")
+      _, total = tf.while_loop(
+          cond=lambda i, unused_s: i < 3,
+          body=lambda i, s: (i + 1, s + scaled),
+          loop_vars=[tf.constant(0), tf.zeros_like(scaled)])
+      tf.identity(total, name="out")
+    g = gde.Graph(tf_pre)
+    model = gde.Graph(tf_model)
+    num_nodes = len(g.nodes)
+
+    out, init = g.import_graph(model, prefix="model",
+                               input_map={"x:0": g["prep:0"]},
+                               return_elements=["out:0", v.initializer.name])
+    self.assertEqual(num_nodes + len(model.nodes), len(g.nodes))
+    self.assertIs(g["model/out:0"], out)
+    self.assertIs(g["model/" + v.initializer.name], init)
+    self.assertIs(g["prep:0"], g["model/scaled"].inputs[0])
+    # The replacement input has a more specific shape, which propagates.
+    self.assertEqual([2, 3], g["model/scaled:0"].shape)
+    self.assertEqual([None, 3], model["scaled:0"].shape)
+    self.assertEqual(["model/" + v.op.name],
+                     list(g["model/scaled"].colocation_groups))
+    self.assertEqual(["model/" + model.get_frame_names()[0]],
+                     list(g.get_frame_names()))
+    self.assertEqual(["model/" + v.name], list(g.variable_names))
+    self.assertEqual(
+      model.name_to_variable(v.name).collection_names,
+      g.name_to_variable("model/" + v.name).collection_names)
+
+    # Names are checked before anything is added.
+    with self.assertRaisesRegex(ValueError, "already in use"):
+      g.import_graph(model, prefix="MODEL")
+    with self.assertRaisesRegex(ValueError, "of type int32"):
+      g.import_graph(model, prefix="model2",
+                     input_map={"x:0": "model/Const:0"})
+    self.assertEqual(num_nodes + len(model.nodes), len(g.nodes))
+
+    with tf.Session(graph=g.to_tf_graph()) as sess:
+      sess.run("model/" + v.initializer.name)
+      result = sess.run("model/out:0", {"raw:0": [[1., 2., 3.]] * 2})
+    self.assertEqual([[6., 12., 18.]] * 2, result.tolist())
+
+  def test_propagate_shapes(self):
+    tf_g = tf.Graph()
+    with tf_g.as_default():
+      x = tf.placeholder(tf.float32, shape=[None, 3], name="x")
+      y = tf.nn.relu(x, name="y")
+      tf.reduce_sum(y, axis=1, name="z")
+      tf.shape(x, name="s")
+      tf.nn.relu(tf.constant([1.0, 2.0]), name="unrelated")
+    g = gde.Graph(tf_g)
+    unrelated_t = g["unrelated"].outputs[0]
+    y_t = g["y"].outputs[0]
+
+    g["x"].clear_attrs()
+    g["x"].add_attr("dtype", tf.float32)
+    g["x"].add_attr("shape", tf.TensorShape([7, 3]))
+    changed = g.propagate_shapes([g["x"]])
+
+    self.assertEqual([g["x"].outputs[0], y_t, g["z"].outputs[0]],
+                     list(changed))
+    # Tensors are updated in place.
+    self.assertEqual([7, 3], g["y"].inputs[0].shape.as_list())
+    self.assertEqual([7], g["z"].outputs[0].shape.as_list())
+    self.assertIs(unrelated_t, g["unrelated"].outputs[0])
+    self.assertEqual([g["y"], g["s"]], g["x"].outputs[0].consumers())
+
+    # Nothing to do the second time around.
+    self.assertEqual(tuple(), g.propagate_shapes([g["x"]]))
+
+    # The consumer index follows edits.
+    g["z"].replace_input(0, g["x"].outputs[0])
+    self.assertEqual(frozenset([g["y"], g["z"], g["s"]]),
+                     g.node_consumers(g["x"]))
+    self.assertEqual(frozenset(), g.node_consumers(g["y"]))
+
+  def test_propagate_shapes_while_loop(self):
+    tf_g = tf.Graph()
+    with tf_g.as_default():
+      v = tf.placeholder(tf.float32, shape=[3], name="v")
+      tf.while_loop(cond=lambda i: i < 10,
+                    body=lambda i: i + tf.reduce_sum(v * 2.0, name="total"),
+                    loop_vars=[tf.constant(0.0)])
+    g = gde.Graph(tf_g)
+    mul_node = g["while/mul"]
+    self.assertEqual([3], mul_node.outputs[0].shape.as_list())
+
+    g["v"].clear_attrs()
+    g["v"].add_attr("dtype", tf.float32)
+    g["v"].add_attr("shape", tf.TensorShape([5]))
+    changed = g.propagate_shapes([g["v"]])
+    self.assertIn(mul_node.outputs[0], changed)
+    self.assertEqual([5], mul_node.outputs[0].shape.as_list())
+
+  def test_propagate_shapes_stops_early(self):
+    tf_g = tf.Graph()
+    with tf_g.as_default():
+      t = tf.placeholder(tf.float32, shape=[3], name="x")
+      for i in range(20):
+        t = tf.nn.relu(t, name="relu_{}".format(i))
+    g = gde.Graph(tf_g)
+    # Edit the graph so that the cached ranks need repairing.
+    g["relu_5"].replace_input(0, g["x"].output(0))
+
+    inferred = []
+    infer_outputs = gde.Node.infer_outputs
+
+    def record(n):
+      inferred.append(n.name)
+      infer_outputs(n)
+
+    with mock.patch.object(gde.Node, "infer_outputs", autospec=True,
+                           side_effect=record):
+      # Outputs of relu_5 do not change, so nothing downstream is visited.
+      self.assertEqual(tuple(), g.propagate_shapes([g["relu_5"]]))
+      self.assertEqual(["relu_5"], inferred)
+
+  def test_propagate_shapes_wide_fan_in(self):
+    tf_g = tf.Graph()
+    with tf_g.as_default():
+      tf.placeholder(tf.float32, shape=[None], name="p")
+      tf.constant(0, name="axis")
+    g = gde.Graph(tf_g)
+    num_inputs = 12
+
+    # Create the ConcatV2 before its inputs, so that node ids do not follow
+    # the order of the data flow.
+    concat = g.add_node("concat", "ConcatV2")
+    concat.add_attr("N", num_inputs)
+    concat.add_attr("T", tf.float32)
+    concat.add_attr("Tidx", tf.int32)
+    inputs = []
+    for i in range(num_inputs):
+      t = g["p"].outputs[0]
+      for j in range(i + 1):
+        ident = g.add_node("ident_{}_{}".format(i, j), "Identity")
+        ident.add_attr("T", tf.float32)
+        ident.set_inputs([t])
+        ident.infer_outputs()
+        t = ident.outputs[0]
+      inputs.append(t)
+    concat.set_inputs(inputs + [g["axis"].outputs[0]])
+    concat.infer_outputs()
+    self.assertEqual([None], concat.outputs[0].shape.as_list())
+
+    g["p"].clear_attrs()
+    g["p"].add_attr("dtype", tf.float32)
+    g["p"].add_attr("shape", tf.TensorShape([4]))
+    changed = g.propagate_shapes([g["p"]])
+    for t in inputs:
+      self.assertEqual([4], t.shape.as_list())
+    self.assertEqual([4 * num_inputs], concat.outputs[0].shape.as_list())
+    self.assertEqual(concat.outputs[0], changed[-1])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,112 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for lazy loading of the graph_def_editor package."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import importlib
+import os
+import subprocess
+import sys
+import textwrap
+import unittest
+
+# Load TensorFlow before GDE, as the other test modules do, so that GDE uses
+# TensorFlow's protobuf bindings no matter which test module pytest imports
+# first. The tests below import GDE without TensorFlow in fresh interpreters.
+importlib.import_module("tensorflow")
+
+import graph_def_editor as gde  # pylint: disable=g-import-not-at-top
+
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Upper bound on the time that `import graph_def_editor` may add to the
+# startup of a fresh interpreter. Generous, to avoid flakiness on busy
+# machines; the actual cost is around a millisecond.
+_IMPORT_TIME_BUDGET_US = 50000
+
+
+def _run_isolated(script):
+  """Run a Python script in a fresh interpreter that can import GDE from the
+  source tree, and return its stdout and stderr."""
+  script = "import sys\nsys.path.insert(0, {!r})\n".format(_REPO_ROOT) + \
+           textwrap.dedent(script)
+  result = subprocess.run([sys.executable, "-I", "-X", "importtime", "-c",
+                           script],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+  if result.returncode != 0:
+    raise AssertionError(result.stderr.decode("utf-8"))
+  return result.stdout.decode("utf-8"), result.stderr.decode("utf-8")
+
+
+class ImportTest(unittest.TestCase):
+
+  @unittest.skipIf(sys.version_info < (3, 7),
+                   "Lazy loading of submodules needs Python 3.7")
+  def test_lazy_submodules(self):
+    _run_isolated("""
+      import graph_def_editor as gde
+      loaded = [m for m in sys.modules if m.startswith("graph_def_editor.")]
+      assert not loaded, loaded
+      for m in ("numpy", "google.protobuf", "tensorflow"):
+        assert m not in sys.modules, m
+
+      from graph_def_editor import graph
+      assert gde.Graph is graph.Graph
+      assert "Graph" in vars(gde)  # Cached after the first lookup
+      assert gde.sgv is gde.subgraph.make_view
+      assert "tensorflow" not in sys.modules
+
+      namespace = {}
+      exec("from graph_def_editor import *", namespace)
+      assert namespace["reroute_ts"] is gde.reroute.reroute_ts
+      assert "ph" not in namespace
+      assert "tensorflow" not in sys.modules
+    """)
+
+  def test_exports(self):
+    # The table of lazily-loaded names must match the submodules.
+    for module_name, names in gde._SUBMODULE_EXPORTS.items():
+      module = importlib.import_module("graph_def_editor." + module_name)
+      expected = getattr(module, "__all__", None) or \
+          getattr(module, "_allowed_symbols")
+      self.assertEqual(sorted(expected), sorted(names), module_name)
+      for name in names:
+        self.assertIs(getattr(module, name), getattr(gde, name))
+    for name in gde.__all__:
+      self.assertIn(name, dir(gde))
+    self.assertIn("graph", dir(gde))
+    with self.assertRaises(AttributeError):
+      getattr(gde, "no_such_attribute")
+
+  @unittest.skipIf(sys.version_info < (3, 7),
+                   "Lazy loading of submodules needs Python 3.7")
+  def test_import_time(self):
+    _, import_times = _run_isolated("import graph_def_editor")
+    # Lines of -X importtime output look like
+    # "import time:  self [us] | cumulative | imported package"
+    cumulative_us = None
+    for line in import_times.splitlines():
+      fields = line.split("|")
+      if len(fields) == 3 and fields[2].strip() == "graph_def_editor":
+        cumulative_us = int(fields[1])
+    self.assertIsNotNone(cumulative_us, import_times)
+    self.assertLess(cumulative_us, _IMPORT_TIME_BUDGET_US)
+
+
+if __name__ == "__main__":
+  unittest.main()
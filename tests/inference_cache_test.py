@@ -0,0 +1,141 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for inference_cache.py in the GraphDef Editor."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import tensorflow as tf
+import unittest
+
+import graph_def_editor as gde
+
+
+class InferenceCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    self.old_cache = gde.get_inference_cache()
+    self.temp_dir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    gde.set_inference_cache(self.old_cache)
+    shutil.rmtree(self.temp_dir)
+
+  def test_lru(self):
+    cache = gde.InferenceCache(max_entries=2)
+    cache.put("a", [(tf.float32, [1])])
+    cache.put("b", [(tf.float32, [2])])
+    cache.get("a")
+    cache.put("c", [(tf.float32, [3])])
+    self.assertEqual(2, len(cache))
+    self.assertIsNone(cache.get("b"))
+    self.assertEqual([(tf.float32, tf.TensorShape([1]))], cache.get("a"))
+
+  def test_disk_store(self):
+    path = os.path.join(self.temp_dir, "cache.db")
+    cache = gde.InferenceCache(path=path)
+    cache.put("a", [(tf.int32, None), (tf.float32, [None, 3])])
+    cache.close()
+    cache = gde.InferenceCache(path=path)
+    outputs = cache.get("a")
+    self.assertEqual(tf.int32, outputs[0][0])
+    self.assertIsNone(outputs[0][1].ndims)
+    self.assertEqual([None, 3], outputs[1][1].as_list())
+    cache.close()
+
+  def test_graph_load(self):
+    cache = gde.InferenceCache()
+    gde.set_inference_cache(cache)
+    tf_g = tf.Graph()
+    with tf_g.as_default():
+      x = tf.placeholder(tf.float32, shape=[None, 512], name="x")
+      # LeakyRelu has no Python shape function, so TensorFlow handles it.
+      tf.nn.leaky_relu(tf.nn.leaky_relu(x), name="y")
+    graph_def = tf_g.as_graph_def()
+
+    g = gde.Graph(graph_def)
+    self.assertEqual(0, cache.hits)
+    # Second load is answered entirely from the cache and shape functions.
+    g2 = gde.Graph(graph_def)
+    self.assertEqual(2, cache.hits)
+    self.assertEqual(g["y"].outputs[0].shape.as_list(),
+                     g2["y"].outputs[0].shape.as_list())
+
+    # Both LeakyRelu nodes have the same signature.
+    hits = cache.hits
+    g2["y"].infer_outputs()
+    self.assertEqual(hits + 1, cache.hits)
+
+  def test_value_sensitive_inputs(self):
+    cache = gde.InferenceCache()
+    gde.set_inference_cache(cache)
+    tf_g = tf.Graph()
+    with tf_g.as_default():
+      x = tf.placeholder(tf.float32, shape=[6], name="x")
+      tf.reshape(x, [2, 3], name="r1")
+      tf.reshape(x, [3, 2], name="r2")
+      z = tf.placeholder(tf.float32, shape=[None], name="z")
+      tf.reshape(x, tf.shape(z), name="r3")
+    g = gde.Graph(tf_g)
+    # Reshapes that differ only in the value of a constant input must not
+    # share an entry.
+    self.assertEqual([2, 3], g["r1"].outputs[0].shape.as_list())
+    self.assertEqual([3, 2], g["r2"].outputs[0].shape.as_list())
+    g["r1"].infer_outputs()
+    g["r2"].infer_outputs()
+    self.assertEqual([3, 2], g["r2"].outputs[0].shape.as_list())
+    # Shape of r3 comes from a computed tensor, so it is never cached.
+    self.assertIsNone(gde.inference_cache.node_signature(g["r3"]))
+
+  def test_signature_salt(self):
+    tf_g = tf.Graph()
+    with tf_g.as_default():
+      x = tf.placeholder(tf.float32, shape=[3], name="x")
+      tf.nn.leaky_relu(x, name="y")
+    g = gde.Graph(tf_g)
+    signature = gde.inference_cache.node_signature(g["y"])
+    path = os.path.join(self.temp_dir, "cache.db")
+    cache = gde.InferenceCache(path=path)
+    cache.put(signature, [(tf.float32, [3])])
+    cache.close()
+
+    # Entries written by another version of TensorFlow or of the signature
+    # format are not served.
+    cache = gde.InferenceCache(path=path)
+    old_salt = gde.inference_cache._signature_salt()
+    gde.inference_cache._salt = "gde-inference-cache-v0;tensorflow=0.0"
+    try:
+      self.assertIsNone(
+        cache.get(gde.inference_cache.node_signature(g["y"])))
+    finally:
+      gde.inference_cache._salt = old_salt
+    self.assertIsNotNone(cache.get(signature))
+    cache.close()
+
+    # Nor are entries computed before a shape function was registered.
+    gde.register_shape_function("LeakyRelu", lambda ctx: None)
+    try:
+      self.assertNotEqual(signature,
+                          gde.inference_cache.node_signature(g["y"]))
+    finally:
+      gde.unregister_shape_function("LeakyRelu")
+    self.assertEqual(signature, gde.inference_cache.node_signature(g["y"]))
+
+
+if __name__ == "__main__":
+  unittest.main()
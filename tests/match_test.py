@@ -62,6 +62,53 @@ class MatchTest(unittest.TestCase):
             gde.OpMatcher("^.*/h$").control_input_ops("^.*/c$")
             .output_ops([]))(self.f_op))
 
+  def test_find_all(self):
+    g = self.graph
+    add = gde.op_type(("Add", "AddV2"))
+    self.assertTrue(add(self.f_op))
+    self.assertFalse(gde.op_type("Const", self.f_op))
+    self.assertEqual([g["foo/bar/e"], g["foo/bar/f"]],
+                     gde.find_all(g, gde.OpMatcher(add)
+                                  .input_ops(add, "^foo/d$")))
+    self.assertEqual([g["foo/bar/f"], g["foo/bar/g"]],
+                     gde.find_all(g, gde.OpMatcher(True)
+                                  .input_ops(True, gde.op_type("Const"))
+                                  .output_ops(add)))
+    self.assertEqual([g["foo/bar/h"]],
+                     gde.find_all(g, gde.OpMatcher(add).control_input_ops(
+                       gde.OpMatcher(add).output_ops(None))))
+    self.assertEqual([g["foo/c"]],
+                     gde.find_all(g, gde.OpMatcher("c").output_ops(
+                       [add, add, add])))
+    self.assertEqual([], gde.find_all(g, gde.OpMatcher(add).output_ops(
+      [add, add])))
+    # find_all() agrees with calling the matcher on every node.
+    matcher = gde.OpMatcher(add).input_ops(True, "^foo/d$").output_ops(None)
+    self.assertEqual([n for n in g.nodes if matcher(n)],
+                     gde.find_all(g, matcher))
+
+    # Indexes are rebuilt after the graph changes.
+    g["foo/bar/e"].replace_input(1, g["a:0"])
+    self.assertEqual([g["foo/bar/f"]],
+                     gde.find_all(g, gde.OpMatcher(add)
+                                  .input_ops(add, "^foo/d$")))
+
+  def test_find_all_by_attr(self):
+    g = self.graph
+    float32 = gde.op_attr("dtype", gde.dtypes.float32)
+    self.assertEqual([g["a"], g["foo/b"], g["foo/d"]],
+                     gde.find_all(g, float32))
+    self.assertTrue(gde.op_attr("T", gde.dtypes.float32, self.f_op))
+    self.assertEqual([], gde.find_all(g, gde.op_attr("dtype",
+                                                     gde.dtypes.int32)))
+    g["foo/bar/h"].add_attr("_marker", [1, 2])
+    self.assertEqual([g["foo/bar/h"]],
+                     gde.find_all(g, gde.op_attr("_marker", [1, 2])))
+    self.assertEqual([g["foo/bar/h"]],
+                     gde.find_all(g, gde.OpMatcher(gde.op_attr("_marker",
+                                                               (1, 2)))
+                                  .input_ops("f", "g")))
+
 
 if __name__ == "__main__":
   unittest.main()
@@ -0,0 +1,112 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for op_set.py in the GraphDef Editor."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+import unittest
+
+import graph_def_editor as gde
+
+
+class OpSetTest(unittest.TestCase):
+
+  def setUp(self):
+    tf_graph = tf.Graph()
+    with tf_graph.as_default():
+      a = tf.constant([1., 1.], shape=[2], name="a")
+      with tf.name_scope("foo"):
+        b = tf.constant([2., 2.], shape=[2], name="b")
+        c = tf.add(a, b, name="c")
+        d = tf.constant([3., 3.], shape=[2], name="d")
+        with tf.name_scope("bar"):
+          tf.add(c, d, name="e")
+          f = tf.add(c, d, name="f")
+          g = tf.add(c, a, name="g")
+          with tf.control_dependencies([c.op]):
+            tf.add(f, g, name="h")
+    self.graph = gde.Graph(tf_graph)
+
+  def test_set_algebra(self):
+    g = self.graph
+    x = [g["a"], g["foo/c"], g["foo/bar/e"]]
+    y = [g["foo/c"], g["foo/d"], g["foo/bar/h"]]
+    xs, ys = gde.OpSet(g, x), gde.OpSet(g, y)
+    x_set, y_set = frozenset(x), frozenset(y)
+
+    self.assertEqual(3, len(xs))
+    self.assertIn(g["a"], xs)
+    self.assertNotIn(g["foo/b"], xs)
+    self.assertNotIn("a", xs)
+    # Iteration follows the order in which nodes were added to the graph.
+    self.assertEqual(sorted(x, key=lambda n: n.id_in_graph), list(xs))
+    self.assertEqual(x_set | y_set, frozenset(xs | ys))
+    self.assertEqual(x_set & y_set, frozenset(xs & ys))
+    self.assertEqual(x_set - y_set, frozenset(xs - ys))
+    self.assertEqual(x_set ^ y_set, frozenset(xs ^ ys))
+    self.assertEqual(x_set | y_set, frozenset(xs.union(y)))
+    self.assertEqual(x_set - y_set, frozenset(x_set - ys))
+    self.assertEqual(frozenset(g.nodes) - x_set, frozenset(xs.complement()))
+    self.assertEqual(gde.OpSet.all_ops(g), xs | xs.complement())
+    self.assertTrue((xs & ys) <= xs)
+    self.assertTrue(xs >= [g["a"]])
+    self.assertFalse(xs.isdisjoint(ys))
+    self.assertTrue(xs.isdisjoint([g["foo/b"]]))
+    self.assertEqual(xs, gde.OpSet(g, reversed(x)))
+    self.assertEqual(hash(xs), hash(gde.OpSet(g, reversed(x))))
+    self.assertFalse(gde.OpSet(g))
+    self.assertEqual([g["foo/c"].id_in_graph], list((xs & ys).ids()))
+
+    # Sets made before nodes are added can be combined with later ones.
+    new_node = gde.make_const(g, "new", np.array(1.0))
+    self.assertEqual(x_set | {new_node}, frozenset(xs | [new_node]))
+
+    # Removed nodes drop out.
+    g.remove_node("new")
+    self.assertEqual(x_set, frozenset(xs | [g["a"]]))
+    self.assertEqual(len(g.nodes), len(gde.OpSet.all_ops(g)))
+
+    with self.assertRaises(ValueError):
+      xs | gde.OpSet(gde.Graph(), [])
+
+  def test_op_set_arguments(self):
+    g = self.graph
+    within = gde.OpSet(g, gde.select_ops("^foo/", graph=g))
+    ops = gde.get_forward_walk_ops([g["foo/c"]], within_ops=within)
+    self.assertEqual(frozenset(ops), frozenset(within - [g["foo/b"],
+                                                          g["foo/d"]]))
+    ops = gde.get_backward_walk_ops([g["foo/bar/g"]], within_ops=within)
+    self.assertEqual(frozenset([g["foo/b"], g["foo/c"], g["foo/bar/g"]]),
+                     frozenset(ops))
+
+    sgv = gde.sgv(gde.OpSet(g, [g["foo/bar/f"], g["foo/bar/g"]]))
+    self.assertEqual([g["foo/c:0"], g["foo/d:0"], g["a:0"]], list(sgv.inputs))
+
+    # All the consumers of foo/c are in foo/bar, so they are left alone.
+    cannot_modify = gde.OpSet(g, gde.select_ops("^foo/bar/", graph=g))
+    self.assertEqual(0, gde.reroute_ts([g["foo/d:0"]], [g["foo/c:0"]],
+                                       cannot_modify=cannot_modify))
+    can_modify = cannot_modify - [g["foo/bar/e"]]
+    self.assertEqual(2, gde.reroute_ts([g["foo/d:0"]], [g["foo/c:0"]],
+                                       can_modify=can_modify))
+    self.assertIs(g["foo/d:0"], g["foo/bar/f"].inputs[0])
+    self.assertIs(g["foo/c:0"], g["foo/bar/e"].inputs[0])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,140 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for pass_manager.py in the GraphDef Editor."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import tensorflow as tf
+import unittest
+
+import graph_def_editor as gde
+from graph_def_editor.pattern import Input, Op
+
+
+class PassManagerTest(unittest.TestCase):
+
+  def setUp(self):
+    tf_graph = tf.Graph()
+    with tf_graph.as_default():
+      x = tf.placeholder(tf.float32, shape=[2], name="x")
+      a = tf.identity(tf.identity(x, name="i1"), name="i2")
+      b = tf.negative(tf.negative(a, name="n1"), name="n2")
+      tf.add(b, x, name="c")
+    self.graph = gde.Graph(tf_graph)
+    self.temp_dir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+
+  def test_pipeline(self):
+    g = self.graph
+    identity = gde.RewriteRule(Op("Identity", inputs=[Input("x")]),
+                               lambda _, bindings: bindings["x"],
+                               name="identity")
+    double_negation = gde.RewriteRule(
+      Op("Neg", inputs=[Op("Neg", inputs=[Input("x")])]),
+      lambda _, bindings: bindings["x"], name="double_negation")
+    orders = []
+
+    def record_order(graph, analyses):
+      orders.append(analyses.get("topological_order"))
+      return False
+
+    pm = gde.PassManager(count_graph_size=True, dump_dir=self.temp_dir)
+    pm.add(record_order).add(identity).add(record_order)
+    pm.add(double_negation).add(record_order)
+    self.assertTrue(pm.run(g))
+    self.assertEqual(["x", "c"], [n.name for n in g.nodes])
+    self.assertIs(g["x:0"], g["c"].inputs[0])
+
+    records = pm.records
+    self.assertEqual(["record_order", "identity", "record_order",
+                      "double_negation", "record_order"],
+                     [r.name for r in records])
+    self.assertEqual([False, True, False, True, False],
+                     [r.changed for r in records])
+    self.assertEqual(-2, records[1].node_delta)
+    self.assertEqual(-2, records[3].edge_delta)
+    self.assertIsNone(records[1].memory_peak)
+    # Analyses are recomputed only after passes that change the graph.
+    self.assertEqual(["x", "i1", "i2", "n1", "n2", "c"],
+                     [n.name for n in orders[0]])
+    self.assertEqual(["x", "n1", "n2", "c"], [n.name for n in orders[1]])
+    self.assertEqual(["x", "c"], [n.name for n in orders[2]])
+    self.assertEqual(["000_input.pb", "001_identity.pb",
+                      "002_double_negation.pb"],
+                     sorted(os.listdir(self.temp_dir)))
+    graph_def = tf.GraphDef()
+    with open(records[3].dump_path, "rb") as f:
+      graph_def.ParseFromString(f.read())
+    self.assertEqual(2, len(graph_def.node))
+    self.assertIn("double_negation", pm.summary())
+    self.assertIn("-2", pm.summary())
+
+  def test_analysis_reuse(self):
+    g = self.graph
+    calls = []
+
+    @gde.register_analysis("num_nodes")
+    def num_nodes(graph):
+      calls.append(len(graph.nodes))
+      return len(graph.nodes)
+
+    def add_node(graph, analyses):
+      analyses.get("num_nodes")
+      graph.add_node("new_{}".format(len(graph.nodes)), "NoOp")
+
+    try:
+      pm = gde.PassManager()
+      pm.add(add_node, name="preserving", preserves=["num_nodes"])
+      pm.add(add_node, name="invalidating", invalidates=["num_nodes"])
+      pm.add(add_node, name="other", invalidates=["topological_order"])
+      pm.add(add_node)
+      pm.run(g)
+      self.assertEqual([6, 8], calls)
+      self.assertEqual(10, len(g.nodes))
+      with self.assertRaises(ValueError):
+        gde.PassManager().add(add_node, preserves=[], invalidates=[])
+      with self.assertRaises(ValueError):
+        gde.Analyses(g).get("no_such_analysis")
+    finally:
+      gde.unregister_analysis("num_nodes")
+
+  def test_fixed_point(self):
+    g = self.graph
+    bypass_one = gde.RewriteDriver([gde.RewriteRule(
+      Op(["Identity", "Neg"], inputs=[Input("x")]),
+      lambda _, bindings: bindings["x"], name="bypass")], max_rewrites=1)
+    inner = gde.PassManager([bypass_one], name="inner", fixed_point=True,
+                            track_memory=True)
+    pm = gde.PassManager([inner])
+    self.assertTrue(pm.run(g))
+    self.assertEqual(["x", "c"], [n.name for n in g.nodes])
+    # Four iterations that each remove a node, then one that changes nothing.
+    self.assertEqual(["inner/bypass"] * 5 + ["inner"],
+                     [r.name for r in pm.records])
+    self.assertEqual([0, 1, 2, 3, 4], [r.iteration for r in pm.records[:5]])
+    self.assertIsNotNone(pm.records[0].memory_delta)
+    # Counting nodes and edges is off by default.
+    self.assertIsNone(pm.records[0].node_delta)
+    self.assertFalse(pm.run(g))
+
+
+if __name__ == "__main__":
+  unittest.main()
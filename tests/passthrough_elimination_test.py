@@ -0,0 +1,115 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for passthrough_elimination.py in the GraphDef Editor."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+import unittest
+
+import graph_def_editor as gde
+
+
+class PassthroughEliminationTest(unittest.TestCase):
+
+  def setUp(self):
+    tf_graph = tf.Graph()
+    with tf_graph.as_default():
+      x = tf.placeholder(tf.float32, shape=[2], name="x")
+      v = tf.Variable([1., 2.], name="v")
+      training = tf.placeholder_with_default(False, shape=[], name="training")
+      with tf.control_dependencies([v.initializer]):
+        group = tf.no_op(name="group")
+      with tf.control_dependencies([x.op]):
+        a = tf.identity(x, name="a")
+      b = tf.stop_gradient(tf.identity(a, name="a2"), name="b")
+      with tf.control_dependencies([b.op, group]):
+        c = tf.multiply(b, v, name="c")
+      logits = tf.identity(c, name="logits")
+      scale = tf.where(training, 2., 1., name="scale")
+      tf.identity(logits * scale, name="out")
+    self.graph = gde.Graph(tf_graph)
+
+  def _run(self, g):
+    with tf.Session(graph=g.to_tf_graph()) as sess:
+      sess.run("v/Assign")
+      return sess.run("out:0", feed_dict={"x:0": np.array([1., 2.])})
+
+  def test_eliminate_passthrough_ops(self):
+    g = self.graph
+    expected = self._run(g)
+    num_nodes = len(g.nodes)
+    num_removed = gde.eliminate_passthrough_ops(g, keep=["logits"])
+    for name in ("training", "group", "a", "a2", "b"):
+      self.assertFalse(g.contains_node(name), name)
+    self.assertEqual(5, num_removed)
+    self.assertEqual(num_nodes - 5, len(g.nodes))
+    # Protected nodes and outputs stay.
+    for name in ("logits", "out", "v/read"):
+      self.assertTrue(g.contains_node(name), name)
+    self.assertIs(g["x:0"], g["c"].inputs[0])
+    self.assertIs(g["v/read:0"], g["c"].inputs[1])
+    # Control dependencies are forwarded to the consumers: x is a data
+    # producer of c already, and group is replaced with v/Assign.
+    self.assertEqual([g["v/Assign"]], list(g["c"].control_inputs))
+    np.testing.assert_allclose(expected, self._run(g))
+    self.assertEqual(0, gde.eliminate_passthrough_ops(g, keep=["logits"]))
+    self.assertEqual(1, gde.eliminate_passthrough_ops(g))
+    self.assertFalse(g.contains_node("logits"))
+
+  def test_options(self):
+    g = self.graph
+    gde.eliminate_passthrough_ops(g, remove_placeholders_with_default=False,
+                                  keep=[g["a2:0"]])
+    self.assertTrue(g.contains_node("training"))
+    self.assertTrue(g.contains_node("a2"))
+    # a2 now reads x directly and depends on what a depended on.
+    self.assertIs(g["x:0"], g["a2"].inputs[0])
+    with tf.Session(graph=g.to_tf_graph()) as sess:
+      sess.run("v/Assign")
+      np.testing.assert_allclose([2., 8.], sess.run(
+        "out:0", feed_dict={"x:0": np.array([1., 2.]), "training:0": True}))
+
+    # Identities that copy to another device stay.
+    self.setUp()
+    g = self.graph
+    g["a2"].device = "/device:GPU:0"
+    gde.eliminate_passthrough_ops(g)
+    self.assertTrue(g.contains_node("a2"))
+    self.assertIs(g["x:0"], g["a2"].inputs[0])
+
+  def test_collections(self):
+    g = self.graph
+    # pylint: disable=protected-access
+    g._collections["outputs"] = [g["a:0"], g["x:0"], g["a2"], "a2"]
+    # pylint: enable=protected-access
+    gde.eliminate_passthrough_ops(g)
+    self.assertFalse(g.contains_node("a"))
+    self.assertFalse(g.contains_node("a2"))
+    # Collected nodes that were removed are dropped from the collection.
+    self.assertEqual([g["x:0"], "a2"], g.get_collection("outputs"))
+
+  def test_pass_manager(self):
+    g = self.graph
+    pm = gde.PassManager([gde.eliminate_passthrough_ops],
+                         count_graph_size=True)
+    self.assertTrue(pm.run(g))
+    self.assertEqual(-6, pm.records[0].node_delta)
+
+
+if __name__ == "__main__":
+  unittest.main()
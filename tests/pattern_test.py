@@ -0,0 +1,105 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for pattern.py in the GraphDef Editor."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+import unittest
+
+import graph_def_editor as gde
+from graph_def_editor.pattern import Input, Op, optional, repeated
+
+_ADD = ("Add", "AddV2")
+
+
+class PatternTest(unittest.TestCase):
+
+  def setUp(self):
+    tf_graph = tf.Graph()
+    with tf_graph.as_default():
+      x = tf.placeholder(tf.float32, shape=[2], name="x")
+      c = tf.constant([1., 2.], name="c")
+      r1 = tf.nn.relu(tf.add(x, c, name="a1"), name="r1")
+      r2 = tf.nn.relu(tf.add(c, r1, name="a2"), name="r2")
+      sq = tf.multiply(r2, r2, name="sq")
+      i2 = tf.identity(tf.identity(sq, name="i1"), name="i2")
+      tf.nn.relu(i2, name="out")
+    self.graph = gde.Graph(tf_graph)
+
+  def test_bindings(self):
+    g = self.graph
+    p = Op("Relu", name="relu", inputs=[
+      Op(_ADD, name="add", commutative=True, inputs=[
+        Input("x"), Op("Const", name="bias")])])
+    self.assertEqual({"relu": g["r1"], "add": g["a1"], "x": g["x:0"],
+                      "bias": g["c"]}, p.match(g["r1"]))
+    self.assertIsNone(p.match(g["out"]))
+    matches = p.find_matches(g)
+    self.assertEqual([g["r1"], g["r2"]], [m["relu"] for m in matches])
+    self.assertIs(g["r1:0"], matches[1]["x"])
+
+    # Without commutative=True, the order of the inputs matters.
+    p = Op("Relu", inputs=[Op(_ADD, inputs=[Input(), Op("Const")])])
+    self.assertEqual([{}], p.find_matches(g))
+
+    # Attribute constraints
+    self.assertEqual(3, len(Op("Relu", attrs={"T": gde.dtypes.float32})
+                            .find_matches(g)))
+    self.assertEqual([], Op("Relu", attrs={"T": gde.dtypes.int32})
+                     .find_matches(g))
+
+  def test_shared_inputs(self):
+    g = self.graph
+    square = Op("Mul", name="sq", inputs=[Input("x"), Input("x")])
+    self.assertEqual([{"sq": g["sq"], "x": g["r2:0"]}],
+                     square.find_matches(g))
+    # Two Ops with the same name must match the same node.
+    p = Op("Mul", inputs=[Op("Relu", name="r"), Op("Relu", name="r")])
+    self.assertEqual({"r": g["r2"]}, p.match(g["sq"]))
+    p = Op(_ADD, inputs=[Input("a"), Input("a")])
+    self.assertEqual([], p.find_matches(g))
+
+  def test_repeated_and_optional(self):
+    g = self.graph
+    chain = Op("Relu", name="out", inputs=[
+      repeated(Op("Identity", name="ids", inputs=[Input("x")]))])
+    self.assertEqual([{"out": g["out"], "ids": [g["i2"], g["i1"]],
+                       "x": g["sq:0"]}], chain.find_matches(g))
+    chain = Op("Relu", inputs=[
+      repeated(Op("Identity", name="ids", inputs=[Input("x")]),
+               max_count=1)])
+    self.assertEqual([{"ids": [g["i2"]], "x": g["i1:0"]}],
+                     chain.find_matches(g))
+    chain = Op("Relu", inputs=[
+      repeated(Op("Identity", inputs=[Input()]), min_count=3)])
+    self.assertEqual([], chain.find_matches(g))
+
+    p = Op("Relu", name="relu", inputs=[
+      optional(Op(_ADD, name="add", inputs=[Input("x"), Op("Const")]))])
+    self.assertEqual([g["a1"], None, None],
+                     [m["add"] for m in p.find_matches(g)])
+    self.assertEqual(g["x:0"], p.match(g["r1"])["x"])
+    self.assertEqual(g["a2:0"], p.match(g["r2"])["x"])
+
+    with self.assertRaises(ValueError):
+      repeated(Op("Identity"))
+    with self.assertRaises(ValueError):
+      repeated(Op("Mul", inputs=[Input(), Input("y")]))
+
+
+if __name__ == "__main__":
+  unittest.main()
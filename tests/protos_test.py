@@ -0,0 +1,181 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the TensorFlow-free data model in the GraphDef Editor."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import os
+import pickle
+import subprocess
+import sys
+import tensorflow as tf
+import textwrap
+import unittest
+from unittest import mock
+
+import graph_def_editor as gde
+from graph_def_editor import dtypes, protos, tensor_shape, tensor_util
+
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ProtosTest(unittest.TestCase):
+
+  def test_no_tensorflow_import(self):
+    # Run in a fresh, isolated interpreter so that TensorFlow is not already
+    # loaded.
+    script = textwrap.dedent("""
+      import numpy as np
+      import sys
+      sys.path.insert(0, {root!r})
+      import graph_def_editor as gde
+      from graph_def_editor.protos import graph_pb2
+
+      graph_def = graph_pb2.GraphDef()
+      a = graph_def.node.add(name="a", op="Placeholder")
+      a.attr["dtype"].type = gde.dtypes.float32.as_datatype_enum
+      b = graph_def.node.add(name="b", op="Identity", input=["a"])
+      b.attr["T"].type = gde.dtypes.float32.as_datatype_enum
+
+      g = gde.Graph(graph_def)
+      g["a"].set_outputs_from_pairs([(gde.dtypes.float32, [None, 3])])
+      g["b"].set_outputs_from_pairs([(gde.dtypes.float32, [None, 3])])
+      c = gde.make_const(g, "c", np.ones([3], dtype=np.float32))
+      g["b"].set_inputs([c.output(0)])
+      gde.sgv(g["b"])
+      assert [n.name for n in g.to_graph_def().node] == ["a", "b", "c"]
+      assert g["b"].output(0).shape == [None, 3]
+      assert "tensorflow" not in sys.modules, "TensorFlow was imported"
+    """).format(root=_REPO_ROOT)
+    result = subprocess.run([sys.executable, "-I", "-c", script],
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    self.assertEqual(0, result.returncode, result.stdout.decode("utf-8"))
+
+  def test_import_order(self):
+    # Importing TensorFlow first gives TensorFlow's bindings. Importing it
+    # after GDE does not, even before GDE has loaded any bindings.
+    script = textwrap.dedent("""
+      import numpy as np
+      import sys
+      sys.path.insert(0, {root!r})
+      {first}
+      {second}
+      from graph_def_editor import protos
+      from tensorflow.core.framework.graph_pb2 import GraphDef
+
+      g = gde.Graph(GraphDef())
+      gde.make_const(g, "c", np.ones([3], dtype=np.float32))
+      graph_def = g.to_graph_def()
+      assert isinstance(graph_def, protos.graph_pb2.GraphDef)
+      assert protos.is_message(graph_def, GraphDef)
+      assert isinstance(protos.to_tensorflow(graph_def), GraphDef)
+      print(isinstance(graph_def, GraphDef))
+    """)
+    import_tf = "import tensorflow as tf"
+    import_gde = "import graph_def_editor as gde"
+    for first, second, expected in ((import_tf, import_gde, "True"),
+                                    (import_gde, import_tf, "False")):
+      result = subprocess.run(
+        [sys.executable, "-I", "-c", script.format(
+          root=_REPO_ROOT, first=first, second=second)],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+      self.assertEqual(0, result.returncode, result.stderr.decode("utf-8"))
+      self.assertEqual(expected, result.stdout.decode("utf-8").strip())
+
+  def test_old_protobuf(self):
+    # protobuf versions before 3.20 have no builder module, so GDE must
+    # fall back to TensorFlow's bindings.
+    self.assertTrue(protos._can_load_vendored_bindings())
+    with mock.patch.dict(sys.modules,
+                         {"google.protobuf.internal.builder": None}):
+      self.assertFalse(protos._can_load_vendored_bindings())
+
+  def test_dtypes(self):
+    for tf_dtype in (tf.float16, tf.float32, tf.float64, tf.bfloat16,
+                     tf.int8, tf.int32, tf.int64, tf.uint8, tf.bool,
+                     tf.string, tf.complex64, tf.qint8, tf.resource):
+      dtype = dtypes.as_dtype(tf_dtype)
+      self.assertEqual(tf_dtype.as_datatype_enum, dtype.as_datatype_enum)
+      self.assertEqual(tf_dtype.name, dtype.name)
+      self.assertEqual(tf_dtype.size, dtype.size)
+      self.assertEqual(tf_dtype.is_floating, dtype.is_floating)
+      self.assertEqual(tf_dtype.is_integer, dtype.is_integer)
+      self.assertEqual(tf_dtype, dtype)
+      self.assertEqual(hash(tf_dtype), hash(dtype))
+      self.assertIs(dtype, dtypes.as_dtype(dtype.name))
+      self.assertIs(dtype, pickle.loads(pickle.dumps(dtype)))
+    self.assertIs(dtypes.float32, dtypes.as_dtype(np.float32))
+    self.assertIs(dtypes.as_dtype(tf.as_dtype(float)), dtypes.as_dtype(float))
+    self.assertIs(dtypes.float32, dtypes.as_dtype("float32_ref").base_dtype)
+    with self.assertRaises(TypeError):
+      dtypes.as_dtype("not_a_type")
+
+  def test_tensor_shape(self):
+    for dims in (None, [], [3], [None, 3], [2, None, 4]):
+      shape = tensor_shape.TensorShape(dims)
+      tf_shape = tf.TensorShape(dims)
+      self.assertEqual(shape, tf_shape)
+      self.assertEqual(tf_shape.ndims, shape.ndims)
+      self.assertEqual(tf_shape.is_fully_defined(), shape.is_fully_defined())
+      self.assertEqual(tf_shape.as_proto(), shape.as_proto())
+      self.assertEqual(shape, tensor_shape.TensorShape(shape.as_proto()))
+      self.assertEqual(shape, tensor_shape.TensorShape(tf_shape))
+    shape = gde.TensorShape([None, 3])
+    self.assertEqual([None, 3], shape)
+    self.assertEqual([2, 3], shape.merge_with([2, None]))
+    self.assertEqual([None, 3, 4], shape + [4])
+    self.assertTrue(shape.is_compatible_with([5, 3]))
+    self.assertFalse(shape.is_compatible_with([5, 4]))
+    with self.assertRaises(ValueError):
+      shape.merge_with([5, 4])
+
+  def test_tensor_util(self):
+    for value in (np.arange(6, dtype=np.float32).reshape([2, 3]),
+                  np.array([True, False]),
+                  np.array(7, dtype=np.int64),
+                  np.array([1 + 2j], dtype=np.complex64),
+                  np.array([b"a", b"bc"], dtype=object)):
+      proto = tensor_util.make_tensor_proto(value)
+      np.testing.assert_array_equal(value, tf.make_ndarray(proto))
+      np.testing.assert_array_equal(
+        value, tensor_util.make_ndarray(tf.make_tensor_proto(value)))
+    # TensorFlow stores splat constants as a single value.
+    proto = tf.make_tensor_proto(np.full([2, 2], 1.5, dtype=np.float16))
+    np.testing.assert_array_equal(np.full([2, 2], 1.5, dtype=np.float16),
+                                  tensor_util.make_ndarray(proto))
+    proto = tf.make_tensor_proto(np.zeros([3], dtype=np.int32))
+    np.testing.assert_array_equal(np.zeros([3], dtype=np.int32),
+                                  tensor_util.make_ndarray(proto))
+
+  def test_as_message(self):
+    from graph_def_editor.protos.vendored import graph_pb2 as vendored_pb2
+    tf_g = tf.Graph()
+    with tf_g.as_default():
+      tf.constant(1.0, name="a")
+    vendored = protos.as_message(tf_g.as_graph_def(), vendored_pb2.GraphDef)
+    self.assertIsInstance(vendored, vendored_pb2.GraphDef)
+    self.assertTrue(protos.is_message(vendored, tf.GraphDef))
+    g = gde.Graph(vendored)
+    self.assertEqual(["a"], [n.name for n in g.nodes])
+    self.assertIsInstance(protos.to_tensorflow(vendored), tf.GraphDef)
+    with self.assertRaises(TypeError):
+      protos.as_message(tf.NodeDef(), vendored_pb2.GraphDef)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,79 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for pruning.py in the GraphDef Editor."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+import unittest
+
+import graph_def_editor as gde
+
+
+class PruningTest(unittest.TestCase):
+
+  def setUp(self):
+    tf_graph = tf.Graph()
+    with tf_graph.as_default():
+      x = tf.placeholder(tf.float32, shape=[2], name="x")
+      v = tf.Variable([1., 2.], name="v")
+      head = tf.constant(0., name="head")
+      with tf.colocate_with(head):
+        a = tf.multiply(x, 2., name="a")
+      check = tf.identity(a, name="check")
+      with tf.control_dependencies([check]):
+        b = tf.add(a, v, name="b")
+      tf.identity(b, name="out")
+      # Training-only branch
+      tf.assign_add(v, b, name="update")
+      tf.placeholder(tf.float32, name="orphan")
+    self.graph = gde.Graph(tf_graph)
+
+  def test_prune(self):
+    g = self.graph
+    self.assertEqual(["v"], [g.name_to_variable(name).name.split(":")[0]
+                             for name in g.variable_names])
+    num_nodes = len(g.nodes)
+    num_removed = gde.prune(g, ["out:0"])
+    # head is kept as the head of the colocation group of a.
+    self.assertEqual(["a", "a/y", "b", "check", "head", "out", "v", "v/read",
+                      "x"], sorted(n.name for n in g.nodes))
+    self.assertEqual(num_nodes - 9, num_removed)
+    # The initializer of v is gone, so the variable goes too.
+    self.assertEqual(0, len(g.variable_names))
+    self.assertEqual(0, gde.prune(g, [g["out"]]))
+
+    with tf.Session(graph=g.to_tf_graph()) as sess:
+      self.assertIn("out", [n.name for n in sess.graph_def.node])
+
+  def test_keep_control(self):
+    g = self.graph
+    gde.prune(g, [g["out"], "v/Assign"], keep_control=False)
+    self.assertFalse(g.contains_node("check"))
+    self.assertEqual(0, len(g["b"].control_inputs))
+    self.assertEqual(1, len(g.variable_names))
+    with tf.Session(graph=g.to_tf_graph()) as sess:
+      sess.run("v/Assign")
+      np.testing.assert_allclose([3., 6.], sess.run(
+        "out:0", feed_dict={"x:0": np.array([1., 2.])}))
+
+    with self.assertRaises(ValueError):
+      gde.prune(g, ["no_such_node"])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -74,6 +74,32 @@ class RerouteTest(unittest.TestCase):
     self.assertTrue(gde.OpMatcher("c0").input_ops("a1", "b1")(self.c0.op))
     self.assertTrue(gde.OpMatcher("c1").input_ops("a1", "b1")(self.c1.op))
 
+  def test_swap_shared_consumer(self):
+    # c0 reads both a0 and b0; swapping them must exchange its two inputs.
+    self.assertEqual(2, gde.swap_ts([self.a0], [self.b0]))
+    self.assertIs(self.b0, self.c0.op.inputs[0])
+    self.assertIs(self.a0, self.c0.op.inputs[1])
+
+  def test_reroute_repeated_source(self):
+    # Both pairs reroute a0; as with one reroute per pair, the first wins.
+    self.assertEqual(1, gde.reroute_ts([self.a1, self.b1],
+                                       [self.a0, self.a0]))
+    self.assertTrue(gde.OpMatcher("c0").input_ops("a1", "b0")(self.c0.op))
+
+  def test_return_changes(self):
+    c0, c1 = self.c0.op, self.c1.op
+    changes = gde.reroute_ts([self.a1], [self.a0], return_changes=True)
+    self.assertEqual(((c0, 0, self.a0, self.a1),), changes)
+    # c0 reads both a1 and b0; the swap rewires both of its inputs and the
+    # first input of c1.
+    changes = gde.swap_ts([self.a1], [self.b0], return_changes=True)
+    self.assertEqual(
+      set([(c0, 0, self.a1, self.b0), (c1, 0, self.a1, self.b0),
+           (c0, 1, self.b0, self.a1)]),
+      set(changes))
+    self.assertEqual(tuple(), gde.swap_ts([self.a2], [self.a2],
+                                          return_changes=True))
+
   def test_compatibility(self):
     with self.assertRaises(ValueError):
       gde.reroute_ts([self.a0, self.b0], [self.a2, self.b2])
@@ -0,0 +1,150 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for rewrite.py in the GraphDef Editor."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+import unittest
+
+import graph_def_editor as gde
+from graph_def_editor.pattern import Input, Op
+
+
+def _square(g, bindings):
+  mul = bindings["mul"]
+  ret = g.add_node(mul.name + "/square", "Square")
+  ret.add_attr("T", mul.get_attr("T"))
+  ret.set_inputs([bindings["x"]])
+  ret.infer_outputs()
+  return ret.output(0)
+
+
+class RewriteTest(unittest.TestCase):
+
+  def setUp(self):
+    tf_graph = tf.Graph()
+    with tf_graph.as_default():
+      x = tf.placeholder(tf.float32, shape=[2], name="x")
+      a = tf.multiply(x, x, name="a")
+      b = tf.multiply(a, a, name="b")
+      c = tf.multiply(b, x, name="c")
+      with tf.control_dependencies([b.op]):
+        d = tf.identity(tf.identity(c, name="i1"), name="i2")
+      tf.multiply(d, d, name="e")
+    self.graph = gde.Graph(tf_graph)
+
+  def _run(self, g):
+    with tf.Session(graph=g.to_tf_graph()) as sess:
+      return sess.run("e:0", feed_dict={"x:0": np.array([1., 2.])})
+
+  def test_apply(self):
+    g = self.graph
+    expected = self._run(g)
+    rule = gde.RewriteRule(Op("Mul", name="mul",
+                              inputs=[Input("x"), Input("x")]), _square)
+    # e is an output of the graph, so it stays.
+    self.assertEqual(2, rule.apply(g))
+    self.assertEqual("Mul", g["e"].op_type)
+    for name in ("a", "b"):
+      self.assertFalse(g.contains_node(name))
+      self.assertEqual("Square", g[name + "/square"].op_type)
+    self.assertIs(g["b/square:0"], g["c"].inputs[0])
+    # Control dependencies on a replaced node move to its replacement.
+    self.assertEqual([g["b/square"]], list(g["i1"].control_inputs))
+    np.testing.assert_allclose(expected, self._run(g))
+    self.assertEqual(0, rule.apply(g))
+
+  def test_non_overlapping(self):
+    g = self.graph
+    bypass = gde.RewriteRule(Op("Identity", inputs=[Input("x")]),
+                             lambda _, bindings: bindings["x"])
+    # i1 has a control input, so only i2 is removed.
+    self.assertEqual(1, bypass.apply(g))
+    self.assertEqual(["i1"], [n.name for n in g.nodes
+                              if n.op_type == "Identity"])
+    self.assertIs(g["i1:0"], g["e"].inputs[0])
+
+    x = g["x:0"]
+    for i in range(4):
+      x = g.add_node("j{}".format(i), "Identity")
+      x.add_attr("T", gde.dtypes.float32)
+      x.set_inputs([g["x:0"]] if i == 0 else [g["j{}:0".format(i - 1)]])
+      x.infer_outputs()
+    g.add_node("k", "Neg").set_inputs([g["j3:0"]])
+    pair = Op("Identity", name="outer", inputs=[
+      Op("Identity", name="inner", inputs=[Input("x")])])
+    self.assertEqual(3, len(pair.find_matches(g)))
+    rewritten = []
+
+    def bypass_pair(_, bindings):
+      rewritten.append((bindings["outer"].name, bindings["inner"].name))
+      return bindings["x"]
+
+    self.assertEqual(2, gde.RewriteRule(pair, bypass_pair).apply(g))
+    self.assertEqual([("j1", "j0"), ("j3", "j2")], rewritten)
+    self.assertEqual(["i1"], [n.name for n in g.nodes
+                              if n.op_type == "Identity"])
+
+    # Nodes inside the match that are used elsewhere cannot be removed, so
+    # the match is skipped. Here i1 has a control dependency on b.
+    rule = gde.RewriteRule(Op("Mul", name="c", inputs=[
+      Op("Mul", name="b", inputs=[Input("a"), Input("a")]), Input("x")]),
+                           lambda _, bindings: bindings["x"])
+    self.assertEqual([g["c"]], [m["c"] for m in rule.pattern.find_matches(g)
+                                if m["b"].name == "b"])
+    self.assertEqual(1, rule.apply(g))
+    self.assertTrue(g.contains_node("c"))
+    self.assertFalse(g.contains_node("b/square"))
+
+    with self.assertRaises(ValueError):
+      gde.RewriteRule(Op("Mul", inputs=[Input("x"), Input("x")]),
+                      lambda g, _: []).apply(g)
+
+
+  def test_driver(self):
+    tf_graph = tf.Graph()
+    with tf_graph.as_default():
+      x = tf.placeholder(tf.float32, shape=[2], name="x")
+      y = tf.negative(tf.identity(tf.negative(x, name="n1"), name="i1"),
+                      name="n2")
+      y = tf.negative(tf.negative(tf.identity(y, name="i2"), name="n3"),
+                      name="n4")
+      tf.nn.relu(y, name="out")
+    g = gde.Graph(tf_graph)
+    identity = gde.RewriteRule(Op("Identity", inputs=[Input("x")]),
+                               lambda _, b: b["x"], name="identity")
+    double_negation = gde.RewriteRule(
+      Op("Neg", inputs=[Op("Neg", inputs=[Input("x")])]),
+      lambda _, b: b["x"], name="double_negation")
+
+    # Removing the Identity ops exposes more double negations, which the
+    # driver finds without another pass over the graph.
+    driver = gde.RewriteDriver([double_negation, identity], max_rewrites=1)
+    self.assertEqual(1, driver.run(g))
+    self.assertEqual([("identity", "i1")], driver.history)
+    driver = gde.RewriteDriver([double_negation, identity])
+    self.assertEqual(3, driver.run(g))
+    self.assertEqual([("double_negation", "n2"), ("identity", "i2"),
+                      ("double_negation", "n4")], driver.history)
+    self.assertEqual(["x", "out"], [n.name for n in g.nodes])
+    self.assertIs(g["x:0"], g["out"].inputs[0])
+    self.assertEqual(0, driver.run(g))
+
+
+if __name__ == "__main__":
+  unittest.main()
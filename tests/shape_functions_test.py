@@ -0,0 +1,132 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for shape_functions.py in the GraphDef Editor."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+import unittest
+
+import graph_def_editor as gde
+from graph_def_editor import graph as gde_graph
+from graph_def_editor import shape_functions
+
+
+class ShapeFunctionsTest(unittest.TestCase):
+
+  def setUp(self):
+    self.old_cache = gde.get_inference_cache()
+    gde.set_inference_cache(None)
+
+  def tearDown(self):
+    gde.set_inference_cache(self.old_cache)
+
+  def _check_matches_tf(self, tf_g):
+    """Verify that shape functions alone can decode the graph, and that the
+    results are identical to TensorFlow's."""
+    output_map = gde_graph._decode_graph_without_tf(tf_g.as_graph_def())
+    self.assertIsNotNone(output_map)
+    for op in tf_g.get_operations():
+      expected = [(t.dtype, t.shape) for t in op.outputs]
+      actual = output_map[op.name]
+      self.assertEqual(len(expected), len(actual), op.name)
+      for (dtype, shape), (dtype_, shape_) in zip(expected, actual):
+        self.assertEqual(dtype, dtype_, op.name)
+        self.assertEqual(shape.ndims, shape_.ndims, op.name)
+        if shape.ndims is not None:
+          self.assertEqual(shape.as_list(), shape_.as_list(), op.name)
+
+  def test_common_ops(self):
+    tf_g = tf.Graph()
+    with tf_g.as_default():
+      x = tf.placeholder(tf.float32, shape=[None, 32, 32, 3], name="x")
+      y = tf.nn.conv2d(x, tf.ones([3, 3, 3, 8]), strides=[1, 2, 2, 1],
+                       padding="SAME")
+      y = tf.nn.relu(tf.nn.bias_add(y, tf.zeros([8])))
+      y = tf.nn.depthwise_conv2d(y, tf.ones([3, 3, 8, 2]),
+                                 strides=[1, 1, 1, 1], padding="VALID")
+      y = tf.nn.max_pool(y, ksize=[1, 2, 2, 1], strides=[1, 2, 2, 1],
+                         padding="VALID")
+      y = tf.nn.avg_pool(y, ksize=[1, 3, 3, 1], strides=[1, 1, 1, 1],
+                         padding="SAME")
+      y = tf.transpose(y, [0, 3, 1, 2])
+      y = tf.reduce_mean(y, axis=[2, 3])
+      y = tf.matmul(y, tf.ones([16, 10]))
+      y = tf.nn.softmax(y + tf.zeros([10]))
+      tf.argmax(y, axis=1)
+      tf.cast(tf.greater(y, 0.5), tf.int32)
+
+      z = tf.placeholder(tf.float32, shape=[4, 6], name="z")
+      parts = tf.split(z, 2, axis=1)
+      c = tf.concat(parts + [z], axis=-1)
+      r = tf.reshape(c, [-1, 3])
+      tf.squeeze(tf.expand_dims(r, 0), axis=[0])
+      tf.stack([z, z], axis=1)
+      tf.gather(z, tf.constant([0, 2]), axis=1)
+      tf.matmul(tf.ones([2, 4, 5]), tf.ones([5, 7]))
+      tf.shape(z)
+      tf.identity(tf.stop_gradient(z))
+    self._check_matches_tf(tf_g)
+
+  def test_deferral(self):
+    tf_g = tf.Graph()
+    with tf_g.as_default():
+      x = tf.placeholder(tf.float32, shape=[None, 3, 4], name="x")
+      # TensorFlow can resolve the -1 here, so the Python function defers.
+      tf.reshape(x, [-1, 12], name="r")
+    g = gde.Graph(tf_g)
+    self.assertIsNone(gde_graph._decode_graph_without_tf(tf_g.as_graph_def()))
+    self.assertEqual([None, 12], g["r"].outputs[0].shape.as_list())
+
+  def test_mat_mul_rank(self):
+    node_def = tf.NodeDef(name="m", op="MatMul")
+    node_def.attr["T"].type = tf.float32.as_datatype_enum
+
+    def infer(shape_a, shape_b):
+      return shape_functions.infer_outputs(node_def, [
+        (tf.float32, tf.TensorShape(shape_a), "Placeholder", None),
+        (tf.float32, tf.TensorShape(shape_b), "Placeholder", None)])
+
+    [(_, shape)] = infer(None, [3, 4])
+    self.assertEqual([None, 4], shape.as_list())
+    [(_, shape)] = infer([2, 3], None)
+    self.assertEqual([2, None], shape.as_list())
+    # Inputs of known rank other than 2 are left to TensorFlow.
+    self.assertIsNone(infer([], [3, 4]))
+    self.assertIsNone(infer([2, 3], []))
+    self.assertIsNone(infer([2, 3, 4], [4, 5]))
+
+  def test_register(self):
+    self.assertIsNone(gde.get_shape_function("MyOp"))
+
+    @gde.register_shape_function("MyOp")
+    def _my_op_shape(ctx):
+      return [(ctx.input_dtype(0), ctx.input_shape(0).concatenate([2]))]
+    try:
+      self.assertIs(_my_op_shape, gde.get_shape_function("MyOp"))
+      g = gde.Graph()
+      x = gde.make_placeholder(g, "x", tf.float32, tf.TensorShape([3]))
+      n = g.add_node("n", "MyOp")
+      n.set_inputs([x.output(0)])
+      n.infer_outputs()
+      self.assertEqual([3, 2], n.outputs[0].shape.as_list())
+    finally:
+      gde.unregister_shape_function("MyOp")
+    self.assertIsNone(gde.get_shape_function("MyOp"))
+
+
+if __name__ == "__main__":
+  unittest.main()
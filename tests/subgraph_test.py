@@ -95,6 +95,38 @@ class SubgraphTest(unittest.TestCase):
     self.assertEqual(list(sgv.outputs), [self.h])
     self.assertEqual(len(sgv.ops), 7)
 
+  def test_lazy_boundary(self):
+    sgv = gde.sgv(self.f.op, self.g.op)
+    remapped = sgv.remap_inputs([2, 0])
+    self.assertEqual(list(remapped.inputs), [self.a, self.c])
+    self.assertEqual(1, remapped.input_index(self.c))
+    self.assertEqual(0, remapped.output_index(self.f))
+    with self.assertRaises(ValueError):
+      remapped.input_index(self.d)
+    self.assertIs(self.g.op, remapped.find_op_by_name(self.g.op.name))
+    with self.assertRaises(ValueError):
+      remapped.find_op_by_name(self.c.op.name)
+    # Views made from one another share what they have computed.
+    self.assertIs(sgv.outputs[0], remapped.outputs[0])
+    # pylint: disable=protected-access
+    self.assertIs(sgv._output_ts, remapped._output_ts)
+    self.assertIs(sgv._view_ops, remapped._view_ops)
+    # pylint: enable=protected-access
+
+    # A copy keeps the boundary that the original had when it was copied.
+    sgv = gde.sgv(self.e.op)
+    sgv_copy = sgv.copy()
+    self.e.op.replace_input(1, self.a)
+    self.assertEqual(list(sgv_copy.inputs), [self.c, self.d])
+    self.assertEqual(list(gde.sgv(self.e.op).inputs), [self.c, self.a])
+
+    sgv = gde.sgv(self.f.op, self.g.op, self.b)
+    self.assertEqual(list(sgv.inputs), [self.c, self.d, self.a, self.b])
+    self.assertEqual(list(sgv.passthroughs), [self.b])
+    self.assertTrue(sgv.is_passthrough(self.b))
+    # Tensors connected to the ops cannot be passthrough tensors.
+    self.assertEqual(0, len(gde.sgv(self.f.op, self.c).passthroughs))
+
 
 if __name__ == "__main__":
   test.main()
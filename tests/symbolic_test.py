@@ -0,0 +1,81 @@
+# Copyright 2019 IBM. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for symbolic.py in the GraphDef Editor."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+import unittest
+
+import graph_def_editor as gde
+
+
+class SymbolicTest(unittest.TestCase):
+
+  def test_symbolic_dim(self):
+    batch = gde.SymbolicDim.symbol("batch")
+    seq = gde.SymbolicDim.symbol("seq")
+    d = batch * seq * 4 + batch * 2
+    self.assertEqual("4*batch*seq + 2*batch", str(d))
+    self.assertEqual(frozenset(["batch", "seq"]), d.symbols)
+    self.assertEqual(4 * 3 * 5 + 3 * 2, d.evaluate({"batch": 3, "seq": 5}))
+    self.assertEqual(seq * 2 + 1, d.exact_div(batch * 2))
+    self.assertIsNone(d.exact_div(4))
+    self.assertIsNone(d.exact_div(seq))
+    self.assertTrue((batch + -1 * batch + 3).is_constant)
+    self.assertEqual(batch * 2, batch + batch)
+    self.assertEqual(hash(batch * 2), hash(batch + batch))
+
+  def test_propagation(self):
+    tf_g = tf.Graph()
+    with tf_g.as_default():
+      x = tf.placeholder(tf.float32, shape=[None, 784], name="x")
+      y = tf.placeholder(tf.float32, shape=[None, None, 16], name="y")
+      r = tf.reshape(tf.nn.relu(x), [-1, 28, 28], name="r")
+      c = tf.concat([r, r], axis=0, name="c")
+      t = tf.transpose(y, [1, 0, 2], name="t")
+      m = tf.matmul(tf.reshape(t, [-1, 16]), tf.ones([16, 8]), name="m")
+      s = tf.reduce_sum(m, axis=1, name="s")
+      tf.where(tf.ones_like(s) > 0.0, s, s, name="opaque")
+    g = gde.Graph(tf_g)
+    g.set_symbolic_shape("x:0", ["batch", None])
+    g.set_symbolic_shape(g["y"].output(0), ["batch", "seq", None])
+    g.infer_symbolic_shapes()
+
+    batch = gde.SymbolicDim.symbol("batch")
+    seq = gde.SymbolicDim.symbol("seq")
+    self.assertEqual([batch, 784], g[x.op.name].output(0).symbolic_shape)
+    self.assertEqual([batch, 28, 28], g[r.op.name].output(0).symbolic_shape)
+    self.assertEqual([batch * 2, 28, 28],
+                     g[c.op.name].output(0).symbolic_shape)
+    self.assertEqual([seq, batch, 16], g[t.op.name].output(0).symbolic_shape)
+    self.assertEqual([batch * seq, 8], g[m.op.name].output(0).symbolic_shape)
+    self.assertEqual([batch * seq], g[s.op.name].output(0).symbolic_shape)
+    # Ops without a symbolic shape function report their concrete shape.
+    self.assertEqual([None], g["opaque"].output(0).symbolic_shape)
+
+    num_bytes = gde.symbolic_num_elements(
+      g[c.op.name].output(0).symbolic_shape) * tf.float32.size
+    self.assertEqual(2 * 28 * 28 * 4 * 32, num_bytes.evaluate({"batch": 32}))
+    self.assertEqual([64, 28, 28], gde.evaluate_symbolic_shape(
+      g[c.op.name].output(0).symbolic_shape, {"batch": 32}).as_list())
+
+    with self.assertRaises(ValueError):
+      g.set_symbolic_shape("x:0", ["batch"])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -196,6 +196,43 @@ class TransformTest(unittest.TestCase):
     self.assertNear(
       np.linalg.norm(val - np.array([11])), 0.0, ERROR_TOLERANCE)
 
+  def test_copy_infers_shapes(self):
+    tf_graph = tf.Graph()
+    with tf_graph.as_default():
+      x = tf.placeholder(tf.float32, shape=[None, 3], name="x")
+      y = tf.nn.relu(x, name="y")
+      tf.reduce_sum(y, axis=1, name="z")
+      tf.placeholder(tf.float32, shape=[5, 3], name="x_new")
+    g = gde.Graph(tf_graph)
+
+    sgv, info = gde.copy_with_input_replacements(
+        [g["y"], g["z"]], {g["x"].output(0): g["x_new"].output(0)})
+    # Shapes of the copies are re-inferred from the new input's shape...
+    self.assertEqual([5, 3],
+                     info.transformed(g["y"]).outputs[0].shape.as_list())
+    self.assertEqual([5], sgv.outputs[0].shape.as_list())
+
+    # ...while copies with unchanged inputs keep the original metadata.
+    _, info = gde.copy([g["y"], g["z"]], g)
+    self.assertEqual([None],
+                     info.transformed(g["z"]).outputs[0].shape.as_list())
+
+  def test_copy_reshape_with_new_shape_const(self):
+    tf_graph = tf.Graph()
+    with tf_graph.as_default():
+      x = tf.placeholder(tf.float32, shape=[2, 6], name="x")
+      tf.reshape(x, tf.constant([3, 4], name="shape"), name="r")
+      tf.constant([4, 3], name="new_shape")
+    g = gde.Graph(tf_graph)
+    self.assertEqual([3, 4], g["r"].outputs[0].shape.as_list())
+
+    # The new shape has the same dtype and static shape as the old one, but
+    # a different value, so the copy's output shape must be re-inferred.
+    _, info = gde.copy_with_input_replacements(
+        [g["r"]], {g["shape"].output(0): g["new_shape"].output(0)})
+    self.assertEqual([4, 3],
+                     info.transformed(g["r"]).outputs[0].shape.as_list())
+
   @staticmethod
   def _create_replace_graph():
     """Subroutine of the next few tests. Creates the graph that all these
@@ -214,6 +251,133 @@ class TransformTest(unittest.TestCase):
     ret = gde.Graph(tmp_graph)
     return ret, ret["a"].output(0), ret["a_new"].output(0), ret["c"].output(0)
 
+  def test_copy_topological_order(self):
+    # After this edit, "o" consumes a node that was created after it.
+    late = gde.make_const(self.graph, "late", np.ones([10], np.float32))
+    self.o.replace_input(0, late.output(0))
+    graph = gde.Graph()
+    _, info = gde.copy(self.graph, graph)
+    self.assertEqual(len(self.graph.nodes), len(graph.nodes))
+    self.assertIs(graph["late"].output(0), info.transformed(self.o).inputs[0])
+
+  def test_copy_while_loop_temporaries(self):
+    tf_graph = tf.Graph()
+    with tf_graph.as_default():
+      max_index = tf.placeholder(dtype=tf.int32, shape=tuple())
+      _, result = tf.while_loop(
+          cond=lambda i, unused_s: i <= max_index,
+          body=lambda i, s: (i + 1, s + i),
+          loop_vars=[tf.constant(1), tf.constant(0)])
+    g = gde.Graph(tf_graph)
+    copied_graph = gde.Graph()
+    _, info = gde.copy(g, dst_graph=copied_graph, dst_scope="imported")
+    # Temporary placeholders for the loop's back edges are gone.
+    self.assertEqual(len(g.nodes), len(copied_graph.nodes))
+    self.assertFalse(any("geph_tmp" in n.name for n in copied_graph.nodes))
+    next_iteration = info.transformed(g["while/NextIteration"])
+    self.assertIn(next_iteration.outputs[0],
+                  info.transformed(g["while/Merge"]).inputs)
+    with tf.Session(graph=copied_graph.to_tf_graph()) as sess:
+      self.assertEqual(55, sess.run("imported/" + result.name,
+                                    {"imported/" + max_index.name: 10}))
+
+  def test_replicate(self):
+    tf_g = tf.Graph()
+    with tf_g.as_default():
+      x = tf.placeholder(tf.float32, shape=[8, 4], name="x")
+      w = tf.constant(np.ones([4, 3], dtype=np.float32), name="w")
+      y = tf.nn.relu(tf.matmul(x, w, name="tower/matmul"), name="tower/relu")
+      tf.identity(y, name="out")
+      tf.placeholder(tf.float32, shape=[8, 4], name="x0")
+      tf.placeholder(tf.float32, shape=[2, 4], name="x1")
+    g = gde.Graph(tf_g)
+    tower = gde.sgv(g["tower/matmul"], g["tower/relu"])
+    x_t = g["x"].output(0)
+
+    sgvs, infos = gde.replicate(
+        tower, 2, scope_fn="gpu_{}".format,
+        input_bindings=[{x_t: g["x0"].output(0)},
+                        {x_t: g["x1"].output(0)}])
+    self.assertEqual(2, len(sgvs))
+    for i, (sgv_, info) in enumerate(zip(sgvs, infos)):
+      matmul_ = info.transformed(g["tower/matmul"])
+      self.assertEqual("gpu_{}/tower/matmul".format(i), matmul_.name)
+      self.assertIs(g["w"].output(0), matmul_.inputs[1])
+      self.assertIs(g["tower/matmul"], info.original(matmul_))
+      self.assertEqual(len(tower.inputs), len(sgv_.inputs))
+      self.assertEqual([info.transformed(t) for t in tower.outputs],
+                       list(sgv_.outputs))
+    self.assertIs(g["x0"].output(0), sgvs[0].inputs[0])
+    self.assertEqual([8, 3], sgvs[0].outputs[0].shape.as_list())
+    # The second copy has a different input shape, so it was re-inferred.
+    self.assertEqual([2, 3], sgvs[1].outputs[0].shape.as_list())
+
+    # Without bindings, every copy gets its own placeholders, as with copy().
+    sgvs, _ = gde.replicate(tower, 2)
+    self.assertEqual("replica_0/tower/matmul", sgvs[0].ops[0].name)
+    self.assertEqual("Placeholder", sgvs[1].inputs[0].node.op_type)
+    self.assertIsNot(sgvs[0].inputs[0], sgvs[1].inputs[0])
+    with self.assertRaises(ValueError):
+      gde.replicate(tower, 2, input_bindings=[{}])
+
+  def test_replicate_topological_order(self):
+    tf_g = tf.Graph()
+    with tf_g.as_default():
+      x = tf.placeholder(tf.float32, shape=[8, 4], name="x")
+      y = tf.nn.relu(x, name="tower/relu")
+      tf.reduce_sum(y, axis=1, name="tower/sum")
+      tf.placeholder(tf.float32, shape=[2, 4], name="x1")
+    g = gde.Graph(tf_g)
+    # After this edit, tower/sum consumes a node that was created after it.
+    late = g.add_node("tower/late", "Neg")
+    late.add_attr("T", gde.dtypes.float32)
+    late.set_inputs([g["tower/relu:0"]])
+    late.infer_outputs()
+    g["tower/sum"].replace_input(0, late.output(0))
+    tower = gde.sgv(g["tower/relu"], g["tower/sum"], late)
+
+    _, infos = gde.replicate(
+        tower, 1, input_bindings=[{g["x:0"]: g["x1:0"]}])
+    # Shapes are re-inferred producers first.
+    self.assertEqual([2, 4], infos[0].transformed(late).outputs[0]
+                     .shape.as_list())
+    self.assertEqual([2], infos[0].transformed(g["tower/sum"]).outputs[0]
+                     .shape.as_list())
+
+  def test_replicate_while_loop(self):
+    tf_graph = tf.Graph()
+    with tf_graph.as_default():
+      max_index = tf.placeholder(dtype=tf.int32, shape=tuple(),
+                                 name="max_index")
+      index_start = tf.constant(1)
+      sum_start = tf.constant(0)
+      _, result = tf.while_loop(
+          cond=lambda i, unused_s: i <= max_index,
+          body=lambda i, s: (i + 1, s + i),
+          loop_vars=[index_start, sum_start])
+      tf.identity(result, name="result")
+    g = gde.Graph(tf_graph)
+    loop_ops = [n for n in g.nodes if n.name not in ("max_index", "result")]
+    result_t = g[result.op.name].output(0)
+    max_index_t = g["max_index"].output(0)
+
+    # With (empty) bindings, inputs that are not bound stay connected to the
+    # original tensors.
+    _, infos = gde.replicate(loop_ops, 2, input_bindings=lambda i: {})
+    frame_names = set()
+    for info in infos:
+      for n in info.transformed(loop_ops):
+        if n.op_type == "Enter":
+          frame_names.add(n.get_attr("frame_name"))
+    self.assertEqual(2, len(frame_names))
+
+    tf_copied_graph = g.to_tf_graph()
+    with tf_copied_graph.as_default():
+      with tf.Session() as sess:
+        sums = sess.run([info.transformed(result_t).name for info in infos],
+                        feed_dict={max_index_t.name: 10})
+        self.assertEqual([55, 55], sums)
+
   def test_graph_replace(self):
     g, a, a_new, c = self._create_replace_graph()
     c_new = gde.graph_replace(c, {a: a_new})